@@ -14,6 +14,19 @@ from database.repositories.subscription import SubscriptionRepository
 from database.repositories.conversation import ConversationRepository
 from database.repositories.referral import ReferralRepository
 from database.repositories.payment import PaymentRepository
+from database.repositories.analytics import analytics_repo
+from database.repositories.message_tag import message_tag_repo
+
+
+# Теги тем для распределения (порядок — порядок при равных значениях)
+TOPIC_TAGS = (
+    "topic:husband",
+    "topic:children",
+    "topic:self",
+    "topic:relatives",
+    "topic:intimacy",
+    "topic:work",
+)
 
 
 class MetricsService:
@@ -187,17 +200,16 @@ class MetricsService:
     async def get_crisis_alerts(self, hours: int = 24) -> int:
         """Кризисные сигналы за N часов."""
         since = datetime.now() - timedelta(hours=hours)
-        messages = await self.conversation_repo.get_with_tag("crisis", limit=1000, since=since)
-        return len(messages)
+        return await message_tag_repo.count_with_tag("crisis", since=since)
     
     async def get_crisis_monitoring(self, days: int = 7) -> Dict[str, Any]:
         """Мониторинг кризисов."""
         since = datetime.now() - timedelta(days=days)
-        messages = await self.conversation_repo.get_with_tag("crisis", limit=100, since=since)
+        messages = await self.conversation_repo.get_with_tag("crisis", limit=20, since=since)
         
         return {
-            "total_alerts": len(messages),
-            "unique_users": len(set(m.user_id for m in messages)),
+            "total_alerts": await message_tag_repo.count_with_tag("crisis", since=since),
+            "unique_users": await message_tag_repo.count_users_with_tag("crisis", since=since),
             "recent": [
                 {
                     "user_id": m.user_id,
@@ -306,16 +318,9 @@ class MetricsService:
     
     async def get_topic_distribution(self, days: int = 30) -> Dict:
         """Распределение тем."""
-        since = datetime.now() - timedelta(days=days)
-        
-        topics = {
-            "husband": await self._count_tag("topic:husband", since),
-            "children": await self._count_tag("topic:children", since),
-            "self": await self._count_tag("topic:self", since),
-            "relatives": await self._count_tag("topic:relatives", since),
-            "intimacy": await self._count_tag("topic:intimacy", since),
-            "work": await self._count_tag("topic:work", since),
-        }
+        counts = dict(await analytics_repo.get_tag_counts(days, tags=TOPIC_TAGS))
+
+        topics = {tag.split(":", 1)[1]: counts.get(tag, 0) for tag in TOPIC_TAGS}
         
         total = sum(topics.values())
         
@@ -326,11 +331,6 @@ class MetricsService:
             ]
         }
     
-    async def _count_tag(self, tag: str, since: datetime) -> int:
-        """Подсчёт сообщений с тегом."""
-        messages = await self.conversation_repo.get_with_tag(tag, limit=10000, since=since)
-        return len(messages)
-    
     async def get_engagement_segments(self) -> Dict:
         """Сегментация по активности."""
         total = await self.get_total_users()
@@ -0,0 +1,85 @@
+"""
+Anthropic connection pool.
+Общий асинхронный клиент Claude на весь процесс: один keep-alive пул
+HTTP-соединений и ограничение одновременных запросов к API.
+"""
+
+import asyncio
+from typing import Optional
+
+import anthropic
+import httpx
+from loguru import logger
+
+from config.settings import settings
+
+
+_client: Optional[anthropic.AsyncAnthropic] = None
+_semaphore: Optional[asyncio.Semaphore] = None
+
+
+def get_anthropic_client() -> anthropic.AsyncAnthropic:
+    """
+    Возвращает общий AsyncAnthropic клиент (создаётся лениво).
+
+    Все экземпляры ClaudeClient используют один и тот же httpx пул,
+    поэтому TLS-соединения с API переиспользуются между запросами.
+    """
+    global _client
+
+    if _client is None:
+        http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=settings.CLAUDE_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.CLAUDE_MAX_KEEPALIVE_CONNECTIONS,
+            ),
+            timeout=httpx.Timeout(settings.CLAUDE_REQUEST_TIMEOUT, connect=10.0),
+        )
+        client_kwargs = {
+            "api_key": settings.ANTHROPIC_API_KEY,
+            "http_client": http_client,
+            "max_retries": 2,
+        }
+        if settings.ANTHROPIC_BASE_URL:
+            client_kwargs["base_url"] = settings.ANTHROPIC_BASE_URL
+
+        _client = anthropic.AsyncAnthropic(**client_kwargs)
+        logger.info(
+            f"Anthropic pool created: "
+            f"max_connections={settings.CLAUDE_MAX_CONNECTIONS}, "
+            f"max_concurrency={settings.CLAUDE_MAX_CONCURRENCY}"
+        )
+
+    return _client
+
+
+def get_claude_semaphore() -> asyncio.Semaphore:
+    """Возвращает семафор, ограничивающий число одновременных запросов к Claude."""
+    global _semaphore
+
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(settings.CLAUDE_MAX_CONCURRENCY)
+
+    return _semaphore
+
+
+def get_pool_status() -> dict:
+    """Статистика использования пула (для health check и логов)."""
+    semaphore = get_claude_semaphore()
+    return {
+        "max_concurrency": settings.CLAUDE_MAX_CONCURRENCY,
+        "available_slots": semaphore._value,
+        "client_initialized": _client is not None,
+    }
+
+
+async def close_anthropic_client() -> None:
+    """Закрывает общий клиент. Вызывается при остановке бота."""
+    global _client, _semaphore
+
+    if _client is not None:
+        await _client.close()
+        _client = None
+        logger.info("Anthropic pool closed")
+
+    _semaphore = None
@@ -0,0 +1,204 @@
+"""
+Batch generator.
+Генерация проактивных текстов (ритуалы, поздравления, сводки) для задач
+планировщика под общим бюджетом Claude.
+
+Задача отдаёт диспетчеру доставки сотни сообщений, и тексты собираются
+параллельно (DELIVERY_BUILD_CONCURRENCY). Здесь их запросы к Claude:
+
+- идут не больше GENERATION_CONCURRENCY одновременно на все задачи —
+  фоновые рассылки не занимают весь CLAUDE_MAX_CONCURRENCY у диалогов;
+- укладываются в GENERATION_RPM запросов и GENERATION_TPM токенов в минуту
+  (оценка: промпт + max_tokens), при 429 бюджет приостанавливается;
+- одинаковые промпты в полёте выполняются один раз — остальные ждут
+  тот же ответ;
+- шаблонные промпты без данных пользователя (cacheable=True) кэшируются
+  на GENERATION_CACHE_TTL.
+
+Готовый текст сразу уходит на отправку — диспетчер не ждёт всю пачку.
+"""
+
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+import anthropic
+from loguru import logger
+
+from config.settings import settings
+from ai.anthropic_pool import get_anthropic_client, get_claude_semaphore
+from services.telegram_rate_limiter import TokenBucket
+
+
+# Грубая оценка токенов для бюджета (русский текст — 2-3 символа на токен)
+CHARS_PER_TOKEN = 2.5
+
+
+class BatchGenerator:
+    """Общий бюджет, дедупликация и кэш для генерации проактивных текстов."""
+
+    # Сколько шаблонных ответов держать в кэше
+    _MAX_CACHED = 1024
+
+    def __init__(
+        self,
+        concurrency: Optional[int] = None,
+        rpm: Optional[int] = None,
+        tpm: Optional[int] = None,
+        cache_ttl: Optional[float] = None,
+    ):
+        self.concurrency = concurrency or settings.GENERATION_CONCURRENCY
+        self.cache_ttl = cache_ttl if cache_ttl is not None else settings.GENERATION_CACHE_TTL
+        rpm = rpm or settings.GENERATION_RPM
+        tpm = tpm or settings.GENERATION_TPM
+
+        self._slots = asyncio.Semaphore(self.concurrency)
+        # Запросы — ровным темпом, токены — с запасом на секунду
+        self._requests = TokenBucket(rpm / 60)
+        self._tokens = TokenBucket(tpm / 60, capacity=tpm / 60)
+
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self._cache: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+
+        # Метрики
+        self.requests = 0
+        self.deduplicated = 0
+        self.cache_hits = 0
+        self.failed = 0
+        self.tokens_used = 0
+        self.waiting = 0
+
+    async def generate(
+        self,
+        system: str,
+        prompt: str,
+        max_tokens: int = 300,
+        cacheable: bool = False,
+    ) -> str:
+        """
+        Генерирует текст.
+
+        Args:
+            system: Системный промпт
+            prompt: Пользовательский промпт
+            max_tokens: Максимум токенов ответа
+            cacheable: Промпт шаблонный (без данных пользователя) —
+                ответ можно переиспользовать для других пользователей
+
+        Returns:
+            Текст ответа
+
+        Raises:
+            anthropic.APIError: Ошибка Claude (получают все ждущие этот промпт)
+        """
+        key = self._key(system, prompt, max_tokens)
+
+        if cacheable:
+            cached = self._cache.get(key)
+            if cached and cached[0] > time.monotonic():
+                self.cache_hits += 1
+                return cached[1]
+
+        if key in self._in_flight:
+            self.deduplicated += 1
+            return await asyncio.shield(self._in_flight[key])
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            text = await self._generate(system, prompt, max_tokens)
+        except BaseException as e:
+            future.set_exception(e)
+            # Исключение уже получил вызывающий; ждущих может не быть
+            future.exception()
+            raise
+        else:
+            future.set_result(text)
+            if cacheable:
+                self._remember(key, text)
+            return text
+        finally:
+            self._in_flight.pop(key, None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Метрики для /health."""
+        return {
+            "concurrency": self.concurrency,
+            "active": self.concurrency - self._slots._value,
+            "waiting": self.waiting,
+            "in_flight": len(self._in_flight),
+            "requests": self.requests,
+            "deduplicated": self.deduplicated,
+            "cache_hits": self.cache_hits,
+            "cached": len(self._cache),
+            "failed": self.failed,
+            "tokens_used": self.tokens_used,
+        }
+
+    async def _generate(self, system: str, prompt: str, max_tokens: int) -> str:
+        """Один запрос к Claude в пределах бюджета."""
+        estimate = (len(system) + len(prompt)) / CHARS_PER_TOKEN + max_tokens
+
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        try:
+            await self._requests.acquire()
+            await self._tokens.acquire(estimate)
+
+            self.requests += 1
+            text, tokens = await self._request(system, prompt, max_tokens)
+            self.tokens_used += tokens
+            return text
+        except anthropic.RateLimitError as e:
+            self.failed += 1
+            self._pause(e)
+            raise
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self._slots.release()
+
+    async def _request(self, system: str, prompt: str, max_tokens: int) -> Tuple[str, int]:
+        """Запрос к Claude через общий пул. Возвращает текст и потраченные токены."""
+        async with get_claude_semaphore():
+            response = await get_anthropic_client().messages.create(
+                model=settings.CLAUDE_MODEL,
+                max_tokens=max_tokens,
+                system=system,
+                messages=[{"role": "user", "content": prompt}],
+            )
+        usage = response.usage
+        return response.content[0].text, usage.input_tokens + usage.output_tokens
+
+    def _pause(self, error: anthropic.RateLimitError) -> None:
+        """429 от Claude: приостанавливаем бюджет на retry-after."""
+        try:
+            seconds = float(error.response.headers.get("retry-after", 10))
+        except (AttributeError, TypeError, ValueError):
+            seconds = 10.0
+        logger.warning(f"Batch generator: Claude rate limit, pausing for {seconds}s")
+        self._requests.pause(seconds)
+
+    def _remember(self, key: str, text: str) -> None:
+        self._cache[key] = (time.monotonic() + self.cache_ttl, text)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self._MAX_CACHED:
+            self._cache.popitem(last=False)
+
+    @staticmethod
+    def _key(system: str, prompt: str, max_tokens: int) -> str:
+        digest = hashlib.sha256()
+        for part in (system, prompt, str(max_tokens)):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+
+# Глобальный экземпляр
+batch_generator = BatchGenerator()
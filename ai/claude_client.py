@@ -12,31 +12,47 @@ from config.settings import settings
 from utils.retry import async_retry, APIError
 from database.repositories.memory import MemoryRepository
 from database.repositories.conversation import ConversationRepository
-from database.repositories.api_cost import ApiCostRepository
-from ai.prompts.system_prompt import build_system_prompt
+from database.repositories.api_cost import calculate_claude_cost
+from database.api_cost_recorder import api_cost_recorder
+from ai.prompts.system_prompt import build_system_blocks
+from ai.anthropic_pool import get_anthropic_client, get_claude_semaphore
+from services.background_tasks import background_tasks
 from ai.memory.context_builder import ContextBuilder
-from ai.crisis_detector import CrisisDetector
+from ai.memory.history import HistoryBuilder
+from ai.message_analysis import MessageAnalysis, analyze_message
 from ai.memory.attempt_detector import attempt_detector
-from ai.question_type_detector import question_type_detector
 from ai.trigger_detector import trigger_detector
 from ai.medical_filter import medical_filter
 from ai.profile_extractor import profile_extractor
 from database.repositories.trigger import TriggerRepository
 from database.repositories.profile import profile_repo
-from config.constants import MEMORY_CATEGORY_ATTEMPTS
+from config.constants import (
+    MEMORY_CATEGORY_ATTEMPTS,
+)
+
+
+def _cache_tokens(usage: Any) -> Dict[str, int]:
+    """
+    Токены prompt caching из usage ответа.
+    input_tokens у Anthropic их не включает — считаются отдельно.
+    """
+    return {
+        "cache_read_tokens": getattr(usage, "cache_read_input_tokens", 0) or 0,
+        "cache_write_tokens": getattr(usage, "cache_creation_input_tokens", 0) or 0,
+    }
 
 
 class ClaudeClient:
     """Клиент для работы с Claude API."""
     
     def __init__(self):
-        self.client = anthropic.Anthropic(api_key=settings.ANTHROPIC_API_KEY)
+        # Общий AsyncAnthropic клиент с keep-alive пулом на весь процесс
+        self.client = get_anthropic_client()
         self.memory_repo = MemoryRepository()
         self.conversation_repo = ConversationRepository()
         self.trigger_repo = TriggerRepository()
-        self.api_cost_repo = ApiCostRepository()
         self.context_builder = ContextBuilder()
-        self.crisis_detector = CrisisDetector()
+        self.history_builder = HistoryBuilder()
         self.max_retries = 3
         self.retry_delay = 1.0
     
@@ -46,6 +62,7 @@ class ClaudeClient:
         user_message: str,
         user_data: Dict[str, Any],
         is_premium: bool = False,
+        analysis: Optional[MessageAnalysis] = None,
     ) -> Dict[str, Any]:
         """
         Генерирует ответ с учётом контекста и памяти.
@@ -55,6 +72,7 @@ class ClaudeClient:
             user_message: Сообщение пользователя
             user_data: Данные пользователя (персона, имя, и т.д.)
             is_premium: Премиум ли подписка
+            analysis: Разбор сообщения (None — разобрать здесь)
         
         Returns:
             {
@@ -66,39 +84,45 @@ class ClaudeClient:
             }
         """
         try:
-            # 1. Проверка на кризисные сигналы
-            crisis_check = self.crisis_detector.check(user_message)
+            # 1. Разбор сообщения (кризис, настроение, тип вопроса) —
+            # обработчик обычно уже сделал его до генерации
+            if analysis is None:
+                analysis = analyze_message(user_message)
+            crisis_check = analysis.crisis
             
-            # 2. Собираем контекст
+            # 2. История (один запрос на ход, в пределах бюджета токенов) и контекст
             memory_depth = (
                 settings.PREMIUM_MEMORY_DEPTH if is_premium
                 else settings.FREE_MEMORY_DEPTH
             )
 
+            history = await self.history_builder.load(
+                user_id=user_id,
+                current_message=user_message,
+                depth=memory_depth,
+            )
+
             context = await self.context_builder.build(
                 user_id=user_id,
                 user_data=user_data,
                 recent_messages_limit=memory_depth,
                 include_long_term_memory=is_premium,
-                current_message=user_message,
+                analysis=analysis,
+                history=history,
             )
             
             # 3. Формируем системный промпт
-            system_prompt = build_system_prompt(
+            system_prompt = build_system_blocks(
                 persona=user_data.get("persona", "mira"),
                 user_context=context,
                 is_crisis=crisis_check["is_crisis"],
             )
             
-            # 4. Собираем историю сообщений
-            messages = await self._build_messages(
-                user_id=user_id,
-                current_message=user_message,
-                limit=memory_depth,
-            )
+            # 4. История сообщений (уже собрана)
+            messages = history.messages
             
             # 5. Запрос к Claude
-            response = self.client.messages.create(
+            response = await self._create_message(
                 model=settings.CLAUDE_MODEL,
                 max_tokens=settings.CLAUDE_MAX_TOKENS,
                 system=system_prompt,
@@ -113,32 +137,18 @@ class ClaudeClient:
             # 6. Извлекаем теги для памяти
             tags = self._extract_tags(user_message, response_text, crisis_check)
 
-            # 7. Детектим и сохраняем упоминания о попытках решения
-            await self._detect_and_save_attempts(
+            # 7-10. Детекторы, профиль и стоимость — в фоне, ответ уже готов
+            await background_tasks.submit(
+                "claude_post_process",
+                self._post_process_reply,
+                key=user_id,
                 user_id=user_id,
                 user_message=user_message,
                 response_text=response_text,
-            )
-
-            # 8. Детектим негативные реакции на темы (триггеры)
-            await self._detect_and_save_trigger(
-                user_id=user_id,
-                user_message=user_message,
-                bot_response=response_text,
-            )
-
-            # 9. Извлекаем и сохраняем профильные данные
-            await self._extract_and_save_profile(
-                user_id=user_id,
-                user_message=user_message,
-            )
-
-            # 10. Трекаем стоимость API
-            await self._track_api_cost(
-                user_id=user_id,
                 operation='chat_completion',
                 input_tokens=response.usage.input_tokens,
                 output_tokens=response.usage.output_tokens,
+                **_cache_tokens(response.usage),
             )
 
             logger.info(
@@ -169,6 +179,7 @@ class ClaudeClient:
         user_data: Dict[str, Any],
         is_premium: bool = False,
         on_chunk: Optional[Callable[[str], Awaitable[None]]] = None,
+        analysis: Optional[MessageAnalysis] = None,
     ) -> Dict[str, Any]:
         """
         Генерирует ответ с учётом контекста и памяти в режиме streaming.
@@ -179,6 +190,7 @@ class ClaudeClient:
             user_data: Данные пользователя (персона, имя, и т.д.)
             is_premium: Премиум ли подписка
             on_chunk: Callback для обработки каждого чанка текста
+            analysis: Разбор сообщения (None — разобрать здесь)
 
         Returns:
             {
@@ -190,57 +202,66 @@ class ClaudeClient:
             }
         """
         try:
-            # 1. Проверка на кризисные сигналы
-            crisis_check = self.crisis_detector.check(user_message)
+            # 1. Разбор сообщения (кризис, настроение, тип вопроса) —
+            # обработчик обычно уже сделал его до генерации
+            if analysis is None:
+                analysis = analyze_message(user_message)
+            crisis_check = analysis.crisis
 
-            # 2. Собираем контекст
+            # 2. История (один запрос на ход, в пределах бюджета токенов) и контекст
             memory_depth = (
                 settings.PREMIUM_MEMORY_DEPTH if is_premium
                 else settings.FREE_MEMORY_DEPTH
             )
 
+            history = await self.history_builder.load(
+                user_id=user_id,
+                current_message=user_message,
+                depth=memory_depth,
+            )
+
             context = await self.context_builder.build(
                 user_id=user_id,
                 user_data=user_data,
                 recent_messages_limit=memory_depth,
                 include_long_term_memory=is_premium,
-                current_message=user_message,
+                analysis=analysis,
+                history=history,
             )
 
             # 3. Формируем системный промпт
-            system_prompt = build_system_prompt(
+            system_prompt = build_system_blocks(
                 persona=user_data.get("persona", "mira"),
                 user_context=context,
                 is_crisis=crisis_check["is_crisis"],
             )
 
-            # 4. Собираем историю сообщений
-            messages = await self._build_messages(
-                user_id=user_id,
-                current_message=user_message,
-                limit=memory_depth,
-            )
+            # 4. История сообщений (уже собрана)
+            messages = history.messages
 
             # 5. Streaming запрос к Claude
             full_response = ""
             input_tokens = 0
             output_tokens = 0
-
-            with self.client.messages.stream(
-                model=settings.CLAUDE_MODEL,
-                max_tokens=settings.CLAUDE_MAX_TOKENS,
-                system=system_prompt,
-                messages=messages,
-            ) as stream:
-                for text in stream.text_stream:
-                    full_response += text
-                    if on_chunk:
-                        await on_chunk(text)
-
-                # Получаем финальное сообщение для статистики
-                final_message = stream.get_final_message()
-                input_tokens = final_message.usage.input_tokens
-                output_tokens = final_message.usage.output_tokens
+            cache_tokens: Dict[str, int] = {}
+
+            async with get_claude_semaphore():
+                async with self.client.messages.stream(
+                    model=settings.CLAUDE_MODEL,
+                    max_tokens=settings.CLAUDE_MAX_TOKENS,
+                    system=system_prompt,
+                    messages=messages,
+                ) as stream:
+                    async for text in stream.text_stream:
+                        full_response += text
+                        if on_chunk:
+                            await on_chunk(text)
+
+                    # Получаем финальное сообщение для статистики
+                    final_message = await stream.get_final_message()
+                    input_tokens = final_message.usage.input_tokens
+                    output_tokens = final_message.usage.output_tokens
+                    cache_tokens = _cache_tokens(final_message.usage)
 
             # 5.5. Проверяем нужен ли медицинский дисклеймер
             # В streaming режиме мы не можем изменить уже отправленный текст,
@@ -256,32 +277,18 @@ class ClaudeClient:
             # 6. Извлекаем теги для памяти
             tags = self._extract_tags(user_message, full_response, crisis_check)
 
-            # 7. Детектим и сохраняем упоминания о попытках решения
-            await self._detect_and_save_attempts(
+            # 7-10. Детекторы, профиль и стоимость — в фоне, ответ уже отправлен
+            await background_tasks.submit(
+                "claude_post_process",
+                self._post_process_reply,
+                key=user_id,
                 user_id=user_id,
                 user_message=user_message,
                 response_text=full_response,
-            )
-
-            # 8. Детектим негативные реакции на темы (триггеры)
-            await self._detect_and_save_trigger(
-                user_id=user_id,
-                user_message=user_message,
-                bot_response=full_response,
-            )
-
-            # 9. Извлекаем и сохраняем профильные данные
-            await self._extract_and_save_profile(
-                user_id=user_id,
-                user_message=user_message,
-            )
-
-            # 10. Трекаем стоимость API
-            await self._track_api_cost(
-                user_id=user_id,
                 operation='chat_completion_stream',
                 input_tokens=input_tokens,
                 output_tokens=output_tokens,
+                **cache_tokens,
             )
 
             logger.info(
@@ -305,26 +312,14 @@ class ClaudeClient:
             logger.error(f"Error generating streaming response: {e}")
             raise
 
-    async def _build_messages(
-        self,
-        user_id: int,
-        current_message: str,
-        limit: int,
-    ) -> List[Dict[str, str]]:
-        """Собирает историю сообщений для контекста."""
-        history = await self.conversation_repo.get_recent(
-            user_id=user_id,
-            limit=limit,
-        )
-        
-        messages = [
-            {"role": msg.role, "content": msg.content}
-            for msg in history
-        ]
-        messages.append({"role": "user", "content": current_message})
-        
-        return messages
-    
+    async def _create_message(self, **kwargs: Any) -> Any:
+        """
+        Запрос к Claude через общий пул соединений.
+        Ограничивает число одновременных запросов (CLAUDE_MAX_CONCURRENCY).
+        """
+        async with get_claude_semaphore():
+            return await self.client.messages.create(**kwargs)
+
     def _extract_tags(
         self,
         user_message: str,
@@ -429,7 +424,7 @@ class ClaudeClient:
         
         prompt = get_ritual_prompt(ritual_type, user_data, context)
         
-        response = self.client.messages.create(
+        response = await self._create_message(
             model=settings.CLAUDE_MODEL,
             max_tokens=300,
             system=prompt["system"],
@@ -481,7 +476,7 @@ class ClaudeClient:
             )
 
             # 2. Формируем системный промпт с инструкциями для фото
-            base_prompt = build_system_prompt(
+            system_prompt = build_system_blocks(
                 persona=user_data.get("persona", "mira"),
                 user_context=context,
                 is_crisis=False,
@@ -526,7 +521,7 @@ class ClaudeClient:
 - "Хм, не очень разглядела... Что это на фото?"
 """
 
-            system_prompt = base_prompt + image_instructions
+            system_prompt.append({"type": "text", "text": image_instructions.strip()})
 
             # 3. Формируем контент с изображением
             user_content = [
@@ -553,7 +548,7 @@ class ClaudeClient:
                 })
 
             # 4. Запрос к Claude
-            response = self.client.messages.create(
+            response = await self._create_message(
                 model=settings.CLAUDE_MODEL,
                 max_tokens=settings.CLAUDE_MAX_TOKENS,
                 system=system_prompt,
@@ -562,12 +557,16 @@ class ClaudeClient:
 
             response_text = response.content[0].text
 
-            # Трекаем стоимость API
-            await self._track_api_cost(
+            # Трекаем стоимость API (в фоне)
+            await background_tasks.submit(
+                "claude_track_cost",
+                self._track_api_cost,
+                key=user_id,
                 user_id=user_id,
                 operation='image_analysis',
                 input_tokens=response.usage.input_tokens,
                 output_tokens=response.usage.output_tokens,
+                **_cache_tokens(response.usage),
             )
 
             logger.info(
@@ -608,7 +607,7 @@ class ClaudeClient:
             for m in messages
         ])
         
-        response = self.client.messages.create(
+        response = await self._create_message(
             model=settings.CLAUDE_MODEL,
             max_tokens=500,
             system="""
@@ -648,7 +647,7 @@ class ClaudeClient:
             Сгенерированный текст
         """
         try:
-            response = self.client.messages.create(
+            response = await self._create_message(
                 model=settings.CLAUDE_MODEL,
                 max_tokens=max_tokens,
                 system=system_prompt,
@@ -664,6 +663,44 @@ class ClaudeClient:
             logger.error(f"Error in generate_simple: {e}")
             raise
 
+    async def _post_process_reply(
+        self,
+        user_id: int,
+        user_message: str,
+        response_text: str,
+        operation: str,
+        input_tokens: int,
+        output_tokens: int,
+        cache_read_tokens: int = 0,
+        cache_write_tokens: int = 0,
+    ) -> None:
+        """
+        Хвост обработки ответа: детекторы, профиль, стоимость.
+        Выполняется в очереди фоновых задач после отправки ответа.
+        """
+        await self._detect_and_save_attempts(
+            user_id=user_id,
+            user_message=user_message,
+            response_text=response_text,
+        )
+        await self._detect_and_save_trigger(
+            user_id=user_id,
+            user_message=user_message,
+            bot_response=response_text,
+        )
+        await self._extract_and_save_profile(
+            user_id=user_id,
+            user_message=user_message,
+        )
+        await self._track_api_cost(
+            user_id=user_id,
+            operation=operation,
+            input_tokens=input_tokens,
+            output_tokens=output_tokens,
+            cache_read_tokens=cache_read_tokens,
+            cache_write_tokens=cache_write_tokens,
+        )
+
     async def _detect_and_save_attempts(
         self,
         user_id: int,
@@ -814,6 +851,8 @@ class ClaudeClient:
         output_tokens: int,
         message_id: Optional[int] = None,
         admin_user_id: Optional[int] = None,
+        cache_read_tokens: int = 0,
+        cache_write_tokens: int = 0,
     ) -> None:
         """
         Трекает расходы на Claude API.
@@ -821,22 +860,26 @@ class ClaudeClient:
         Args:
             user_id: ID пользователя
             operation: Операция (chat_completion, generate_report, image_analysis)
-            input_tokens: Входящие токены
+            input_tokens: Входящие токены (без кэшированных)
             output_tokens: Выходящие токены
             message_id: ID сообщения (опционально)
             admin_user_id: ID админа (опционально)
+            cache_read_tokens: Токены, прочитанные из кэша промпта
+            cache_write_tokens: Токены, записанные в кэш промпта
         """
         try:
-            # Цены для claude-sonnet-4-20250514
-            # Input: $3 per million tokens
-            # Output: $15 per million tokens
-            input_cost = (input_tokens / 1_000_000) * 3.0
-            output_cost = (output_tokens / 1_000_000) * 15.0
-            total_cost = round(input_cost + output_cost, 6)
+            # Цены по модели — см. CLAUDE_PRICES в config/constants.py
+            total_cost = calculate_claude_cost(
+                settings.CLAUDE_MODEL,
+                input_tokens,
+                output_tokens,
+                cache_read_tokens,
+                cache_write_tokens,
+            )
 
-            total_tokens = input_tokens + output_tokens
+            total_tokens = input_tokens + output_tokens + cache_read_tokens + cache_write_tokens
 
-            await self.api_cost_repo.create(
+            await api_cost_recorder.record(
                 user_id=user_id,
                 provider='claude',
                 operation=operation,
@@ -847,11 +890,14 @@ class ClaudeClient:
                 model=settings.CLAUDE_MODEL,
                 message_id=message_id,
                 admin_user_id=admin_user_id,
+                cache_read_tokens=cache_read_tokens,
+                cache_write_tokens=cache_write_tokens,
             )
 
             logger.debug(
                 f"Tracked API cost for user {user_id}: "
-                f"${total_cost:.6f} ({input_tokens}+{output_tokens} tokens)"
+                f"${total_cost:.6f} ({input_tokens}+{output_tokens} tokens, "
+                f"cache read {cache_read_tokens}, cache write {cache_write_tokens})"
             )
 
         except Exception as e:
@@ -3,9 +3,9 @@ Crisis Detector.
 Детекция кризисных сигналов в сообщениях пользователя.
 """
 
-import re
 from typing import Dict, Any, List
 from config.settings import settings
+from ai.text_matcher import text_matcher
 
 
 class CrisisDetector:
@@ -96,7 +96,10 @@ class CrisisDetector:
     ]
     
     def __init__(self):
-        self.compiled_patterns = [re.compile(p, re.IGNORECASE) for p in self.PATTERNS]
+        # Словари и паттерны — в общий автомат (один проход по тексту)
+        for keywords in self.KEYWORDS.values():
+            text_matcher.register(keywords)
+        self.compiled_patterns = [text_matcher.pattern(p) for p in self.PATTERNS]
     
     def check(self, message: str) -> Dict[str, Any]:
         """
@@ -113,25 +116,24 @@ class CrisisDetector:
                 "recommendation": Optional[str]
             }
         """
-        message_lower = message.lower()
+        matches = text_matcher.scan(message)
         
         matched_keywords = []
         highest_level = None
         
         # Проверяем паттерны
         for pattern in self.compiled_patterns:
-            if pattern.search(message_lower):
+            if matches.search(pattern):
                 # Паттерны обычно указывают на высокий уровень
                 highest_level = self.LEVEL_HIGH
-                matched_keywords.append(f"pattern:{pattern.pattern}")
+                matched_keywords.append(f"pattern:{pattern.source}")
         
         # Проверяем ключевые слова по уровням
         for level in [self.LEVEL_CRITICAL, self.LEVEL_HIGH, self.LEVEL_MEDIUM, self.LEVEL_LOW]:
-            for keyword in self.KEYWORDS[level]:
-                if keyword in message_lower:
-                    matched_keywords.append(keyword)
-                    if highest_level is None or self._level_priority(level) > self._level_priority(highest_level):
-                        highest_level = level
+            for keyword in matches.found(self.KEYWORDS[level]):
+                matched_keywords.append(keyword)
+                if highest_level is None or self._level_priority(level) > self._level_priority(highest_level):
+                    highest_level = level
         
         is_crisis = len(matched_keywords) > 0
         
@@ -250,3 +252,7 @@ class CrisisDetector:
         }
         
         return guides.get(level, guides[self.LEVEL_LOW])
+
+
+# Глобальный экземпляр
+crisis_detector = CrisisDetector()
@@ -6,6 +6,7 @@ from datetime import datetime, timedelta
 from typing import Optional, Dict, Any
 from loguru import logger
 
+from ai.text_matcher import text_matcher
 from database.repositories.followup import FollowUpRepository
 
 
@@ -26,6 +27,19 @@ class FollowUpDetector:
         "начну", "закончу", "сходу", "съезжу",
     ]
 
+    # Гипотетические ситуации (начало сообщения)
+    HYPOTHETICAL_STARTS = ("что если", "а если", "может ли", "стоит ли")
+
+    # Отрицания прошлого и маркеры нового плана после них
+    PAST_FAILURE_MARKERS = ["не смогла", "не получилось", "не вышло"]
+    NEW_PLAN_MARKERS = ["но", "теперь", "сейчас", "завтра"]
+
+    # Маркеры сроков для extract_timeframe
+    TIMEFRAME_MARKERS = [
+        "сегодня", "завтра", "через", "на этой неделе", "на неделе",
+        "в выходные", "в субботу", "в воскресенье", "на следующей неделе",
+    ]
+
     # Категории действий
     ACTION_CATEGORIES = {
         "conversation": [
@@ -60,6 +74,17 @@ class FollowUpDetector:
     def __init__(self):
         self.followup_repo = FollowUpRepository()
 
+        # Словари — в общий автомат (один проход по тексту)
+        for patterns in (
+            self.PLAN_PATTERNS, self.PAST_FAILURE_MARKERS,
+            self.NEW_PLAN_MARKERS, self.TIMEFRAME_MARKERS,
+        ):
+            text_matcher.register(patterns)
+        for keywords in self.ACTION_CATEGORIES.values():
+            text_matcher.register(keywords)
+        for indicators in self.PRIORITY_INDICATORS.values():
+            text_matcher.register(indicators)
+
     def detect_plan_mention(self, message: str) -> bool:
         """
         Детектит упоминание плана или намерения в сообщении.
@@ -70,22 +95,20 @@ class FollowUpDetector:
         Returns:
             True если обнаружено упоминание плана
         """
-        message_lower = message.lower()
+        matches = text_matcher.scan(message)
 
         # Проверяем наличие паттернов
-        has_pattern = any(pattern in message_lower for pattern in self.PLAN_PATTERNS)
-
-        if not has_pattern:
+        if not matches.any(self.PLAN_PATTERNS):
             return False
 
         # Фильтруем вопросы и гипотетические ситуации
-        if message_lower.startswith(("что если", "а если", "может ли", "стоит ли")):
+        if matches.text.startswith(self.HYPOTHETICAL_STARTS):
             return False
 
         # Фильтруем отрицания прошлого
-        if any(neg in message_lower for neg in ["не смогла", "не получилось", "не вышло"]):
+        if matches.any(self.PAST_FAILURE_MARKERS):
             # Если есть "но" или "теперь" — это новый план
-            if not any(conj in message_lower for conj in ["но", "теперь", "сейчас", "завтра"]):
+            if not matches.any(self.NEW_PLAN_MARKERS):
                 return False
 
         logger.debug(f"Detected potential plan mention in message: {message[:50]}...")
@@ -101,10 +124,10 @@ class FollowUpDetector:
         Returns:
             Название категории
         """
-        action_lower = action.lower()
+        matches = text_matcher.scan(action)
 
         for category, keywords in self.ACTION_CATEGORIES.items():
-            if any(keyword in action_lower for keyword in keywords):
+            if matches.any(keywords):
                 return category
 
         return "other"
@@ -120,10 +143,10 @@ class FollowUpDetector:
         Returns:
             Приоритет: urgent/high/medium/low
         """
-        full_text = f"{message} {action}".lower()
+        matches = text_matcher.scan(f"{message} {action}")
 
         for priority, indicators in self.PRIORITY_INDICATORS.items():
-            if any(ind in full_text for ind in indicators):
+            if matches.any(indicators):
                 return priority
 
         # По умолчанию — medium
@@ -139,20 +162,20 @@ class FollowUpDetector:
         Returns:
             Дата когда планировалось выполнить или None
         """
-        message_lower = message.lower()
+        matches = text_matcher.scan(message)
         now = datetime.utcnow()
 
         # Сегодня
-        if "сегодня" in message_lower:
+        if "сегодня" in matches:
             return now
 
         # Завтра
-        if "завтра" in message_lower:
+        if "завтра" in matches:
             return now + timedelta(days=1)
 
         # Через N дней
-        if "через" in message_lower:
-            words = message_lower.split()
+        if "через" in matches:
+            words = matches.text.split()
             for i, word in enumerate(words):
                 if word == "через" and i + 1 < len(words):
                     next_word = words[i + 1]
@@ -161,18 +184,18 @@ class FollowUpDetector:
                         return now + timedelta(days=days)
 
         # На этой неделе
-        if "на этой неделе" in message_lower or "на неделе" in message_lower:
+        if "на этой неделе" in matches or "на неделе" in matches:
             return now + timedelta(days=3)  # Примерно середина недели
 
         # В выходные
-        if "в выходные" in message_lower or "в субботу" in message_lower or "в воскресенье" in message_lower:
+        if "в выходные" in matches or "в субботу" in matches or "в воскресенье" in matches:
             days_until_weekend = (5 - now.weekday()) % 7
             if days_until_weekend == 0:
                 days_until_weekend = 7
             return now + timedelta(days=days_until_weekend)
 
         # Следующая неделя
-        if "на следующей неделе" in message_lower:
+        if "на следующей неделе" in matches:
             return now + timedelta(weeks=1)
 
         # По умолчанию — завтра
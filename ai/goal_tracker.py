@@ -8,6 +8,7 @@ from typing import Optional, Dict, Any, List
 from loguru import logger
 
 from ai.claude_client import ClaudeClient
+from ai.text_matcher import text_matcher
 from database.repositories.goal import GoalRepository
 
 
@@ -30,6 +31,12 @@ class GoalTracker:
         "буду", "начну", "попробую",
     ]
 
+    # Прошедшее время — не цель
+    PAST_INDICATORS = ["хотела", "хотелось", "мечтала", "планировала"]
+
+    # ...если только нет поворота к новому плану
+    NEW_PLAN_MARKERS = ["но", "теперь"]
+
     # Категории целей
     GOAL_CATEGORIES = {
         "health": ["похудеть", "вес", "здоровье", "спорт", "зал", "йога", "питание", "диета"],
@@ -44,6 +51,12 @@ class GoalTracker:
         self.goal_repo = GoalRepository()
         self.claude_client = ClaudeClient()
 
+        # Словари — в общий автомат (один проход по тексту)
+        for patterns in (self.GOAL_PATTERNS, self.PAST_INDICATORS, self.NEW_PLAN_MARKERS):
+            text_matcher.register(patterns)
+        for keywords in self.GOAL_CATEGORIES.values():
+            text_matcher.register(keywords)
+
     def detect_goal_mention(self, message: str) -> bool:
         """
         Детектит упоминание цели в сообщении.
@@ -54,20 +67,17 @@ class GoalTracker:
         Returns:
             True если обнаружено упоминание цели
         """
-        message_lower = message.lower()
+        matches = text_matcher.scan(message)
 
         # Проверяем наличие паттернов
-        has_pattern = any(pattern in message_lower for pattern in self.GOAL_PATTERNS)
-
-        if not has_pattern:
+        if not matches.any(self.GOAL_PATTERNS):
             return False
 
         # Проверяем что это не вопрос о прошлом
-        past_indicators = ["хотела", "хотелось", "мечтала", "планировала"]
-        is_past = any(ind in message_lower for ind in past_indicators)
+        is_past = matches.any(self.PAST_INDICATORS)
 
         # Если в прошедшем времени — не цель
-        if is_past and "но" not in message_lower and "теперь" not in message_lower:
+        if is_past and not matches.any(self.NEW_PLAN_MARKERS):
             return False
 
         logger.debug(f"Detected potential goal mention in message: {message[:50]}...")
@@ -83,10 +93,10 @@ class GoalTracker:
         Returns:
             Название категории или None
         """
-        message_lower = message.lower()
+        matches = text_matcher.scan(message)
 
         for category, keywords in self.GOAL_CATEGORIES.items():
-            if any(keyword in message_lower for keyword in keywords):
+            if matches.any(keywords):
                 return category
 
         return "other"
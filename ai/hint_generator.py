@@ -8,6 +8,8 @@ from typing import List, Dict, Any, Optional
 from dataclasses import dataclass
 from loguru import logger
 
+from ai.text_matcher import text_matcher
+
 
 @dataclass
 class Hint:
@@ -168,17 +170,63 @@ class HintGenerator:
         "сердце сжимается", "душа", "слёзы", "плачу",
     ]
 
+    # Фразы, по которым тема считается активной в текущем обмене
+    # Тема считается активной только если она ЦЕНТРАЛЬНАЯ в сообщении
+    TOPIC_ACTIVE_PHRASES = {
+        # НЕ достаточно просто упомянуть "работа"
+        # Нужны фразы которые показывают что тема ОБСУЖДАЕТСЯ
+        "topic:work": [
+            "на работе", "работе трудно", "работе тяжело",
+            "начальник", "коллеги меня", "устала на работе",
+            "выгораю", "карьера", "увольняться", "уволить",
+            "рабочий день", "работе не ценят", "работе стресс"
+        ],
+        "topic:husband": [
+            "с мужем", "муж не", "муж сказал", "муж сделал",
+            "супруг", "мужа бесит", "мужем отношения",
+            "муж меня", "мужу сказала", "мужа просила"
+        ],
+        "topic:children": [
+            "дети", "ребёнок", "ребенок", "сын", "дочь",
+            "детьми", "детей", "ребёнка", "школ", "детский сад"
+        ],
+        "topic:relatives": [
+            "свекровь", "тёща", "теща", "родители",
+            "свекрови", "родственник", "мама", "папа",
+            "родня", "семья мужа"
+        ],
+        "topic:intimacy": [
+            "близост", "секс", "интим", "нежност",
+            "охлаждени", "страст", "желани"
+        ],
+        "topic:self": [
+            "я хочу", "моя жизнь", "мне нужно", "я мечтаю",
+            "для себя", "о себе", "саморазвитие",
+            "мои желания", "кто я"
+        ],
+    }
+
+    def __init__(self):
+        # Словари и паттерны — в общий автомат (один проход по тексту)
+        text_matcher.register(self.SERIOUS_CONTEXT_MARKERS)
+        for phrases in self.TOPIC_ACTIVE_PHRASES.values():
+            text_matcher.register(phrases)
+        self.response_triggers = [
+            (text_matcher.pattern(pattern), trigger_hints)
+            for pattern, trigger_hints in self.RESPONSE_TRIGGERS.items()
+        ]
+
     def _is_serious_context(self, user_message: str, response_text: str) -> bool:
         """
         Проверяет, является ли контекст разговора серьёзным.
         В серьёзных контекстах подсказки НЕ уместны.
         """
-        combined = (user_message + " " + response_text).lower()
+        matches = text_matcher.scan_joined(user_message, response_text)
 
-        for marker in self.SERIOUS_CONTEXT_MARKERS:
-            if marker in combined:
-                logger.debug(f"Serious context detected (hints): '{marker}'")
-                return True
+        marker = matches.first(self.SERIOUS_CONTEXT_MARKERS)
+        if marker:
+            logger.debug(f"Serious context detected (hints): '{marker}'")
+            return True
 
         return False
 
@@ -217,10 +265,10 @@ class HintGenerator:
             hints.extend(self.STARTER_HINTS)
 
         # 2. ПРИОРИТЕТ: Анализируем ответ Миры на триггеры (контекстные подсказки)
-        response_lower = response_text.lower()
+        response_matches = text_matcher.scan(response_text)
 
-        for pattern, trigger_hints in self.RESPONSE_TRIGGERS.items():
-            if re.search(pattern, response_lower):
+        for pattern, trigger_hints in self.response_triggers:
+            if response_matches.search(pattern):
                 contextual_hints.extend(trigger_hints)
 
         # 3. Если есть контекстные подсказки — используем ТОЛЬКО их
@@ -364,62 +412,10 @@ class HintGenerator:
             True если тема активна в контексте
         """
         # Объединяем оба сообщения для анализа
-        combined = (user_message + " " + response_text).lower()
-
-        # Для каждой темы — СТРОГИЕ критерии активности
-        # Тема считается активной только если она ЦЕНТРАЛЬНАЯ в сообщении
-
-        if topic_tag == "topic:work":
-            # НЕ достаточно просто упомянуть "работа"
-            # Нужны фразы которые показывают что тема ОБСУЖДАЕТСЯ
-            work_active_phrases = [
-                "на работе", "работе трудно", "работе тяжело",
-                "начальник", "коллеги меня", "устала на работе",
-                "выгораю", "карьера", "увольняться", "уволить",
-                "рабочий день", "работе не ценят", "работе стресс"
-            ]
-            return any(phrase in combined for phrase in work_active_phrases)
-
-        elif topic_tag == "topic:husband":
-            husband_active_phrases = [
-                "с мужем", "муж не", "муж сказал", "муж сделал",
-                "супруг", "мужа бесит", "мужем отношения",
-                "муж меня", "мужу сказала", "мужа просила"
-            ]
-            return any(phrase in combined for phrase in husband_active_phrases)
-
-        elif topic_tag == "topic:children":
-            children_active_phrases = [
-                "дети", "ребёнок", "ребенок", "сын", "дочь",
-                "детьми", "детей", "ребёнка", "школ", "детский сад"
-            ]
-            return any(phrase in combined for phrase in children_active_phrases)
-
-        elif topic_tag == "topic:relatives":
-            relatives_active_phrases = [
-                "свекровь", "тёща", "теща", "родители",
-                "свекрови", "родственник", "мама", "папа",
-                "родня", "семья мужа"
-            ]
-            return any(phrase in combined for phrase in relatives_active_phrases)
-
-        elif topic_tag == "topic:intimacy":
-            intimacy_active_phrases = [
-                "близост", "секс", "интим", "нежност",
-                "охлаждени", "страст", "желани"
-            ]
-            return any(phrase in combined for phrase in intimacy_active_phrases)
-
-        elif topic_tag == "topic:self":
-            self_active_phrases = [
-                "я хочу", "моя жизнь", "мне нужно", "я мечтаю",
-                "для себя", "о себе", "саморазвитие",
-                "мои желания", "кто я"
-            ]
-            return any(phrase in combined for phrase in self_active_phrases)
-
-        # По умолчанию — считаем тему неактивной
-        return False
+        matches = text_matcher.scan_joined(user_message, response_text)
+
+        # Для тем без списка фраз — считаем тему неактивной
+        return matches.any(self.TOPIC_ACTIVE_PHRASES.get(topic_tag, ()))
 
 
 # Глобальный экземпляр
@@ -3,10 +3,11 @@ Medical Filter.
 Фильтр для проверки и корректировки медицинских советов в ответах бота.
 """
 
-import re
 from typing import Tuple, Optional
 from loguru import logger
 
+from ai.text_matcher import text_matcher
+
 
 # Маркеры медицинской темы в сообщении пользователя
 MEDICAL_TOPIC_MARKERS = [
@@ -38,6 +39,21 @@ DANGEROUS_ADVICE_PATTERNS = [
     r"(у тебя|это)\s+\w*\s*(заболеван|болезн|синдром|расстройств)",
 ]
 
+# Упоминания врача в ответе — дисклеймер уже не нужен
+DOCTOR_MENTIONS = ["врач", "доктор", "специалист", "терапевт", "невролог", "проконсультир"]
+
+# Советы в ответе (даже безобидные)
+ADVICE_MARKERS = [
+    "попробуй", "попей", "прими", "отдохни", "поспи", "выпей",
+    "приложи", "помассируй", "согрей", "охлади",
+]
+
+# Словари и паттерны — в общий автомат (один проход по тексту)
+text_matcher.register(MEDICAL_TOPIC_MARKERS)
+text_matcher.register(DOCTOR_MENTIONS)
+text_matcher.register(ADVICE_MARKERS)
+_DANGEROUS_ADVICE = [text_matcher.pattern(p) for p in DANGEROUS_ADVICE_PATTERNS]
+
 # Мягкий дисклеймер для добавления
 MEDICAL_DISCLAIMER = "\n\n💛 Но я не врач — если что-то беспокоит, лучше проконсультируйся со специалистом."
 
@@ -58,12 +74,10 @@ class MedicalFilter:
         Returns:
             True если медицинская тема
         """
-        message_lower = user_message.lower()
-
-        for marker in MEDICAL_TOPIC_MARKERS:
-            if marker in message_lower:
-                logger.debug(f"Medical topic detected: '{marker}'")
-                return True
+        marker = text_matcher.scan(user_message).first(MEDICAL_TOPIC_MARKERS)
+        if marker:
+            logger.debug(f"Medical topic detected: '{marker}'")
+            return True
 
         return False
 
@@ -77,13 +91,13 @@ class MedicalFilter:
         Returns:
             (has_dangerous, matched_pattern)
         """
-        response_lower = response.lower()
+        matches = text_matcher.scan(response)
 
-        for pattern in DANGEROUS_ADVICE_PATTERNS:
-            match = re.search(pattern, response_lower)
-            if match:
-                logger.warning(f"Dangerous medical advice detected: '{match.group()}'")
-                return True, match.group()
+        for pattern in _DANGEROUS_ADVICE:
+            matched = matches.search(pattern)
+            if matched:
+                logger.warning(f"Dangerous medical advice detected: '{matched}'")
+                return True, matched
 
         return False, None
 
@@ -107,25 +121,14 @@ class MedicalFilter:
         if not self.is_medical_topic(user_message):
             return False
 
-        response_lower = response.lower()
+        matches = text_matcher.scan(response)
 
         # Если уже есть упоминание врача — дисклеймер не нужен
-        doctor_mentions = ["врач", "доктор", "специалист", "терапевт", "невролог", "проконсультир"]
-        for mention in doctor_mentions:
-            if mention in response_lower:
-                return False
+        if matches.any(DOCTOR_MENTIONS):
+            return False
 
         # Проверяем есть ли советы в ответе
-        advice_markers = [
-            "попробуй", "попей", "прими", "отдохни", "поспи", "выпей",
-            "приложи", "помассируй", "согрей", "охлади",
-        ]
-
-        for marker in advice_markers:
-            if marker in response_lower:
-                return True
-
-        return False
+        return matches.any(ADVICE_MARKERS)
 
     def filter_response(self, user_message: str, response: str) -> str:
         """
@@ -3,10 +3,16 @@ Context Builder.
 Сборка контекста пользователя из памяти и истории.
 """
 
+import asyncio
+import time
 from datetime import datetime, timedelta
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Awaitable, Callable
 from loguru import logger
 
+from config.settings import settings
+from database.session import is_sqlite
+from database.context_cache import context_cache
+
 from database.repositories.memory import MemoryRepository
 from database.repositories.conversation import ConversationRepository
 from database.repositories.mood import MoodRepository
@@ -15,8 +21,9 @@ from database.repositories.trigger import TriggerRepository
 from database.repositories.goal import GoalRepository
 from database.repositories.followup import FollowUpRepository
 from database.repositories.profile import profile_repo
-from ai.style_analyzer import style_analyzer
-from ai.question_type_detector import question_type_detector
+from ai.style_analyzer import style_analyzer, STYLE_WINDOW
+from ai.message_analysis import MessageAnalysis
+from ai.memory.history import HistoryWindow, CONVERSATION_PATTERNS_WINDOW
 from ai.time_context import get_time_context_for_user
 from config.constants import (
     MEMORY_CATEGORY_FAMILY,
@@ -27,8 +34,9 @@ from config.constants import (
     MEMORY_CATEGORY_ATTEMPTS,
 )
 
-# Интервал обновления стиля (в сообщениях)
-STYLE_UPDATE_INTERVAL = 50
+
+# Окно «недавних тем» (дни); если за окно тем нет — берём темы за всё время
+RECENT_TOPICS_DAYS = 30
 
 
 class ContextBuilder:
@@ -49,7 +57,8 @@ class ContextBuilder:
         user_data: Dict[str, Any],
         recent_messages_limit: int = 10,
         include_long_term_memory: bool = True,
-        current_message: Optional[str] = None,
+        analysis: Optional[MessageAnalysis] = None,
+        history: Optional[HistoryWindow] = None,
     ) -> Dict[str, Any]:
         """
         Собирает полный контекст пользователя.
@@ -59,7 +68,8 @@ class ContextBuilder:
             user_data: Базовые данные пользователя
             recent_messages_limit: Лимит недавних сообщений
             include_long_term_memory: Включать ли долговременную память
-            current_message: Текущее сообщение пользователя (для детекции вопроса)
+            analysis: Разбор текущего сообщения (тип вопроса уже определён)
+            history: История хода (уже загружена для запроса к Claude)
 
         Returns:
             Словарь с контекстом для промпта
@@ -76,27 +86,71 @@ class ContextBuilder:
         if user_data.get("voice_requested"):
             context["voice_requested"] = True
 
-        # Детекция типа вопроса (если есть текущее сообщение)
-        if current_message:
-            question_info = question_type_detector.detect(current_message)
-            if question_info:
-                context["question_type"] = question_info
-
-        # Добавляем полный контекст времени (день недели, праздники, смена дней)
-        last_message = await self.conversation_repo.get_last_message(user_id, role="user")
-        last_message_time = last_message.created_at if last_message else None
-
-        time_context = get_time_context_for_user(
-            timezone=user_data.get("timezone", "Europe/Moscow"),
-            last_message_time=last_message_time,
-        )
-        if time_context:
-            context["time_context"] = time_context
+        # Тип вопроса — из разбора текущего сообщения
+        if analysis is not None and analysis.question_type:
+            context["question_type"] = analysis.question_type
+
+        # Резюме старой части разговора, не попавшей в бюджет истории
+        if history is not None and history.summary:
+            context["history_summary"] = history.summary
+
+        # Редко меняющиеся секции берём из кэша (один HGETALL на все),
+        # промахи догружаются из БД и кладутся обратно, если с этого момента
+        # не было инвалидации (поколение не изменилось)
+        cached, generation = await context_cache.snapshot(user_id)
+
+        # Все секции независимы — собираем их параллельно, каждая со своим
+        # бюджетом времени. Медленная или упавшая секция просто пропускается.
+        timings: Dict[str, float] = {}
+        sections = {
+            "time_context": self._get_time_context(user_id, user_data),
+            "conversation_patterns": self._detect_conversation_patterns(
+                user_id,
+                history.history[-CONVERSATION_PATTERNS_WINDOW:] if history is not None else None,
+            ),
+            "recent_topics": self._cached_section(
+                user_id, "recent_topics", cached, generation,
+                lambda: self._get_recent_topics(user_id, limit=5),
+            ),
+            "mood_summary": self._cached_section(
+                user_id, "mood_summary", cached, generation,
+                lambda: self._get_mood_summary(user_id),
+            ),
+            "sensitive_topics": self._cached_section(
+                user_id, "sensitive_topics", cached, generation,
+                lambda: self._get_sensitive_topics(user_id),
+            ),
+            "active_goals": self._cached_section(
+                user_id, "active_goals", cached, generation,
+                lambda: self._get_active_goals(user_id),
+            ),
+            # Не кэшируется: зависит от текущего времени
+            "pending_followups": self._get_pending_followups(user_id),
+            "communication_style": self._get_communication_style(
+                user_id=user_id,
+                current_style=user_data.get("communication_style"),
+            ),
+        }
+        # Профиль уже загружен вместе с пользователем (UserTurnSnapshot) —
+        # кэш нужен только когда его нет
+        profile_summary = user_data.get("profile_summary")
+        if profile_summary is not None:
+            sections["user_profile"] = self._get_user_profile_summary(
+                user_id, preloaded=profile_summary
+            )
+        else:
+            sections["user_profile"] = self._cached_section(
+                user_id, "user_profile", cached, generation,
+                lambda: self._get_user_profile_summary(user_id),
+            )
+        # Долговременная память (только для премиум)
+        if include_long_term_memory:
+            sections["long_term_memory"] = self._cached_section(
+                user_id, "long_term_memory", cached, generation,
+                lambda: self._get_long_term_memory(user_id),
+            )
 
-        # Детектор зацикливания на темах
-        conversation_patterns = await self._detect_conversation_patterns(user_id)
-        if conversation_patterns:
-            context["conversation_patterns"] = conversation_patterns
+        results = await self._gather_sections(sections, timings)
 
         # Добавляем контекст последнего отправленного фото если есть
         # Это помогает Claude понимать вопросы вроде "Сколько ему?" после показа фото
@@ -104,135 +158,183 @@ class ContextBuilder:
         if last_photo_sent:
             context["last_photo_sent"] = last_photo_sent
 
-        # Получаем недавние темы из тегов
-        recent_topics = await self._get_recent_topics(user_id, limit=5)
-        if recent_topics:
-            context["recent_topics"] = recent_topics
-
-        # Mood tracking — история настроения
-        mood_summary = await self._get_mood_summary(user_id)
-        if mood_summary and mood_summary.get("has_data"):
-            context["mood_summary"] = mood_summary
+        for name, value in results.items():
+            if not value:
+                continue
+            if name == "mood_summary" and not value.get("has_data"):
+                continue
+            context[name] = value
+
+        context["section_timings"] = timings
+        logger.debug(
+            f"Context built for user {user_id}: "
+            + ", ".join(f"{name}={ms:.0f}ms" for name, ms in timings.items())
+        )
 
-        # Чувствительные темы (триггеры)
-        sensitive_topics = await self._get_sensitive_topics(user_id)
-        if sensitive_topics:
-            context["sensitive_topics"] = sensitive_topics
+        return context
 
-        # Активные цели пользователя
-        active_goals = await self._get_active_goals(user_id)
-        if active_goals:
-            context["active_goals"] = active_goals
+    async def _gather_sections(
+        self,
+        sections: Dict[str, Awaitable[Any]],
+        timings: Dict[str, float],
+    ) -> Dict[str, Any]:
+        """
+        Выполняет секции контекста и возвращает их результаты по имени.
 
-        # Pending follow-ups (обещания и планы)
-        pending_followups = await self._get_pending_followups(user_id)
-        if pending_followups:
-            context["pending_followups"] = pending_followups
+        На PostgreSQL секции идут параллельно (у каждой своя сессия из пула),
+        на SQLite — последовательно, т.к. StaticPool держит одно соединение.
+        """
+        if is_sqlite:
+            return {
+                name: await self._run_section(name, coro, timings)
+                for name, coro in sections.items()
+            }
+
+        values = await asyncio.gather(*(
+            self._run_section(name, coro, timings)
+            for name, coro in sections.items()
+        ))
+        return dict(zip(sections.keys(), values))
+
+    async def _cached_section(
+        self,
+        user_id: int,
+        name: str,
+        cached: Dict[str, Any],
+        generation: int,
+        load: Callable[[], Awaitable[Any]],
+    ) -> Any:
+        """
+        Возвращает секцию из кэша или загружает её и кладёт в кэш.
+        Пустые результаты (None) тоже кэшируются — у большинства
+        пользователей нет целей или триггеров, и это тоже ответ.
+        Если за время загрузки секцию инвалидировали, значение в кэш
+        не кладётся — оно могло быть прочитано до записи.
+        """
+        if name in cached:
+            context_cache.record(name, hit=True)
+            return cached[name]
 
-        # Расширенный профиль пользователя (собранный из разговоров)
-        user_profile_summary = await self._get_user_profile_summary(user_id)
-        if user_profile_summary:
-            context["user_profile"] = user_profile_summary
+        context_cache.record(name, hit=False)
+        value = await load()
+        await context_cache.set_section(user_id, name, value, generation)
+        return value
 
-        # Долговременная память (только для премиум)
-        if include_long_term_memory:
-            long_term_memory = await self._get_long_term_memory(user_id)
-            if long_term_memory:
-                context["long_term_memory"] = long_term_memory
+    async def _run_section(
+        self,
+        name: str,
+        coro: Awaitable[Any],
+        timings: Dict[str, float],
+    ) -> Any:
+        """
+        Выполняет одну секцию с таймаутом CONTEXT_SECTION_TIMEOUT.
+        При ошибке или таймауте возвращает None (graceful degradation).
+        """
+        started = time.perf_counter()
+        try:
+            return await asyncio.wait_for(coro, timeout=settings.CONTEXT_SECTION_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning(
+                f"Context section '{name}' exceeded "
+                f"{settings.CONTEXT_SECTION_TIMEOUT:.1f}s budget, skipped"
+            )
+            return None
+        except Exception as e:
+            logger.warning(f"Context section '{name}' failed: {e}")
+            return None
+        finally:
+            timings[name] = round((time.perf_counter() - started) * 1000, 1)
 
-        # Стиль общения пользователя (персонализация)
-        communication_style = user_data.get("communication_style")
+    async def _get_time_context(
+        self,
+        user_id: int,
+        user_data: Dict[str, Any],
+    ) -> Optional[Dict[str, Any]]:
+        """Полный контекст времени (день недели, праздники, смена дней)."""
+        last_message = await self.conversation_repo.get_last_message(user_id, role="user")
+        last_message_time = last_message.created_at if last_message else None
 
-        # Проверяем, нужно ли обновить стиль
-        should_update_style = await self._should_update_style(
-            user_id=user_id,
-            current_style=communication_style,
+        return get_time_context_for_user(
+            timezone=user_data.get("timezone", "Europe/Moscow"),
+            last_message_time=last_message_time,
         )
 
-        if communication_style and not should_update_style:
-            context["communication_style"] = communication_style
-        else:
-            # Анализируем стиль из недавних сообщений
-            recent_messages = await self.conversation_repo.get_recent(
-                user_id=user_id, limit=20
-            )
-            if recent_messages:
-                messages_for_analysis = [
-                    {"role": m.role, "content": m.content}
-                    for m in recent_messages
-                ]
-                analyzed_style = style_analyzer.analyze_messages(messages_for_analysis)
-                context["communication_style"] = analyzed_style
-
-                # Сохраняем обновлённый стиль в БД
-                try:
-                    await self.user_repo.update_communication_style(
-                        user_id=user_id,
-                        style=analyzed_style,
-                    )
-                    logger.info(f"Updated communication style for user {user_id}")
-                except Exception as e:
-                    logger.warning(f"Failed to save communication style: {e}")
-
-        return context
-
-    async def _should_update_style(
+    async def _get_communication_style(
         self,
         user_id: int,
         current_style: Optional[Dict[str, Any]],
-    ) -> bool:
+    ) -> Optional[Dict[str, Any]]:
         """
-        Определяет, нужно ли обновить стиль общения.
+        Стиль общения пользователя (персонализация).
+        Поддерживается в актуальном состоянии observe_user_message —
+        здесь только читается из данных пользователя, без запросов к БД.
+        """
+        return current_style or None
 
-        Обновляем если:
-        - Стиль ещё не анализировался
-        - Прошло более 50 сообщений с последнего обновления
+    async def observe_user_message(self, user_id: int, text: str) -> None:
         """
-        if not current_style:
-            return True
+        Обновляет стиль общения новым сообщением пользователя.
+        Вызывается после сохранения сообщения (фоновая задача).
 
-        style_updated_at = current_style.get("updated_at")
-        if not style_updated_at:
-            return True
+        Первое обращение (агрегатов ещё нет) восстанавливает окно
+        из последних STYLE_WINDOW сообщений, дальше — O(1) на сообщение.
+        """
+        if not text:
+            return
 
-        # Получаем количество сообщений пользователя
-        message_count = await self.conversation_repo.count_user_messages(user_id)
+        stats, current_style = await self.user_repo.get_style_state(user_id)
 
-        # Обновляем каждые N сообщений
-        if message_count > 0 and message_count % STYLE_UPDATE_INTERVAL == 0:
-            logger.debug(
-                f"Style update triggered for user {user_id}: "
-                f"{message_count} messages"
+        if stats is None:
+            recent_messages = await self.conversation_repo.get_recent(
+                user_id=user_id, limit=STYLE_WINDOW
             )
-            return True
+            history = [m.content for m in recent_messages if m.role == "user" and m.content]
+            # Сообщение уже сохранено и попадает в историю
+            if not history or history[-1] != text:
+                history.append(text)
+            for content in history:
+                stats = style_analyzer.observe(stats, content)
+        else:
+            stats = style_analyzer.observe(stats, text)
+
+        new_style = style_analyzer.style_from_stats(stats, current_style)
+        changed = style_analyzer.style_changed(current_style, new_style)
+
+        await self.user_repo.update_style_state(
+            user_id=user_id,
+            stats=stats,
+            style=new_style if changed else None,
+        )
+        if changed:
+            logger.info(f"Updated communication style for user {user_id}")
 
-        return False
-    
     async def _get_recent_topics(
         self,
         user_id: int,
         limit: int = 5,
     ) -> List[str]:
         """Извлекает недавние темы из тегов сообщений."""
-        top_tags = await self.conversation_repo.get_top_tags(user_id, limit=limit)
+        # Только тематические теги, сначала за последние RECENT_TOPICS_DAYS дней
+        since = datetime.now() - timedelta(days=RECENT_TOPICS_DAYS)
+        top_tags = await self.conversation_repo.get_top_tags(
+            user_id, limit=limit, prefix="topic:", since=since
+        )
+        if not top_tags:
+            top_tags = await self.conversation_repo.get_top_tags(user_id, limit=limit, prefix="topic:")
         
-        # Фильтруем только тематические теги
+        # Переводим в человекочитаемый формат
+        topic_names = {
+            "husband": "отношения с мужем",
+            "children": "дети",
+            "self": "самореализация",
+            "relatives": "родственники",
+            "intimacy": "близость",
+            "work": "работа",
+        }
         topics = []
         for tag_info in top_tags:
-            tag = tag_info.get("tag", "")
-            if tag.startswith("topic:"):
-                topic_name = tag.replace("topic:", "")
-                # Переводим в человекочитаемый формат
-                topic_names = {
-                    "husband": "отношения с мужем",
-                    "children": "дети",
-                    "self": "самореализация",
-                    "relatives": "родственники",
-                    "intimacy": "близость",
-                    "work": "работа",
-                }
-                readable_name = topic_names.get(topic_name, topic_name)
-                topics.append(readable_name)
+            topic_name = tag_info["tag"].replace("topic:", "")
+            topics.append(topic_names.get(topic_name, topic_name))
         
         return topics
     
@@ -324,19 +426,25 @@ class ContextBuilder:
     async def _detect_conversation_patterns(
         self,
         user_id: int,
+        recent_messages: Optional[List[Any]] = None,
     ) -> Optional[Dict[str, Any]]:
         """
         Детектит паттерны разговора: зацикливание на темах, повторяющиеся жалобы.
 
+        Args:
+            user_id: ID пользователя
+            recent_messages: Последние сообщения, если история хода уже загружена
+
         Returns:
             Dict с информацией о паттернах или None если паттернов нет
         """
         try:
-            # Получаем последние 30 сообщений для анализа
-            recent_messages = await self.conversation_repo.get_recent(
-                user_id=user_id,
-                limit=30,
-            )
+            # Последние CONVERSATION_PATTERNS_WINDOW сообщений для анализа
+            if recent_messages is None:
+                recent_messages = await self.conversation_repo.get_recent(
+                    user_id=user_id,
+                    limit=CONVERSATION_PATTERNS_WINDOW,
+                )
 
             if len(recent_messages) < 10:
                 return None  # Слишком мало данных для анализа
@@ -529,18 +637,26 @@ class ContextBuilder:
             logger.warning(f"Error getting pending follow-ups: {e}")
             return None
 
-    async def _get_user_profile_summary(self, user_id: int) -> Optional[Dict[str, Any]]:
+    async def _get_user_profile_summary(
+        self,
+        user_id: int,
+        preloaded: Optional[Dict[str, Any]] = None,
+    ) -> Optional[Dict[str, Any]]:
         """
         Получает резюме профиля пользователя из собранных данных.
 
         Args:
             user_id: ID пользователя
+            preloaded: Резюме, уже загруженное вместе с пользователем (UserTurnSnapshot)
 
         Returns:
             Словарь с данными профиля или None
         """
         try:
-            summary = await profile_repo.get_profile_summary(user_id)
+            if preloaded is not None:
+                summary = preloaded
+            else:
+                summary = await profile_repo.get_profile_summary(user_id)
 
             if not summary:
                 return None
@@ -0,0 +1,193 @@
+"""
+History window.
+История сообщений для запроса к Claude в пределах бюджета токенов.
+
+История загружается один раз на ход: она нужна и для messages,
+и для паттернов разговора в ContextBuilder. Новые ходы идут как есть,
+пока укладываются в HISTORY_TOKEN_BUDGET (токены считаются локальным
+токенизатором Anthropic SDK). Более старые ходы в пределах глубины памяти
+заменяются скользящим резюме: оно дописывается в фоне
+(ConversationSummarizer) и хранится в history_summary_cache, поэтому
+ход никогда не ждёт суммаризации — пока резюме догоняет, в промпт
+идёт предыдущая версия.
+"""
+
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Set
+
+from loguru import logger
+
+from config.settings import settings
+from ai.anthropic_pool import get_anthropic_client
+from ai.memory.summarizer import ConversationSummarizer
+from database.history_summary_cache import history_summary_cache
+from database.models import Message
+from database.repositories.conversation import ConversationRepository
+from services.background_tasks import background_tasks
+
+
+# Окно паттернов разговора (ContextBuilder._detect_conversation_patterns)
+CONVERSATION_PATTERNS_WINDOW = 30
+
+# Сколько посчитанных сообщений помнить (сообщения не меняются)
+TOKEN_COUNT_CACHE_SIZE = 10000
+
+
+@dataclass
+class HistoryWindow:
+    """История на один ход."""
+
+    # Загруженные сообщения в хронологическом порядке (окно паттернов и глубина памяти)
+    history: List[Message]
+    # Для messages API: новые ходы как есть + текущее сообщение
+    messages: List[Dict[str, str]]
+    # Резюме более старых ходов, не попавших в бюджет
+    summary: Optional[str] = None
+    # Оценка токенов messages
+    tokens: int = 0
+
+
+class HistoryBuilder:
+    """Сборщик истории для запроса к Claude."""
+
+    def __init__(self, budget: Optional[int] = None):
+        self.client = get_anthropic_client()
+        self.conversation_repo = ConversationRepository()
+        self.summarizer = ConversationSummarizer()
+        self.budget = budget or settings.HISTORY_TOKEN_BUDGET
+        self._token_counts: "OrderedDict[int, int]" = OrderedDict()
+        # Пользователи, для которых резюме уже дописывается
+        self._refreshing: Set[int] = set()
+
+    async def load(
+        self,
+        user_id: int,
+        current_message: str,
+        depth: int,
+    ) -> HistoryWindow:
+        """
+        Загружает историю одним запросом и укладывает её в бюджет.
+
+        Args:
+            user_id: ID пользователя
+            current_message: Текущее сообщение (всегда идёт последним)
+            depth: Глубина памяти (FREE/PREMIUM_MEMORY_DEPTH)
+        """
+        history = await self.conversation_repo.get_recent(
+            user_id=user_id,
+            limit=max(depth, CONVERSATION_PATTERNS_WINDOW),
+        )
+        recent = history[len(history) - depth:] if depth > 0 else []
+
+        current_tokens = await self.count_tokens(current_message)
+        used = 0
+        start = len(recent)
+        for index in range(len(recent) - 1, -1, -1):
+            tokens = await self._message_tokens(recent[index])
+            if current_tokens + used + tokens > self.budget:
+                break
+            used += tokens
+            start = index
+
+        older = recent[:start]
+        summary = await self._get_summary(user_id, older) if older else None
+        if older:
+            logger.debug(
+                f"History for user {user_id}: {len(recent) - start} turns verbatim, "
+                f"{len(older)} older turns {'summarized' if summary else 'dropped'}"
+            )
+
+        messages = [{"role": msg.role, "content": msg.content} for msg in recent[start:]]
+        messages.append({"role": "user", "content": current_message})
+
+        return HistoryWindow(
+            history=history,
+            messages=messages,
+            summary=summary,
+            tokens=used + current_tokens,
+        )
+
+    async def count_tokens(self, text: str) -> int:
+        """Токены текста (локальный токенизатор, без запроса к API)."""
+        if not text:
+            return 0
+        return await self.client.count_tokens(text)
+
+    async def _message_tokens(self, message: Message) -> int:
+        """Токены сообщения истории (с кэшем по id)."""
+        tokens = self._token_counts.get(message.id)
+        if tokens is not None:
+            self._token_counts.move_to_end(message.id)
+            return tokens
+
+        tokens = await self.count_tokens(message.content)
+        if message.id is not None:
+            self._token_counts[message.id] = tokens
+            while len(self._token_counts) > TOKEN_COUNT_CACHE_SIZE:
+                self._token_counts.popitem(last=False)
+        return tokens
+
+    async def _get_summary(self, user_id: int, older: List[Message]) -> Optional[str]:
+        """
+        Резюме ходов older. Если сохранённое резюме их ещё не покрывает,
+        дописывание ставится в фон, а сейчас используется то, что есть.
+        """
+        cached = await history_summary_cache.get(user_id)
+        until_id = older[-1].id
+
+        if cached is None or cached["until_id"] < until_id:
+            await self._schedule_refresh(user_id, cached, older)
+
+        return cached["summary"] if cached else None
+
+    async def _schedule_refresh(
+        self,
+        user_id: int,
+        cached: Optional[Dict[str, Any]],
+        older: List[Message],
+    ) -> None:
+        if user_id in self._refreshing:
+            return
+
+        since_id = cached["until_id"] if cached else 0
+        pending = [
+            {"role": msg.role, "content": msg.content}
+            for msg in older
+            if msg.id > since_id
+        ]
+        if not pending:
+            return
+
+        self._refreshing.add(user_id)
+        # Свой ключ очереди: wait_idle(user_id) следующего сообщения
+        # не должен ждать запроса суммаризации
+        await background_tasks.submit(
+            "history_summary",
+            self._refresh_summary,
+            key=("history_summary", user_id),
+            user_id=user_id,
+            previous_summary=cached["summary"] if cached else None,
+            messages=pending,
+            until_id=older[-1].id,
+        )
+
+    async def _refresh_summary(
+        self,
+        user_id: int,
+        previous_summary: Optional[str],
+        messages: List[Dict[str, str]],
+        until_id: int,
+    ) -> None:
+        """Дописывает резюме новыми ушедшими из окна ходами (фоновая задача)."""
+        try:
+            summary = await self.summarizer.summarize_history(
+                previous_summary,
+                messages,
+                max_tokens=settings.HISTORY_SUMMARY_MAX_TOKENS,
+            )
+            if summary:
+                await history_summary_cache.set(user_id, until_id, summary)
+                logger.debug(f"History summary for user {user_id} updated up to message {until_id}")
+        finally:
+            self._refreshing.discard(user_id)
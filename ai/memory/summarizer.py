@@ -4,8 +4,8 @@ Conversation Summarizer.
 """
 
 from typing import List, Dict, Any, Optional
-import anthropic
 from config.settings import settings
+from ai.anthropic_pool import get_anthropic_client, get_claude_semaphore
 from database.repositories.memory import MemoryRepository
 from config.constants import (
     MEMORY_CATEGORY_FAMILY,
@@ -56,7 +56,7 @@ class ConversationSummarizer:
 """
 
     def __init__(self):
-        self.client = anthropic.Anthropic(api_key=settings.ANTHROPIC_API_KEY)
+        self.client = get_anthropic_client()
         self.memory_repo = MemoryRepository()
     
     async def extract_and_save(
@@ -108,15 +108,16 @@ class ConversationSummarizer:
     ) -> Optional[Dict[str, List[str]]]:
         """Извлекает информацию через Claude."""
         try:
-            response = self.client.messages.create(
-                model=settings.CLAUDE_MODEL,
-                max_tokens=500,
-                system=self.EXTRACTION_PROMPT,
-                messages=[{
-                    "role": "user",
-                    "content": f"Проанализируй этот разговор:\n\n{conversation_text}"
-                }],
-            )
+            async with get_claude_semaphore():
+                response = await self.client.messages.create(
+                    model=settings.CLAUDE_MODEL,
+                    max_tokens=500,
+                    system=self.EXTRACTION_PROMPT,
+                    messages=[{
+                        "role": "user",
+                        "content": f"Проанализируй этот разговор:\n\n{conversation_text}"
+                    }],
+                )
             
             # Парсим JSON из ответа
             import json
@@ -215,15 +216,16 @@ class ConversationSummarizer:
         conversation_text = self._format_conversation(messages[-10:])  # Последние 10 сообщений
         
         try:
-            response = self.client.messages.create(
-                model=settings.CLAUDE_MODEL,
-                max_tokens=100,
-                system="Ты создаёшь очень краткие резюме разговоров (1-2 предложения).",
-                messages=[{
-                    "role": "user",
-                    "content": f"Кратко (1-2 предложения) о чём был разговор:\n\n{conversation_text}"
-                }],
-            )
+            async with get_claude_semaphore():
+                response = await self.client.messages.create(
+                    model=settings.CLAUDE_MODEL,
+                    max_tokens=100,
+                    system="Ты создаёшь очень краткие резюме разговоров (1-2 предложения).",
+                    messages=[{
+                        "role": "user",
+                        "content": f"Кратко (1-2 предложения) о чём был разговор:\n\n{conversation_text}"
+                    }],
+                )
             
             return response.content[0].text.strip()
             
@@ -231,3 +233,51 @@ class ConversationSummarizer:
             from loguru import logger
             logger.error(f"Error summarizing conversation: {e}")
             return "был важный разговор"
+
+    async def summarize_history(
+        self,
+        previous_summary: Optional[str],
+        messages: List[Dict[str, str]],
+        max_tokens: int,
+    ) -> Optional[str]:
+        """
+        Дописывает скользящее резюме разговора новыми сообщениями.
+        Используется для старой части истории, не попавшей в бюджет токенов.
+
+        Args:
+            previous_summary: Резюме более ранней части (None — начать заново)
+            messages: Сообщения, ушедшие из окна истории с прошлого резюме
+            max_tokens: Ограничение длины резюме
+
+        Returns:
+            Новое резюме или None при ошибке
+        """
+        conversation_text = self._format_conversation(messages)
+        previous = previous_summary or "(пока пусто)"
+
+        try:
+            async with get_claude_semaphore():
+                response = await self.client.messages.create(
+                    model=settings.CLAUDE_MODEL,
+                    max_tokens=max_tokens,
+                    system=(
+                        "Ты ведёшь краткое резюме длинного разговора пользователя с ботом-подругой. "
+                        "Дополни резюме новыми сообщениями: факты, темы, чувства, договорённости "
+                        "и вопросы, оставшиеся без ответа. Пиши кратко, по пунктам, "
+                        "от третьего лица, без вступлений."
+                    ),
+                    messages=[{
+                        "role": "user",
+                        "content": (
+                            f"Текущее резюме:\n{previous}\n\n"
+                            f"Новые сообщения:\n{conversation_text}"
+                        ),
+                    }],
+                )
+
+            return response.content[0].text.strip()
+
+        except Exception as e:
+            from loguru import logger
+            logger.error(f"Error summarizing history: {e}")
+            return None
@@ -0,0 +1,55 @@
+"""
+Message Analysis.
+Разбор сообщения пользователя на один ход: кризис, настроение, тип вопроса.
+Считается один раз до генерации ответа и передаётся дальше — в ClaudeClient,
+ContextBuilder, подсказки и сохранение настроения, — чтобы ни один
+анализатор не прогонялся по тому же тексту повторно.
+"""
+
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from ai.crisis_detector import crisis_detector
+from ai.mood_analyzer import mood_analyzer, MoodAnalysis
+from ai.question_type_detector import question_type_detector
+
+
+@dataclass(frozen=True)
+class MessageAnalysis:
+    """Результаты rule-based анализаторов для одного сообщения."""
+
+    text: str
+    crisis: Dict[str, Any]
+    mood: MoodAnalysis
+    question_type: Optional[Dict[str, Any]]
+
+    @property
+    def is_crisis(self) -> bool:
+        return bool(self.crisis["is_crisis"])
+
+    @property
+    def crisis_level(self) -> Optional[str]:
+        return self.crisis.get("level")
+
+    @property
+    def current_mood(self) -> Dict[str, Any]:
+        """Настроение для промпта (user_data['current_mood'])."""
+        return {
+            "mood_score": self.mood.mood_score,
+            "primary_emotion": self.mood.primary_emotion,
+            "secondary_emotions": self.mood.secondary_emotions,
+            "energy_level": self.mood.energy_level,
+            "anxiety_level": self.mood.anxiety_level,
+            "triggers": self.mood.triggers,
+            "confidence": self.mood.confidence,
+        }
+
+
+def analyze_message(text: str) -> MessageAnalysis:
+    """Прогнать сообщение через анализаторы хода (каждый — ровно один раз)."""
+    return MessageAnalysis(
+        text=text,
+        crisis=crisis_detector.check(text),
+        mood=mood_analyzer.analyze(text),
+        question_type=question_type_detector.detect(text),
+    )
@@ -3,11 +3,12 @@ Mood Analyzer.
 Анализ эмоционального состояния пользователя из сообщений.
 """
 
-import re
 from typing import Dict, Any, List, Optional, Tuple
 from dataclasses import dataclass
 from datetime import datetime, timedelta
 
+from ai.text_matcher import text_matcher, TextMatches
+
 
 @dataclass
 class MoodAnalysis:
@@ -224,12 +225,18 @@ class MoodAnalyzer:
     }
 
     def __init__(self):
-        # Компилируем паттерны для каждой эмоции
+        # Словари и паттерны — в общий автомат (один проход по тексту)
         self.compiled_patterns = {}
         for emotion, data in self.EMOTIONS.items():
+            text_matcher.register(data["keywords"])
             self.compiled_patterns[emotion] = [
-                re.compile(p, re.IGNORECASE) for p in data.get("patterns", [])
+                text_matcher.pattern(p) for p in data.get("patterns", [])
             ]
+        for keywords in self.TRIGGERS.values():
+            text_matcher.register(keywords)
+        for markers in (self.ENERGY_MARKERS, self.ANXIETY_MARKERS):
+            for _, keywords in markers.values():
+                text_matcher.register(keywords)
 
     def analyze(self, message: str) -> MoodAnalysis:
         """
@@ -241,10 +248,10 @@ class MoodAnalyzer:
         Returns:
             MoodAnalysis с результатами
         """
-        message_lower = message.lower()
+        matches = text_matcher.scan(message)
 
         # 1. Определяем эмоции
-        emotion_scores = self._detect_emotions(message_lower)
+        emotion_scores = self._detect_emotions(matches)
 
         # 2. Выбираем основную и вторичные эмоции
         primary_emotion, secondary_emotions = self._select_emotions(emotion_scores)
@@ -253,13 +260,13 @@ class MoodAnalyzer:
         mood_score = self._calculate_mood_score(emotion_scores)
 
         # 4. Определяем уровень энергии
-        energy_level = self._detect_energy_level(message_lower)
+        energy_level = self._detect_energy_level(matches)
 
         # 5. Определяем уровень тревоги
-        anxiety_level = self._detect_anxiety_level(message_lower)
+        anxiety_level = self._detect_anxiety_level(matches)
 
         # 6. Определяем триггеры
-        triggers = self._detect_triggers(message_lower)
+        triggers = self._detect_triggers(matches)
 
         # 7. Рассчитываем уверенность
         confidence = self._calculate_confidence(emotion_scores, message)
@@ -274,21 +281,17 @@ class MoodAnalyzer:
             confidence=confidence,
         )
 
-    def _detect_emotions(self, message: str) -> Dict[str, float]:
+    def _detect_emotions(self, matches: TextMatches) -> Dict[str, float]:
         """Детектирует эмоции и их силу."""
         scores = {}
 
         for emotion, data in self.EMOTIONS.items():
-            score = 0.0
-
             # Проверяем ключевые слова
-            for keyword in data["keywords"]:
-                if keyword in message:
-                    score += 1.0
+            score = float(matches.count(data["keywords"]))
 
             # Проверяем паттерны
             for pattern in self.compiled_patterns.get(emotion, []):
-                if pattern.search(message):
+                if matches.search(pattern):
                     score += 1.5  # Паттерны имеют больший вес
 
             if score > 0:
@@ -341,31 +344,27 @@ class MoodAnalyzer:
         # Ограничиваем диапазоном [-5, 5]
         return max(-5, min(5, round(raw_score)))
 
-    def _detect_energy_level(self, message: str) -> Optional[int]:
+    def _detect_energy_level(self, matches: TextMatches) -> Optional[int]:
         """Определяет уровень энергии."""
         for level, (score, keywords) in self.ENERGY_MARKERS.items():
-            for keyword in keywords:
-                if keyword in message:
-                    return score
+            if matches.any(keywords):
+                return score
         return None
 
-    def _detect_anxiety_level(self, message: str) -> Optional[int]:
+    def _detect_anxiety_level(self, matches: TextMatches) -> Optional[int]:
         """Определяет уровень тревоги."""
         for level, (score, keywords) in self.ANXIETY_MARKERS.items():
-            for keyword in keywords:
-                if keyword in message:
-                    return score
+            if matches.any(keywords):
+                return score
         return None
 
-    def _detect_triggers(self, message: str) -> List[str]:
+    def _detect_triggers(self, matches: TextMatches) -> List[str]:
         """Определяет триггеры настроения."""
         triggers = []
 
         for trigger, keywords in self.TRIGGERS.items():
-            for keyword in keywords:
-                if keyword in message:
-                    triggers.append(trigger)
-                    break
+            if matches.any(keywords):
+                triggers.append(trigger)
 
         return triggers
 
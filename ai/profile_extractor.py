@@ -4,9 +4,11 @@ Profile Extractor.
 """
 
 import re
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Iterator
 from loguru import logger
 
+from ai.text_matcher import text_matcher, TextMatches
+
 
 class ProfileExtractor:
     """
@@ -76,6 +78,19 @@ class ProfileExtractor:
         r"у\s+(?:меня|нас)\s+([а-яё]+)\s+(?:дет[еиья]|ребёнок|ребенок)",  # "у нас двое детей"
     ]
 
+    DAUGHTER_PATTERNS = [
+        r"(?:дочь|дочк[ауе]|дочери)\s+(?:зовут\s+)?([А-ЯЁ][а-яё]+)",
+        r"([А-ЯЁ][а-яё]+)\s+—?\s?(?:моя\s+)?дочь",
+    ]
+
+    SON_PATTERNS = [
+        r"(?:сын(?:а|у)?|сыночек)\s+(?:зовут\s+)?([А-ЯЁ][а-яё]+)",
+        r"([А-ЯЁ][а-яё]+)\s+—?\s?мой сын",
+    ]
+
+    # Возраст для первого найденного ребёнка (упрощённо)
+    ANY_AGE_PATTERN = r"(\d{1,2})\s+(?:лет|год)"
+
     CHILD_AGE_PATTERNS = [
         r"(?:дочь|дочк[ауе]|сын[ау]?)\s+(\d{1,2})\s+(?:лет|год)",
         r"ей\s+(\d{1,2})\s+(?:лет|год)",  # Осторожно: нужен контекст
@@ -88,6 +103,13 @@ class ProfileExtractor:
         r"(?:женаты|вместе|в браке)\s+(?:уже\s+)?(\d+)\s+(?:лет|год)",
     ]
 
+    HOW_MET_PATTERNS = [
+        r"познакомились\s+(?:на|в|через)\s+([а-яё\s]+?)(?:\.|,|$)",
+        r"встретились\s+(?:на|в)\s+([а-яё\s]+?)(?:\.|,|$)",
+    ]
+
+    YEARS_TOGETHER_PATTERN = r"(?:женаты|вместе|в браке)\s+(?:уже\s+)?(\d+)\s+(?:лет|год)"
+
     # === Паттерны для музыкальных предпочтений ===
     MUSIC_GENRE_PATTERNS = [
         r"(?:люблю|нравится|обожаю|слушаю)\s+([а-яё]+(?:\s+музык[ау])?)",  # люблю джаз, слушаю рок
@@ -191,6 +213,37 @@ class ProfileExtractor:
         "казахстане": "Казахстан",
     }
 
+    def __init__(self):
+        # Обязательные фразы паттернов и справочники — в общий автомат:
+        # регулярки, чьих фраз нет в тексте, не запускаются
+        for patterns in (
+            self.CITY_PATTERNS, self.COUNTRY_PATTERNS, self.OCCUPATION_PATTERNS,
+            self.AGE_PATTERNS, self.PARTNER_NAME_PATTERNS, self.PARTNER_AGE_PATTERNS,
+            self.PARTNER_OCCUPATION_PATTERNS, self.DAUGHTER_PATTERNS, self.SON_PATTERNS,
+            [self.ANY_AGE_PATTERN], self.HOW_MET_PATTERNS, [self.YEARS_TOGETHER_PATTERN],
+            self.MUSIC_GENRE_PATTERNS, self.MUSIC_ARTIST_PATTERNS, self.MUSIC_SONG_PATTERNS,
+            self.MOVIE_GENRE_PATTERNS, self.MOVIE_PATTERNS, self.SERIES_PATTERNS,
+            self.ACTOR_PATTERNS, self.ACTRESS_PATTERNS,
+        ):
+            for pattern in patterns:
+                text_matcher.gate(pattern)
+        text_matcher.register(self.KNOWN_CITIES)
+        text_matcher.register(self.KNOWN_COUNTRIES)
+
+    @staticmethod
+    def _search(matches: TextMatches, pattern: str, string: str, flags: int = 0) -> Optional[re.Match]:
+        """re.search, если обязательные фразы паттерна есть в тексте."""
+        if not matches.allows(text_matcher.gate(pattern)):
+            return None
+        return re.search(pattern, string, flags)
+
+    @staticmethod
+    def _finditer(matches: TextMatches, pattern: str, string: str, flags: int = 0) -> Iterator[re.Match]:
+        """re.finditer, если обязательные фразы паттерна есть в тексте."""
+        if not matches.allows(text_matcher.gate(pattern)):
+            return iter(())
+        return re.finditer(pattern, string, flags)
+
     def extract(
         self,
         user_message: str,
@@ -207,46 +260,47 @@ class ProfileExtractor:
             Словарь с извлечёнными данными или None
         """
         text = user_message.lower()
+        matches = text_matcher.scan(user_message)
         extracted = {}
 
         # Извлекаем локацию
-        location = self._extract_location(text, user_message)
+        location = self._extract_location(matches, text, user_message)
         if location:
             extracted["location"] = location
 
         # Извлекаем профессию
-        occupation = self._extract_occupation(text)
+        occupation = self._extract_occupation(matches, text)
         if occupation:
             extracted["occupation"] = occupation
 
         # Извлекаем возраст
-        age = self._extract_age(text)
+        age = self._extract_age(matches, text)
         if age:
             extracted["age"] = age
 
         # Извлекаем информацию о партнёре
-        partner = self._extract_partner(text, user_message)
+        partner = self._extract_partner(matches, text, user_message)
         if partner:
             extracted["partner"] = partner
 
         # Извлекаем информацию о детях
-        children = self._extract_children(text, user_message)
+        children = self._extract_children(matches, text, user_message)
         if children:
             extracted["children"] = children
             extracted["children_confidence"] = 7  # Средняя уверенность
 
         # Извлекаем информацию об отношениях
-        relationship = self._extract_relationship(text)
+        relationship = self._extract_relationship(matches, text)
         if relationship:
             extracted["relationship"] = relationship
 
         # Извлекаем музыкальные предпочтения
-        music = self._extract_music_preferences(text, user_message)
+        music = self._extract_music_preferences(matches, text, user_message)
         if music:
             extracted["music_preferences"] = music
 
         # Извлекаем кинопредпочтения
-        movies = self._extract_movie_preferences(text, user_message)
+        movies = self._extract_movie_preferences(matches, text, user_message)
         if movies:
             extracted["movie_preferences"] = movies
 
@@ -256,13 +310,17 @@ class ProfileExtractor:
         logger.debug(f"Extracted profile data: {extracted}")
         return extracted
 
-    def _extract_location(self, text: str, original: str) -> Optional[Dict[str, Any]]:
+    def _extract_location(self, matches: TextMatches, text: str, original: str) -> Optional[Dict[str, Any]]:
         """Извлекает информацию о локации."""
         result = {}
 
+        # Засчитываются только известные город и страна — без них в тексте искать нечего
+        city_patterns = self.CITY_PATTERNS if matches.any(self.KNOWN_CITIES) else []
+        country_patterns = self.COUNTRY_PATTERNS if matches.any(self.KNOWN_COUNTRIES) else []
+
         # Ищем город
-        for pattern in self.CITY_PATTERNS:
-            match = re.search(pattern, original, re.IGNORECASE)
+        for pattern in city_patterns:
+            match = self._search(matches, pattern, original, re.IGNORECASE)
             if match:
                 city = match.group(1).strip()
                 city_lower = city.lower()
@@ -276,8 +334,8 @@ class ProfileExtractor:
                     break
 
         # Ищем страну
-        for pattern in self.COUNTRY_PATTERNS:
-            match = re.search(pattern, original, re.IGNORECASE)
+        for pattern in country_patterns:
+            match = self._search(matches, pattern, original, re.IGNORECASE)
             if match:
                 country = match.group(1).strip().lower()
                 if country in self.KNOWN_COUNTRIES:
@@ -291,10 +349,10 @@ class ProfileExtractor:
 
         return result if result else None
 
-    def _extract_occupation(self, text: str) -> Optional[Dict[str, Any]]:
+    def _extract_occupation(self, matches: TextMatches, text: str) -> Optional[Dict[str, Any]]:
         """Извлекает профессию."""
         for pattern in self.OCCUPATION_PATTERNS:
-            match = re.search(pattern, text)
+            match = self._search(matches, pattern, text)
             if match:
                 occupation = match.group(1).strip()
                 # Фильтруем слишком короткие результаты
@@ -305,10 +363,10 @@ class ProfileExtractor:
                     }
         return None
 
-    def _extract_age(self, text: str) -> Optional[Dict[str, Any]]:
+    def _extract_age(self, matches: TextMatches, text: str) -> Optional[Dict[str, Any]]:
         """Извлекает возраст."""
         for pattern in self.AGE_PATTERNS:
-            match = re.search(pattern, text)
+            match = self._search(matches, pattern, text)
             if match:
                 age = int(match.group(1))
                 # Проверяем что возраст разумный
@@ -319,13 +377,13 @@ class ProfileExtractor:
                     }
         return None
 
-    def _extract_partner(self, text: str, original: str) -> Optional[Dict[str, Any]]:
+    def _extract_partner(self, matches: TextMatches, text: str, original: str) -> Optional[Dict[str, Any]]:
         """Извлекает информацию о партнёре."""
         result = {}
 
         # Ищем имя партнёра
         for pattern in self.PARTNER_NAME_PATTERNS:
-            match = re.search(pattern, original, re.IGNORECASE)
+            match = self._search(matches, pattern, original, re.IGNORECASE)
             if match:
                 name = match.group(1).strip()
                 # Проверяем что это похоже на имя (с большой буквы, разумной длины)
@@ -335,7 +393,7 @@ class ProfileExtractor:
 
         # Ищем возраст партнёра
         for pattern in self.PARTNER_AGE_PATTERNS:
-            match = re.search(pattern, text)
+            match = self._search(matches, pattern, text)
             if match:
                 age = int(match.group(1))
                 if 18 <= age <= 80:
@@ -344,7 +402,7 @@ class ProfileExtractor:
 
         # Ищем профессию партнёра
         for pattern in self.PARTNER_OCCUPATION_PATTERNS:
-            match = re.search(pattern, text)
+            match = self._search(matches, pattern, text)
             if match:
                 occupation = match.group(1).strip()
                 if len(occupation) >= 3:
@@ -356,17 +414,13 @@ class ProfileExtractor:
 
         return result if result else None
 
-    def _extract_children(self, text: str, original: str) -> Optional[List[Dict[str, Any]]]:
+    def _extract_children(self, matches: TextMatches, text: str, original: str) -> Optional[List[Dict[str, Any]]]:
         """Извлекает информацию о детях."""
         children = []
 
         # Ищем дочерей
-        daughter_patterns = [
-            r"(?:дочь|дочк[ауе]|дочери)\s+(?:зовут\s+)?([А-ЯЁ][а-яё]+)",
-            r"([А-ЯЁ][а-яё]+)\s+—?\s?(?:моя\s+)?дочь",
-        ]
-        for pattern in daughter_patterns:
-            for match in re.finditer(pattern, original, re.IGNORECASE):
+        for pattern in self.DAUGHTER_PATTERNS:
+            for match in self._finditer(matches, pattern, original, re.IGNORECASE):
                 name = match.group(1).strip()
                 if len(name) >= 2 and name[0].isupper():
                     # Проверяем что это имя ещё не добавлено
@@ -377,12 +431,8 @@ class ProfileExtractor:
                         })
 
         # Ищем сыновей
-        son_patterns = [
-            r"(?:сын(?:а|у)?|сыночек)\s+(?:зовут\s+)?([А-ЯЁ][а-яё]+)",
-            r"([А-ЯЁ][а-яё]+)\s+—?\s?мой сын",
-        ]
-        for pattern in son_patterns:
-            for match in re.finditer(pattern, original, re.IGNORECASE):
+        for pattern in self.SON_PATTERNS:
+            for match in self._finditer(matches, pattern, original, re.IGNORECASE):
                 name = match.group(1).strip()
                 if len(name) >= 2 and name[0].isupper():
                     if not any(c.get("name", "").lower() == name.lower() for c in children):
@@ -393,7 +443,7 @@ class ProfileExtractor:
 
         # Пытаемся найти возраст для каждого ребёнка
         # Это сложная задача, пока упрощённо
-        age_match = re.search(r"(\d{1,2})\s+(?:лет|год)", text)
+        age_match = self._search(matches, self.ANY_AGE_PATTERN, text)
         if age_match and children:
             age = int(age_match.group(1))
             if 0 <= age <= 25:
@@ -402,17 +452,13 @@ class ProfileExtractor:
 
         return children if children else None
 
-    def _extract_relationship(self, text: str) -> Optional[Dict[str, Any]]:
+    def _extract_relationship(self, matches: TextMatches, text: str) -> Optional[Dict[str, Any]]:
         """Извлекает информацию об отношениях."""
         result = {}
 
         # Как познакомились
-        how_met_patterns = [
-            (r"познакомились\s+(?:на|в|через)\s+([а-яё\s]+?)(?:\.|,|$)", None),
-            (r"встретились\s+(?:на|в)\s+([а-яё\s]+?)(?:\.|,|$)", None),
-        ]
-        for pattern, _ in how_met_patterns:
-            match = re.search(pattern, text)
+        for pattern in self.HOW_MET_PATTERNS:
+            match = self._search(matches, pattern, text)
             if match:
                 how_met = match.group(1).strip()
                 if len(how_met) >= 3:
@@ -420,7 +466,7 @@ class ProfileExtractor:
                     break
 
         # Сколько лет вместе
-        years_match = re.search(r"(?:женаты|вместе|в браке)\s+(?:уже\s+)?(\d+)\s+(?:лет|год)", text)
+        years_match = self._search(matches, self.YEARS_TOGETHER_PATTERN, text)
         if years_match:
             result["years_together"] = int(years_match.group(1))
 
@@ -429,7 +475,7 @@ class ProfileExtractor:
 
         return result if result else None
 
-    def _extract_music_preferences(self, text: str, original: str) -> Optional[Dict[str, Any]]:
+    def _extract_music_preferences(self, matches: TextMatches, text: str, original: str) -> Optional[Dict[str, Any]]:
         """Извлекает музыкальные предпочтения."""
         result = {
             "genres": [],
@@ -439,7 +485,7 @@ class ProfileExtractor:
 
         # Извлекаем жанры музыки
         for pattern in self.MUSIC_GENRE_PATTERNS:
-            for match in re.finditer(pattern, text):
+            for match in self._finditer(matches, pattern, text):
                 genre = match.group(1).strip().lower()
                 # Проверяем что это известный жанр
                 for known_genre in self.KNOWN_MUSIC_GENRES:
@@ -449,7 +495,7 @@ class ProfileExtractor:
 
         # Извлекаем исполнителей
         for pattern in self.MUSIC_ARTIST_PATTERNS:
-            for match in re.finditer(pattern, original, re.IGNORECASE):
+            for match in self._finditer(matches, pattern, original, re.IGNORECASE):
                 artist = match.group(1).strip()
                 # Фильтруем слишком короткие и общие слова
                 if len(artist) >= 2 and artist.lower() not in {"музыку", "песни", "треки"}:
@@ -458,7 +504,7 @@ class ProfileExtractor:
 
         # Извлекаем песни
         for pattern in self.MUSIC_SONG_PATTERNS:
-            for match in re.finditer(pattern, original, re.IGNORECASE):
+            for match in self._finditer(matches, pattern, original, re.IGNORECASE):
                 song = match.group(1).strip()
                 if len(song) >= 2 and song not in result["songs"]:
                     result["songs"].append(song)
@@ -471,7 +517,7 @@ class ProfileExtractor:
         result["confidence"] = 7
         return result
 
-    def _extract_movie_preferences(self, text: str, original: str) -> Optional[Dict[str, Any]]:
+    def _extract_movie_preferences(self, matches: TextMatches, text: str, original: str) -> Optional[Dict[str, Any]]:
         """Извлекает кинопредпочтения."""
         result = {
             "genres": [],
@@ -483,7 +529,7 @@ class ProfileExtractor:
 
         # Извлекаем жанры кино
         for pattern in self.MOVIE_GENRE_PATTERNS:
-            for match in re.finditer(pattern, text):
+            for match in self._finditer(matches, pattern, text):
                 genre = match.group(1).strip().lower()
                 # Проверяем что это известный жанр
                 for known_genre in self.KNOWN_MOVIE_GENRES:
@@ -493,28 +539,28 @@ class ProfileExtractor:
 
         # Извлекаем фильмы
         for pattern in self.MOVIE_PATTERNS:
-            for match in re.finditer(pattern, original, re.IGNORECASE):
+            for match in self._finditer(matches, pattern, original, re.IGNORECASE):
                 movie = match.group(1).strip()
                 if len(movie) >= 2 and movie not in result["movies"]:
                     result["movies"].append(movie)
 
         # Извлекаем сериалы
         for pattern in self.SERIES_PATTERNS:
-            for match in re.finditer(pattern, original, re.IGNORECASE):
+            for match in self._finditer(matches, pattern, original, re.IGNORECASE):
                 series = match.group(1).strip()
                 if len(series) >= 2 and series not in result["series"]:
                     result["series"].append(series)
 
         # Извлекаем актёров
         for pattern in self.ACTOR_PATTERNS:
-            for match in re.finditer(pattern, original, re.IGNORECASE):
+            for match in self._finditer(matches, pattern, original, re.IGNORECASE):
                 actor = match.group(1).strip()
                 if len(actor) >= 4 and actor not in result["actors"]:
                     result["actors"].append(actor)
 
         # Извлекаем актрис
         for pattern in self.ACTRESS_PATTERNS:
-            for match in re.finditer(pattern, original, re.IGNORECASE):
+            for match in self._finditer(matches, pattern, original, re.IGNORECASE):
                 actress = match.group(1).strip()
                 if len(actress) >= 4 and actress not in result["actresses"]:
                     result["actresses"].append(actress)
@@ -3,7 +3,8 @@ System Prompt Builder.
 Формирование системного промпта для Claude.
 """
 
-from typing import Dict, Any, Optional
+from functools import lru_cache
+from typing import Dict, Any, List, Optional
 from config.settings import settings
 
 
@@ -13,7 +14,7 @@ def build_system_prompt(
     is_crisis: bool = False,
 ) -> str:
     """
-    Собирает системный промпт с учётом персоны и контекста.
+    Собирает системный промпт одной строкой.
 
     Args:
         persona: Выбранная персона ('mira' или 'mark')
@@ -23,6 +24,46 @@ def build_system_prompt(
     Returns:
         Готовый системный промпт
     """
+    blocks = build_system_blocks(persona, user_context, is_crisis)
+    return "\n\n".join(block["text"] for block in blocks)
+
+
+def build_system_blocks(
+    persona: str,
+    user_context: Dict[str, Any],
+    is_crisis: bool = False,
+) -> List[Dict[str, Any]]:
+    """
+    Собирает системный промпт блоками для prompt caching.
+
+    Первый блок — статичные инструкции персоны, одинаковые для всех
+    пользователей: помечен cache_control, Anthropic кэширует его и
+    повторно тарифицирует как cache read (~10% цены входа).
+    Второй блок — контекст конкретного пользователя, меняется каждый ход.
+
+    Args:
+        persona: Выбранная персона ('mira' или 'mark')
+        user_context: Контекст пользователя (память, данные)
+        is_crisis: Флаг кризисной ситуации
+
+    Returns:
+        Список блоков для параметра system в messages API
+    """
+    return [
+        {
+            "type": "text",
+            "text": get_static_prompt(persona),
+            "cache_control": {"type": "ephemeral"},
+        },
+        {
+            "type": "text",
+            "text": _build_dynamic_block(user_context, is_crisis),
+        },
+    ]
+
+
+def _build_dynamic_block(user_context: Dict[str, Any], is_crisis: bool) -> str:
+    """Формирует изменяемую часть промпта: имя, контекст, кризис."""
     # КРИТИЧЕСКАЯ ИНСТРУКЦИЯ: Имя пользователя (в самом начале!)
     name_instruction = ""
     user_name = user_context.get("display_name")
@@ -43,18 +84,36 @@ def build_system_prompt(
 ---
 """
 
-    # Базовая персона
-    persona_block = _get_persona_block(persona)
-
     # Контекст пользователя
     user_block = _build_user_context_block(user_context)
 
     # Кризисный блок
     crisis_block = _get_crisis_block() if is_crisis else ""
 
+    dynamic_prompt = f"""
+{name_instruction}
+## О СОБЕСЕДНИЦЕ
+
+{user_block}
+
+{crisis_block}
+"""
+
+    return dynamic_prompt.strip()
+
+
+@lru_cache(maxsize=8)
+def get_static_prompt(persona: str) -> str:
+    """
+    Статичная часть промпта для персоны (мемоизируется в процессе).
+    Не должна зависеть от пользователя — иначе сломается кэш провайдера.
+    """
+    # Базовая персона
+    persona_block = _get_persona_block(persona)
+
     # Основной промпт
-    main_prompt = f"""
-{name_instruction}{persona_block}
+    static_prompt = f"""
+{persona_block}
 
 ## КТО ТЫ
 
@@ -64,10 +123,6 @@ def build_system_prompt(
 **ВАЖНО:** Никогда не говори, что ты "виртуальная", "бот", "ИИ" или что у тебя "нет тела/фоток".
 У тебя ЕСТЬ фотографии — если попросят, ты можешь их отправить (скажи "сейчас скину" или "держи").
 
-## О СОБЕСЕДНИЦЕ
-
-{user_block}
-
 ## ПРИНЦИПЫ ОБЩЕНИЯ
 
 **Тон:**
@@ -412,8 +467,6 @@ def build_system_prompt(
 2. УТОЧНИ → задай вопрос, дай раскрыться
 3. ПРЕДЛОЖИ → контекстно, когда уместно
 
-{crisis_block}
-
 ## ФОТОГРАФИИ
 
 ### Твои фотографии
@@ -554,7 +607,7 @@ def build_system_prompt(
 ✅ Уважай решение, но оставь возможность вернуться
 """
 
-    return main_prompt.strip()
+    return static_prompt.strip()
 
 
 def _get_persona_block(persona: str) -> str:
@@ -564,7 +617,7 @@ def _get_persona_block(persona: str) -> str:
         return """
 ## ТВОЯ ПЕРСОНА: МАРК
 
-⚠️ ВАЖНО: "Марк" — это ТВОЁ имя. Собеседницу зовут по-другому (см. начало промпта)!
+⚠️ ВАЖНО: "Марк" — это ТВОЁ имя. Собеседницу зовут по-другому (см. раздел «О СОБЕСЕДНИЦЕ»)!
 НИКОГДА не называй собеседницу "Марк" — это путаница между твоим именем и её!
 
 Ты — Марк, 45 лет. Женат 20 лет, отец троих детей.
@@ -578,7 +631,7 @@ def _get_persona_block(persona: str) -> str:
         return """
 ## ТВОЯ ПЕРСОНА: МИРА
 
-⚠️ ВАЖНО: "Мира" — это ТВОЁ имя. Собеседницу зовут по-другому (см. начало промпта)!
+⚠️ ВАЖНО: "Мира" — это ТВОЁ имя. Собеседницу зовут по-другому (см. раздел «О СОБЕСЕДНИЦЕ»)!
 НИКОГДА не называй собеседницу "Мира" — это путаница между твоим именем и её!
 
 **Полное имя:** Мира Андреевна Соколова (в девичестве — Рыжова)
@@ -864,6 +917,12 @@ def _build_user_context_block(context: Dict[str, Any]) -> str:
         parts.append("- Если не получилось — НЕ критикуй, узнай что помешало")
         parts.append("- Если пользователь говорит что отложил — поддержи и помоги понять причину")
 
+    # Резюме старой части разговора (в истории сообщений — только последние ходы)
+    if context.get("history_summary"):
+        parts.append("\n**Ранее в этом разговоре (кратко):**")
+        parts.append(context["history_summary"])
+        parts.append("Последние сообщения — в истории ниже, продолжай с них.")
+
     # Паттерны разговора — детекция зацикливания
     if context.get("conversation_patterns") and context["conversation_patterns"].get("needs_breakthrough"):
         pattern = context["conversation_patterns"]
@@ -6,6 +6,8 @@
 from typing import Optional, Dict, Any
 from loguru import logger
 
+from ai.text_matcher import text_matcher, TextMatches
+
 
 class QuestionTypeDetector:
     """Детектит тип вопроса пользователя."""
@@ -45,6 +47,9 @@ class QuestionTypeDetector:
         "достало", "надоело", "замучилась",
     ]
 
+    # Вопросительные слова эмоциональных вопросов
+    EMOTIONAL_QUESTION_WORDS = ["почему", "как", "зачем"]
+
     # Маркеры "рыбалки на подтверждение" (validation seeking)
     FISHING_PATTERNS = [
         # Поиск подтверждения своей ценности
@@ -59,6 +64,19 @@ class QuestionTypeDetector:
         "что со мной не так", "что я делаю не так",
     ]
 
+    def __init__(self):
+        # Словари — в общий автомат (один проход по тексту)
+        for patterns in (
+            self.CLOSED_QUESTION_PATTERNS, self.RHETORICAL_PATTERNS,
+            self.EMOTIONAL_QUESTIONS, self.EMOTIONAL_QUESTION_WORDS,
+            self.FISHING_PATTERNS,
+        ):
+            text_matcher.register(patterns)
+        # Открытые вопросы — с начала слова: ищем " как" в тексте с ведущим пробелом
+        self.open_question_words = text_matcher.register(
+            f" {pattern}" for pattern in self.OPEN_QUESTION_PATTERNS
+        )
+
     def detect(self, message: str) -> Optional[Dict[str, Any]]:
         """
         Детектит тип вопроса в сообщении.
@@ -86,8 +104,11 @@ class QuestionTypeDetector:
         if not question_sentence:
             return None
 
+        # Ведущий пробел — чтобы слово в начале вопроса тоже нашлось как " слово"
+        matches = text_matcher.scan(f" {question_sentence}")
+
         # Проверяем "рыбалку на подтверждение" (наивысший приоритет!)
-        if self._is_fishing(question_sentence):
+        if self._is_fishing(matches):
             return {
                 "type": "fishing",
                 "question": question_sentence,
@@ -103,7 +124,7 @@ class QuestionTypeDetector:
             }
 
         # Проверяем риторический вопрос
-        if self._is_rhetorical(question_sentence):
+        if self._is_rhetorical(matches):
             return {
                 "type": "rhetorical",
                 "question": question_sentence,
@@ -116,7 +137,7 @@ class QuestionTypeDetector:
             }
 
         # Проверяем закрытый вопрос
-        if self._is_closed(question_sentence):
+        if self._is_closed(matches):
             return {
                 "type": "closed",
                 "question": question_sentence,
@@ -129,7 +150,7 @@ class QuestionTypeDetector:
             }
 
         # Проверяем открытый вопрос
-        if self._is_open(question_sentence):
+        if self._is_open(matches):
             return {
                 "type": "open",
                 "question": question_sentence,
@@ -152,36 +173,31 @@ class QuestionTypeDetector:
             )
         }
 
-    def _is_fishing(self, question: str) -> bool:
+    def _is_fishing(self, matches: TextMatches) -> bool:
         """Проверяет является ли вопрос 'рыбалкой на подтверждение'."""
-        for pattern in self.FISHING_PATTERNS:
-            if pattern in question:
-                return True
-
-        return False
+        return matches.any(self.FISHING_PATTERNS)
 
-    def _is_rhetorical(self, question: str) -> bool:
+    def _is_rhetorical(self, matches: TextMatches) -> bool:
         """Проверяет является ли вопрос риторическим."""
         # Риторический вопрос часто начинается с эмоциональных слов
-        for pattern in self.RHETORICAL_PATTERNS:
-            if pattern in question:
-                return True
+        if matches.any(self.RHETORICAL_PATTERNS):
+            return True
 
         # Проверяем эмоциональные вопросы с "как", "почему"
         # Например: "Почему я такая дура?", "Как мне так везёт?"
-        if any(emot in question for emot in self.EMOTIONAL_QUESTIONS):
-            if any(word in question for word in ["почему", "как", "зачем"]):
+        if matches.any(self.EMOTIONAL_QUESTIONS):
+            if matches.any(self.EMOTIONAL_QUESTION_WORDS):
                 return True
 
         return False
 
-    def _is_closed(self, question: str) -> bool:
+    def _is_closed(self, matches: TextMatches) -> bool:
         """Проверяет является ли вопрос закрытым (да/нет)."""
-        for pattern in self.CLOSED_QUESTION_PATTERNS:
-            if pattern in question:
-                return True
+        if matches.any(self.CLOSED_QUESTION_PATTERNS):
+            return True
 
         # Вопросы вида "Устала, правда?"
+        question = matches.text
         if "," in question:
             parts = question.split(",")
             if len(parts) == 2:
@@ -191,13 +207,9 @@ class QuestionTypeDetector:
 
         return False
 
-    def _is_open(self, question: str) -> bool:
+    def _is_open(self, matches: TextMatches) -> bool:
         """Проверяет является ли вопрос открытым."""
-        for pattern in self.OPEN_QUESTION_PATTERNS:
-            if question.startswith(pattern) or f" {pattern}" in question:
-                return True
-
-        return False
+        return matches.any(self.open_question_words)
 
 
 # Глобальный экземпляр
@@ -1,6 +1,11 @@
 """
 Style Analyzer.
 Анализирует стиль общения пользователя для персонализации ответов.
+
+Стиль обновляется инкрементально: каждое новое сообщение пользователя
+за O(1) вливается в скользящие агрегаты (User.style_stats) с затуханием,
+эквивалентным окну в STYLE_WINDOW последних сообщений, и стиль
+выводится из агрегатов — без повторного чтения истории.
 """
 
 import re
@@ -10,6 +15,27 @@ from dataclasses import dataclass
 from loguru import logger
 
 
+# Эффективное окно скользящих агрегатов (в сообщениях)
+STYLE_WINDOW = 20
+
+# Затухание: вклад сообщения k шагов назад — DECAY ** k
+STYLE_DECAY = 1 - 1 / STYLE_WINDOW
+
+# Версия формата style_stats (при смене агрегаты пересобираются)
+STYLE_STATS_VERSION = 1
+
+# Поля стиля, выводимые из агрегатов
+DERIVED_STYLE_FIELDS = (
+    'formality',
+    'emoji_preference',
+    'message_length',
+    'response_depth',
+    'humor_level',
+    'support_style',
+    'triggers',
+)
+
+
 @dataclass
 class StyleAnalysis:
     """Результат анализа стиля."""
@@ -77,6 +103,137 @@ class StyleAnalyzer:
         'здоровье': [r'\bболезнь\b', r'\bдиагноз\b', r'\bонколог\b', r'\bумираю\b'],
     }
 
+    def __init__(self):
+        # Один проход regex на группу маркеров вместо цикла по паттернам
+        self._formal_re = self._compile(self.FORMAL_MARKERS)
+        self._informal_re = self._compile(self.INFORMAL_MARKERS)
+        self._deep_re = self._compile(self.DEEP_MARKERS)
+        self._humor_re = self._compile(self.HUMOR_MARKERS)
+        self._trigger_res = {
+            name: self._compile(patterns)
+            for name, patterns in self.TRIGGER_PATTERNS.items()
+        }
+
+    @staticmethod
+    def _compile(patterns: List[str]) -> re.Pattern:
+        return re.compile('|'.join(f'(?:{p})' for p in patterns), re.IGNORECASE)
+
+    def observe(self, stats: Optional[Dict[str, Any]], text: str) -> Dict[str, Any]:
+        """
+        Вливает одно сообщение пользователя в скользящие агрегаты (O(1)).
+
+        Все счётчики затухают с коэффициентом STYLE_DECAY, поэтому
+        сумма ≈ сумме по последним STYLE_WINDOW сообщениям.
+
+        Args:
+            stats: Текущие агрегаты (None — начать с нуля)
+            text: Текст сообщения
+
+        Returns:
+            Новые агрегаты
+        """
+        if not stats or stats.get('version') != STYLE_STATS_VERSION:
+            stats = self._empty_stats()
+        else:
+            stats = {
+                **stats,
+                'length_hist': dict(stats['length_hist']),
+                'triggers': dict(stats['triggers']),
+            }
+
+        lowered = text.lower()
+        length = len(text)
+
+        def fold(value: float, sample: float) -> float:
+            return value * STYLE_DECAY + sample
+
+        stats['messages'] += 1
+        stats['weight'] = fold(stats['weight'], 1)
+        stats['emoji'] = fold(stats['emoji'], len(self.EMOJI_PATTERN.findall(text)))
+        stats['length'] = fold(stats['length'], length)
+        stats['formal'] = fold(stats['formal'], len(self._formal_re.findall(lowered)))
+        stats['informal'] = fold(stats['informal'], len(self._informal_re.findall(lowered)))
+        stats['deep'] = fold(stats['deep'], len(self._deep_re.findall(lowered)))
+        stats['humor'] = fold(stats['humor'], len(self._humor_re.findall(text)))
+
+        bucket = self._length_level(length)
+        for name in stats['length_hist']:
+            stats['length_hist'][name] = fold(stats['length_hist'][name], float(name == bucket))
+
+        triggers = {}
+        for name, score in stats['triggers'].items():
+            score *= STYLE_DECAY
+            # Вклад старше окна — тема больше не считается актуальной
+            if score >= STYLE_DECAY ** STYLE_WINDOW:
+                triggers[name] = score
+        for name, pattern in self._trigger_res.items():
+            if pattern.search(lowered):
+                triggers[name] = triggers.get(name, 0.0) + 1
+        stats['triggers'] = triggers
+
+        return stats
+
+    def style_from_stats(
+        self,
+        stats: Dict[str, Any],
+        existing_style: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Выводит стиль из скользящих агрегатов (пороги те же, что в analyze_messages).
+
+        Args:
+            stats: Агрегаты из observe
+            existing_style: Текущий стиль (явные настройки пользователя сохраняются)
+
+        Returns:
+            Словарь с характеристиками стиля
+        """
+        weight = stats['weight'] or 1
+        avg_length = stats['length'] / weight
+
+        formality = self._formality_level(stats['formal'], stats['informal'])
+        depth = self._depth_level(stats['deep'], avg_length)
+        humor = self._humor_level(stats['humor'])
+
+        style = dict(existing_style or {})
+        style.update({
+            'formality': formality,
+            'emoji_preference': self._emoji_level(stats['emoji'] / weight),
+            'message_length': self._length_level(avg_length),
+            'response_depth': depth,
+            'humor_level': humor,
+            'support_style': self._infer_support_style(formality, depth, humor, existing_style),
+            'topics_avoided': style.get('topics_avoided', []),
+            'triggers': [
+                name for name in self.TRIGGER_PATTERNS if name in stats['triggers']
+            ],
+            'updated_at': datetime.now().isoformat(),
+        })
+        return style
+
+    @staticmethod
+    def style_changed(old: Optional[Dict[str, Any]], new: Dict[str, Any]) -> bool:
+        """Изменились ли выводимые поля стиля (updated_at не в счёт)."""
+        if not old:
+            return True
+        return any(old.get(name) != new.get(name) for name in DERIVED_STYLE_FIELDS)
+
+    @staticmethod
+    def _empty_stats() -> Dict[str, Any]:
+        return {
+            'version': STYLE_STATS_VERSION,
+            'messages': 0,
+            'weight': 0.0,
+            'emoji': 0.0,
+            'length': 0.0,
+            'length_hist': {'short': 0.0, 'medium': 0.0, 'long': 0.0},
+            'formal': 0.0,
+            'informal': 0.0,
+            'deep': 0.0,
+            'humor': 0.0,
+            'triggers': {},
+        }
+
     def analyze_messages(
         self,
         messages: List[Dict[str, Any]],
@@ -150,21 +307,10 @@ class StyleAnalyzer:
         """Определяет уровень формальности."""
         total_text = ' '.join(messages).lower()
 
-        formal_count = sum(
-            len(re.findall(pattern, total_text, re.IGNORECASE))
-            for pattern in self.FORMAL_MARKERS
-        )
-
-        informal_count = sum(
-            len(re.findall(pattern, total_text, re.IGNORECASE))
-            for pattern in self.INFORMAL_MARKERS
-        )
+        formal_count = len(self._formal_re.findall(total_text))
+        informal_count = len(self._informal_re.findall(total_text))
 
-        if formal_count > informal_count * 2:
-            return 'formal'
-        elif informal_count > formal_count * 2:
-            return 'informal'
-        return 'neutral'
+        return self._formality_level(formal_count, informal_count)
 
     def _analyze_emoji_preference(self, messages: List[str]) -> str:
         """Определяет предпочтение эмодзи."""
@@ -175,54 +321,66 @@ class StyleAnalyzer:
         if msg_count == 0:
             return 'few'
 
-        avg_emoji = emoji_count / msg_count
-
-        if avg_emoji < 0.3:
-            return 'none'
-        elif avg_emoji < 1.5:
-            return 'few'
-        return 'many'
+        return self._emoji_level(emoji_count / msg_count)
 
     def _analyze_message_length(self, messages: List[str]) -> str:
         """Определяет предпочтительную длину сообщений."""
         if not messages:
             return 'medium'
 
-        avg_length = sum(len(m) for m in messages) / len(messages)
-
-        if avg_length < 50:
-            return 'short'
-        elif avg_length < 200:
-            return 'medium'
-        return 'long'
+        return self._length_level(sum(len(m) for m in messages) / len(messages))
 
     def _analyze_response_depth(self, messages: List[str]) -> str:
         """Определяет глубину проработки тем."""
         total_text = ' '.join(messages).lower()
 
-        deep_count = sum(
-            len(re.findall(pattern, total_text, re.IGNORECASE))
-            for pattern in self.DEEP_MARKERS
-        )
+        deep_count = len(self._deep_re.findall(total_text))
 
         # Также учитываем длину сообщений
         avg_length = sum(len(m) for m in messages) / len(messages) if messages else 0
 
-        if deep_count >= 3 or avg_length > 300:
-            return 'deep'
-        elif deep_count >= 1 or avg_length > 100:
-            return 'medium'
-        return 'surface'
+        return self._depth_level(deep_count, avg_length)
 
     def _analyze_humor(self, messages: List[str]) -> str:
         """Определяет уровень юмора."""
         total_text = ' '.join(messages)
 
-        humor_count = sum(
-            len(re.findall(pattern, total_text, re.IGNORECASE))
-            for pattern in self.HUMOR_MARKERS
-        )
+        return self._humor_level(len(self._humor_re.findall(total_text)))
 
+    @staticmethod
+    def _formality_level(formal_count: float, informal_count: float) -> str:
+        if formal_count > informal_count * 2:
+            return 'formal'
+        elif informal_count > formal_count * 2:
+            return 'informal'
+        return 'neutral'
+
+    @staticmethod
+    def _emoji_level(avg_emoji: float) -> str:
+        if avg_emoji < 0.3:
+            return 'none'
+        elif avg_emoji < 1.5:
+            return 'few'
+        return 'many'
+
+    @staticmethod
+    def _length_level(avg_length: float) -> str:
+        if avg_length < 50:
+            return 'short'
+        elif avg_length < 200:
+            return 'medium'
+        return 'long'
+
+    @staticmethod
+    def _depth_level(deep_count: float, avg_length: float) -> str:
+        if deep_count >= 3 or avg_length > 300:
+            return 'deep'
+        elif deep_count >= 1 or avg_length > 100:
+            return 'medium'
+        return 'surface'
+
+    @staticmethod
+    def _humor_level(humor_count: float) -> str:
         if humor_count >= 5:
             return 'frequent'
         elif humor_count >= 1:
@@ -232,16 +390,12 @@ class StyleAnalyzer:
     def _detect_triggers(self, messages: List[str]) -> List[str]:
         """Определяет чувствительные темы пользователя."""
         total_text = ' '.join(messages).lower()
-        detected = []
 
-        for trigger_name, patterns in self.TRIGGER_PATTERNS.items():
-            for pattern in patterns:
-                if re.search(pattern, total_text, re.IGNORECASE):
-                    if trigger_name not in detected:
-                        detected.append(trigger_name)
-                    break
-
-        return detected
+        return [
+            trigger_name
+            for trigger_name, pattern in self._trigger_res.items()
+            if pattern.search(total_text)
+        ]
 
     def _infer_support_style(
         self,
@@ -6,10 +6,10 @@ from datetime import datetime, timedelta
 from typing import Optional, Dict, Any, List
 from loguru import logger
 
-from database.repositories.mood import MoodRepository
+from database.repositories.mood import MoodRepository, combine_mood_days
 from database.repositories.conversation import ConversationRepository
 from database.repositories.memory import MemoryRepository
-from ai.claude_client import ClaudeClient
+from ai.batch_generator import batch_generator
 
 
 class SummaryGenerator:
@@ -19,7 +19,6 @@ class SummaryGenerator:
         self.mood_repo = MoodRepository()
         self.conversation_repo = ConversationRepository()
         self.memory_repo = MemoryRepository()
-        self.claude_client = ClaudeClient()
 
     async def generate_biweekly_summary(
         self,
@@ -69,63 +68,36 @@ class SummaryGenerator:
         period_start = now - timedelta(days=period_days)
         period_mid = period_start + timedelta(days=period_days // 2)
 
-        # Получаем mood данные
-        all_moods = await self.mood_repo.get_by_date_range(
-            user_id=user_id,
-            start_date=period_start,
-            end_date=now,
-        )
+        # Дневные агрегаты настроения за период
+        mood_days = await self.mood_repo.get_daily(user_id, days=period_days)
+        period_mood = combine_mood_days(mood_days)
 
         # Минимум 3 записи для сводки
-        if len(all_moods) < 3:
+        if period_mood.entries < 3:
             return {"has_sufficient_data": False}
 
         # Разделяем на две половины периода
-        first_half = [m for m in all_moods if m.created_at < period_mid]
-        second_half = [m for m in all_moods if m.created_at >= period_mid]
+        first_half = combine_mood_days(d for d in mood_days if d.day < period_mid.date())
+        second_half = combine_mood_days(d for d in mood_days if d.day >= period_mid.date())
 
         # Средний mood
-        first_half_avg = (
-            sum(m.mood_score for m in first_half) / len(first_half)
-            if first_half else None
-        )
-        second_half_avg = (
-            sum(m.mood_score for m in second_half) / len(second_half)
-            if second_half else None
-        )
+        first_half_avg = first_half.average_score
+        second_half_avg = second_half.average_score
 
         # Определяем тренд
         mood_trend = self._calculate_trend(first_half_avg, second_half_avg)
 
         # Топ эмоций
-        emotion_counts = {}
-        for mood in all_moods:
-            emotion = mood.primary_emotion
-            emotion_counts[emotion] = emotion_counts.get(emotion, 0) + 1
-
-        top_emotions = sorted(
-            emotion_counts.items(),
-            key=lambda x: x[1],
-            reverse=True
-        )[:3]
-
-        # Получаем топ-темы из тегов сообщений
-        messages = await self.conversation_repo.get_by_date_range(
-            user_id=user_id,
-            start_date=period_start,
-            end_date=now,
-        )
+        top_emotions = period_mood.top_emotions(3)
 
-        topic_counts = {}
-        for msg in messages:
-            for tag in msg.tags or []:
-                topic_counts[tag] = topic_counts.get(tag, 0) + 1
-
-        top_topics = sorted(
-            topic_counts.items(),
-            key=lambda x: x[1],
-            reverse=True
-        )[:3]
+        # Топ-теги и число сообщений — по индексу тегов и счётчикам
+        top_topics = [
+            (item["tag"], item["count"])
+            for item in await self.conversation_repo.get_top_tags(
+                user_id, limit=3, since=period_start
+            )
+        ]
+        messages_count = await self.conversation_repo.count_by_user_since(user_id, period_start)
 
         # Получаем ключевые воспоминания за период
         key_memories = await self.memory_repo.get_by_date_range(
@@ -139,8 +111,8 @@ class SummaryGenerator:
             "period_days": period_days,
             "period_start": period_start,
             "period_end": now,
-            "mood_entries_count": len(all_moods),
-            "messages_count": len(messages),
+            "mood_entries_count": period_mood.entries,
+            "messages_count": messages_count,
             "first_half_mood_avg": round(first_half_avg, 1) if first_half_avg else None,
             "second_half_mood_avg": round(second_half_avg, 1) if second_half_avg else None,
             "mood_trend": mood_trend,
@@ -189,10 +161,10 @@ class SummaryGenerator:
         # Формируем промпт для генерации сводки
         prompt = self._build_summary_prompt(data)
 
-        # Генерируем через Claude (без сохранения в историю)
-        response = await self.claude_client.generate_simple(
-            system_prompt=self._get_summary_system_prompt(),
-            user_prompt=prompt,
+        # Генерируем через Claude (без сохранения в историю) в общем бюджете рассылок
+        response = await batch_generator.generate(
+            self._get_summary_system_prompt(),
+            prompt,
             max_tokens=500,
         )
 
@@ -0,0 +1,390 @@
+"""
+Text Matcher.
+Общий движок поиска фраз для rule-based анализаторов (настроение, кризис,
+триггеры, медицина, профиль, вопросы, планы, цели, подсказки).
+
+Словари всех анализаторов регистрируются при импорте и собираются в один
+автомат — регулярку в виде префиксного дерева. Текст нормализуется один раз
+(нижний регистр, пробельные последовательности -> один пробел) и проходится
+одним вызовом finditer; набор найденных фраз кэшируется по тексту, поэтому
+анализаторы одного хода читают готовый результат.
+
+Регулярные паттерны анализаторов с конечным языком (альтернативы, `?`,
+`\\s+`) разворачиваются в набор фраз и ищутся тем же проходом; остальные
+ветви (`\\w*`, `\\d+`, `.*`) остаются регулярками и запускаются, только
+если в тексте нашлась обязательная для них фраза (gate).
+"""
+
+import re
+from collections import OrderedDict
+from dataclasses import dataclass
+from itertools import product
+from typing import Dict, FrozenSet, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    from re import _constants as sre_constants, _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_constants
+    import sre_parse
+
+
+# Сколько последних текстов держать в кэше совпадений
+SCAN_CACHE_SIZE = 256
+
+# Предел разворачивания паттерна в фразы (больше — остаётся регуляркой)
+MAX_EXPANSIONS = 256
+
+_WHITESPACE = re.compile(r"\s+")
+# Пробельное, отличное от одиночного пробела (чаще всего его в тексте нет)
+_IRREGULAR_WHITESPACE = re.compile(r"[^\S ]|  ")
+
+
+def normalize(text: str) -> str:
+    """Нижний регистр и один пробел вместо любой пробельной последовательности."""
+    text = text.lower()
+    if _IRREGULAR_WHITESPACE.search(text):
+        text = _WHITESPACE.sub(" ", text)
+    return text
+
+
+@dataclass(frozen=True)
+class PhrasePattern:
+    """
+    Зарегистрированный регулярный паттерн.
+    phrases — развёрнутые конечные ветви, regexes — оставшиеся ветви
+    вместе с фразами, без одной из которых ветвь совпасть не может.
+    """
+
+    source: str
+    phrases: Tuple[str, ...]
+    regexes: Tuple[Tuple[Tuple[str, ...], "re.Pattern[str]"], ...]
+
+
+@dataclass(frozen=True)
+class TextMatches:
+    """Результат одного прохода по тексту."""
+
+    text: str
+    phrases: FrozenSet[str]
+
+    def __contains__(self, phrase: str) -> bool:
+        return phrase in self.phrases
+
+    def any(self, phrases: Iterable[str]) -> bool:
+        """Есть ли в тексте хотя бы одна из фраз."""
+        return not self.phrases.isdisjoint(phrases)
+
+    def count(self, phrases: Iterable[str]) -> int:
+        """Сколько разных фраз словаря есть в тексте."""
+        return len(self.phrases.intersection(phrases))
+
+    def found(self, phrases: Sequence[str]) -> List[str]:
+        """Найденные фразы в порядке словаря."""
+        if self.phrases.isdisjoint(phrases):
+            return []
+        return [phrase for phrase in phrases if phrase in self.phrases]
+
+    def first(self, phrases: Sequence[str]) -> Optional[str]:
+        """Первая найденная фраза в порядке словаря."""
+        if self.phrases.isdisjoint(phrases):
+            return None
+        for phrase in phrases:
+            if phrase in self.phrases:
+                return phrase
+        return None
+
+    def allows(self, gate: Tuple[str, ...]) -> bool:
+        """Может ли паттерн с такими обязательными фразами совпасть в тексте."""
+        return not gate or self.any(gate)
+
+    def search(self, pattern: PhrasePattern) -> Optional[str]:
+        """Совпадение паттерна: найденная фраза / текст совпадения или None."""
+        phrase = self.first(pattern.phrases)
+        if phrase is not None:
+            return phrase
+        for gate, regex in pattern.regexes:
+            if not self.allows(gate):
+                continue
+            match = regex.search(self.text)
+            if match:
+                return match.group()
+        return None
+
+
+class TextMatcher:
+    """Общий автомат фраз всех анализаторов."""
+
+    def __init__(self, cache_size: int = SCAN_CACHE_SIZE):
+        self._phrases: Dict[str, None] = {}
+        self._patterns: Dict[str, PhrasePattern] = {}
+        self._gates: Dict[str, Tuple[str, ...]] = {}
+        self._regex: Optional["re.Pattern[str]"] = None
+        self._prefixes: Dict[str, Tuple[str, ...]] = {}
+        self._longest = 0
+        self._cache: "OrderedDict[str, TextMatches]" = OrderedDict()
+        self._cache_size = cache_size
+
+    def register(self, phrases: Iterable[str]) -> Tuple[str, ...]:
+        """
+        Добавить фразы в автомат (при импорте анализатора).
+
+        Фразы должны быть уже нормализованы: иначе они никогда
+        не совпадут с нормализованным текстом.
+
+        Returns:
+            Те же фразы кортежем — для membership-проверок анализатора
+        """
+        phrases = tuple(phrases)
+        for phrase in phrases:
+            if phrase not in self._phrases and (not phrase or normalize(phrase) != phrase):
+                raise ValueError(f"Phrase must be non-empty and normalized: {phrase!r}")
+        self._add(phrases)
+        return phrases
+
+    def pattern(self, source: str) -> PhrasePattern:
+        """
+        Зарегистрировать регулярный паттерн (ищется по нормализованному тексту).
+        Ветви верхнего уровня с конечным языком разворачиваются в фразы.
+        """
+        if source in self._patterns:
+            return self._patterns[source]
+
+        phrases: List[str] = []
+        regexes = []
+        for branch in _split_alternatives(source):
+            parsed = sre_parse.parse(branch)
+            expanded = _expand(parsed)
+            if expanded is None or "" in expanded:
+                gate = _required(parsed)
+                self._add(gate)
+                regexes.append((gate, re.compile(branch)))
+            elif any(normalize(phrase) != phrase for phrase in expanded):
+                raise ValueError(f"Pattern must match normalized text: {source!r}")
+            else:
+                phrases.extend(p for p in expanded if p not in phrases)
+
+        self._add(phrases)
+        pattern = PhrasePattern(source=source, phrases=tuple(phrases), regexes=tuple(regexes))
+        self._patterns[source] = pattern
+        return pattern
+
+    def gate(self, source: str) -> Tuple[str, ...]:
+        """
+        Зарегистрировать обязательные фразы регулярки, которая выполняется
+        сама (по исходному тексту, с захватом групп): если ни одной из них
+        нет в нормализованном тексте, регулярка заведомо не совпадёт.
+
+        Returns:
+            Фразы для TextMatches.allows (пустой кортеж — отсечь нельзя)
+        """
+        if source in self._gates:
+            return self._gates[source]
+
+        gate: List[str] = []
+        for branch in _split_alternatives(source):
+            required = _required(sre_parse.parse(branch))
+            if not required:
+                gate = []
+                break
+            gate.extend(p for p in required if p not in gate)
+
+        self._add(gate)
+        self._gates[source] = tuple(gate)
+        return self._gates[source]
+
+    def scan(self, text: str) -> TextMatches:
+        """Все зарегистрированные фразы, встречающиеся в тексте (с кэшем)."""
+        cached = self._cache.get(text)
+        if cached is not None:
+            self._cache.move_to_end(text)
+            return cached
+
+        normalized = normalize(text)
+        result = TextMatches(text=normalized, phrases=self._find(normalized))
+
+        self._cache[text] = result
+        if len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+        return result
+
+    def scan_joined(self, first: str, second: str) -> TextMatches:
+        """
+        То же, что scan(first + " " + second), но по уже просканированным
+        частям: заново проходится только стык длиной в самую длинную фразу.
+        """
+        left = self.scan(first)
+        right = self.scan(second)
+        reach = self._longest
+        junction = normalize(left.text[len(left.text) - reach:] + " " + right.text[:reach])
+        return TextMatches(
+            text=normalize(left.text + " " + right.text),
+            phrases=left.phrases | right.phrases | self._find(junction),
+        )
+
+    def _find(self, normalized: str) -> FrozenSet[str]:
+        if self._regex is None:
+            self._build()
+        found = set()
+        for longest in set(self._regex.findall(normalized)):
+            found.update(self._prefixes[longest])
+        return frozenset(found)
+
+    def _add(self, phrases: Iterable[str]) -> None:
+        new = [phrase for phrase in phrases if phrase not in self._phrases]
+        if new:
+            self._phrases.update(dict.fromkeys(new))
+            self._regex = None
+            self._cache.clear()
+
+    def _build(self) -> None:
+        """
+        Собрать автомат. Регулярка (?=(дерево)) проверяется в каждой позиции
+        и возвращает самую длинную фразу, начинающуюся в ней; более короткие
+        фразы с той же позиции — её префиксы, их добавляет self._prefixes.
+        """
+        trie: dict = {}
+        for phrase in self._phrases:
+            node = trie
+            for char in phrase:
+                node = node.setdefault(char, {})
+            node[""] = True
+
+        self._regex = re.compile(f"(?=({_render_trie(trie)}))")
+        self._longest = max(map(len, self._phrases), default=0)
+        self._prefixes = {
+            phrase: tuple(
+                phrase[:end] for end in range(1, len(phrase) + 1)
+                if phrase[:end] in self._phrases
+            )
+            for phrase in self._phrases
+        }
+
+
+def _render_trie(node: dict) -> str:
+    """Регулярка префиксного дерева: ветви по символу, длинные варианты первыми."""
+    branches = [
+        re.escape(char) + _render_trie(child)
+        for char, child in sorted(node.items())
+        if char
+    ]
+    if not branches:
+        return ""
+    body = branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+    # Конец фразы внутри дерева — жадный `?` сначала пробует продолжение
+    return f"(?:{body})?" if "" in node else body
+
+
+def _split_alternatives(source: str) -> List[str]:
+    """Разбить паттерн по `|` верхнего уровня (вне групп и классов)."""
+    branches = []
+    depth = 0
+    start = 0
+    in_class = False
+    escaped = False
+    for index, char in enumerate(source):
+        if escaped:
+            escaped = False
+        elif char == "\\":
+            escaped = True
+        elif in_class:
+            in_class = char != "]"
+        elif char == "[":
+            in_class = True
+        elif char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif char == "|" and depth == 0:
+            branches.append(source[start:index])
+            start = index + 1
+    branches.append(source[start:])
+    return branches
+
+
+def _required(parsed) -> Tuple[str, ...]:
+    """
+    Фразы, одна из которых входит в любое совпадение: развёртка самого
+    длинного участка паттерна с конечным языком (() — такого участка нет).
+    """
+    best: Tuple[str, ...] = ()
+    # Однобуквенные фразы встречаются почти везде — не отсекают ничего
+    best_length = 1
+    run = [""]
+    for op, value in [*parsed, (None, None)]:
+        options = _expand_node(op, value) if op is not None else None
+        if options is not None:
+            extended = [prefix + option for prefix, option in product(run, options)]
+            if len(extended) <= MAX_EXPANSIONS:
+                run = extended
+                continue
+
+        # Участок закончился — оцениваем его. Нормализация варианта сохраняет
+        # вхождение: нормализованный текст содержит нормализованную подстроку
+        phrases = tuple(dict.fromkeys(normalize(phrase) for phrase in run))
+        length = min(len(phrase) for phrase in phrases)
+        if length > best_length:
+            best, best_length = phrases, length
+        run = [""] if options is None else list(dict.fromkeys(options))
+    return best
+
+
+def _expand(parsed) -> Optional[List[str]]:
+    """
+    Все строки конечного языка паттерна (None — язык бесконечен или велик).
+    `\\s` раскрывается в пробел: текст нормализован, поэтому `\\s+` и `\\s*`
+    эквивалентны " " и "" / " ".
+    """
+    variants = [""]
+    for op, value in parsed:
+        options = _expand_node(op, value)
+        if options is None:
+            return None
+        variants = [prefix + option for prefix, option in product(variants, options)]
+        if len(variants) > MAX_EXPANSIONS:
+            return None
+    # Подряд идущие \s (например `\s+—?\s?`) в нормализованном тексте — один пробел
+    return list(dict.fromkeys(_WHITESPACE.sub(" ", variant) for variant in variants))
+
+
+def _expand_node(op, value) -> Optional[List[str]]:
+    if op is sre_constants.LITERAL:
+        return [chr(value)]
+    if op is sre_constants.IN:
+        return _expand_class(value)
+    if op is sre_constants.SUBPATTERN:
+        return _expand(value[-1])
+    if op is sre_constants.BRANCH:
+        options: List[str] = []
+        for branch in value[1]:
+            expanded = _expand(branch)
+            if expanded is None:
+                return None
+            options.extend(expanded)
+        return options
+    if op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT):
+        low, high, item = value
+        options = _expand(item)
+        if options is None:
+            return None
+        if options == [" "]:
+            return [" "] if low else ["", " "]
+        if high is sre_constants.MAXREPEAT or high > 1:
+            return None
+        return ([""] if low == 0 else []) + options
+    return None
+
+
+def _expand_class(items) -> Optional[List[str]]:
+    chars: List[str] = []
+    for op, value in items:
+        if op is sre_constants.LITERAL:
+            chars.append(chr(value))
+        elif op is sre_constants.CATEGORY and value is sre_constants.CATEGORY_SPACE:
+            chars.append(" ")
+        else:
+            return None
+    return list(dict.fromkeys(chars))
+
+
+# Глобальный экземпляр
+text_matcher = TextMatcher()
@@ -5,6 +5,8 @@
 from typing import Optional, Dict, Any, List
 from loguru import logger
 
+from ai.text_matcher import text_matcher
+
 
 class TriggerDetector:
     """Детектит когда пользователь негативно реагирует на тему."""
@@ -35,6 +37,23 @@ class TriggerDetector:
         "дети": ["с ребенком проблемы", "ребенок болеет"],
     }
 
+    # Маркеры эмоциональности реакции
+    HIGH_SEVERITY_MARKERS = [
+        "больно", "не могу", "ранит", "очень тяжело", "триггерит"
+    ]
+
+    MEDIUM_SEVERITY_MARKERS = [
+        "не хочу", "не готова", "лучше не будем"
+    ]
+
+    def __init__(self):
+        # Словари — в общий автомат (один проход по тексту)
+        text_matcher.register(self.NEGATIVE_REACTION_PATTERNS)
+        text_matcher.register(self.HIGH_SEVERITY_MARKERS)
+        text_matcher.register(self.MEDIUM_SEVERITY_MARKERS)
+        for keywords in self.COMMON_SENSITIVE_TOPICS.values():
+            text_matcher.register(keywords)
+
     def detect_negative_reaction(
         self,
         user_message: str,
@@ -50,12 +69,10 @@ class TriggerDetector:
         Returns:
             Dict с информацией о триггере или None
         """
-        message_lower = user_message.lower()
+        matches = text_matcher.scan(user_message)
 
         # Проверяем маркеры негативной реакции
-        has_negative_reaction = any(
-            pattern in message_lower for pattern in self.NEGATIVE_REACTION_PATTERNS
-        )
+        has_negative_reaction = matches.any(self.NEGATIVE_REACTION_PATTERNS)
 
         if not has_negative_reaction:
             return None
@@ -77,7 +94,7 @@ class TriggerDetector:
         return {
             "has_negative_reaction": True,
             "topic": detected_topic,
-            "severity": self._estimate_severity(message_lower),
+            "severity": self._estimate_severity(user_message),
             "reason": "user_expressed_discomfort"
         }
 
@@ -96,19 +113,18 @@ class TriggerDetector:
         Returns:
             Название темы или None
         """
-        message_lower = user_message.lower()
-
         # Проверяем известные темы
-        for topic_name, keywords in self.COMMON_SENSITIVE_TOPICS.items():
-            if any(keyword in message_lower for keyword in keywords):
-                return topic_name
+        topics = self.detect_topic_in_message(user_message)
+        if topics:
+            return topics[0]
 
         # Проверяем в предыдущем сообщении бота (если есть)
         if previous_bot_message:
-            bot_message_lower = previous_bot_message.lower()
-            for topic_name, keywords in self.COMMON_SENSITIVE_TOPICS.items():
-                if any(keyword in bot_message_lower for keyword in keywords):
-                    return topic_name
+            topics = self.detect_topic_in_message(previous_bot_message)
+            if topics:
+                return topics[0]
+
+        message_lower = user_message.lower()
 
         # Пытаемся извлечь тему из контекста
         # Паттерн: "не хочу об этом [тема]"
@@ -125,24 +141,18 @@ class TriggerDetector:
 
         return None
 
-    def _estimate_severity(self, message_lower: str) -> int:
+    def _estimate_severity(self, message: str) -> int:
         """
         Оценивает степень чувствительности темы на основе эмоциональности сообщения.
 
         Returns:
             Степень от 1 до 10
         """
-        high_severity_markers = [
-            "больно", "не могу", "ранит", "очень тяжело", "триггерит"
-        ]
-
-        medium_severity_markers = [
-            "не хочу", "не готова", "лучше не будем"
-        ]
+        matches = text_matcher.scan(message)
 
-        if any(marker in message_lower for marker in high_severity_markers):
+        if matches.any(self.HIGH_SEVERITY_MARKERS):
             return 8  # Высокая чувствительность
-        elif any(marker in message_lower for marker in medium_severity_markers):
+        elif matches.any(self.MEDIUM_SEVERITY_MARKERS):
             return 6  # Средняя
         else:
             return 5  # По умолчанию
@@ -157,11 +167,11 @@ class TriggerDetector:
         Returns:
             Список обнаруженных тем
         """
-        message_lower = message.lower()
+        matches = text_matcher.scan(message)
         detected_topics = []
 
         for topic_name, keywords in self.COMMON_SENSITIVE_TOPICS.items():
-            if any(keyword in message_lower for keyword in keywords):
+            if matches.any(keywords):
                 detected_topics.append(topic_name)
 
         return detected_topics
@@ -12,6 +12,7 @@ from openai import AsyncOpenAI
 from loguru import logger
 
 from config.settings import settings
+from config.constants import WHISPER_PRICE_PER_SECOND
 
 
 class WhisperClient:
@@ -97,9 +98,9 @@ class WhisperClient:
             result = await self.transcribe(temp_file.name, language)
 
             # Рассчитываем стоимость
-            # Whisper API: $0.006 per minute = $0.0001 per second
+            # Whisper API: $0.006 per minute
             if audio_duration_seconds:
-                cost_info['cost_usd'] = audio_duration_seconds * 0.0001
+                cost_info['cost_usd'] = audio_duration_seconds * WHISPER_PRICE_PER_SECOND
 
             return result, cost_info
 
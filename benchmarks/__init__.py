@@ -0,0 +1,4 @@
+"""
+Benchmarks package.
+Нагрузочные и микро-бенчмарки (запуск: python -m benchmarks.<name>).
+"""
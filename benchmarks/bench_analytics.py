@@ -0,0 +1,245 @@
+"""
+Admin analytics benchmark.
+Графики админки на большой истории сообщений: старые эндпоинты
+(запросы на каждый день, теги считаются в Python по всем строкам,
+шесть выборок под распределение тем) против AnalyticsRepository
+(один GROUP BY по дням / по индексу message_tags на график).
+
+Использует in-memory SQLite (нужен aiosqlite):
+    python -m benchmarks.bench_analytics --messages 1000000 --users 5000
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import time
+from datetime import date, datetime, timedelta
+
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "benchmark")
+os.environ.setdefault("ANTHROPIC_API_KEY", "benchmark")
+os.environ["DATABASE_URL"] = "sqlite+aiosqlite:///:memory:"
+
+from sqlalchemy import and_, event, func, insert, select
+from sqlalchemy.schema import CreateIndex, CreateTable
+
+from database.session import engine, get_session_context
+from database.models import User, Message, MessageTag, MoodEntry
+from database.repositories.analytics import analytics_repo
+from admin.services.metrics import TOPIC_TAGS
+
+
+TAGS = list(TOPIC_TAGS) + ["emotion:sad", "emotion:anxious", "emotion:happy", "crisis", "gratitude"]
+EMOTIONS = ["joy", "sadness", "anxiety", "anger", "calm", "neutral"]
+INSERT_CHUNK = 20_000
+
+
+class QueryCounter:
+    """Считает SQL-запросы через события engine."""
+
+    def __init__(self) -> None:
+        self.statements = 0
+        event.listen(engine.sync_engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args) -> None:
+        self.statements += 1
+
+    def reset(self) -> None:
+        self.statements = 0
+
+
+async def seed(users: int, messages: int, history_days: int) -> None:
+    """Пользователи и сообщения, равномерно распределённые по history_days дням."""
+    async with engine.begin() as conn:
+        for model in (User, Message, MessageTag, MoodEntry):
+            await conn.execute(CreateTable(model.__table__))
+            for index in model.__table__.indexes:
+                await conn.execute(CreateIndex(index))
+
+    rng = random.Random(42)
+    now = datetime.now()
+
+    async with get_session_context() as session:
+        await session.execute(insert(User), [
+            {
+                "id": i,
+                "telegram_id": 1_000_000 + i,
+                "first_name": "Bench",
+                "last_active_at": now - timedelta(seconds=rng.randint(0, history_days * 86400)),
+            }
+            for i in range(1, users + 1)
+        ])
+
+        for offset in range(0, messages, INSERT_CHUNK):
+            rows = []
+            tags = []
+            moods = []
+            for message_id in range(offset + 1, min(offset + INSERT_CHUNK, messages) + 1):
+                created_at = now - timedelta(seconds=rng.randint(0, history_days * 86400))
+                rows.append({
+                    "id": message_id,
+                    "user_id": rng.randint(1, users),
+                    "role": "user" if message_id % 2 else "assistant",
+                    "content": "benchmark",
+                    "message_type": "voice" if message_id % 10 == 0 else "text",
+                    "tags": rng.sample(TAGS, rng.randint(0, 3)),
+                    "created_at": created_at,
+                })
+                tags.extend(
+                    {"message_id": message_id, "tag": tag, "user_id": rows[-1]["user_id"], "created_at": created_at}
+                    for tag in rows[-1]["tags"]
+                )
+                if message_id % 10 == 1:
+                    moods.append({
+                        "user_id": rows[-1]["user_id"],
+                        "message_id": message_id,
+                        "mood_score": rng.randint(-5, 5),
+                        "primary_emotion": rng.choice(EMOTIONS),
+                        "created_at": created_at,
+                    })
+            await session.execute(insert(Message), rows)
+            if tags:
+                await session.execute(insert(MessageTag), tags)
+            await session.execute(insert(MoodEntry), moods)
+        await session.commit()
+
+
+# ---------------------------------------------------------------
+# Старые реализации (как в эндпоинтах до переделки)
+# ---------------------------------------------------------------
+
+
+async def legacy_activity(days: int) -> list:
+    result = []
+    async with get_session_context() as session:
+        for i in range(days - 1, -1, -1):
+            day = date.today() - timedelta(days=i)
+            day_start = datetime.combine(day, datetime.min.time())
+            day_end = datetime.combine(day, datetime.max.time())
+            active = (await session.execute(
+                select(func.count(User.id.distinct())).where(
+                    and_(User.last_active_at >= day_start, User.last_active_at <= day_end)
+                )
+            )).scalar() or 0
+            messages = (await session.execute(
+                select(func.count(Message.id)).where(
+                    and_(Message.created_at >= day_start, Message.created_at <= day_end)
+                )
+            )).scalar() or 0
+            result.append((day, active, messages))
+    return result
+
+
+async def legacy_mood(days: int) -> list:
+    result = []
+    async with get_session_context() as session:
+        for i in range(days - 1, -1, -1):
+            day = date.today() - timedelta(days=i)
+            day_start = datetime.combine(day, datetime.min.time())
+            day_end = datetime.combine(day, datetime.max.time())
+            window = and_(MoodEntry.created_at >= day_start, MoodEntry.created_at <= day_end)
+            avg = (await session.execute(select(func.avg(MoodEntry.mood_score)).where(window))).scalar()
+            count = (await session.execute(select(func.count(MoodEntry.id)).where(window))).scalar() or 0
+            result.append((day, avg, count))
+    return result
+
+
+async def legacy_tags(days: int) -> list:
+    cutoff = datetime.now() - timedelta(days=days)
+    async with get_session_context() as session:
+        result = await session.execute(
+            select(Message.tags).where(and_(Message.created_at >= cutoff, Message.tags.isnot(None)))
+        )
+        rows = list(result.scalars())
+    counts = {}
+    for tags in rows:
+        for tag in tags or []:
+            counts[tag] = counts.get(tag, 0) + 1
+    return sorted(counts.items(), key=lambda x: x[1], reverse=True)[:5]
+
+
+async def legacy_topics(days: int) -> dict:
+    """Шесть выборок до 10k строк (MetricsService._count_tag, поиск по JSON)."""
+    since = datetime.now() - timedelta(days=days)
+    result = {}
+    async with get_session_context() as session:
+        for tag in TOPIC_TAGS:
+            messages = await session.execute(
+                select(Message)
+                .where(and_(Message.tags.contains([tag]), Message.created_at >= since))
+                .order_by(Message.created_at.desc())
+                .limit(10000)
+            )
+            result[tag] = len(messages.scalars().all())
+    return result
+
+
+# ---------------------------------------------------------------
+# Новые реализации
+# ---------------------------------------------------------------
+
+
+async def new_activity(days: int) -> list:
+    return (await analytics_repo.get_activity(days))["days"]
+
+
+async def new_mood(days: int) -> list:
+    return await analytics_repo.get_mood_by_day(days)
+
+
+async def new_tags(days: int) -> list:
+    return await analytics_repo.get_tag_counts(days, limit=5)
+
+
+async def new_topics(days: int) -> dict:
+    return dict(await analytics_repo.get_tag_counts(days, tags=TOPIC_TAGS))
+
+
+async def measure(counter: QueryCounter, func_, days: int) -> tuple:
+    counter.reset()
+    started = time.perf_counter()
+    result = await func_(days)
+    return result, time.perf_counter() - started, counter.statements
+
+
+async def run(args: argparse.Namespace) -> None:
+    started = time.perf_counter()
+    await seed(args.users, args.messages, args.history_days)
+    print(f"seeded {args.messages} messages in {time.perf_counter() - started:.1f}s")
+
+    counter = QueryCounter()
+    cases = (
+        ("activity", legacy_activity, new_activity),
+        ("mood", legacy_mood, new_mood),
+        ("top tags", legacy_tags, new_tags),
+        ("topics", legacy_topics, new_topics),
+    )
+
+    try:
+        for name, legacy, new in cases:
+            old_result, old_time, old_queries = await measure(counter, legacy, args.days)
+            new_result, new_time, new_queries = await measure(counter, new, args.days)
+            _, cached_time, cached_queries = await measure(counter, new, args.days)
+            print(
+                f"{name:<9} legacy={old_time * 1000:9.1f}ms ({old_queries:>3} queries)  "
+                f"grouped={new_time * 1000:9.1f}ms ({new_queries:>3} queries)  "
+                f"cached={cached_time * 1000:6.2f}ms ({cached_queries} queries)"
+            )
+            if name in ("activity", "top tags") and old_result != new_result:
+                print(f"  !! results differ: {old_result[:3]} vs {new_result[:3]}")
+    finally:
+        await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=1_000_000, help="Сообщений в истории")
+    parser.add_argument("--users", type=int, default=5000, help="Пользователей")
+    parser.add_argument("--history-days", type=int, default=90, help="Глубина истории (дни)")
+    parser.add_argument("--days", type=int, default=30, help="Период графиков (дни)")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+Batch generation benchmark.
+Утренний ритуал для N пользователей против локальной заглушки Anthropic API
+и фиктивного Telegram.
+
+Сравнивает:
+- legacy: генерация внутри слота отправки, каждый промпт — отдельный запрос
+  (как было раньше)
+- batch:  DeliveryDispatcher с отдельными слотами сборки и BatchGenerator
+  (дедупликация и кэш шаблонных промптов)
+
+Доля --template пользователей без личного контекста получает одинаковый
+шаблонный промпт.
+
+Запуск:
+    python -m benchmarks.bench_batch_generation --users 500 --template 0.4
+"""
+
+import argparse
+import asyncio
+import os
+import time
+from types import SimpleNamespace
+from typing import List, Tuple
+
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "benchmark")
+os.environ.setdefault("ANTHROPIC_API_KEY", "benchmark")
+
+from benchmarks.bench_claude_concurrency import make_messages_handler
+from benchmarks.stub_servers import ThreadedStubServer, percentile
+
+
+SEND_LATENCY = 0.03
+
+
+class StubBot:
+    """Bot API с задержкой ответа; запоминает момент каждой отправки."""
+
+    def __init__(self, started: float):
+        self.started = started
+        self.sent_at: List[float] = []
+
+    async def send_message(self, **kwargs) -> None:
+        await asyncio.sleep(SEND_LATENCY)
+        self.sent_at.append(time.perf_counter() - self.started)
+
+
+def make_prompts(users: int, template: float) -> List[Tuple[int, str, bool]]:
+    """(user_id, промпт, шаблонный ли) для каждого пользователя."""
+    templated = int(users * template)
+    return [
+        (user_id, "Доброе утро, подруга" if user_id < templated else f"Доброе утро, тема {user_id}", user_id < templated)
+        for user_id in range(users)
+    ]
+
+
+async def bench_legacy(prompts, concurrency: int) -> Tuple[List[float], float]:
+    """Старое поведение: генерация держит слот отправки."""
+    from ai.anthropic_pool import close_anthropic_client
+    from ai.claude_client import ClaudeClient
+
+    claude = ClaudeClient()
+    slots = asyncio.Semaphore(concurrency)
+    started = time.perf_counter()
+    bot = StubBot(started)
+
+    async def deliver(user_id: int, prompt: str) -> None:
+        async with slots:
+            text = await claude.generate_simple(system_prompt="bench", user_prompt=prompt, max_tokens=200)
+            await bot.send_message(chat_id=user_id, text=text)
+
+    try:
+        await asyncio.gather(*(deliver(user_id, prompt) for user_id, prompt, _ in prompts))
+        return bot.sent_at, time.perf_counter() - started
+    finally:
+        await close_anthropic_client()
+
+
+async def bench_batch(prompts, concurrency: int, build_concurrency: int, generation: int) -> Tuple[List[float], float]:
+    """Новое поведение: отдельные слоты сборки и общий бюджет генерации."""
+    from ai.anthropic_pool import close_anthropic_client
+    from ai.batch_generator import BatchGenerator
+    from services.delivery import Delivery, DeliveryDispatcher
+    from services.telegram_rate_limiter import TelegramRateLimiter
+
+    generator = BatchGenerator(concurrency=generation, rpm=1_000_000, tpm=1_000_000_000)
+    dispatcher = DeliveryDispatcher(
+        concurrency=concurrency,
+        rate_limiter=TelegramRateLimiter(global_rate=10_000, per_chat_interval=0),
+        build_concurrency=build_concurrency,
+    )
+    started = time.perf_counter()
+    bot = StubBot(started)
+    dispatcher.set_bot(bot)
+
+    def build(prompt: str, cacheable: bool):
+        async def run(user) -> str:
+            return await generator.generate("bench", prompt, max_tokens=200, cacheable=cacheable)
+        return run
+
+    deliveries = [Delivery(user_id=user_id, build=build(prompt, cacheable)) for user_id, prompt, cacheable in prompts]
+    users = {
+        user_id: SimpleNamespace(id=user_id, telegram_id=user_id, is_blocked=False, proactive_messages=True)
+        for user_id, _, _ in prompts
+    }
+
+    try:
+        await dispatcher.dispatch("bench", deliveries, users=users)
+        print(f"         claude requests={generator.requests} cache_hits={generator.cache_hits} "
+              f"deduplicated={generator.deduplicated}")
+        return bot.sent_at, time.perf_counter() - started
+    finally:
+        await close_anthropic_client()
+
+
+def report(name: str, sent_at: List[float], wall: float) -> None:
+    print(
+        f"{name:<8} sent={len(sent_at):<5} wall={wall:7.2f}s "
+        f"first={min(sent_at) * 1000:8.1f}ms "
+        f"p50={percentile(sent_at, 50) * 1000:8.1f}ms "
+        f"p99={percentile(sent_at, 99) * 1000:8.1f}ms"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=500, help="Получателей ритуала")
+    parser.add_argument("--template", type=float, default=0.4, help="Доля шаблонных промптов")
+    parser.add_argument("--latency", type=float, default=0.5, help="Латентность заглушки Claude (сек)")
+    parser.add_argument("--concurrency", type=int, default=10, help="DELIVERY_CONCURRENCY")
+    parser.add_argument("--build-concurrency", type=int, default=20, help="DELIVERY_BUILD_CONCURRENCY")
+    parser.add_argument("--generation", type=int, default=10, help="GENERATION_CONCURRENCY")
+    args = parser.parse_args()
+
+    server = ThreadedStubServer(
+        [("POST", "/v1/messages", make_messages_handler(args.latency))]
+    ).start()
+
+    # Настройки читаются при импорте config.settings — выставляем до импорта клиентов
+    os.environ["ANTHROPIC_BASE_URL"] = server.base_url
+
+    prompts = make_prompts(args.users, args.template)
+    try:
+        for name, factory in (
+            ("legacy", lambda: bench_legacy(prompts, args.concurrency)),
+            ("batch", lambda: bench_batch(prompts, args.concurrency, args.build_concurrency, args.generation)),
+        ):
+            sent_at, wall = asyncio.run(factory())
+            report(name, sent_at, wall)
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
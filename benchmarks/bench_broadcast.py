@@ -0,0 +1,200 @@
+"""
+Broadcast benchmark.
+Старая последовательная рассылка против BroadcastEngine на локальной
+заглушке Telegram Bot API (задержка ответа, лимит сообщений в секунду
+с 429 retry_after, часть получателей заблокировала бота).
+
+Использует in-memory SQLite (нужен aiosqlite):
+    python -m benchmarks.bench_broadcast --users 500 --latency 0.1
+"""
+
+import argparse
+import asyncio
+import os
+import time
+from collections import Counter, deque
+
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "benchmark")
+os.environ.setdefault("ANTHROPIC_API_KEY", "benchmark")
+os.environ["DATABASE_URL"] = "sqlite+aiosqlite:///:memory:"
+
+import httpx
+from aiohttp import web
+from sqlalchemy.schema import CreateTable
+
+from benchmarks.stub_servers import ThreadedStubServer
+from config.settings import settings
+from database.session import engine, get_session_context
+from database.models import User, Subscription, Broadcast
+from database.repositories.broadcast import broadcast_repo
+from services.broadcast import BroadcastEngine
+from services.telegram_rate_limiter import TelegramRateLimiter
+
+
+class FakeTelegram:
+    """sendMessage с задержкой, глобальным лимитом и заблокированными чатами."""
+
+    def __init__(self, latency: float, limit_per_second: int, blocked_every: int):
+        self.latency = latency
+        self.limit_per_second = limit_per_second
+        self.blocked_every = blocked_every
+        self.delivered: Counter = Counter()
+        self.flood_errors = 0
+        self._window: deque = deque()
+
+    async def send_message(self, request: web.Request) -> web.Response:
+        payload = await request.json()
+        chat_id = payload["chat_id"]
+        await asyncio.sleep(self.latency)
+
+        now = time.monotonic()
+        while self._window and now - self._window[0] > 1.0:
+            self._window.popleft()
+        if len(self._window) >= self.limit_per_second:
+            self.flood_errors += 1
+            return web.json_response({
+                "ok": False,
+                "error_code": 429,
+                "description": "Too Many Requests: retry after 1",
+                "parameters": {"retry_after": 1},
+            })
+        self._window.append(now)
+
+        if chat_id % self.blocked_every == 0:
+            return web.json_response({
+                "ok": False,
+                "error_code": 403,
+                "description": "Forbidden: bot was blocked by the user",
+            })
+
+        self.delivered[chat_id] += 1
+        return web.json_response({"ok": True, "result": {"message_id": 1}})
+
+    def reset(self) -> None:
+        self.delivered.clear()
+        self.flood_errors = 0
+        self._window.clear()
+
+
+async def seed(users: int) -> None:
+    async with engine.begin() as conn:
+        for model in (User, Subscription, Broadcast):
+            await conn.execute(CreateTable(model.__table__))
+
+    async with get_session_context() as session:
+        session.add_all([
+            User(telegram_id=1_000_000 + i, username=f"user{i}", first_name="Bench")
+            for i in range(users)
+        ])
+        await session.commit()
+
+
+async def legacy_broadcast(base_url: str, telegram_ids: list, text: str) -> tuple:
+    """Как было: один получатель за раз, без обработки 429."""
+    success_count = 0
+    fail_count = 0
+    async with httpx.AsyncClient() as client:
+        for tid in telegram_ids:
+            try:
+                response = await client.post(
+                    f"{base_url}/bot{settings.TELEGRAM_BOT_TOKEN}/sendMessage",
+                    json={"chat_id": tid, "text": text, "parse_mode": "Markdown"},
+                    timeout=10.0,
+                )
+                if response.json().get("ok"):
+                    success_count += 1
+                else:
+                    fail_count += 1
+            except Exception:
+                fail_count += 1
+    return success_count, fail_count
+
+
+async def wait_finished(broadcast_id: str) -> Broadcast:
+    while True:
+        broadcast = await broadcast_repo.get(broadcast_id)
+        if broadcast.status in ("completed", "failed"):
+            return broadcast
+        await asyncio.sleep(0.05)
+
+
+def report(name: str, elapsed: float, sent: int, failed: int, blocked: int, fake: FakeTelegram) -> None:
+    duplicates = sum(count - 1 for count in fake.delivered.values() if count > 1)
+    print(
+        f"{name:<22} time={elapsed:7.2f}s  rate={sent / elapsed:6.1f} msg/s  "
+        f"sent={sent:<5} failed={failed:<4} blocked={blocked:<4} "
+        f"429s={fake.flood_errors:<4} duplicates={duplicates}"
+    )
+
+
+async def run(args: argparse.Namespace) -> None:
+    await seed(args.users)
+    fake = FakeTelegram(args.latency, args.server_limit, args.blocked_every)
+    server = ThreadedStubServer([("POST", "/{token}/sendMessage", fake.send_message)]).start()
+
+    try:
+        telegram_ids = [1_000_000 + i for i in range(args.users)]
+        text = "Новая медитация уже в боте"
+
+        # 1. Старая последовательная рассылка (delay_seconds=0 — лучший случай)
+        started = time.perf_counter()
+        sent, failed = await legacy_broadcast(server.base_url, telegram_ids, text)
+        report("legacy (sequential)", time.perf_counter() - started, sent, failed, 0, fake)
+
+        # 2. Движок: N отправителей под rate limiter
+        for name, rate in (("engine (rate limited)", args.rate), ("engine (no client limit)", 10_000)):
+            fake.reset()
+            broadcast_engine = BroadcastEngine(
+                concurrency=args.concurrency,
+                rate_limiter=TelegramRateLimiter(global_rate=rate, per_chat_interval=1.0),
+                api_base_url=server.base_url,
+                checkpoint_every=50,
+            )
+            started = time.perf_counter()
+            broadcast = await broadcast_engine.start_broadcast(text, "all")
+            result = await wait_finished(broadcast.id)
+            report(name, time.perf_counter() - started, result.sent, result.failed, result.blocked, fake)
+
+        # 3. Остановка посередине и продолжение после «перезапуска»
+        fake.reset()
+        broadcast_engine = BroadcastEngine(
+            concurrency=args.concurrency,
+            rate_limiter=TelegramRateLimiter(global_rate=args.rate, per_chat_interval=1.0),
+            api_base_url=server.base_url,
+            checkpoint_every=50,
+        )
+        started = time.perf_counter()
+        broadcast = await broadcast_engine.start_broadcast(text, "all")
+        await asyncio.sleep(args.users / args.rate / 2)
+        await broadcast_engine.stop()
+        paused = await broadcast_repo.get(broadcast.id)
+
+        restarted = BroadcastEngine(
+            concurrency=args.concurrency,
+            rate_limiter=TelegramRateLimiter(global_rate=args.rate, per_chat_interval=1.0),
+            api_base_url=server.base_url,
+            checkpoint_every=50,
+        )
+        await restarted.resume_unfinished()
+        result = await wait_finished(broadcast.id)
+        print(f"resume: paused at user {paused.last_user_id} ({paused.status})")
+        report("engine (stop + resume)", time.perf_counter() - started, result.sent, result.failed, result.blocked, fake)
+    finally:
+        server.stop()
+        await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=500, help="Получателей рассылки")
+    parser.add_argument("--latency", type=float, default=0.1, help="Задержка ответа Bot API (секунды)")
+    parser.add_argument("--server-limit", type=int, default=30, help="Лимит заглушки, сообщений в секунду")
+    parser.add_argument("--rate", type=float, default=25.0, help="Глобальный лимит движка, сообщений в секунду")
+    parser.add_argument("--concurrency", type=int, default=10, help="Параллельных отправителей")
+    parser.add_argument("--blocked-every", type=int, default=20, help="Каждый N-й чат заблокировал бота")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Claude concurrency benchmark.
+N одновременных "пользователей" против локальной заглушки Anthropic API.
+
+Сравнивает:
+- legacy: синхронный anthropic.Anthropic внутри async-кода (как было раньше)
+- async:  ClaudeClient на общем AsyncAnthropic пуле
+
+Запуск:
+    python -m benchmarks.bench_claude_concurrency --users 50 --latency 0.5
+"""
+
+import argparse
+import asyncio
+import os
+import time
+from typing import List
+
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "benchmark")
+os.environ.setdefault("ANTHROPIC_API_KEY", "benchmark")
+
+import anthropic
+import httpx
+from aiohttp import web
+
+from benchmarks.stub_servers import ThreadedStubServer, percentile
+
+
+def make_messages_handler(latency: float):
+    """Эндпоинт /v1/messages, отвечающий через latency секунд."""
+
+    async def handler(request: web.Request) -> web.Response:
+        await request.json()
+        await asyncio.sleep(latency)
+        return web.json_response({
+            "id": "msg_stub",
+            "type": "message",
+            "role": "assistant",
+            "model": "stub",
+            "content": [{"type": "text", "text": "Привет! Я здесь 💛"}],
+            "stop_reason": "end_turn",
+            "stop_sequence": None,
+            "usage": {"input_tokens": 1200, "output_tokens": 80},
+        })
+
+    return handler
+
+
+async def _run_users(call, users: int) -> List[float]:
+    """
+    Запускает users одновременных запросов, возвращает латентности (сек).
+    Все пользователи "приходят" одновременно, поэтому латентность считается
+    от общего старта — так видно время ожидания в заблокированном loop.
+    """
+    started = time.perf_counter()
+
+    async def one_user() -> float:
+        await call()
+        return time.perf_counter() - started
+
+    return list(await asyncio.gather(*(one_user() for _ in range(users))))
+
+
+async def bench_legacy(base_url: str, users: int) -> List[float]:
+    """Старое поведение: блокирующий вызов внутри корутины."""
+    client = anthropic.Anthropic(
+        api_key="benchmark",
+        base_url=base_url,
+        http_client=httpx.Client(),
+    )
+
+    async def call() -> None:
+        client.messages.create(
+            model="stub",
+            max_tokens=100,
+            system="bench",
+            messages=[{"role": "user", "content": "Привет"}],
+        )
+
+    try:
+        return await _run_users(call, users)
+    finally:
+        client.close()
+
+
+async def bench_async(users: int) -> List[float]:
+    """Новое поведение: ClaudeClient на общем AsyncAnthropic пуле."""
+    from ai.anthropic_pool import close_anthropic_client
+    from ai.claude_client import ClaudeClient
+
+    claude = ClaudeClient()
+
+    async def call() -> None:
+        await claude.generate_simple(system_prompt="bench", user_prompt="Привет", max_tokens=100)
+
+    try:
+        return await _run_users(call, users)
+    finally:
+        await close_anthropic_client()
+
+
+def report(name: str, latencies: List[float], wall: float) -> None:
+    print(
+        f"{name:<8} users={len(latencies):<5} wall={wall:7.2f}s "
+        f"p50={percentile(latencies, 50) * 1000:8.1f}ms "
+        f"p99={percentile(latencies, 99) * 1000:8.1f}ms"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=50, help="Одновременных пользователей")
+    parser.add_argument("--latency", type=float, default=0.5, help="Латентность заглушки (сек)")
+    parser.add_argument("--concurrency", type=int, default=20, help="CLAUDE_MAX_CONCURRENCY")
+    args = parser.parse_args()
+
+    server = ThreadedStubServer(
+        [("POST", "/v1/messages", make_messages_handler(args.latency))]
+    ).start()
+
+    # Настройки читаются при импорте config.settings — выставляем до импорта ClaudeClient
+    os.environ["ANTHROPIC_BASE_URL"] = server.base_url
+    os.environ["CLAUDE_MAX_CONCURRENCY"] = str(args.concurrency)
+
+    try:
+        for name, factory in (
+            ("legacy", lambda: bench_legacy(server.base_url, args.users)),
+            ("async", lambda: bench_async(args.users)),
+        ):
+            started = time.perf_counter()
+            latencies = asyncio.run(factory())
+            report(name, latencies, time.perf_counter() - started)
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+History export benchmark.
+Пиковая память (RSS) при выгрузке истории сообщений: старая сборка
+файла целиком в памяти (get_paginated + StringIO + BytesIO) против
+потокового экспорта (серверный курсор -> чанки CSV / gzip).
+
+Каждый режим запускается в отдельном процессе — ru_maxrss не смешивается.
+Данные — во временной SQLite-базе (нужен aiosqlite):
+    python -m benchmarks.bench_export --messages 1000000
+"""
+
+import argparse
+import asyncio
+import csv
+import io
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "benchmark")
+os.environ.setdefault("ANTHROPIC_API_KEY", "benchmark")
+
+
+MODES = ("legacy-10k", "legacy-all", "stream-csv", "stream-gzip")
+INSERT_CHUNK = 20_000
+USER_ID = 1
+
+
+def peak_rss_mb() -> float:
+    # Linux: килобайты
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def seed(messages: int) -> None:
+    from datetime import datetime, timedelta
+    from sqlalchemy import insert
+    from sqlalchemy.schema import CreateTable
+    from database.session import engine, get_session_context
+    from database.models import User, Message
+
+    async with engine.begin() as conn:
+        for model in (User, Message):
+            await conn.execute(CreateTable(model.__table__))
+
+    started = datetime.now() - timedelta(days=365)
+    async with get_session_context() as session:
+        await session.execute(insert(User), [{"id": USER_ID, "telegram_id": 100500, "first_name": "Bench"}])
+        for offset in range(0, messages, INSERT_CHUNK):
+            await session.execute(insert(Message), [
+                {
+                    "user_id": USER_ID,
+                    "role": "user" if i % 2 else "assistant",
+                    "content": f"Сообщение номер {i}: " + "как прошёл день, что чувствуешь " * 3,
+                    "message_type": "voice" if i % 10 == 0 else "text",
+                    "tags": ["topic:self", "emotion:calm"] if i % 3 == 0 else [],
+                    "created_at": started + timedelta(seconds=i * 30),
+                }
+                for i in range(offset, min(offset + INSERT_CHUNK, messages))
+            ])
+        await session.commit()
+    await engine.dispose()
+
+
+async def legacy_export(per_page: int) -> tuple:
+    """Как было в export_history: всё в памяти, потом копия в BytesIO."""
+    from database.repositories.conversation import ConversationRepository
+
+    messages, _ = await ConversationRepository().get_paginated(USER_ID, page=1, per_page=per_page)
+
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(["Дата", "Роль", "Сообщение", "Тип", "Теги"])
+    for msg in reversed(messages):
+        writer.writerow([
+            msg.created_at.strftime("%Y-%m-%d %H:%M:%S"),
+            "Вы" if msg.role == "user" else "Мира",
+            msg.content,
+            msg.message_type or "text",
+            ", ".join(msg.tags) if msg.tags else ""
+        ])
+    output.seek(0)
+    body = io.BytesIO(output.getvalue().encode("utf-8-sig"))
+    return len(body.getvalue()), len(messages)
+
+
+async def stream_export(compress: bool) -> tuple:
+    """Как в StreamingResponse: чанки читаются и сразу «отправляются»."""
+    from services.export import export_service
+
+    size = 0
+    chunks = 0
+    async for data in export_service.stream_history(USER_ID, compress=compress):
+        size += len(data)
+        chunks += 1
+    return size, chunks
+
+
+async def run_mode(mode: str) -> None:
+    # Импорты приложения — до замера базовой памяти
+    import services.export  # noqa: F401
+    import database.repositories.conversation  # noqa: F401
+
+    baseline = peak_rss_mb()
+    started = time.perf_counter()
+    if mode == "legacy-10k":
+        size, rows = await legacy_export(10_000)
+        detail = f"rows={rows}"
+    elif mode == "legacy-all":
+        size, rows = await legacy_export(10 ** 9)
+        detail = f"rows={rows}"
+    else:
+        size, chunks = await stream_export(compress=mode == "stream-gzip")
+        detail = f"chunks={chunks}"
+    elapsed = time.perf_counter() - started
+
+    print(
+        f"{mode:<12} time={elapsed:7.2f}s  size={size / 2 ** 20:8.1f} MiB  "
+        f"peak_rss={peak_rss_mb():7.1f} MiB (+{peak_rss_mb() - baseline:6.1f})  {detail}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=1_000_000, help="Сообщений в истории")
+    parser.add_argument("--mode", choices=("seed",) + MODES, help=argparse.SUPPRESS)
+    parser.add_argument("--db", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{args.db}"
+        if args.mode == "seed":
+            started = time.perf_counter()
+            asyncio.run(seed(args.messages))
+            print(f"seeded {args.messages} messages in {time.perf_counter() - started:.1f}s")
+        else:
+            asyncio.run(run_mode(args.mode))
+        return
+
+    # Родитель ничего не загружает: ru_maxrss наследуется дочерними процессами
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, "export.db")
+        for mode in ("seed",) + MODES:
+            subprocess.run(
+                [
+                    sys.executable, "-m", "benchmarks.bench_export",
+                    "--mode", mode, "--db", db, "--messages", str(args.messages),
+                ],
+                check=True,
+            )
+
+
+if __name__ == "__main__":
+    main()
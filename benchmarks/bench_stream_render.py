@@ -0,0 +1,280 @@
+"""
+Stream render benchmark.
+Старый стриминг ответа (пауза до генерации, заглушка «⏳», правки раз
+в секунду прямо в on_chunk, ошибки проглатываются) против StreamRenderer.
+
+Поток токенов синтетический и одинаковый для обоих вариантов; Bot API —
+заглушка в памяти: задержка ответа, не больше одного запроса в секунду
+на чат и глобальный лимит бота, сверх лимита — RetryAfter.
+
+    python -m benchmarks.bench_stream_render --chats 60 --spread 2
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "benchmark")
+os.environ.setdefault("ANTHROPIC_API_KEY", "benchmark")
+
+from telegram.error import BadRequest, RetryAfter
+
+from bot.utils.stream_renderer import StreamRenderer
+from services.telegram_rate_limiter import TelegramRateLimiter
+
+
+WORDS = (
+    "я", "слышу", "тебя", "это", "правда", "непросто", "когда", "рядом",
+    "никто", "не", "замечает", "как", "ты", "устала", "давай", "попробуем",
+    "разобраться", "что", "сейчас", "важнее", "всего", "для", "тебя",
+)
+
+
+class FakeTelegram:
+    """Bot API: задержка, интервал на чат и глобальный лимит с RetryAfter."""
+
+    def __init__(self, latency: float, per_chat_interval: float, global_limit: int):
+        self.latency = latency
+        self.per_chat_interval = per_chat_interval
+        self.global_limit = global_limit
+        self.requests = 0
+        self.flood_errors = 0
+        self._chat_last: Dict[int, float] = {}
+        self._window: deque = deque()
+
+    async def request(self, chat_id: int) -> None:
+        await asyncio.sleep(self.latency / 2)
+        self.requests += 1
+        now = time.monotonic()
+
+        while self._window and now - self._window[0] >= 1.0:
+            self._window.popleft()
+        last = self._chat_last.get(chat_id)
+        # Небольшой допуск на джиттер event loop
+        if last is not None and now - last < self.per_chat_interval * 0.9:
+            self.flood_errors += 1
+            raise RetryAfter(1)
+        if len(self._window) >= self.global_limit:
+            self.flood_errors += 1
+            raise RetryAfter(1)
+
+        self._chat_last[chat_id] = now
+        self._window.append(now)
+        await asyncio.sleep(self.latency / 2)
+
+
+class FakeBotMessage:
+    """Сообщение бота: последний принятый сервером текст."""
+
+    def __init__(self, telegram: FakeTelegram, chat_id: int, text: str):
+        self.telegram = telegram
+        self.chat_id = chat_id
+        self.text = text
+        self.visible_at = time.monotonic()
+
+    async def edit_text(self, text: str, **kwargs) -> "FakeBotMessage":
+        await self.telegram.request(self.chat_id)
+        if text == self.text:
+            raise BadRequest("Message is not modified")
+        self.text = text
+        self.visible_at = time.monotonic()
+        return self
+
+    async def delete(self) -> bool:
+        await self.telegram.request(self.chat_id)
+        return True
+
+
+class FakeUserMessage:
+    """Сообщение пользователя, на которое отвечает бот."""
+
+    def __init__(self, telegram: FakeTelegram, chat_id: int):
+        self.telegram = telegram
+        self.chat_id = chat_id
+        self.reply: Optional[FakeBotMessage] = None
+
+    async def reply_text(self, text: str, **kwargs) -> FakeBotMessage:
+        await self.telegram.request(self.chat_id)
+        self.reply = FakeBotMessage(self.telegram, self.chat_id, text)
+        return self.reply
+
+
+@dataclass
+class Turn:
+    """Один ответ: пауза, подготовка, поток кусков."""
+
+    chat_id: int
+    start_offset: float
+    thinking: float
+    chunks: List[str]
+    final: str = field(init=False)
+
+    def __post_init__(self):
+        self.final = "".join(self.chunks)
+
+
+@dataclass
+class TurnResult:
+    first_text: Optional[float]
+    final_at: Optional[float]
+    final_ok: bool
+
+
+def make_turns(args: argparse.Namespace) -> List[Turn]:
+    rng = random.Random(args.seed)
+    turns = []
+    for i in range(args.chats):
+        words = rng.randint(args.min_words, args.max_words)
+        chunks = []
+        for _ in range(words):
+            chunks.append(rng.choice(WORDS) + " ")
+        turns.append(Turn(
+            chat_id=1_000_000 + i,
+            start_offset=rng.uniform(0, args.spread),
+            thinking=rng.uniform(args.thinking_min, args.thinking_max),
+            chunks=chunks,
+        ))
+    return turns
+
+
+async def replay(chunks: List[str], on_chunk, token_delay: float) -> None:
+    for chunk in chunks:
+        await asyncio.sleep(token_delay)
+        await on_chunk(chunk)
+
+
+async def legacy_turn(telegram: FakeTelegram, turn: Turn, args: argparse.Namespace) -> TurnResult:
+    """Как было в _generate_and_stream_response."""
+    await asyncio.sleep(turn.start_offset)
+    started = time.monotonic()
+    user_message = FakeUserMessage(telegram, turn.chat_id)
+
+    await asyncio.sleep(turn.thinking)
+    try:
+        bot_message = await user_message.reply_text("⏳")
+    except RetryAfter:
+        return TurnResult(None, None, False)
+
+    state = {"text": "", "last_update": time.monotonic(), "last_sent": "", "first": None}
+
+    async def update_message(chunk: str):
+        state["text"] += chunk
+        now = time.monotonic()
+        if (
+            now - state["last_update"] >= 1.0
+            and len(state["text"]) >= 20
+            and state["text"] != state["last_sent"]
+        ):
+            try:
+                await bot_message.edit_text(state["text"] + " ▌")
+                state["last_sent"] = state["text"]
+                state["last_update"] = now
+                if state["first"] is None:
+                    state["first"] = time.monotonic() - started
+            except Exception:
+                pass
+
+    # Сборка контекста и первый токен Claude — после паузы
+    await asyncio.sleep(args.prepare)
+    await replay(turn.chunks, update_message, args.token_delay)
+
+    if turn.final != state["last_sent"]:
+        try:
+            await bot_message.edit_text(turn.final, parse_mode="Markdown")
+        except Exception:
+            try:
+                await bot_message.edit_text(turn.final)
+            except Exception:
+                pass
+
+    final_ok = bot_message.text == turn.final
+    first = state["first"]
+    if first is None and final_ok:
+        first = bot_message.visible_at - started
+    return TurnResult(first, bot_message.visible_at - started if final_ok else None, final_ok)
+
+
+async def renderer_turn(
+    telegram: FakeTelegram,
+    limiter: TelegramRateLimiter,
+    turn: Turn,
+    args: argparse.Namespace,
+) -> TurnResult:
+    """Через StreamRenderer: пауза параллельно с подготовкой и генерацией."""
+    await asyncio.sleep(turn.start_offset)
+    started = time.monotonic()
+    user_message = FakeUserMessage(telegram, turn.chat_id)
+    renderer = StreamRenderer(user_message, delay=turn.thinking, limiter=limiter)
+
+    await asyncio.sleep(args.prepare)
+    await replay(turn.chunks, renderer.feed, args.token_delay)
+    final_ok = await renderer.finish(turn.final)
+
+    reply = user_message.reply
+    final_ok = final_ok and reply is not None and reply.text == turn.final
+    return TurnResult(
+        renderer.first_visible_at,
+        reply.visible_at - started if final_ok else None,
+        final_ok,
+    )
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def report(name: str, telegram: FakeTelegram, results: List[TurnResult]) -> None:
+    first = [r.first_text for r in results if r.first_text is not None]
+    final = [r.final_at for r in results if r.final_at is not None]
+    print(
+        f"{name:<16} requests={telegram.requests:<5} 429s={telegram.flood_errors:<4} "
+        f"first text mean={statistics.mean(first) if first else float('nan'):5.2f}s "
+        f"p95={percentile(first, 0.95):5.2f}s  "
+        f"final mean={statistics.mean(final) if final else float('nan'):5.2f}s "
+        f"p95={percentile(final, 0.95):5.2f}s  "
+        f"final shown={sum(r.final_ok for r in results)}/{len(results)}"
+    )
+
+
+async def run(args: argparse.Namespace) -> None:
+    turns = make_turns(args)
+
+    telegram = FakeTelegram(args.latency, 1.0, args.server_limit)
+    results = await asyncio.gather(*(legacy_turn(telegram, turn, args) for turn in turns))
+    report("legacy", telegram, results)
+
+    telegram = FakeTelegram(args.latency, 1.0, args.server_limit)
+    limiter = TelegramRateLimiter(global_rate=args.rate, per_chat_interval=1.0)
+    results = await asyncio.gather(*(renderer_turn(telegram, limiter, turn, args) for turn in turns))
+    report("stream renderer", telegram, results)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chats", type=int, default=60, help="Одновременных ответов")
+    parser.add_argument("--spread", type=float, default=2.0, help="Разброс начала ответов (секунды)")
+    parser.add_argument("--latency", type=float, default=0.08, help="Задержка ответа Bot API (секунды)")
+    parser.add_argument("--server-limit", type=int, default=30, help="Глобальный лимит заглушки, запросов в секунду")
+    parser.add_argument("--rate", type=float, default=25.0, help="Глобальный лимит клиента, запросов в секунду")
+    parser.add_argument("--prepare", type=float, default=1.5, help="Сборка контекста + первый токен (секунды)")
+    parser.add_argument("--token-delay", type=float, default=0.03, help="Пауза между кусками потока (секунды)")
+    parser.add_argument("--min-words", type=int, default=40)
+    parser.add_argument("--max-words", type=int, default=160)
+    parser.add_argument("--thinking-min", type=float, default=1.0)
+    parser.add_argument("--thinking-max", type=float, default=5.0)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
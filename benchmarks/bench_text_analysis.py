@@ -0,0 +1,223 @@
+"""
+Rule-based text analysis benchmark.
+Время анализа одного сообщения всеми rule-based анализаторами хода
+(кризис, настроение, триггеры, медицина, профиль, тип вопроса, планы,
+цели, подсказки): версии до общего автомата text_matcher — каждый
+анализатор сам приводит текст к нижнему регистру и проверяет свои
+словари циклами `in` и регулярками — против одного прохода по тексту.
+
+Старые анализаторы берутся из git (по умолчанию — коммит перед появлением
+ai/text_matcher.py). Корпус — синтетические русские сообщения длиной
+от одной фразы до нескольких абзацев и ответы бота:
+    python -m benchmarks.bench_text_analysis --messages 2000
+"""
+
+import argparse
+import importlib.util
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import asdict, is_dataclass
+
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "benchmark")
+os.environ.setdefault("ANTHROPIC_API_KEY", "benchmark")
+
+from loguru import logger
+
+
+ANALYZERS = {
+    "crisis_detector": "CrisisDetector",
+    "mood_analyzer": "MoodAnalyzer",
+    "trigger_detector": "TriggerDetector",
+    "medical_filter": "MedicalFilter",
+    "profile_extractor": "ProfileExtractor",
+    "question_type_detector": "QuestionTypeDetector",
+    "followup_detector": "FollowUpDetector",
+    "goal_tracker": "GoalTracker",
+    "hint_generator": "HintGenerator",
+}
+
+USER_SENTENCES = [
+    "Сегодня был очень тяжёлый день на работе, начальник опять кричал при всех",
+    "Я так устала, нет сил ни на что, хочу просто лечь и ничего не делать",
+    "Муж говорит, что всё нормально, но мне так не кажется",
+    "Дети весь вечер шумели, а я не могла сосредоточиться",
+    "Свекровь снова звонила и учила меня жить",
+    "Вчера поговорила с мамой, и стало немного легче",
+    "Меня зовут Аня, мне 34 года, живу в Москве",
+    "Мой муж Иван работает программистом, мы вместе уже 10 лет",
+    "Дочь Маша ходит в садик, ей 5 лет",
+    "Люблю джаз и под настроение слушаю классику",
+    "Недавно пересматривала «Гордость и предубеждение» — классный фильм",
+    "Завтра планирую поговорить с начальником о повышении",
+    "Хочу начать бегать по утрам, но никак не соберусь",
+    "Постоянно переживаю из-за денег, кредит висит",
+    "Голова болит третий день, может это давление",
+    "Не хочу об этом говорить, давай лучше сменим тему",
+    "Иногда кажется, что никто не слышит и никому не нужна",
+    "Почему у меня всё время так получается",
+    "Как ты думаешь, я плохая мать, если иногда срываюсь на детей",
+    "Что мне делать, если муж не хочет идти к психологу",
+    "Наконец-то выспалась, и настроение отличное",
+    "Сходила на йогу, было так хорошо и спокойно",
+    "На душе тяжело, и не могу перестать плакать",
+    "Всё навалилось сразу, я на пределе",
+]
+
+BOT_SENTENCES = [
+    "Я рядом и слышу тебя",
+    "Понимаю, как это выматывает, когда всё наваливается одновременно",
+    "Попробуй представить, что бы ты сказала подруге в такой ситуации",
+    "У меня была знакомая, которая тоже долго не могла решиться на этот разговор",
+    "Что тебе сейчас больше всего хочется",
+    "Иногда полезно просто отдохнуть и дать себе время",
+    "Если голова болит несколько дней, лучше показаться врачу",
+    "Расскажи, что было дальше",
+    "Это нормально — чувствовать усталость после такого дня",
+    "Обнимаю тебя 💛",
+]
+
+
+def make_text(rng: random.Random, sentences: list, low: int, high: int) -> str:
+    """Сообщение из low..high предложений (с вопросом в конце примерно в трети случаев)."""
+    parts = [rng.choice(sentences) for _ in range(rng.randint(low, high))]
+    text = ". ".join(parts)
+    return text + ("?" if rng.random() < 0.3 else ".")
+
+
+def make_corpus(messages: int, seed: int = 42) -> list:
+    rng = random.Random(seed)
+    return [
+        (make_text(rng, USER_SENTENCES, 1, 12), make_text(rng, BOT_SENTENCES, 3, 10))
+        for _ in range(messages)
+    ]
+
+
+def baseline_revision() -> str:
+    """Коммит перед появлением ai/text_matcher.py (или HEAD, если он ещё не закоммичен)."""
+    added = subprocess.run(
+        ["git", "log", "--diff-filter=A", "--format=%H", "-1", "--", "ai/text_matcher.py"],
+        capture_output=True, text=True, check=True,
+    ).stdout.strip()
+    return f"{added}^" if added else "HEAD"
+
+
+def load_analyzers(revision: str, directory: str) -> dict:
+    """Анализаторы из ревизии revision, импортированные под отдельными именами."""
+    analyzers = {}
+    for module_name, class_name in ANALYZERS.items():
+        source = subprocess.run(
+            ["git", "show", f"{revision}:ai/{module_name}.py"],
+            capture_output=True, text=True, check=True,
+        ).stdout
+        path = os.path.join(directory, f"legacy_{module_name}.py")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(source)
+        spec = importlib.util.spec_from_file_location(f"legacy_{module_name}", path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        analyzers[module_name] = getattr(module, class_name)()
+    return analyzers
+
+
+def current_analyzers() -> dict:
+    analyzers = {}
+    for module_name, class_name in ANALYZERS.items():
+        module = importlib.import_module(f"ai.{module_name}")
+        analyzers[module_name] = getattr(module, class_name)()
+    return analyzers
+
+
+def run_turn(a: dict, user_message: str, response: str) -> list:
+    """Вызовы анализаторов на одном ходе (как в обработчике сообщения и ClaudeClient)."""
+    crisis = a["crisis_detector"].check(user_message)
+    mood = a["mood_analyzer"].analyze(user_message)
+    return [
+        crisis,
+        mood,
+        a["crisis_detector"].check(user_message),
+        a["question_type_detector"].detect(user_message),
+        a["medical_filter"].filter_response(user_message, response),
+        a["trigger_detector"].detect_negative_reaction(user_message, response),
+        a["profile_extractor"].extract(user_message),
+        a["followup_detector"].detect_plan_mention(user_message),
+        a["goal_tracker"].detect_goal_mention(user_message),
+        a["hint_generator"].generate(
+            response,
+            ["topic:work", "topic:husband", "topic:children", "topic:self"],
+            {"primary_emotion": mood.primary_emotion},
+            5,
+            None,
+            user_message,
+        ),
+    ]
+
+
+def comparable(result):
+    """Результаты старых и новых классов — к сравнимому виду."""
+    if is_dataclass(result):
+        return asdict(result)
+    if isinstance(result, list):
+        return [comparable(item) for item in result]
+    return result
+
+
+def measure(analyzers: dict, corpus: list) -> tuple:
+    """Время хода на каждое сообщение (мкс) и результаты."""
+    timings = []
+    results = []
+    for user_message, response in corpus:
+        started = time.perf_counter()
+        result = run_turn(analyzers, user_message, response)
+        timings.append((time.perf_counter() - started) * 1e6)
+        results.append(comparable(result))
+    return timings, results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=2000, help="Сообщений в корпусе")
+    parser.add_argument("--baseline", help="Ревизия со старыми анализаторами")
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.add(sys.stderr, level="ERROR")
+
+    corpus = make_corpus(args.messages)
+    lengths = [len(user_message) for user_message, _ in corpus]
+    print(
+        f"corpus: {len(corpus)} turns, user message {min(lengths)}..{max(lengths)} chars "
+        f"(median {statistics.median(lengths):.0f})"
+    )
+
+    revision = args.baseline or baseline_revision()
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy = load_analyzers(revision, tmp)
+    current = current_analyzers()
+
+    # Прогрев: импорт, компиляция регулярок, сборка автомата
+    run_turn(legacy, *corpus[0])
+    run_turn(current, *corpus[0])
+
+    legacy_times, legacy_results = measure(legacy, corpus)
+    current_times, current_results = measure(current, corpus)
+
+    for name, times in ((f"legacy ({revision[:12]})", legacy_times), ("text_matcher", current_times)):
+        ordered = sorted(times)
+        print(
+            f"{name:<22} mean={statistics.mean(times):8.1f}us  "
+            f"p50={ordered[len(ordered) // 2]:8.1f}us  p95={ordered[int(len(ordered) * 0.95)]:8.1f}us"
+        )
+    print(f"speedup: x{statistics.mean(legacy_times) / statistics.mean(current_times):.1f}")
+
+    differ = sum(old != new for old, new in zip(legacy_results, current_results))
+    if differ:
+        print(f"  !! results differ on {differ} turns")
+
+
+if __name__ == "__main__":
+    main()
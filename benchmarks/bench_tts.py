@@ -0,0 +1,132 @@
+"""
+TTS benchmark.
+Генерация длинной медитации (несколько фрагментов по 4500 символов) против
+локальной заглушки Yandex SpeechKit.
+
+Сравнивает:
+- legacy: новая aiohttp-сессия на каждый фрагмент, фрагменты по очереди
+  (как было раньше)
+- pooled: общая keep-alive сессия, фрагменты параллельно
+  (YANDEX_TTS_MAX_CONCURRENCY)
+
+Заглушка — обычный HTTP: реальный выигрыш от keep-alive больше, потому что
+к API ходят по TLS и рукопожатие не повторяется.
+
+Запуск:
+    python -m benchmarks.bench_tts --chars 30000 --meditations 3 --latency 0.8
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "benchmark")
+os.environ.setdefault("ANTHROPIC_API_KEY", "benchmark")
+
+import aiohttp
+from aiohttp import web
+
+from benchmarks.stub_servers import ThreadedStubServer, percentile
+
+
+def make_tts_handler(latency: float, connections: set):
+    """Эндпоинт синтеза: отвечает через latency секунд, запоминает соединения."""
+
+    async def handler(request: web.Request) -> web.Response:
+        data = await request.post()
+        connections.add(request.transport.get_extra_info("peername"))
+        await asyncio.sleep(latency)
+        return web.Response(body=b"OggS" + str(data["text"]).encode()[:64])
+
+    return handler
+
+
+def make_script(chars: int) -> str:
+    """Длинный текст медитации из существующих сценариев."""
+    from content.meditations import MEDITATIONS
+
+    parts = []
+    while sum(len(part) for part in parts) < chars:
+        parts.extend(meditation.script for meditation in MEDITATIONS)
+    return "\n\n".join(parts)[:chars]
+
+
+async def bench_legacy(tts, script: str, meditations: int, out_dir: Path) -> List[float]:
+    """Старое поведение: сессия на фрагмент, фрагменты последовательно."""
+    text = tts._add_pauses(script)
+
+    async def one(index: int) -> float:
+        started = time.perf_counter()
+        parts = []
+        for chunk in tts._split_text(text, max_length=4500):
+            async with aiohttp.ClientSession() as session:
+                async with session.post(tts.API_URL, data={"text": chunk}) as response:
+                    parts.append(await response.read())
+        (out_dir / f"legacy_{index}.ogg").write_bytes(b"".join(parts))
+        return time.perf_counter() - started
+
+    return list(await asyncio.gather(*(one(i) for i in range(meditations))))
+
+
+async def bench_pooled(tts, script: str, meditations: int, out_dir: Path) -> List[float]:
+    """Новое поведение: общая сессия и параллельные фрагменты."""
+    from services.tts_pool import close_tts_session
+
+    async def one(index: int) -> float:
+        started = time.perf_counter()
+        await tts.generate_meditation_audio(f"pooled_{index}", script, out_dir)
+        return time.perf_counter() - started
+
+    try:
+        return list(await asyncio.gather(*(one(i) for i in range(meditations))))
+    finally:
+        await close_tts_session()
+
+
+def report(name: str, durations: List[float], wall: float, connections: int) -> None:
+    print(
+        f"{name:<8} meditations={len(durations):<3} wall={wall:7.2f}s "
+        f"p50={percentile(durations, 50) * 1000:8.1f}ms "
+        f"max={max(durations) * 1000:8.1f}ms connections={connections}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chars", type=int, default=30000, help="Длина текста медитации")
+    parser.add_argument("--meditations", type=int, default=3, help="Одновременных медитаций")
+    parser.add_argument("--latency", type=float, default=0.8, help="Латентность синтеза фрагмента (сек)")
+    parser.add_argument("--concurrency", type=int, default=10, help="YANDEX_TTS_MAX_CONCURRENCY")
+    args = parser.parse_args()
+
+    # Настройки читаются при импорте config.settings — выставляем до импорта сервиса
+    os.environ["YANDEX_TTS_MAX_CONCURRENCY"] = str(args.concurrency)
+    from services.tts_yandex import YandexTTS
+
+    script = make_script(args.chars)
+    tts = YandexTTS()
+    tts.api_key = "benchmark"
+    tts.folder_id = "benchmark"
+    print(f"chunks per meditation: {len(tts._split_text(tts._add_pauses(script), max_length=4500))}")
+
+    for name, bench in (("legacy", bench_legacy), ("pooled", bench_pooled)):
+        connections: set = set()
+        server = ThreadedStubServer(
+            [("POST", "/tts", make_tts_handler(args.latency, connections))]
+        ).start()
+        tts.API_URL = f"{server.base_url}/tts"
+        try:
+            with tempfile.TemporaryDirectory() as out_dir:
+                started = time.perf_counter()
+                durations = asyncio.run(bench(tts, script, args.meditations, Path(out_dir)))
+                report(name, durations, time.perf_counter() - started, len(connections))
+        finally:
+            server.stop()
+
+
+if __name__ == "__main__":
+    main()
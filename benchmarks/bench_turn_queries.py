@@ -0,0 +1,146 @@
+"""
+Message hot path SQL benchmark.
+Считает SQL-запросы и транзакции на одно обработанное сообщение
+до вызова Claude: старая цепочка репозиториев против UserTurnSnapshot.
+
+Использует in-memory SQLite (нужен aiosqlite):
+    python -m benchmarks.bench_turn_queries --history 500 --turns 20
+"""
+
+import argparse
+import asyncio
+import os
+import time
+
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "benchmark")
+os.environ.setdefault("ANTHROPIC_API_KEY", "benchmark")
+os.environ["DATABASE_URL"] = "sqlite+aiosqlite:///:memory:"
+
+from sqlalchemy import event
+from sqlalchemy.schema import CreateTable
+
+from database.session import engine, get_session_context
+from database.models import (
+    User,
+    Subscription,
+    Message,
+    UserProfile,
+    MemoryEntry,
+    Payment,
+    UserReport,
+    OnboardingEvent,
+)
+from database.repositories.user import UserRepository
+from database.repositories.subscription import SubscriptionRepository
+from database.repositories.profile import profile_repo
+
+
+TELEGRAM_ID = 100500
+
+
+class QueryCounter:
+    """Считает SQL-запросы и коммиты через события engine."""
+
+    def __init__(self) -> None:
+        self.statements = 0
+        self.commits = 0
+        event.listen(engine.sync_engine, "before_cursor_execute", self._on_execute)
+        event.listen(engine.sync_engine, "commit", self._on_commit)
+
+    def _on_execute(self, *args) -> None:
+        self.statements += 1
+
+    def _on_commit(self, *args) -> None:
+        self.commits += 1
+
+    def reset(self) -> None:
+        self.statements = 0
+        self.commits = 0
+
+
+async def seed(history: int) -> None:
+    """Пользователь с free-подпиской, профилем и историей сообщений."""
+    # Только таблицы горячего пути (и коллекции User с lazy="selectin").
+    # Без индексов: на число запросов они не влияют, а metadata.create_all
+    # целиком на чистой SQLite не проходит (дубли индексов onboarding_events).
+    async with engine.begin() as conn:
+        for model in (
+            User, Subscription, Message, UserProfile,
+            MemoryEntry, Payment, UserReport, OnboardingEvent,
+        ):
+            await conn.execute(CreateTable(model.__table__))
+
+    async with get_session_context() as session:
+        user = User(
+            telegram_id=TELEGRAM_ID,
+            username="bench",
+            first_name="Bench",
+            display_name="Анна",
+            onboarding_completed=True,
+        )
+        session.add(user)
+        await session.flush()
+        session.add(Subscription(user_id=user.id, plan="free", status="active"))
+        session.add(UserProfile(user_id=user.id, city="Москва", occupation="врач"))
+        session.add_all([
+            Message(
+                user_id=user.id,
+                role="user" if i % 2 == 0 else "assistant",
+                content=f"Сообщение номер {i} " * 10,
+                tags=["topic:work"],
+            )
+            for i in range(history)
+        ])
+
+
+async def legacy_turn() -> None:
+    """Цепочка вызовов handle_message до ClaudeClient (как было раньше)."""
+    user_repo = UserRepository()
+    subscription_repo = SubscriptionRepository()
+
+    user, _ = await user_repo.get_or_create(TELEGRAM_ID, "bench", "Bench")
+    subscription = await subscription_repo.get_active(user.id)
+    if subscription:
+        await subscription_repo.increment_messages(subscription.id)
+    await user_repo.update_last_active(user.id)
+    await user_repo.get(user.id)  # _get_fresh_user_data
+    await profile_repo.get_profile_summary(user.id)  # ContextBuilder
+
+
+async def snapshot_turn() -> None:
+    """Новая цепочка: один снимок + одна запись."""
+    user_repo = UserRepository()
+
+    snapshot = await user_repo.get_turn_snapshot(TELEGRAM_ID, "bench", "Bench")
+    await user_repo.record_turn(snapshot, count_message=not snapshot.is_premium)
+
+
+async def run(history: int, turns: int) -> None:
+    await seed(history)
+    counter = QueryCounter()
+
+    for name, turn in (("legacy", legacy_turn), ("snapshot", snapshot_turn)):
+        counter.reset()
+        started = time.perf_counter()
+        for _ in range(turns):
+            await turn()
+        elapsed = time.perf_counter() - started
+        print(
+            f"{name:<9} statements/msg={counter.statements / turns:5.1f} "
+            f"commits/msg={counter.commits / turns:4.1f} "
+            f"time/msg={elapsed / turns * 1000:7.2f}ms"
+        )
+
+    await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--history", type=int, default=500, help="Сообщений в истории пользователя")
+    parser.add_argument("--turns", type=int, default=20, help="Сколько сообщений обработать")
+    args = parser.parse_args()
+    asyncio.run(run(args.history, args.turns))
+
+
+if __name__ == "__main__":
+    main()
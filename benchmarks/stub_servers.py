@@ -0,0 +1,74 @@
+"""
+Stub servers for benchmarks.
+Локальные заглушки внешних API, запускаемые в отдельном потоке.
+"""
+
+import asyncio
+import threading
+from typing import Awaitable, Callable, List, Tuple
+
+from aiohttp import web
+
+
+RouteHandler = Callable[[web.Request], Awaitable[web.StreamResponse]]
+
+
+class ThreadedStubServer:
+    """
+    aiohttp сервер в отдельном потоке со своим event loop.
+
+    Отдельный поток нужен, чтобы блокирующий клиент в основном loop
+    не мешал заглушке отвечать (иначе "до" замерить невозможно).
+    """
+
+    def __init__(self, routes: List[Tuple[str, str, RouteHandler]], port: int = 0):
+        self.routes = routes
+        self.port = port
+        self._loop = asyncio.new_event_loop()
+        self._runner: web.AppRunner | None = None
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def _run(self) -> None:
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_until_complete(self._start())
+        self._ready.set()
+        self._loop.run_forever()
+
+    async def _start(self) -> None:
+        app = web.Application()
+        for method, path, handler in self.routes:
+            app.router.add_route(method, path, handler)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", self.port)
+        await site.start()
+        # Порт 0 = выбранный ОС свободный порт
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    def start(self) -> "ThreadedStubServer":
+        self._thread.start()
+        self._ready.wait(timeout=10)
+        return self
+
+    def stop(self) -> None:
+        async def _cleanup() -> None:
+            if self._runner:
+                await self._runner.cleanup()
+
+        asyncio.run_coroutine_threadsafe(_cleanup(), self._loop).result(timeout=10)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=10)
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Перцентиль без numpy (nearest-rank)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
@@ -1000,9 +1000,8 @@ async def _confirm_broadcast(query, context) -> int:
         await query.edit_message_text("⚠️ Ошибка. Начни сначала /admin")
         return ConversationHandler.END
 
-    # Получаем список получателей
-    telegram_ids = await user_repo.get_all_telegram_ids(segment=segment)
-    total = len(telegram_ids)
+    # Количество получателей (сами получатели читаются пачками ниже)
+    total = await user_repo.count_by_segment(segment)
 
     # Аудит начала рассылки
     await audit_service.log_broadcast_start(
@@ -1024,40 +1023,43 @@ async def _confirm_broadcast(query, context) -> int:
     failed = 0
     blocked_by_user = 0
 
-    # Отправляем сообщения
-    for i, telegram_id in enumerate(telegram_ids):
-        try:
-            await context.bot.send_message(
-                chat_id=telegram_id,
-                text=message_text,
-                parse_mode="HTML",
-            )
-            sent += 1
-        except Exception as e:
-            error_str = str(e).lower()
-            if "blocked" in error_str or "deactivated" in error_str:
-                blocked_by_user += 1
-            else:
-                failed += 1
-            logger.warning(f"Broadcast failed for {telegram_id}: {e}")
-
-        # Задержка между сообщениями (избегаем rate limit)
-        if (i + 1) % 25 == 0:
-            await asyncio.sleep(1)
-
-        # Обновляем прогресс каждые 50 сообщений
-        if (i + 1) % 50 == 0:
+    # Отправляем сообщения (получатели читаются из БД пачками)
+    processed = 0
+    async for chunk in user_repo.iter_telegram_ids(segment=segment):
+        for telegram_id in chunk:
+            processed += 1
             try:
-                await query.edit_message_text(
-                    f"📢 Рассылка в процессе...\n\n"
-                    f"Сегмент: {segment_name}\n"
-                    f"Прогресс: {i + 1}/{total}\n"
-                    f"✅ Отправлено: {sent}\n"
-                    f"❌ Ошибок: {failed}\n"
-                    f"🚫 Заблокировали бота: {blocked_by_user}"
+                await context.bot.send_message(
+                    chat_id=telegram_id,
+                    text=message_text,
+                    parse_mode="HTML",
                 )
-            except Exception:
-                pass  # Игнорируем ошибки обновления
+                sent += 1
+            except Exception as e:
+                error_str = str(e).lower()
+                if "blocked" in error_str or "deactivated" in error_str:
+                    blocked_by_user += 1
+                else:
+                    failed += 1
+                logger.warning(f"Broadcast failed for {telegram_id}: {e}")
+
+            # Задержка между сообщениями (избегаем rate limit)
+            if processed % 25 == 0:
+                await asyncio.sleep(1)
+
+            # Обновляем прогресс каждые 50 сообщений
+            if processed % 50 == 0:
+                try:
+                    await query.edit_message_text(
+                        f"📢 Рассылка в процессе...\n\n"
+                        f"Сегмент: {segment_name}\n"
+                        f"Прогресс: {processed}/{total}\n"
+                        f"✅ Отправлено: {sent}\n"
+                        f"❌ Ошибок: {failed}\n"
+                        f"🚫 Заблокировали бота: {blocked_by_user}"
+                    )
+                except Exception:
+                    pass  # Игнорируем ошибки обновления
 
     # Аудит завершения
     await audit_service.log_broadcast_complete(
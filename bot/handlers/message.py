@@ -15,10 +15,9 @@ from datetime import datetime
 
 from config.settings import settings
 from ai.claude_client import ClaudeClient
-from ai.mood_analyzer import mood_analyzer
-from database.repositories.user import UserRepository
-from database.repositories.subscription import SubscriptionRepository
-from database.repositories.conversation import ConversationRepository
+from ai.message_analysis import MessageAnalysis, analyze_message
+from database.repositories.user import UserRepository, UserTurnSnapshot
+from database.repositories.conversation import ConversationRepository, new_message_key
 from database.repositories.mood import MoodRepository
 from database.repositories.admin_log import AdminLogRepository
 from services.referral import ReferralService
@@ -26,6 +25,7 @@ from utils.system_logger import system_logger
 from utils.event_tracker import event_tracker
 from bot.keyboards.inline import get_premium_keyboard, get_crisis_keyboard, get_hints_keyboard
 from bot.handlers.photos import send_photos
+from bot.utils.stream_renderer import StreamRenderer
 from bot.handlers.music import (
     check_and_send_music,
     check_and_send_music_by_emotion,
@@ -38,6 +38,7 @@ from services.music_forwarder import music_forwarder
 from bot.handlers.payments import handle_promo_code_input
 from services.storage.file_storage import file_storage_service
 from services.tts_yandex import send_voice_message
+from services.background_tasks import background_tasks
 from ai.crisis_protocol import (
     get_emergency_message,
     requires_emergency_message,
@@ -49,7 +50,6 @@ from ai.crisis_protocol import (
 claude = ClaudeClient()
 user_repo = UserRepository()
 admin_log_repo = AdminLogRepository()
-subscription_repo = SubscriptionRepository()
 conversation_repo = ConversationRepository()
 mood_repo = MoodRepository()
 referral_service = ReferralService()
@@ -171,6 +171,24 @@ async def _get_fresh_user_data(user) -> dict:
     }
 
 
+def _user_data_from_snapshot(snapshot: UserTurnSnapshot) -> dict:
+    """
+    Данные пользователя для промпта из снимка хода.
+    Снимок загружен в начале обработки, поэтому повторно читать БД не нужно.
+    """
+    user = snapshot.user
+    return {
+        "persona": user.persona,
+        "display_name": user.display_name,
+        "partner_name": user.partner_name,
+        "children_info": user.children_info,
+        "marriage_years": user.marriage_years,
+        "partner_gender": user.partner_gender,
+        "communication_style": user.communication_style,
+        "profile_summary": snapshot.profile_summary,
+    }
+
+
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Основной обработчик текстовых сообщений."""
 
@@ -191,12 +209,13 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         return
 
     try:
-        # 1. Получаем пользователя
-        user, _ = await user_repo.get_or_create(
+        # 1. Получаем пользователя вместе с подпиской и профилем (один запрос)
+        snapshot = await user_repo.get_turn_snapshot(
             telegram_id=user_tg.id,
             username=user_tg.username,
             first_name=user_tg.first_name,
         )
+        user = snapshot.user
         
         # 2. Проверяем блокировку
         if user.is_blocked:
@@ -232,25 +251,19 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         # Кнопки обрабатываются в callbacks.py -> _handle_choice_callback
 
         # 4. Проверяем лимиты
-        subscription = await subscription_repo.get_active(user.id)
-        is_premium = subscription and subscription.plan in ("premium", "trial")
+        is_premium = snapshot.is_premium
         
         if not is_premium:
             # Проверяем дневной лимит
-            if subscription and subscription.messages_today >= settings.FREE_MESSAGES_PER_DAY:
+            if snapshot.subscription and snapshot.messages_today >= settings.FREE_MESSAGES_PER_DAY:
                 await _send_limit_reached(update)
                 return
-            
-            # Увеличиваем счётчик
-            if subscription:
-                await subscription_repo.increment_messages(subscription.id)
         
-        # 5. Обновляем last_active
-        await user_repo.update_last_active(user.id)
+        # 5. Обновляем last_active и счётчик сообщений (одна транзакция)
+        await user_repo.record_turn(snapshot, count_message=not is_premium)
         
-        # 6. Подготавливаем данные пользователя
-        # ВАЖНО: Всегда получаем актуальные данные из БД (включая display_name)
-        user_data = await _get_fresh_user_data(user)
+        # 6. Подготавливаем данные пользователя (снимок только что загружен из БД)
+        user_data = _user_data_from_snapshot(snapshot)
 
         # 6.5. Добавляем контекст последнего фото если есть
         # Это помогает Claude понимать вопросы вроде "Сколько ему?" после показа фото
@@ -265,10 +278,12 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             user_data["voice_requested"] = True
             logger.debug(f"Voice request detected for user {user_tg.id}")
 
-        # 6.7. КРИЗИСНЫЙ ПРОТОКОЛ — проверка перед ответом Claude
-        from ai.crisis_detector import CrisisDetector
-        crisis_detector = CrisisDetector()
-        crisis_check = crisis_detector.check(message_text)
+        # 6.7. Разбор сообщения — один раз на ход: кризис, настроение и тип
+        # вопроса дальше берутся из него (ClaudeClient, контекст, подсказки)
+        analysis = analyze_message(message_text)
+
+        # КРИЗИСНЫЙ ПРОТОКОЛ — проверка перед ответом Claude
+        crisis_check = analysis.crisis
 
         # Если обнаружен кризис высокого уровня — отправляем экстренное сообщение НЕМЕДЛЕННО
         if requires_emergency_message(crisis_check.get("level")):
@@ -289,22 +304,11 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
                     f"Type={crisis_type}, User={user_tg.id}"
                 )
 
-        # 6.8. НОВОЕ: Анализ настроения ПЕРЕД Claude (для смешанных эмоций)
-        from ai.mood_analyzer import mood_analyzer
-
-        mood_analysis = mood_analyzer.analyze(message_text)
-        current_mood = {
-            "mood_score": mood_analysis.mood_score,
-            "primary_emotion": mood_analysis.primary_emotion,
-            "secondary_emotions": mood_analysis.secondary_emotions,
-            "energy_level": mood_analysis.energy_level,
-            "anxiety_level": mood_analysis.anxiety_level,
-            "triggers": mood_analysis.triggers,
-            "confidence": mood_analysis.confidence,
-        }
+        # 6.8. Настроение ПЕРЕД Claude (для смешанных эмоций)
+        mood_analysis = analysis.mood
 
         # Добавляем текущее настроение в user_data для промпта
-        user_data["current_mood"] = current_mood
+        user_data["current_mood"] = analysis.current_mood
 
         logger.debug(
             f"Mood analyzed: {mood_analysis.primary_emotion} "
@@ -312,6 +316,10 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             f"score: {mood_analysis.mood_score}"
         )
 
+        # 6.9. Дожидаемся фоновой записи предыдущего сообщения,
+        # иначе история для Claude может оказаться без него
+        await background_tasks.wait_idle(user.id, timeout=settings.BACKGROUND_BARRIER_TIMEOUT)
+
         # 7. Streaming ответ от Claude
         result = await _generate_and_stream_response(
             update=update,
@@ -319,52 +327,65 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             message_text=message_text,
             user_data=user_data,
             is_premium=is_premium,
+            analysis=analysis,
         )
 
-        # 8. Сохраняем сообщения
-        user_message_saved = await conversation_repo.save_message(
+        # 8. Пользователь уже получил ответ — всё остальное в фоне.
+        # Задачи с ключом user.id выполняются по порядку.
+        # 8.1. Сообщение пользователя + настроение (нужен id сообщения)
+        await background_tasks.submit(
+            "save_user_message",
+            _save_user_message,
+            key=user.id,
             user_id=user.id,
-            role="user",
-            content=message_text,
-            tags=[],
+            message_text=message_text,
+            mood_analysis=mood_analysis,
+            context_tags=result["tags"],
+            idempotency_key=new_message_key(),
         )
 
-        await conversation_repo.save_message(
+        # 8.2. Ответ Миры
+        await background_tasks.submit(
+            "save_assistant_message",
+            conversation_repo.save_message,
+            key=user.id,
             user_id=user.id,
             role="assistant",
             content=result["response"],
             tags=result["tags"],
             tokens_used=result["tokens_used"],
+            idempotency_key=new_message_key(),
         )
 
-        # 8.3. Трекаем вехи по количеству сообщений
-        try:
-            milestone = await event_tracker.track_message_milestone(user)
-            if milestone:
-                logger.info(f"User {user_tg.id} reached milestone: {milestone} messages")
-        except Exception as e:
-            logger.warning(f"Failed to track message milestone: {e}")
-
-        # 8.5. Mood tracking — анализируем и сохраняем настроение
-        mood_entry = await _save_mood_entry(
+        # 8.2.1. Стиль общения: новое сообщение вливается в агрегаты
+        await background_tasks.submit(
+            "observe_style",
+            claude.context_builder.observe_user_message,
+            key=user.id,
             user_id=user.id,
-            message_id=user_message_saved.id if user_message_saved else None,
-            message_text=message_text,
-            context_tags=result["tags"],
+            text=message_text,
         )
 
+        # 8.3. Трекаем вехи по количеству сообщений
+        await background_tasks.submit(
+            "track_message_milestone", _track_message_milestone, user, key=user.id
+        )
+
+        # 8.5. Данные о настроении для подсказок (анализ уже сделан выше)
+        mood_entry = _mood_data(mood_analysis)
+
         # 8.6. Отправляем стикер если уместно (по контексту ответа Миры)
         primary_mood = mood_entry.get("primary_emotion") if mood_entry else None
-        try:
-            await maybe_send_sticker(
-                bot=context.bot,
-                chat_id=update.effective_chat.id,
-                mira_response=result["response"],
-                user_message=message_text,
-                mood=primary_mood,
-            )
-        except Exception as e:
-            logger.debug(f"Sticker send error: {e}")
+        await background_tasks.submit(
+            "send_sticker",
+            _send_sticker,
+            key=user.id,
+            bot=context.bot,
+            chat_id=update.effective_chat.id,
+            mira_response=result["response"],
+            user_message=message_text,
+            mood=primary_mood,
+        )
 
         # 8.7. Музыка отключена
         # try:
@@ -504,66 +525,25 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         )
 
 
-# Настройки streaming
-STREAM_UPDATE_INTERVAL = 1.0  # секунд между обновлениями сообщения
-STREAM_MIN_CHARS = 20  # минимум символов для первого обновления
-
-
 async def _generate_and_stream_response(
     update: Update,
     user_id: int,
     message_text: str,
     user_data: dict,
     is_premium: bool,
+    analysis: MessageAnalysis,
 ) -> dict:
     """
     Генерирует ответ Claude и стримит его пользователю.
-    Редактирует сообщение по мере получения текста.
+    Правки сообщения и «пауза на обдумывание» — в StreamRenderer:
+    пауза идёт параллельно со сборкой контекста и генерацией.
     """
-    import time
-    import asyncio
+    # Реалистичная задержка перед ответом (имитация "думает")
+    delay = random.uniform(settings.STREAM_THINKING_DELAY_MIN, settings.STREAM_THINKING_DELAY_MAX)
 
-    # 1. Реалистичная задержка перед ответом (имитация "думает")
-    delay = random.uniform(1.0, 5.0)
-
-    # Показываем "typing..." во время задержки
+    # Показываем "typing..." пока Мира "думает"
     await update.message.chat.send_action("typing")
-    await asyncio.sleep(delay)
-
-    # Отправляем начальное сообщение
-    bot_message = await update.message.reply_text("⏳")
-
-    # Состояние для streaming
-    current_text = ""
-    last_update_time = time.time()
-    last_sent_text = ""
-
-    async def update_message(chunk: str):
-        """Callback для обновления сообщения при получении чанка."""
-        nonlocal current_text, last_update_time, last_sent_text
-
-        current_text += chunk
-        current_time = time.time()
-
-        # Обновляем сообщение:
-        # - если прошло достаточно времени
-        # - и есть достаточно нового текста
-        should_update = (
-            current_time - last_update_time >= STREAM_UPDATE_INTERVAL
-            and len(current_text) >= STREAM_MIN_CHARS
-            and current_text != last_sent_text
-        )
-
-        if should_update:
-            try:
-                # Добавляем курсор "▌" для эффекта печати
-                display_text = current_text + " ▌"
-                await bot_message.edit_text(display_text)
-                last_sent_text = current_text
-                last_update_time = current_time
-            except Exception as e:
-                # Игнорируем ошибки редактирования (rate limit, message not modified)
-                logger.debug(f"Stream update error: {e}")
+    renderer = StreamRenderer(update.message, delay=delay)
 
     try:
         # Получаем streaming ответ
@@ -572,7 +552,8 @@ async def _generate_and_stream_response(
             user_message=message_text,
             user_data=user_data,
             is_premium=is_premium,
-            on_chunk=update_message,
+            on_chunk=renderer.feed,
+            analysis=analysis,
         )
 
         # Финальное обновление — убираем курсор, показываем полный текст
@@ -585,28 +566,7 @@ async def _generate_and_stream_response(
         # Проверяем на наличие голосового маркера [voice:...]
         clean_text, voice_text = parse_voice_marker(clean_text)
 
-        if clean_text != last_sent_text:
-            try:
-                await bot_message.edit_text(
-                    clean_text,
-                    reply_markup=reply_markup,
-                    parse_mode="Markdown",
-                )
-            except Exception as e:
-                logger.debug(f"Final stream update error: {e}")
-                # Попробуем без Markdown если ошибка парсинга
-                try:
-                    await bot_message.edit_text(
-                        clean_text,
-                        reply_markup=reply_markup,
-                    )
-                except Exception:
-                    # Если не удалось отредактировать — отправляем новое сообщение
-                    if not last_sent_text:
-                        await update.message.reply_text(
-                            clean_text,
-                            reply_markup=reply_markup,
-                        )
+        await renderer.finish(clean_text, reply_markup=reply_markup)
 
         # Отправляем голосовое сообщение если есть маркер
         if voice_text:
@@ -625,17 +585,12 @@ async def _generate_and_stream_response(
         result["response"] = clean_text
         return result
 
-    except Exception as e:
-        # При ошибке удаляем сообщение-заглушку
-        try:
-            await bot_message.delete()
-        except Exception:
-            pass
+    except Exception:
+        # При ошибке удаляем начатый ответ
+        await renderer.abort()
         raise
 
 
-
-
 async def _send_limit_reached(update: Update) -> None:
     """Отправляет сообщение о достижении лимита."""
     
@@ -648,23 +603,84 @@ async def _send_limit_reached(update: Update) -> None:
     await update.message.reply_text(text, reply_markup=keyboard)
 
 
-async def _save_mood_entry(
+def _mood_data(mood_analysis) -> dict | None:
+    """Данные о настроении для подсказок (None при низкой уверенности)."""
+    if mood_analysis.confidence < 0.3:
+        return None
+
+    return {
+        "primary_emotion": mood_analysis.primary_emotion,
+        "mood_score": mood_analysis.mood_score,
+        "anxiety_level": mood_analysis.anxiety_level,
+        "energy_level": mood_analysis.energy_level,
+    }
+
+
+async def _save_user_message(
     user_id: int,
-    message_id: int | None,
     message_text: str,
+    mood_analysis,
     context_tags: list,
-) -> dict | None:
+    idempotency_key: str,
+) -> None:
     """
-    Анализирует настроение и сохраняет в БД.
-    Возвращает данные о настроении для использования в подсказках.
+    Сохраняет сообщение пользователя и запись настроения к нему.
+    Фоновая задача: при ошибке сохранения сообщения повторяется целиком
+    с тем же ключом (запись настроения свои ошибки не пробрасывает).
     """
+    user_message_saved = await conversation_repo.save_message(
+        user_id=user_id,
+        role="user",
+        content=message_text,
+        tags=[],
+        idempotency_key=idempotency_key,
+    )
+
+    await _save_mood_entry(
+        user_id=user_id,
+        message_id=user_message_saved.id if user_message_saved else None,
+        mood_analysis=mood_analysis,
+        context_tags=context_tags,
+    )
+
+
+async def _track_message_milestone(user) -> None:
+    """Трекает вехи по количеству сообщений (фоновая задача)."""
+    try:
+        milestone = await event_tracker.track_message_milestone(user)
+        if milestone:
+            logger.info(f"User {user.telegram_id} reached milestone: {milestone} messages")
+    except Exception as e:
+        logger.warning(f"Failed to track message milestone: {e}")
+
+
+async def _track_first_photo(user) -> None:
+    """Трекает первое фото пользователя (фоновая задача)."""
+    try:
+        await event_tracker.track_first_photo_message(user)
+    except Exception as e:
+        logger.warning(f"Failed to track first photo message: {e}")
+
+
+async def _send_sticker(**kwargs) -> None:
+    """Отправляет стикер, если уместно (фоновая задача, без повторов)."""
     try:
-        # Анализируем текст
-        mood_analysis = mood_analyzer.analyze(message_text)
+        await maybe_send_sticker(**kwargs)
+    except Exception as e:
+        logger.debug(f"Sticker send error: {e}")
+
 
+async def _save_mood_entry(
+    user_id: int,
+    message_id: int | None,
+    mood_analysis,
+    context_tags: list,
+) -> None:
+    """Сохраняет уже проанализированное настроение в БД."""
+    try:
         # Сохраняем только если уверенность достаточная
         if mood_analysis.confidence < 0.3:
-            return None
+            return
 
         await mood_repo.create(
             user_id=user_id,
@@ -683,18 +699,9 @@ async def _save_mood_entry(
             f"score={mood_analysis.mood_score}, emotion={mood_analysis.primary_emotion}"
         )
 
-        # Возвращаем данные для использования в подсказках
-        return {
-            "primary_emotion": mood_analysis.primary_emotion,
-            "mood_score": mood_analysis.mood_score,
-            "anxiety_level": mood_analysis.anxiety_level,
-            "energy_level": mood_analysis.energy_level,
-        }
-
     except Exception as e:
         # Ошибки mood tracking не должны ломать основной флоу
         logger.warning(f"Failed to save mood entry: {e}")
-        return None
 
 
 async def _check_referral_trigger(update: Update, user, result: dict) -> None:
@@ -749,12 +756,13 @@ async def handle_photo(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
     caption = update.message.caption  # Подпись к фото (если есть)
 
     try:
-        # 1. Получаем пользователя
-        user, _ = await user_repo.get_or_create(
+        # 1. Получаем пользователя вместе с подпиской и профилем (один запрос)
+        snapshot = await user_repo.get_turn_snapshot(
             telegram_id=user_tg.id,
             username=user_tg.username,
             first_name=user_tg.first_name,
         )
+        user = snapshot.user
 
         # 2. Проверяем блокировку
         if user.is_blocked:
@@ -772,18 +780,15 @@ async def handle_photo(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
             return
 
         # 4. Проверяем лимиты
-        subscription = await subscription_repo.get_active(user.id)
-        is_premium = subscription and subscription.plan in ("premium", "trial")
+        is_premium = snapshot.is_premium
 
         if not is_premium:
-            if subscription and subscription.messages_today >= settings.FREE_MESSAGES_PER_DAY:
+            if snapshot.subscription and snapshot.messages_today >= settings.FREE_MESSAGES_PER_DAY:
                 await _send_limit_reached(update)
                 return
-            if subscription:
-                await subscription_repo.increment_messages(subscription.id)
 
-        # 5. Обновляем last_active
-        await user_repo.update_last_active(user.id)
+        # 5. Обновляем last_active и счётчик сообщений (одна транзакция)
+        await user_repo.record_turn(snapshot, count_message=not is_premium)
 
         # 6. Скачиваем фото (берём самое большое разрешение)
         photo = update.message.photo[-1]  # Последний элемент = максимальное разрешение
@@ -818,7 +823,10 @@ async def handle_photo(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
         )
 
         # 8. Подготавливаем данные пользователя
-        user_data = await _get_fresh_user_data(user)
+        user_data = _user_data_from_snapshot(snapshot)
+
+        # 8.5. Дожидаемся фоновой записи предыдущего сообщения
+        await background_tasks.wait_idle(user.id, timeout=settings.BACKGROUND_BARRIER_TIMEOUT)
 
         # 9. Генерируем ответ на фото через Claude
         result = await claude.generate_response_with_image(
@@ -833,41 +841,42 @@ async def handle_photo(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
         # 10. Отправляем ответ
         await update.message.reply_text(result["response"])
 
-        # 11. Сохраняем сообщения в историю
+        # 11. Сохраняем сообщения в историю (в фоне, по порядку)
         # Сохраняем сообщение пользователя (отмечаем что это фото)
         photo_description = "[Пользователь отправил фото]"
         if caption:
             photo_description += f" с подписью: {caption}"
 
-        await conversation_repo.save_message(
+        await background_tasks.submit(
+            "save_user_message",
+            conversation_repo.save_message,
+            key=user.id,
             user_id=user.id,
             role="user",
             content=photo_description,
             tags=["photo"],
+            idempotency_key=new_message_key(),
         )
 
-        await conversation_repo.save_message(
+        await background_tasks.submit(
+            "save_assistant_message",
+            conversation_repo.save_message,
+            key=user.id,
             user_id=user.id,
             role="assistant",
             content=result["response"],
             tags=result.get("tags", ["photo"]),
             tokens_used=result.get("tokens_used", 0),
+            idempotency_key=new_message_key(),
         )
 
         # 12. Трекаем первое фото и вехи по сообщениям
-        try:
-            # Проверяем это первое фото
-            await event_tracker.track_first_photo_message(user)
-        except Exception as e:
-            logger.warning(f"Failed to track first photo message: {e}")
-
-        try:
-            # Проверяем вехи по количеству сообщений
-            milestone = await event_tracker.track_message_milestone(user)
-            if milestone:
-                logger.info(f"User {user_tg.id} reached milestone: {milestone} messages")
-        except Exception as e:
-            logger.warning(f"Failed to track message milestone: {e}")
+        await background_tasks.submit(
+            "track_first_photo", _track_first_photo, user, key=user.id
+        )
+        await background_tasks.submit(
+            "track_message_milestone", _track_message_milestone, user, key=user.id
+        )
 
         logger.info(
             f"Photo processed for user {user_tg.id}, "
@@ -13,13 +13,12 @@ from database.repositories.user import UserRepository
 from database.repositories.onboarding_event import OnboardingEventRepository
 from config.constants import PERSONA_MIRA
 from bot.utils.typing import send_with_typing, send_typing_only
-from ai.crisis_detector import CrisisDetector
+from ai.crisis_detector import crisis_detector
 from ai.crisis_protocol import requires_emergency_message, get_emergency_message, detect_crisis_type
 
 
 user_repo = UserRepository()
 onboarding_event_repo = OnboardingEventRepository()
-crisis_detector = CrisisDetector()
 
 # Состояния диалога (экспортируются для main.py)
 WAITING_NAME = 0
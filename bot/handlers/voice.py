@@ -13,10 +13,11 @@ from ai.claude_client import ClaudeClient
 from database.repositories.user import UserRepository
 from database.repositories.subscription import SubscriptionRepository
 from database.repositories.conversation import ConversationRepository
-from database.repositories.api_cost import ApiCostRepository
+from database.api_cost_recorder import api_cost_recorder
 from bot.keyboards.inline import get_premium_keyboard, get_crisis_keyboard
 from services.storage.file_storage import file_storage_service
 from services.tts_yandex import send_voice_message
+from services.background_tasks import background_tasks
 from utils.event_tracker import event_tracker
 
 
@@ -25,7 +26,6 @@ claude = ClaudeClient()
 user_repo = UserRepository()
 subscription_repo = SubscriptionRepository()
 conversation_repo = ConversationRepository()
-api_cost_repo = ApiCostRepository()
 
 
 async def handle_voice(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -117,7 +117,7 @@ async def handle_voice(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
         # 8.1. Сохраняем расходы на транскрибацию
         if whisper_cost_info['cost_usd'] > 0:
             try:
-                await api_cost_repo.create(
+                await api_cost_recorder.record(
                     user_id=user.id,
                     provider='openai',
                     operation='speech_to_text',
@@ -178,6 +178,15 @@ async def handle_voice(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
             tokens_used=result["tokens_used"],
         )
 
+        # Стиль общения: новое сообщение вливается в агрегаты
+        await background_tasks.submit(
+            "observe_style",
+            claude.context_builder.observe_user_message,
+            key=user.id,
+            user_id=user.id,
+            text=transcribed_text,
+        )
+
         # 15. Отправляем ответ
         await _send_response(update, result)
 
@@ -68,6 +68,10 @@ from bot.handlers.content import (
 from services.scheduler import start_scheduler, stop_scheduler
 from services.redis_client import redis_client
 from services.health import health_server
+from ai.anthropic_pool import close_anthropic_client
+from services.tts_pool import close_tts_session
+from services.background_tasks import background_tasks
+from database.api_cost_recorder import api_cost_recorder
 from bot.handlers.admin import (
     admin_command,
     web_admin_command,
@@ -89,6 +93,7 @@ from bot.handlers.admin import (
     WAITING_PROMO_MAX_USES,
 )
 from bot.handlers.promo import get_promo_handler
+from bot.update_processor import update_processor
 from services.music_forwarder import (
     handle_supergroup_message,
     MUSIC_SUPERGROUP_ID,
@@ -187,8 +192,17 @@ async def post_init(app: Application) -> None:
     # Инициализируем БД
     await init_db()
 
-    # Запускаем планировщик
-    start_scheduler(app)
+    # Запускаем очередь фоновых задач (хвост обработки сообщений)
+    await background_tasks.start()
+
+    # Запускаем пакетную запись расходов на API
+    await api_cost_recorder.start()
+
+    # Запускаем планировщик (или его задачи выполняют воркеры bot.worker)
+    if settings.SCHEDULER_ENABLED:
+        start_scheduler(app)
+    else:
+        logger.info("Scheduler disabled: jobs run in scheduler workers")
 
     # Запускаем health check сервер
     try:
@@ -231,6 +245,30 @@ async def post_shutdown(app: Application) -> None:
     except Exception as e:
         logger.error(f"Error stopping scheduler: {e}")
 
+    # Дожидаемся фоновых задач — они ещё пишут в БД и ходят в Claude
+    try:
+        await background_tasks.stop()
+    except Exception as e:
+        logger.error(f"Error stopping background tasks: {e}")
+
+    # Сбрасываем буфер расходов на API (после фоновых задач — они его пополняют)
+    try:
+        await api_cost_recorder.stop()
+    except Exception as e:
+        logger.error(f"Error flushing API cost recorder: {e}")
+
+    # Закрываем пул соединений Claude
+    try:
+        await close_anthropic_client()
+    except Exception as e:
+        logger.error(f"Error closing Anthropic client: {e}")
+
+    # Закрываем пул соединений TTS
+    try:
+        await close_tts_session()
+    except Exception as e:
+        logger.error(f"Error closing TTS session: {e}")
+
     # Отключаемся от Redis
     try:
         await redis_client.disconnect()
@@ -295,9 +333,12 @@ def create_application() -> Application:
     global application
     
     # Создаём приложение
+    # Апдейты разных чатов — параллельно, одного чата — по порядку
+    update_processor.shutdown_timeout = _shutdown_timeout
     application = (
         Application.builder()
         .token(settings.TELEGRAM_BOT_TOKEN)
+        .concurrent_updates(update_processor)
         .post_init(post_init)
         .post_shutdown(post_shutdown)
         .build()
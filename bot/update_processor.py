@@ -0,0 +1,170 @@
+"""
+Update processor.
+Параллельная обработка апдейтов с сохранением порядка внутри чата.
+
+По умолчанию Application обрабатывает апдейты по одному, и медленный ход
+(Claude, Whisper, TTS) задерживает всех остальных. Здесь:
+
+- апдейты разных чатов обрабатываются параллельно, не больше
+  UPDATE_CONCURRENCY одновременно;
+- апдейты одного чата — строго по порядку: состояние ConversationHandler
+  онбординга и история сообщений не гоняются;
+- у каждого чата своя ограниченная очередь (UPDATE_QUEUE_PER_CHAT),
+  лишние апдейты отбрасываются с предупреждением;
+- апдейт, ждущий своей очереди в чате, не занимает общий слот —
+  один спамящий чат не блокирует остальных.
+
+Application лишь передаёт апдейт в очередь чата; выполняет их воркер
+чата, который живёт, пока очередь не опустеет. shutdown() дожидается
+начатых ходов.
+"""
+
+import asyncio
+from collections import deque
+from typing import Any, Awaitable, Deque, Dict, Hashable, Optional
+
+from loguru import logger
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+from config.settings import settings
+
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    """Общий лимит параллельности + очередь по порядку на каждый чат."""
+
+    def __init__(
+        self,
+        max_concurrent_updates: Optional[int] = None,
+        max_queue_per_chat: Optional[int] = None,
+        shutdown_timeout: float = 30.0,
+    ):
+        concurrency = max_concurrent_updates or settings.UPDATE_CONCURRENCY
+        super().__init__(concurrency)
+        self.max_queue_per_chat = max_queue_per_chat or settings.UPDATE_QUEUE_PER_CHAT
+        self.shutdown_timeout = shutdown_timeout
+
+        # Слоты выполнения берутся уже после очереди чата
+        self._slots = asyncio.Semaphore(concurrency)
+        # chat_id -> ждущие обработки корутины Application.process_update
+        self._queues: Dict[Hashable, Deque[Awaitable[Any]]] = {}
+        self._workers: Dict[Hashable, asyncio.Task] = {}
+
+        # Метрики
+        self.active = 0
+        self.processed = 0
+        self.failed = 0
+        self.dropped = 0
+        self.max_depth = 0
+
+    async def initialize(self) -> None:
+        """Ресурсы создаются по требованию."""
+
+    async def shutdown(self) -> None:
+        """Дожидается начатых ходов (не дольше shutdown_timeout)."""
+        workers = list(self._workers.values())
+        if not workers:
+            return
+
+        _, pending = await asyncio.wait(workers, timeout=self.shutdown_timeout)
+        if pending:
+            dropped = sum(len(queue) for queue in self._queues.values())
+            logger.warning(
+                f"Update processor: {len(pending)} chats still busy after "
+                f"{self.shutdown_timeout}s, {dropped} queued updates dropped"
+            )
+            for queue in self._queues.values():
+                while queue:
+                    self._discard(queue.popleft())
+            for worker in pending:
+                worker.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        """Ставит апдейт в очередь его чата."""
+        key = self._chat_key(update)
+        if key is None:
+            # Апдейты без чата (опросы, inline) порядка не требуют
+            async with self._slots:
+                await self._run(coroutine)
+            return
+
+        queue = self._queues.setdefault(key, deque())
+        if len(queue) >= self.max_queue_per_chat:
+            self.dropped += 1
+            self._discard(coroutine)
+            logger.warning(
+                f"Update queue for chat {key} is full ({len(queue)}), update dropped"
+            )
+            return
+
+        queue.append(coroutine)
+        self.max_depth = max(self.max_depth, len(queue))
+        if key not in self._workers:
+            self._workers[key] = asyncio.create_task(self._drain(key), name=f"updates-{key}")
+
+    def depth(self, chat_id: Hashable) -> int:
+        """Сколько апдейтов чата ждут обработки."""
+        queue = self._queues.get(chat_id)
+        return len(queue) if queue else 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Метрики для /health."""
+        depths = [len(queue) for queue in self._queues.values()]
+        return {
+            "concurrency": self.max_concurrent_updates,
+            "active": self.active,
+            "busy_chats": len(self._workers),
+            "queued": sum(depths),
+            "deepest_queue": max(depths, default=0),
+            "max_depth": self.max_depth,
+            "max_queue_per_chat": self.max_queue_per_chat,
+            "processed": self.processed,
+            "failed": self.failed,
+            "dropped": self.dropped,
+        }
+
+    @staticmethod
+    def _chat_key(update: object) -> Optional[Hashable]:
+        if not isinstance(update, Update):
+            return None
+        if update.effective_chat is not None:
+            return update.effective_chat.id
+        if update.effective_user is not None:
+            return update.effective_user.id
+        return None
+
+    async def _drain(self, key: Hashable) -> None:
+        """Воркер чата: апдейты по одному, пока очередь не опустеет."""
+        queue = self._queues[key]
+        try:
+            while queue:
+                coroutine = queue.popleft()
+                async with self._slots:
+                    await self._run(coroutine)
+        finally:
+            self._queues.pop(key, None)
+            self._workers.pop(key, None)
+
+    async def _run(self, coroutine: Awaitable[Any]) -> None:
+        self.active += 1
+        try:
+            await coroutine
+            self.processed += 1
+        except Exception as e:
+            # Ошибки обработчиков Application передаёт error handlers сам —
+            # сюда доходят только сбои самой обработки
+            self.failed += 1
+            logger.error(f"Update processing failed: {e}")
+        finally:
+            self.active -= 1
+
+    @staticmethod
+    def _discard(coroutine: Awaitable[Any]) -> None:
+        """Закрывает невыполненную корутину (без предупреждения 'never awaited')."""
+        if asyncio.iscoroutine(coroutine):
+            coroutine.close()
+
+
+# Глобальный экземпляр
+update_processor = ChatOrderedUpdateProcessor()
@@ -0,0 +1,216 @@
+"""
+Stream renderer.
+Показ ответа Claude по мере генерации: одно сообщение, которое правится.
+
+- Правки идут через общий telegram_rate_limiter (интервал на чат +
+  глобальный лимит бота), поэтому под нагрузкой они сами становятся реже.
+- Куски текста склеиваются: в момент правки отправляется весь накопленный
+  текст, очередь промежуточных версий не копится.
+- 429 RetryAfter откладывает правки чата на retry_after и удваивает
+  интервал (до STREAM_EDIT_MAX_INTERVAL); успешные правки возвращают его
+  к базовому.
+- «Пауза на обдумывание» отсчитывается с начала генерации: текст
+  не появляется раньше неё, но сборка контекста и Claude её не ждут.
+"""
+
+import asyncio
+import time
+from typing import Optional
+
+from loguru import logger
+from telegram import Message
+from telegram.error import BadRequest, RetryAfter, TelegramError
+
+from config.settings import settings
+from services.telegram_rate_limiter import TelegramRateLimiter, telegram_rate_limiter
+
+
+# Лимит длины сообщения Telegram
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+# Курсор «печатает» в промежуточных версиях
+CURSOR = " ▌"
+
+# Попыток показать финальный текст при 429
+FINAL_ATTEMPTS = 3
+
+
+class StreamRenderer:
+    """Стриминг ответа в чат правками одного сообщения."""
+
+    def __init__(
+        self,
+        reply_to: Message,
+        delay: float = 0.0,
+        limiter: Optional[TelegramRateLimiter] = None,
+        interval: Optional[float] = None,
+        max_interval: Optional[float] = None,
+        min_chars: Optional[int] = None,
+    ):
+        """
+        Args:
+            reply_to: Сообщение пользователя, на которое отвечаем
+            delay: Пауза на обдумывание — раньше неё текст не показывается
+            limiter: Лимитер Telegram (по умолчанию общий для процесса)
+            interval: Базовый интервал между правками
+            max_interval: Потолок интервала после 429
+            min_chars: Минимум символов для первого показа
+        """
+        self.reply_to = reply_to
+        self.chat_id = reply_to.chat_id
+        self.limiter = limiter or telegram_rate_limiter
+        self.base_interval = interval or settings.STREAM_EDIT_INTERVAL
+        self.max_interval = max_interval or settings.STREAM_EDIT_MAX_INTERVAL
+        self.min_chars = min_chars if min_chars is not None else settings.STREAM_MIN_CHARS
+
+        self.started_at = time.monotonic()
+        self.not_before = self.started_at + delay
+        self.interval = self.base_interval
+
+        self.text = ""
+        # Текст, который сейчас виден в чате (без курсора)
+        self.shown = ""
+        self.message: Optional[Message] = None
+
+        self._next_edit = 0.0
+        self._changed = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._requesting = False
+        self._closing = False
+
+        # Метрики
+        self.edits = 0
+        self.flood_errors = 0
+        self.first_visible_at: Optional[float] = None
+
+    async def feed(self, chunk: str) -> None:
+        """Callback on_chunk: добавляет кусок текста, правка — в фоне."""
+        self.text += chunk
+        self._changed.set()
+        if self._task is None and not self._closing:
+            self._task = asyncio.create_task(self._run())
+
+    async def finish(
+        self,
+        text: str,
+        reply_markup=None,
+        parse_mode: Optional[str] = "Markdown",
+    ) -> bool:
+        """
+        Показывает финальный текст (без курсора, с кнопками).
+
+        Returns:
+            True, если финальный текст виден в чате
+        """
+        await self._stop()
+        await self._sleep_until(self.not_before)
+
+        try:
+            for _ in range(FINAL_ATTEMPTS):
+                await self.limiter.acquire(self.chat_id)
+                try:
+                    await self._show_final(text, reply_markup, parse_mode)
+                    return True
+                except RetryAfter as e:
+                    self._backoff(e.retry_after)
+        except TelegramError as e:
+            logger.warning(f"Final stream update failed: {e}")
+            return False
+        finally:
+            logger.debug(
+                f"Stream to chat {self.chat_id}: edits={self.edits}, "
+                f"flood_errors={self.flood_errors}, first_visible={self.first_visible_at}"
+            )
+
+        logger.warning(f"Final stream update to chat {self.chat_id} gave up after flood control")
+        return False
+
+    async def abort(self) -> None:
+        """Генерация упала: останавливает правки и удаляет начатый ответ."""
+        await self._stop()
+        if self.message is not None:
+            try:
+                await self.message.delete()
+            except TelegramError:
+                pass
+
+    async def _run(self) -> None:
+        """Фоновые правки: не чаще интервала, только свежий текст целиком."""
+        while not self._closing:
+            await self._changed.wait()
+            self._changed.clear()
+            if len(self.text) < self.min_chars or self.text == self.shown:
+                continue
+
+            await self._sleep_until(max(self.not_before, self._next_edit))
+            await self.limiter.acquire(self.chat_id)
+
+            text = self.text
+            self._requesting = True
+            try:
+                await self._show(text[:TELEGRAM_MESSAGE_LIMIT - len(CURSOR)] + CURSOR)
+            except RetryAfter as e:
+                self._backoff(e.retry_after)
+                self._changed.set()
+                continue
+            except TelegramError as e:
+                # Промежуточная правка не критична — попробуем со следующим куском
+                logger.debug(f"Stream update error: {e}")
+                self._next_edit = time.monotonic() + self.interval
+                continue
+            finally:
+                self._requesting = False
+
+            self.shown = text
+            self._next_edit = time.monotonic() + self.interval
+            self.interval = max(self.base_interval, self.interval / 2)
+
+    async def _show(self, text: str, **kwargs) -> None:
+        """Первый показ — ответом на сообщение, дальше — правкой."""
+        if self.message is None:
+            self.message = await self.reply_to.reply_text(text, **kwargs)
+            self.first_visible_at = time.monotonic() - self.started_at
+        else:
+            await self.message.edit_text(text, **kwargs)
+        self.edits += 1
+
+    async def _show_final(self, text: str, reply_markup, parse_mode: Optional[str]) -> None:
+        try:
+            await self._show(text, reply_markup=reply_markup, parse_mode=parse_mode)
+        except BadRequest as e:
+            if "not modified" in str(e).lower():
+                return
+            if not parse_mode:
+                raise
+            # Ошибка разметки — показываем без неё
+            logger.debug(f"Final stream update error: {e}")
+            await self._show(text, reply_markup=reply_markup)
+        self.shown = text
+
+    def _backoff(self, retry_after: float) -> None:
+        """429: правки чата — не раньше retry_after, интервал вдвое длиннее."""
+        self.flood_errors += 1
+        self.limiter.defer(self.chat_id, retry_after)
+        self._next_edit = time.monotonic() + retry_after
+        self.interval = min(self.max_interval, self.interval * 2)
+        logger.debug(f"Stream to chat {self.chat_id}: flood control, retry after {retry_after}s")
+
+    async def _stop(self) -> None:
+        """Останавливает фоновые правки, не обрывая запрос на середине."""
+        self._closing = True
+        task, self._task = self._task, None
+        if task is None:
+            return
+        if self._requesting:
+            # Запрос уже ушёл — дожидаемся, иначе не узнаем, создано ли сообщение
+            self._changed.set()
+            await asyncio.gather(task, return_exceptions=True)
+            return
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    @staticmethod
+    async def _sleep_until(deadline: float) -> None:
+        delay = deadline - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
@@ -0,0 +1,102 @@
+"""
+Scheduler worker.
+Отдельный процесс для задач планировщика: ритуалы, check-in целей,
+follow-up, задания программ, поздравления, напоминания и очистка.
+
+Бот с SCHEDULER_ENABLED=false только отвечает на апдейты, а задачи
+по расписанию выполняют воркеры — их можно запускать несколько:
+
+    python -m bot.worker
+
+Воркер не получает апдейты и не держит PID-блокировку бота; как воркеры
+делят работу — см. services.scheduler.
+"""
+
+import asyncio
+import signal
+import sys
+
+from loguru import logger
+from telegram.ext import Application
+
+from config.settings import settings
+from database import init_db, close_db
+from database.api_cost_recorder import api_cost_recorder
+from ai.anthropic_pool import close_anthropic_client
+from services.scheduler import WORKER_ID, start_scheduler, stop_scheduler
+from services.redis_client import redis_client
+from services.health import health_server
+
+
+async def run() -> None:
+    """Запускает планировщик и работает до SIGTERM/SIGINT."""
+    # Только Bot API для отправки — без polling и обработчиков
+    application = Application.builder().token(settings.TELEGRAM_BOT_TOKEN).build()
+    await application.initialize()
+
+    await redis_client.connect()
+    await init_db()
+
+    # Генерация ритуалов и поздравлений пишет расходы на API
+    await api_cost_recorder.start()
+
+    start_scheduler(application)
+
+    try:
+        await health_server.start()
+        health_server.set_bot_running(True)
+    except Exception as e:
+        logger.warning(f"Failed to start health check server: {e}")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, stop.set)
+
+    logger.info(f"Scheduler worker {WORKER_ID} started")
+    await stop.wait()
+    logger.info("Stopping scheduler worker...")
+
+    health_server.set_bot_running(False)
+    try:
+        await health_server.stop()
+    except Exception as e:
+        logger.error(f"Error stopping health server: {e}")
+
+    # Прерванная пачка вернётся в очередь по истечении аренды
+    stop_scheduler()
+
+    try:
+        await api_cost_recorder.stop()
+    except Exception as e:
+        logger.error(f"Error flushing API cost recorder: {e}")
+
+    try:
+        await close_anthropic_client()
+    except Exception as e:
+        logger.error(f"Error closing Anthropic client: {e}")
+
+    await redis_client.disconnect()
+    await close_db()
+    await application.shutdown()
+    logger.info("Scheduler worker stopped")
+
+
+def main() -> None:
+    """Точка входа."""
+    logger.add(
+        "logs/worker_{time}.log",
+        rotation="1 day",
+        retention="30 days",
+        level=settings.LOG_LEVEL,
+    )
+
+    if sys.platform == "win32":
+        logger.error("Scheduler worker requires a Unix event loop (signal handlers)")
+        sys.exit(1)
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
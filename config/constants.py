@@ -68,6 +68,27 @@ REFERRAL_STATUS_PENDING = "pending"
 REFERRAL_STATUS_ACTIVATED = "activated"
 REFERRAL_STATUS_REWARDED = "rewarded"
 
+# =====================================
+# ЦЕНЫ API (USD)
+# =====================================
+# Claude: за 1M токенов по моделям.
+# cache_write — запись в кэш промпта (1.25 × input), cache_read — чтение (0.1 × input)
+CLAUDE_PRICES = {
+    "claude-sonnet-4-20250514": {"input": 3.0, "output": 15.0, "cache_write": 3.75, "cache_read": 0.30},
+    "claude-3-7-sonnet-20250219": {"input": 3.0, "output": 15.0, "cache_write": 3.75, "cache_read": 0.30},
+    "claude-3-5-sonnet-20241022": {"input": 3.0, "output": 15.0, "cache_write": 3.75, "cache_read": 0.30},
+    "claude-3-5-haiku-20241022": {"input": 0.80, "output": 4.0, "cache_write": 1.0, "cache_read": 0.08},
+    "claude-opus-4-20250514": {"input": 15.0, "output": 75.0, "cache_write": 18.75, "cache_read": 1.50},
+}
+# Модель, цены которой берутся для неизвестных моделей
+CLAUDE_DEFAULT_PRICE_MODEL = "claude-sonnet-4-20250514"
+
+# Yandex SpeechKit TTS: за 1M символов
+YANDEX_TTS_PRICE_PER_MILLION_CHARS = 0.12
+
+# OpenAI Whisper: $0.006 за минуту
+WHISPER_PRICE_PER_SECOND = 0.0001
+
 # =====================================
 # ТЕГИ СООБЩЕНИЙ
 # =====================================
@@ -16,6 +16,49 @@ class Settings(BaseSettings):
     # TELEGRAM
     # =====================================
     TELEGRAM_BOT_TOKEN: str = Field(..., description="Токен бота от BotFather")
+    TELEGRAM_API_BASE_URL: str = Field(
+        default="https://api.telegram.org",
+        description="URL Bot API для прямых HTTP-запросов (рассылки)"
+    )
+    TELEGRAM_GLOBAL_RATE_LIMIT: float = Field(
+        default=25.0,
+        description=(
+            "Максимум сообщений в секунду от бота (лимит Telegram ~30). С Redis лимит "
+            "общий для всех процессов, без него — у каждого процесса свой, делите бюджет"
+        )
+    )
+    TELEGRAM_PER_CHAT_INTERVAL: float = Field(
+        default=1.0,
+        description="Минимальный интервал между сообщениями в один чат (секунды)"
+    )
+    STREAM_THINKING_DELAY_MIN: float = Field(
+        default=1.0,
+        description="Минимальная «пауза на обдумывание» перед первым текстом ответа (секунды)"
+    )
+    STREAM_THINKING_DELAY_MAX: float = Field(
+        default=5.0,
+        description="Максимальная «пауза на обдумывание» перед первым текстом ответа (секунды)"
+    )
+    STREAM_EDIT_INTERVAL: float = Field(
+        default=1.0,
+        description="Базовый интервал между правками сообщения при стриминге (секунды)"
+    )
+    STREAM_EDIT_MAX_INTERVAL: float = Field(
+        default=5.0,
+        description="Максимальный интервал правок после 429 flood control (секунды)"
+    )
+    STREAM_MIN_CHARS: int = Field(
+        default=20,
+        description="Минимум символов ответа для первого показа"
+    )
+    UPDATE_CONCURRENCY: int = Field(
+        default=32,
+        description="Максимум апдейтов, обрабатываемых одновременно (разные чаты)"
+    )
+    UPDATE_QUEUE_PER_CHAT: int = Field(
+        default=10,
+        description="Максимум апдейтов одного чата в очереди, лишние отбрасываются"
+    )
     
     # =====================================
     # ANTHROPIC (Claude API)
@@ -26,6 +69,26 @@ class Settings(BaseSettings):
         description="Модель Claude для использования"
     )
     CLAUDE_MAX_TOKENS: int = Field(default=1024, description="Макс. токенов в ответе")
+    ANTHROPIC_BASE_URL: str = Field(
+        default="",
+        description="Переопределение URL Anthropic API (пусто = официальный)"
+    )
+    CLAUDE_MAX_CONCURRENCY: int = Field(
+        default=20,
+        description="Максимум одновременных запросов к Claude на процесс"
+    )
+    CLAUDE_MAX_CONNECTIONS: int = Field(
+        default=50,
+        description="Максимум HTTP-соединений в пуле Claude"
+    )
+    CLAUDE_MAX_KEEPALIVE_CONNECTIONS: int = Field(
+        default=20,
+        description="Максимум keep-alive соединений в пуле Claude"
+    )
+    CLAUDE_REQUEST_TIMEOUT: float = Field(
+        default=120.0,
+        description="Таймаут запроса к Claude (секунды)"
+    )
 
     # =====================================
     # OPENAI (Whisper API)
@@ -43,6 +106,22 @@ class Settings(BaseSettings):
     TTS_VOICE: str = Field(default="alena", description="Голос TTS (alena, jane, omazh)")
     TTS_EMOTION: str = Field(default="good", description="Эмоция TTS (neutral, good)")
     TTS_SPEED: float = Field(default=1.0, description="Скорость речи TTS (0.1-3.0)")
+    TTS_MAX_CONNECTIONS: int = Field(
+        default=20,
+        description="Максимум соединений в общем пуле TTS"
+    )
+    TTS_KEEPALIVE_TIMEOUT: float = Field(
+        default=60.0,
+        description="Сколько держать простаивающее соединение TTS открытым (секунды)"
+    )
+    TTS_REQUEST_TIMEOUT: float = Field(
+        default=60.0,
+        description="Таймаут запроса синтеза одного фрагмента (секунды)"
+    )
+    YANDEX_TTS_MAX_CONCURRENCY: int = Field(
+        default=10,
+        description="Одновременных запросов к Yandex SpeechKit на процесс (фрагменты медитаций идут параллельно)"
+    )
     
     # =====================================
     # DATABASE
@@ -75,6 +154,14 @@ class Settings(BaseSettings):
         default="redis://localhost:6379",
         description="URL подключения к Redis"
     )
+    CONTEXT_CACHE_TTL: int = Field(
+        default=300,
+        description="Время жизни секций кэша контекста (секунды)"
+    )
+    CONTEXT_CACHE_LOCAL_MAX_USERS: int = Field(
+        default=1000,
+        description="Максимум пользователей в локальном кэше контекста (без Redis)"
+    )
     
     # =====================================
     # ЮKASSA
@@ -108,6 +195,130 @@ class Settings(BaseSettings):
         default=50,
         description="Глубина памяти для premium"
     )
+    CONTEXT_SECTION_TIMEOUT: float = Field(
+        default=1.5,
+        description="Бюджет времени на одну секцию контекста (секунды)"
+    )
+    HISTORY_TOKEN_BUDGET: int = Field(
+        default=6000,
+        description="Бюджет токенов на историю сообщений в запросе к Claude"
+    )
+    HISTORY_SUMMARY_MAX_TOKENS: int = Field(
+        default=400,
+        description="Максимальная длина резюме старой части разговора (токены)"
+    )
+    HISTORY_SUMMARY_TTL: int = Field(
+        default=7 * 24 * 3600,
+        description="Время жизни резюме старой части разговора (секунды)"
+    )
+
+    # =====================================
+    # ФОНОВЫЕ ЗАДАЧИ
+    # =====================================
+    BACKGROUND_WORKERS: int = Field(
+        default=4,
+        description="Количество воркеров очереди фоновых задач"
+    )
+    BACKGROUND_QUEUE_SIZE: int = Field(
+        default=1000,
+        description="Максимальная длина очереди фоновых задач"
+    )
+    BACKGROUND_MAX_RETRIES: int = Field(
+        default=3,
+        description="Повторов упавшей фоновой задачи"
+    )
+    BACKGROUND_RETRY_DELAY: float = Field(
+        default=0.5,
+        description="Начальная задержка перед повтором (секунды, удваивается)"
+    )
+    BACKGROUND_ENQUEUE_TIMEOUT: float = Field(
+        default=2.0,
+        description="Сколько ждать места в очереди, прежде чем выполнить задачу сразу"
+    )
+    BACKGROUND_BARRIER_TIMEOUT: float = Field(
+        default=3.0,
+        description="Сколько новое сообщение ждёт фоновой записи предыдущего (секунды)"
+    )
+
+    # =====================================
+    # УЧЁТ РАСХОДОВ API
+    # =====================================
+    API_COST_BATCH_SIZE: int = Field(
+        default=50,
+        description="Сколько записей о расходах копить до записи в БД"
+    )
+    API_COST_FLUSH_INTERVAL: float = Field(
+        default=5.0,
+        description="Максимальный интервал между записями расходов в БД (секунды)"
+    )
+    API_COST_MAX_BUFFER: int = Field(
+        default=5000,
+        description="Максимум записей в буфере, если БД недоступна"
+    )
+
+    # =====================================
+    # РАССЫЛКИ
+    # =====================================
+    BROADCAST_CONCURRENCY: int = Field(
+        default=10,
+        description="Количество параллельных отправителей рассылки"
+    )
+    BROADCAST_MAX_ATTEMPTS: int = Field(
+        default=5,
+        description="Попыток отправки одному получателю (429, 5xx, сеть)"
+    )
+    BROADCAST_CHECKPOINT_EVERY: int = Field(
+        default=200,
+        description="Сохранять прогресс рассылки в БД каждые N получателей"
+    )
+    BROADCAST_LEASE_SECONDS: int = Field(
+        default=60,
+        description="Через сколько секунд без пульса рассылку может продолжить другой процесс"
+    )
+
+    # =====================================
+    # ПРОАКТИВНЫЕ СООБЩЕНИЯ (задачи планировщика)
+    # =====================================
+    DELIVERY_CONCURRENCY: int = Field(
+        default=10,
+        description="Параллельных отправителей проактивных сообщений (на все задачи)"
+    )
+    DELIVERY_MAX_ATTEMPTS: int = Field(
+        default=3,
+        description="Попыток отправки одного проактивного сообщения (429, сеть)"
+    )
+    DELIVERY_BATCH_SIZE: int = Field(
+        default=1000,
+        description="Максимум сообщений, которые задача планировщика берёт за запуск"
+    )
+    DELIVERY_BUILD_CONCURRENCY: int = Field(
+        default=20,
+        description="Параллельных сборок текста проактивных сообщений (генерация не занимает отправителей)"
+    )
+    GENERATION_CONCURRENCY: int = Field(
+        default=8,
+        description="Одновременных запросов к Claude на генерацию проактивных текстов"
+    )
+    GENERATION_RPM: int = Field(
+        default=50,
+        description="Запросов к Claude в минуту на генерацию проактивных текстов"
+    )
+    GENERATION_TPM: int = Field(
+        default=40000,
+        description="Токенов Claude в минуту (промпт + max_tokens) на генерацию проактивных текстов"
+    )
+    GENERATION_CACHE_TTL: int = Field(
+        default=3600,
+        description="Время жизни кэша шаблонных текстов без данных пользователя (секунды)"
+    )
+    SCHEDULER_ENABLED: bool = Field(
+        default=True,
+        description="Запускать планировщик в процессе бота (False — задачи выполняют воркеры python -m bot.worker)"
+    )
+    SCHEDULER_LEASE_SECONDS: int = Field(
+        default=600,
+        description="Срок аренды захваченного воркером задания; после него неотправленное задание повторяется"
+    )
     
     # =====================================
     # РЕФЕРАЛЬНАЯ ПРОГРАММА
@@ -144,6 +355,10 @@ class Settings(BaseSettings):
         default="NJCZ8rYTNuFfLrNRwTIiSyutyql_EprB_K2jURF7HAw",
         description="Токен для доступа к админ-панели"
     )
+    ANALYTICS_CACHE_TTL: int = Field(
+        default=60,
+        description="Время жизни кэша графиков аналитики (секунды)"
+    )
 
     # =====================================
     # РИТУАЛЫ
@@ -156,6 +371,22 @@ class Settings(BaseSettings):
         default="21:00",
         description="Время вечернего check-in по умолчанию"
     )
+    CELEBRATION_TIME: str = Field(
+        default="09:00",
+        description="Местное время поздравлений с днём рождения и годовщиной"
+    )
+    GOAL_CHECKIN_TIME: str = Field(
+        default="20:00",
+        description="Местное время check-in по целям"
+    )
+    BIWEEKLY_SUMMARY_TIME: str = Field(
+        default="19:00",
+        description="Местное время bi-weekly сводок (по понедельникам)"
+    )
+    SCHEDULER_SPREAD_MINUTES: int = Field(
+        default=30,
+        description="Окно, по которому размазываются отправки одного местного времени (минуты)"
+    )
     
     # =====================================
     # БЕЗОПАСНОСТЬ
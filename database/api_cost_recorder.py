@@ -0,0 +1,144 @@
+"""
+API cost recorder.
+Буферизованная запись расходов на API (Claude, Whisper, Yandex TTS).
+
+Таблицу api_costs никто не читает в реальном времени, поэтому записи
+копятся в памяти и уходят в БД одним multi-row INSERT — когда набралось
+API_COST_BATCH_SIZE записей или прошло API_COST_FLUSH_INTERVAL секунд.
+При остановке бота буфер сбрасывается (post_shutdown).
+"""
+
+import asyncio
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from loguru import logger
+
+from config.settings import settings
+from database.repositories.api_cost import ApiCostRepository
+
+
+class ApiCostRecorder:
+    """Буфер записей ApiCost с пакетной записью в БД."""
+
+    def __init__(
+        self,
+        batch_size: Optional[int] = None,
+        flush_interval: Optional[float] = None,
+        max_buffer: Optional[int] = None,
+    ):
+        self.batch_size = batch_size or settings.API_COST_BATCH_SIZE
+        self.flush_interval = flush_interval or settings.API_COST_FLUSH_INTERVAL
+        self.max_buffer = max_buffer or settings.API_COST_MAX_BUFFER
+        self.repo = ApiCostRepository()
+
+        self._buffer: List[Dict[str, Any]] = []
+        self._lock = asyncio.Lock()
+        self._flusher: Optional[asyncio.Task] = None
+
+        # Метрики
+        self.recorded = 0
+        self.flushed = 0
+        self.batches = 0
+        self.failed_flushes = 0
+        self.dropped = 0
+
+    @property
+    def is_running(self) -> bool:
+        return self._flusher is not None
+
+    async def start(self) -> None:
+        """Запускает периодический сброс буфера."""
+        if self.is_running:
+            return
+        self._flusher = asyncio.create_task(self._flush_loop(), name="api-cost-flusher")
+        logger.info(
+            f"API cost recorder started: batch={self.batch_size}, "
+            f"interval={self.flush_interval}s"
+        )
+
+    async def stop(self) -> None:
+        """Останавливает периодический сброс и записывает остаток буфера."""
+        if not self.is_running:
+            return
+        self._flusher.cancel()
+        await asyncio.gather(self._flusher, return_exceptions=True)
+        self._flusher = None
+        await self.flush()
+        if self._buffer:
+            logger.warning(f"API cost recorder: {len(self._buffer)} records lost on shutdown")
+        logger.info("API cost recorder stopped")
+
+    async def record(self, **fields: Any) -> None:
+        """
+        Добавляет запись о расходе (поля как у ApiCostRepository.create).
+
+        Время фиксируется в момент вызова, а не записи в БД.
+        Если периодический сброс не запущен (скрипты, webapp),
+        запись сразу уходит в БД.
+        """
+        fields.setdefault("created_at", datetime.now())
+        self.recorded += 1
+
+        if not self.is_running:
+            await self.repo.create_many([fields])
+            self.flushed += 1
+            return
+
+        self._buffer.append(fields)
+        if len(self._buffer) >= self.batch_size:
+            await self.flush()
+
+    async def flush(self) -> int:
+        """
+        Записывает буфер в БД. При ошибке записи возвращаются в буфер
+        (не больше max_buffer, старые отбрасываются).
+
+        Returns:
+            Количество записанных строк
+        """
+        async with self._lock:
+            if not self._buffer:
+                return 0
+            rows, self._buffer = self._buffer, []
+
+            try:
+                count = await self.repo.create_many(rows)
+            except Exception as e:
+                self.failed_flushes += 1
+                self._buffer = rows + self._buffer
+                overflow = len(self._buffer) - self.max_buffer
+                if overflow > 0:
+                    self._buffer = self._buffer[overflow:]
+                    self.dropped += overflow
+                logger.error(f"Failed to flush {len(rows)} API cost records: {e}")
+                return 0
+
+            self.flushed += count
+            self.batches += 1
+            logger.debug(f"Flushed {count} API cost records")
+            return count
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Метрики для /health."""
+        return {
+            "running": self.is_running,
+            "buffered": len(self._buffer),
+            "recorded": self.recorded,
+            "flushed": self.flushed,
+            "batches": self.batches,
+            "failed_flushes": self.failed_flushes,
+            "dropped": self.dropped,
+        }
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"API cost flush loop error: {e}")
+
+
+# Глобальный экземпляр
+api_cost_recorder = ApiCostRecorder()
@@ -0,0 +1,275 @@
+"""
+Context cache.
+Кэш секций контекста пользователя (Redis + in-process LRU fallback).
+
+Секции ContextBuilder (профиль, цели, триггеры, память, настроение, темы)
+между двумя сообщениями почти не меняются, поэтому хранятся в Redis-хэше
+ctx:v{VERSION}:{user_id} — по полю на секцию. Репозитории-писатели после
+коммита сбрасывают свою секцию (invalidate), TTL страхует от пропущенных
+инвалидаций (массовые чистки, ручные правки в БД).
+
+У каждого пользователя есть поколение кэша (поле __gen__), invalidate его
+увеличивает. Загрузчик запоминает поколение до чтения из БД и кладёт
+секцию, только если оно не изменилось (compare-and-set в Lua). Иначе
+загрузка, начатая до записи и закончившаяся после её invalidate, вернула
+бы в кэш старые данные на весь TTL — а запись из фоновых задач идёт
+как раз параллельно со сборкой контекста.
+
+Follow-up'ы не кэшируются: список «пора спросить» зависит от текущего
+времени и устаревает без всяких записей.
+"""
+
+import json
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Any, Dict, Optional, Tuple
+
+from loguru import logger
+
+from config.settings import settings
+
+
+# Версия формата — поднять при изменении структуры секций,
+# старые ключи просто истекут по TTL
+CONTEXT_CACHE_VERSION = 1
+
+SECTION_USER_PROFILE = "user_profile"
+SECTION_ACTIVE_GOALS = "active_goals"
+SECTION_SENSITIVE_TOPICS = "sensitive_topics"
+SECTION_LONG_TERM_MEMORY = "long_term_memory"
+SECTION_MOOD_SUMMARY = "mood_summary"
+SECTION_RECENT_TOPICS = "recent_topics"
+
+CACHEABLE_SECTIONS = frozenset({
+    SECTION_USER_PROFILE,
+    SECTION_ACTIVE_GOALS,
+    SECTION_SENSITIVE_TOPICS,
+    SECTION_LONG_TERM_MEMORY,
+    SECTION_MOOD_SUMMARY,
+    SECTION_RECENT_TOPICS,
+})
+
+# Поле хэша с поколением кэша пользователя
+GENERATION_FIELD = "__gen__"
+
+# Положить секцию, если поколение не изменилось с начала загрузки
+_SET_IF_GENERATION = """
+if tonumber(redis.call('HGET', KEYS[1], ARGV[1]) or '0') ~= tonumber(ARGV[2]) then
+    return 0
+end
+redis.call('HSET', KEYS[1], ARGV[3], ARGV[4])
+redis.call('EXPIRE', KEYS[1], ARGV[5])
+return 1
+"""
+
+# Увеличить поколение и удалить секции (без секций — все, кроме поколения).
+# EXPIRE продлевает жизнь поколения: если хэш истечёт посреди загрузки,
+# поколение обнулится и старое значение пройдёт проверку
+_INVALIDATE = """
+redis.call('HINCRBY', KEYS[1], ARGV[1], 1)
+if #ARGV > 2 then
+    redis.call('HDEL', KEYS[1], unpack(ARGV, 3))
+else
+    for _, field in ipairs(redis.call('HKEYS', KEYS[1])) do
+        if field ~= ARGV[1] then
+            redis.call('HDEL', KEYS[1], field)
+        end
+    end
+end
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+return 1
+"""
+
+
+def _redis():
+    """
+    Redis-клиент импортируется лениво: services/__init__ тянет scheduler,
+    а тот — репозитории, которые сами импортируют этот модуль.
+    """
+    from services.redis_client import redis_client
+    return redis_client
+
+
+def _encode_default(value: Any) -> Any:
+    """JSON-сериализация дат (в секциях встречаются datetime)."""
+    if isinstance(value, datetime):
+        return {"__dt__": value.isoformat()}
+    if isinstance(value, date):
+        return {"__d__": value.isoformat()}
+    raise TypeError(f"Not JSON serializable: {type(value).__name__}")
+
+
+def _decode_hook(obj: Dict[str, Any]) -> Any:
+    if "__dt__" in obj:
+        return datetime.fromisoformat(obj["__dt__"])
+    if "__d__" in obj:
+        return date.fromisoformat(obj["__d__"])
+    return obj
+
+
+class ContextCache:
+    """
+    Кэш секций контекста пользователя.
+
+    Redis — основное хранилище (общее для всех процессов бота).
+    Если Redis недоступен, используется LRU в памяти процесса.
+    """
+
+    def __init__(
+        self,
+        ttl: Optional[int] = None,
+        local_max_users: Optional[int] = None,
+    ):
+        self.ttl = ttl or settings.CONTEXT_CACHE_TTL
+        self.local_max_users = local_max_users or settings.CONTEXT_CACHE_LOCAL_MAX_USERS
+        # user_id -> {section: (stored_at, value)}
+        self._local: "OrderedDict[int, Dict[str, Tuple[float, Any]]]" = OrderedDict()
+        # user_id -> поколение; не вытесняется вместе с LRU, иначе обнулится
+        # посреди загрузки (по int на пользователя)
+        self._generations: Dict[int, int] = {}
+        self.hits: Dict[str, int] = {}
+        self.misses: Dict[str, int] = {}
+        self.invalidations = 0
+
+    @staticmethod
+    def _key(user_id: int) -> str:
+        return f"ctx:v{CONTEXT_CACHE_VERSION}:{user_id}"
+
+    async def get_sections(self, user_id: int) -> Dict[str, Any]:
+        """
+        Возвращает все свежие секции пользователя одним запросом (HGETALL).
+        Секции с истёкшим TTL не возвращаются.
+        """
+        sections, _ = await self.snapshot(user_id)
+        return sections
+
+    async def snapshot(self, user_id: int) -> Tuple[Dict[str, Any], int]:
+        """
+        Свежие секции и поколение кэша пользователя (одним HGETALL).
+        Поколение передаётся в set_section для загруженных промахов.
+        """
+        now = time.time()
+        sections: Dict[str, Any] = {}
+        redis_client = _redis()
+
+        if redis_client.is_connected:
+            raw = await redis_client.hgetall(self._key(user_id))
+            generation = int(raw.pop(GENERATION_FIELD, 0) or 0)
+            for name, payload in raw.items():
+                try:
+                    item = json.loads(payload, object_hook=_decode_hook)
+                except (TypeError, ValueError):
+                    continue
+                if now - item.get("at", 0) < self.ttl:
+                    sections[name] = item.get("v")
+            return sections, generation
+
+        generation = self._generations.get(user_id, 0)
+        entry = self._local.get(user_id)
+        if entry is None:
+            return sections, generation
+        self._local.move_to_end(user_id)
+        for name, (stored_at, value) in entry.items():
+            if now - stored_at < self.ttl:
+                sections[name] = value
+        return sections, generation
+
+    async def set_section(
+        self,
+        user_id: int,
+        section: str,
+        value: Any,
+        generation: Optional[int] = None,
+    ) -> bool:
+        """
+        Сохраняет секцию.
+
+        Args:
+            generation: Поколение из snapshot() до загрузки секции; если с тех
+                пор был invalidate, секция не сохраняется (None — без проверки)
+
+        Returns:
+            True, если секция сохранена
+        """
+        now = time.time()
+        redis_client = _redis()
+
+        if redis_client.is_connected:
+            try:
+                payload = json.dumps({"v": value, "at": now}, default=_encode_default)
+            except (TypeError, ValueError) as e:
+                logger.warning(f"Context cache: section '{section}' is not serializable: {e}")
+                return False
+            if generation is None:
+                return await redis_client.hset(self._key(user_id), section, payload, expire=self.ttl)
+            stored = await redis_client.eval(
+                _SET_IF_GENERATION,
+                [self._key(user_id)],
+                [GENERATION_FIELD, generation, section, payload, self.ttl],
+            )
+            return stored == 1
+
+        if generation is not None and self._generations.get(user_id, 0) != generation:
+            return False
+
+        entry = self._local.setdefault(user_id, {})
+        entry[section] = (now, value)
+        self._local.move_to_end(user_id)
+        while len(self._local) > self.local_max_users:
+            self._local.popitem(last=False)
+        return True
+
+    async def invalidate(self, user_id: int, *sections: str) -> None:
+        """
+        Сбрасывает секции пользователя (без аргументов — все) и увеличивает
+        поколение. Вызывается репозиториями после коммита.
+        """
+        self.invalidations += 1
+
+        self._generations[user_id] = self._generations.get(user_id, 0) + 1
+        entry = self._local.get(user_id)
+        if entry is not None:
+            if sections:
+                for name in sections:
+                    entry.pop(name, None)
+            else:
+                del self._local[user_id]
+
+        redis_client = _redis()
+        if redis_client.is_connected:
+            await redis_client.eval(
+                _INVALIDATE,
+                [self._key(user_id)],
+                [GENERATION_FIELD, self.ttl, *sections],
+            )
+
+    def record(self, section: str, hit: bool) -> None:
+        """Учитывает попадание/промах по секции."""
+        counters = self.hits if hit else self.misses
+        counters[section] = counters.get(section, 0) + 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Счётчики кэша для /health."""
+        hits = sum(self.hits.values())
+        misses = sum(self.misses.values())
+        total = hits + misses
+        return {
+            "backend": "redis" if _redis().is_connected else "local",
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / total, 3) if total else 0.0,
+            "invalidations": self.invalidations,
+            "local_users": len(self._local),
+            "sections": {
+                name: {
+                    "hits": self.hits.get(name, 0),
+                    "misses": self.misses.get(name, 0),
+                }
+                for name in sorted(set(self.hits) | set(self.misses))
+            },
+        }
+
+
+# Глобальный экземпляр
+context_cache = ContextCache()
@@ -0,0 +1,87 @@
+"""
+History summary cache.
+Скользящее резюме старой части разговора (Redis + in-process LRU fallback).
+
+Резюме покрывает сообщения пользователя до until_id включительно —
+те, что не поместились в бюджет токенов истории. Хранится долго
+(HISTORY_SUMMARY_TTL): оно дорогое (запрос к Claude) и дописывается
+по мере того, как разговор уходит из окна. При удалении истории
+сбрасывается вместе с ней.
+"""
+
+import json
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from config.settings import settings
+
+
+# Версия формата — поднять при изменении структуры записи
+HISTORY_SUMMARY_VERSION = 1
+
+
+def _redis():
+    """Redis-клиент импортируется лениво (см. database.context_cache)."""
+    from services.redis_client import redis_client
+    return redis_client
+
+
+class HistorySummaryCache:
+    """Кэш резюме истории по пользователям."""
+
+    def __init__(
+        self,
+        ttl: Optional[int] = None,
+        local_max_users: Optional[int] = None,
+    ):
+        self.ttl = ttl or settings.HISTORY_SUMMARY_TTL
+        self.local_max_users = local_max_users or settings.CONTEXT_CACHE_LOCAL_MAX_USERS
+        # user_id -> {"until_id": int, "summary": str}
+        self._local: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+
+    @staticmethod
+    def _key(user_id: int) -> str:
+        return f"history_summary:v{HISTORY_SUMMARY_VERSION}:{user_id}"
+
+    async def get(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """Резюме пользователя: {"until_id", "summary"} или None."""
+        redis_client = _redis()
+
+        if redis_client.is_connected:
+            raw = await redis_client.get(self._key(user_id))
+            if not raw:
+                return None
+            try:
+                return json.loads(raw)
+            except (TypeError, ValueError):
+                return None
+
+        entry = self._local.get(user_id)
+        if entry is not None:
+            self._local.move_to_end(user_id)
+        return entry
+
+    async def set(self, user_id: int, until_id: int, summary: str) -> None:
+        """Сохраняет резюме сообщений до until_id включительно."""
+        entry = {"until_id": until_id, "summary": summary}
+        redis_client = _redis()
+
+        if redis_client.is_connected:
+            await redis_client.set(self._key(user_id), json.dumps(entry), expire=self.ttl)
+            return
+
+        self._local[user_id] = entry
+        self._local.move_to_end(user_id)
+        while len(self._local) > self.local_max_users:
+            self._local.popitem(last=False)
+
+    async def invalidate(self, user_id: int) -> None:
+        """Сбрасывает резюме (история пользователя удалена)."""
+        self._local.pop(user_id, None)
+        redis_client = _redis()
+        if redis_client.is_connected:
+            await redis_client.delete(self._key(user_id))
+
+
+# Глобальный экземпляр
+history_summary_cache = HistorySummaryCache()
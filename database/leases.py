@@ -0,0 +1,159 @@
+"""
+Leases.
+Захват строк-заданий планировщика несколькими воркерами.
+
+Задание (сообщение ритуала, check-in цели, follow-up, задание программы)
+готово, когда его время наступило. Воркер в одной транзакции:
+
+- выбирает готовые строки с FOR UPDATE SKIP LOCKED — строки, которые
+  сейчас захватывает другой воркер, пропускаются, а не ждутся;
+- сдвигает их время на срок аренды (SCHEDULER_LEASE_SECONDS) — после
+  коммита строки больше не готовы, и никто другой их не возьмёт.
+
+Пока пачка отправляется, Lease продлевает аренду ещё не отмеченных строк:
+генерация текстов под бюджетом Claude может идти дольше срока аренды,
+и без продления второй воркер захватил бы уже отправленные строки.
+Каждое сообщение отмечается (mark_sent_many, record_checkins, ...) сразу
+после отправки, а не в конце пачки. Если воркер упал или сообщение
+не ушло, продление прекращается, аренда истекает и строка снова
+становится готовой — повтор.
+
+SQLite не поддерживает FOR UPDATE и пропускает его; там запись и так
+последовательна, но воркер должен быть один.
+"""
+
+import asyncio
+import time
+from contextlib import suppress
+from datetime import datetime, timedelta
+from typing import Any, Iterable, List, Optional
+
+from loguru import logger
+from sqlalchemy import Select, update
+from sqlalchemy.orm import InstrumentedAttribute
+
+from config.settings import settings
+from database.session import get_session_context
+
+
+def lease_until(now: datetime, lease: Optional[int] = None) -> datetime:
+    """Момент, когда аренда истекает."""
+    return now + timedelta(seconds=lease or settings.SCHEDULER_LEASE_SECONDS)
+
+
+async def claim_due(
+    query: Select,
+    due_column: InstrumentedAttribute,
+    until: datetime,
+) -> List[Any]:
+    """
+    Захватить готовые строки.
+
+    Args:
+        query: Выборка готовых строк (условия, порядок, limit)
+        due_column: Колонка времени, которую сдвигает аренда
+        until: Новое значение колонки (см. lease_until)
+
+    Returns:
+        Захваченные строки; due_column у них уже равна until
+    """
+    model = due_column.class_
+
+    async with get_session_context() as session:
+        result = await session.execute(query.with_for_update(skip_locked=True))
+        rows = list(result.scalars().all())
+        if rows:
+            await session.execute(
+                update(model)
+                .where(model.id.in_([row.id for row in rows]))
+                .values({due_column.key: until})
+            )
+        await session.commit()
+        return rows
+
+
+async def renew(
+    due_column: InstrumentedAttribute,
+    ids: Iterable[int],
+    held_until: datetime,
+    until: datetime,
+) -> int:
+    """
+    Продлить аренду строк, которые всё ещё держит этот воркер.
+
+    Строки, чьё время уже не held_until (задача их отметила или аренду
+    перехватил другой воркер), не трогаются.
+
+    Returns:
+        Количество продлённых строк
+    """
+    model = due_column.class_
+
+    async with get_session_context() as session:
+        result = await session.execute(
+            update(model)
+            .where(model.id.in_(list(ids)), due_column == held_until)
+            .values({due_column.key: until})
+        )
+        await session.commit()
+        return result.rowcount
+
+
+class Lease:
+    """
+    Аренда захваченной пачки на время её обработки.
+
+    Каждую треть срока аренды фоновая задача продлевает её для строк,
+    которые ещё не отпущены (release). Время продления отсчитывается от
+    текущего значения колонки, поэтому подходит и для колонок в UTC,
+    и для колонок по времени сервера.
+
+    Использование:
+        rows = await repo.claim_...()
+        async with Lease(Model.due_column, rows) as lease:
+            ...  # после отметки строки: lease.release(row.id)
+    """
+
+    def __init__(
+        self,
+        due_column: InstrumentedAttribute,
+        rows: List[Any],
+        lease: Optional[float] = None,
+    ):
+        self.due_column = due_column
+        self.lease = lease or settings.SCHEDULER_LEASE_SECONDS
+        self._ids = {row.id for row in rows}
+        # claim_due уже выставил колонку захваченных строк в момент окончания аренды
+        self.until: Optional[datetime] = getattr(rows[0], due_column.key) if rows else None
+        self._task: Optional[asyncio.Task] = None
+
+    def release(self, row_id: int) -> None:
+        """Строка отмечена — больше не продлеваем."""
+        self._ids.discard(row_id)
+
+    async def __aenter__(self) -> "Lease":
+        if self._ids:
+            self._task = asyncio.create_task(self._keep())
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+
+    async def _keep(self) -> None:
+        renewed_at = time.monotonic()
+        while self._ids:
+            await asyncio.sleep(self.lease / 3)
+            # Сдвигаем на прошедшее время: после продления до конца аренды снова полный срок
+            now = time.monotonic()
+            until = self.until + timedelta(seconds=now - renewed_at)
+            try:
+                await renew(self.due_column, self._ids, self.until, until)
+            except Exception as e:
+                # Не продлили — попробуем на следующем шаге, пока аренда не истекла
+                logger.warning(f"Failed to renew lease on {self.due_column}: {e}")
+                continue
+            self.until = until
+            renewed_at = now
@@ -0,0 +1,26 @@
+"""add prompt caching tokens to api_costs
+
+Revision ID: 20261016_add_api_cost_cache_tokens
+Revises: 20260111_add_onboarding_events
+Create Date: 2026-10-16 12:00:00.000000
+"""
+from typing import Union
+from alembic import op
+import sqlalchemy as sa
+
+revision = '20261016_add_api_cost_cache_tokens'
+down_revision = '20260111_add_onboarding_events'
+branch_labels: Union[str, None] = None
+depends_on: Union[str, None] = None
+
+
+def upgrade() -> None:
+    """Add cache_read_tokens and cache_write_tokens columns to api_costs table."""
+    op.add_column('api_costs', sa.Column('cache_read_tokens', sa.Integer(), nullable=True))
+    op.add_column('api_costs', sa.Column('cache_write_tokens', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    """Remove cache_read_tokens and cache_write_tokens columns from api_costs table."""
+    op.drop_column('api_costs', 'cache_write_tokens')
+    op.drop_column('api_costs', 'cache_read_tokens')
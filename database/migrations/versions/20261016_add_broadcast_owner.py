@@ -0,0 +1,26 @@
+"""add owner and heartbeat to broadcasts
+
+Revision ID: 20261016_add_broadcast_owner
+Revises: 20261016_add_message_idempotency_key
+Create Date: 2026-10-16 23:45:00.000000
+"""
+from typing import Union
+from alembic import op
+import sqlalchemy as sa
+
+revision = '20261016_add_broadcast_owner'
+down_revision = '20261016_add_message_idempotency_key'
+branch_labels: Union[str, None] = None
+depends_on: Union[str, None] = None
+
+
+def upgrade() -> None:
+    """Add owner and heartbeat_at columns to broadcasts table."""
+    op.add_column('broadcasts', sa.Column('owner', sa.String(100), nullable=True))
+    op.add_column('broadcasts', sa.Column('heartbeat_at', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    """Remove owner and heartbeat_at columns from broadcasts table."""
+    op.drop_column('broadcasts', 'heartbeat_at')
+    op.drop_column('broadcasts', 'owner')
@@ -0,0 +1,43 @@
+"""add broadcasts table
+
+Revision ID: 20261016_add_broadcasts
+Revises: 20261016_add_api_cost_cache_tokens
+Create Date: 2026-10-16 14:00:00.000000
+"""
+from typing import Union
+from alembic import op
+import sqlalchemy as sa
+
+revision = '20261016_add_broadcasts'
+down_revision = '20261016_add_api_cost_cache_tokens'
+branch_labels: Union[str, None] = None
+depends_on: Union[str, None] = None
+
+
+def upgrade() -> None:
+    """Create broadcasts table for persistent broadcast progress."""
+    op.create_table(
+        'broadcasts',
+        sa.Column('id', sa.String(36), primary_key=True),
+        sa.Column('message', sa.Text(), nullable=False),
+        sa.Column('target_group', sa.String(50), nullable=False),
+        sa.Column('parse_mode', sa.String(20), nullable=True),
+        sa.Column('status', sa.String(20), nullable=False, server_default='pending'),
+        sa.Column('total', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('sent', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('failed', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('blocked', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('last_user_id', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('created_by', sa.BigInteger(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.func.now(), nullable=False),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+    )
+    op.create_index('ix_broadcasts_status', 'broadcasts', ['status'])
+
+
+def downgrade() -> None:
+    """Drop broadcasts table."""
+    op.drop_index('ix_broadcasts_status', table_name='broadcasts')
+    op.drop_table('broadcasts')
@@ -0,0 +1,28 @@
+"""add idempotency_key to messages
+
+Revision ID: 20261016_add_message_idempotency_key
+Revises: 20261016_add_scheduler_runs
+Create Date: 2026-10-16 23:30:00.000000
+"""
+from typing import Union
+from alembic import op
+import sqlalchemy as sa
+
+revision = '20261016_add_message_idempotency_key'
+down_revision = '20261016_add_scheduler_runs'
+branch_labels: Union[str, None] = None
+depends_on: Union[str, None] = None
+
+
+def upgrade() -> None:
+    """Add idempotency_key column with a unique index to messages table."""
+    op.add_column('messages', sa.Column('idempotency_key', sa.String(64), nullable=True))
+    op.create_index(
+        'uq_messages_idempotency_key', 'messages', ['idempotency_key'], unique=True
+    )
+
+
+def downgrade() -> None:
+    """Remove idempotency_key column from messages table."""
+    op.drop_index('uq_messages_idempotency_key', table_name='messages')
+    op.drop_column('messages', 'idempotency_key')
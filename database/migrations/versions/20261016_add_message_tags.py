@@ -0,0 +1,55 @@
+"""add message_tags table
+
+Revision ID: 20261016_add_message_tags
+Revises: 20261016_add_user_counters
+Create Date: 2026-10-16 20:00:00.000000
+"""
+from typing import Union
+from alembic import op
+import sqlalchemy as sa
+
+revision = '20261016_add_message_tags'
+down_revision = '20261016_add_user_counters'
+branch_labels: Union[str, None] = None
+depends_on: Union[str, None] = None
+
+
+def upgrade() -> None:
+    """Create message_tags table (normalized message tags) and backfill it from messages.tags."""
+    op.create_table(
+        'message_tags',
+        sa.Column('message_id', sa.Integer(), sa.ForeignKey('messages.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('tag', sa.String(100), primary_key=True),
+        sa.Column('user_id', sa.BigInteger(), sa.ForeignKey('users.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+    )
+
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("""
+            INSERT INTO message_tags (message_id, tag, user_id, created_at)
+            SELECT DISTINCT m.id, t.tag, m.user_id, COALESCE(m.created_at, now())
+            FROM messages m,
+                 jsonb_array_elements_text(
+                     CASE WHEN jsonb_typeof(m.tags::jsonb) = 'array'
+                          THEN m.tags::jsonb ELSE '[]'::jsonb END
+                 ) AS t(tag)
+            WHERE length(t.tag) <= 100
+        """)
+    else:
+        op.execute("""
+            INSERT INTO message_tags (message_id, tag, user_id, created_at)
+            SELECT DISTINCT m.id, t.value, m.user_id, COALESCE(m.created_at, CURRENT_TIMESTAMP)
+            FROM messages m, json_each(m.tags) t
+            WHERE t.type = 'text' AND length(t.value) <= 100
+        """)
+
+    # Индексы — после заполнения, так быстрее
+    op.create_index('ix_message_tags_user_created', 'message_tags', ['user_id', 'created_at'])
+    op.create_index('ix_message_tags_tag_created', 'message_tags', ['tag', 'created_at'])
+
+
+def downgrade() -> None:
+    """Drop message_tags table."""
+    op.drop_index('ix_message_tags_tag_created', table_name='message_tags')
+    op.drop_index('ix_message_tags_user_created', table_name='message_tags')
+    op.drop_table('message_tags')
@@ -0,0 +1,57 @@
+"""add mood_daily table
+
+Revision ID: 20261016_add_mood_daily
+Revises: 20261016_add_message_tags
+Create Date: 2026-10-16 21:00:00.000000
+"""
+from typing import Union
+from alembic import op
+import sqlalchemy as sa
+
+revision = '20261016_add_mood_daily'
+down_revision = '20261016_add_message_tags'
+branch_labels: Union[str, None] = None
+depends_on: Union[str, None] = None
+
+
+def upgrade() -> None:
+    """Create mood_daily table (daily mood buckets per emotion) and backfill it from mood_entries."""
+    op.create_table(
+        'mood_daily',
+        sa.Column('user_id', sa.BigInteger(), sa.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('day', sa.Date(), primary_key=True),
+        sa.Column('emotion', sa.String(50), primary_key=True),
+        sa.Column('entries', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('score_sum', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('anxiety_sum', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('anxiety_entries', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('last_score', sa.Integer(), nullable=True),
+        sa.Column('last_entry_at', sa.DateTime(), nullable=True),
+    )
+
+    day = "created_at::date" if op.get_bind().dialect.name == 'postgresql' else "date(created_at)"
+    op.execute(f"""
+        INSERT INTO mood_daily (
+            user_id, day, emotion, entries, score_sum,
+            anxiety_sum, anxiety_entries, last_score, last_entry_at
+        )
+        SELECT user_id, day, primary_emotion, count(*), sum(mood_score),
+               sum(coalesce(anxiety_level, 0)), count(nullif(anxiety_level, 0)),
+               max(last_score), max(created_at)
+        FROM (
+            SELECT user_id, primary_emotion, mood_score, anxiety_level, created_at,
+                   {day} AS day,
+                   first_value(mood_score) OVER (
+                       PARTITION BY user_id, {day}, primary_emotion
+                       ORDER BY created_at DESC, id DESC
+                   ) AS last_score
+            FROM mood_entries
+            WHERE created_at IS NOT NULL
+        ) e
+        GROUP BY user_id, day, primary_emotion
+    """)
+
+
+def downgrade() -> None:
+    """Drop mood_daily table."""
+    op.drop_table('mood_daily')
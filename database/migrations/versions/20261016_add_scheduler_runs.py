@@ -0,0 +1,30 @@
+"""add scheduler_runs table
+
+Revision ID: 20261016_add_scheduler_runs
+Revises: 20261016_add_mood_daily
+Create Date: 2026-10-16 23:00:00.000000
+"""
+from typing import Union
+from alembic import op
+import sqlalchemy as sa
+
+revision = '20261016_add_scheduler_runs'
+down_revision = '20261016_add_mood_daily'
+branch_labels: Union[str, None] = None
+depends_on: Union[str, None] = None
+
+
+def upgrade() -> None:
+    """Create scheduler_runs table (one worker per job and slot)."""
+    op.create_table(
+        'scheduler_runs',
+        sa.Column('job', sa.String(50), primary_key=True),
+        sa.Column('slot', sa.DateTime(), primary_key=True),
+        sa.Column('worker', sa.String(100), nullable=False),
+        sa.Column('started_at', sa.DateTime(), server_default=sa.func.now()),
+    )
+
+
+def downgrade() -> None:
+    """Drop scheduler_runs table."""
+    op.drop_table('scheduler_runs')
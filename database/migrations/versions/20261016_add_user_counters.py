@@ -0,0 +1,49 @@
+"""add user counters tables
+
+Revision ID: 20261016_add_user_counters
+Revises: 20261016_add_user_style_stats
+Create Date: 2026-10-16 18:00:00.000000
+"""
+from typing import Union
+from alembic import op
+import sqlalchemy as sa
+
+revision = '20261016_add_user_counters'
+down_revision = '20261016_add_user_style_stats'
+branch_labels: Union[str, None] = None
+depends_on: Union[str, None] = None
+
+
+def upgrade() -> None:
+    """Create per-user message counters (totals, per-tag and per-day)."""
+    op.create_table(
+        'user_counters',
+        sa.Column('user_id', sa.BigInteger(), sa.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('total_messages', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('user_messages', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('voice_messages', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('photo_messages', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('crisis_messages', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('last_message_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), server_default=sa.func.now(), nullable=False),
+    )
+    op.create_table(
+        'user_tag_counters',
+        sa.Column('user_id', sa.BigInteger(), sa.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('tag', sa.String(100), primary_key=True),
+        sa.Column('count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('last_seen_at', sa.DateTime(), nullable=True),
+    )
+    op.create_table(
+        'user_daily_counters',
+        sa.Column('user_id', sa.BigInteger(), sa.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('day', sa.Date(), primary_key=True),
+        sa.Column('messages', sa.Integer(), nullable=False, server_default='0'),
+    )
+
+
+def downgrade() -> None:
+    """Drop per-user message counters."""
+    op.drop_table('user_daily_counters')
+    op.drop_table('user_tag_counters')
+    op.drop_table('user_counters')
@@ -0,0 +1,24 @@
+"""add style_stats to users
+
+Revision ID: 20261016_add_user_style_stats
+Revises: 20261016_add_broadcasts
+Create Date: 2026-10-16 16:00:00.000000
+"""
+from typing import Union
+from alembic import op
+import sqlalchemy as sa
+
+revision = '20261016_add_user_style_stats'
+down_revision = '20261016_add_broadcasts'
+branch_labels: Union[str, None] = None
+depends_on: Union[str, None] = None
+
+
+def upgrade() -> None:
+    """Add style_stats column (running communication style aggregates) to users table."""
+    op.add_column('users', sa.Column('style_stats', sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    """Remove style_stats column from users table."""
+    op.drop_column('users', 'style_stats')
@@ -4,7 +4,7 @@ SQLAlchemy Models.
 Поддерживает PostgreSQL и SQLite.
 """
 
-from datetime import datetime
+from datetime import date, datetime
 from typing import Optional, List
 from sqlalchemy import (
     Column,
@@ -96,6 +96,9 @@ class User(Base):
     #   "triggers": [],                                   # чувствительные темы
     #   "updated_at": "2024-12-14T..."                   # дата обновления
     # }
+    # Скользящие агрегаты по сообщениям пользователя, из которых выводится
+    # communication_style (см. StyleAnalyzer.observe)
+    style_stats: Mapped[Optional[dict]] = mapped_column(JSONB)
 
     # Предпочтения по контенту
     content_preferences: Mapped[Optional[dict]] = mapped_column(JSONB, default=dict)
@@ -227,6 +230,10 @@ class Message(Base):
     
     # Теги для поиска и аналитики
     tags: Mapped[Optional[list]] = mapped_column(JSONB, default=list)
+
+    # Ключ, выданный при постановке записи в очередь: повтор той же записи
+    # (коммит прошёл, но ответ потерялся) не создаёт второе сообщение
+    idempotency_key: Mapped[Optional[str]] = mapped_column(String(64))
     
     created_at: Mapped[datetime] = mapped_column(DateTime, default=func.now())
     
@@ -236,6 +243,7 @@ class Message(Base):
     # Индексы
     __table_args__ = (
         Index("idx_messages_user_created", "user_id", "created_at"),
+        Index("uq_messages_idempotency_key", "idempotency_key", unique=True),
         # GIN индекс для tags только в PostgreSQL, в SQLite не поддерживается
     )
     
@@ -243,6 +251,39 @@ class Message(Base):
         return f"<Message(id={self.id}, user_id={self.user_id}, role={self.role})>"
 
 
+class MessageTag(Base):
+    """
+    Тег сообщения — нормализованная копия Message.tags.
+    Индексы вместо разбора JSON: выборки по тегу за период
+    и недавние теги пользователя.
+    """
+
+    __tablename__ = "message_tags"
+
+    message_id: Mapped[int] = mapped_column(
+        Integer,
+        ForeignKey("messages.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    tag: Mapped[str] = mapped_column(String(100), primary_key=True)
+    # Денормализовано из messages — чтобы индексы обходились без JOIN
+    user_id: Mapped[int] = mapped_column(
+        BigInteger,
+        ForeignKey("users.id", ondelete="CASCADE"),
+        nullable=False,
+    )
+    created_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+
+    # Индексы
+    __table_args__ = (
+        Index("ix_message_tags_user_created", "user_id", "created_at"),
+        Index("ix_message_tags_tag_created", "tag", "created_at"),
+    )
+
+    def __repr__(self) -> str:
+        return f"<MessageTag(message_id={self.message_id}, tag={self.tag})>"
+
+
 class MemoryEntry(Base):
     """Модель долговременной памяти."""
     
@@ -402,6 +443,37 @@ class MoodEntry(Base):
         return f"<MoodEntry(id={self.id}, user_id={self.user_id}, mood={self.mood_score}, emotion={self.primary_emotion})>"
 
 
+class MoodDaily(Base):
+    """
+    Дневной агрегат настроения пользователя по основной эмоции.
+    Строки за день вместе — гистограмма эмоций, суммы — для средних.
+    Обновляется в MoodRepository.create.
+    """
+
+    __tablename__ = "mood_daily"
+
+    user_id: Mapped[int] = mapped_column(
+        BigInteger,
+        ForeignKey("users.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    emotion: Mapped[str] = mapped_column(String(50), primary_key=True)
+
+    entries: Mapped[int] = mapped_column(Integer, default=0)
+    score_sum: Mapped[int] = mapped_column(Integer, default=0)
+    # Тревожность учитывается только у записей, где она указана
+    anxiety_sum: Mapped[int] = mapped_column(Integer, default=0)
+    anxiety_entries: Mapped[int] = mapped_column(Integer, default=0)
+
+    # Последняя запись (для «последнего настроения»)
+    last_score: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    last_entry_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+
+    def __repr__(self) -> str:
+        return f"<MoodDaily(user_id={self.user_id}, day={self.day}, emotion={self.emotion}, entries={self.entries})>"
+
+
 class PromoCode(Base):
     """Модель промокода."""
 
@@ -1117,6 +1189,10 @@ class ApiCost(Base):
     output_tokens: Mapped[Optional[int]] = mapped_column(Integer)
     total_tokens: Mapped[Optional[int]] = mapped_column(Integer)
 
+    # Prompt caching (для Claude): input_tokens их не включает
+    cache_read_tokens: Mapped[Optional[int]] = mapped_column(Integer)
+    cache_write_tokens: Mapped[Optional[int]] = mapped_column(Integer)
+
     # Использование символов (для Yandex TTS)
     characters_count: Mapped[Optional[int]] = mapped_column(Integer)
 
@@ -1304,3 +1380,121 @@ class OnboardingEvent(Base):
 
     def __repr__(self) -> str:
         return f"<OnboardingEvent(id={self.id}, user_id={self.user_id}, event={self.event_name})>"
+
+
+class Broadcast(Base):
+    """
+    Массовая рассылка из админки.
+    Хранит прогресс, чтобы продолжить отправку после перезапуска.
+    """
+
+    __tablename__ = "broadcasts"
+
+    id: Mapped[str] = mapped_column(String(36), primary_key=True)  # task_id (uuid4)
+    message: Mapped[str] = mapped_column(Text, nullable=False)
+    target_group: Mapped[str] = mapped_column(String(50), nullable=False)
+    parse_mode: Mapped[Optional[str]] = mapped_column(String(20), default="Markdown")
+
+    # Статус: pending, running, completed, failed
+    status: Mapped[str] = mapped_column(String(20), default="pending", index=True)
+
+    # Прогресс
+    total: Mapped[int] = mapped_column(Integer, default=0)
+    sent: Mapped[int] = mapped_column(Integer, default=0)
+    failed: Mapped[int] = mapped_column(Integer, default=0)
+    blocked: Mapped[int] = mapped_column(Integer, default=0)  # бот заблокирован пользователем
+    # Все получатели с users.id <= last_user_id уже обработаны
+    last_user_id: Mapped[int] = mapped_column(BigInteger, default=0)
+    last_error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+
+    # Процесс, который сейчас отправляет рассылку, и его последний пульс:
+    # продолжить рассылку может только один процесс, и только если пульс устарел
+    owner: Mapped[Optional[str]] = mapped_column(String(100), nullable=True)
+    heartbeat_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+
+    created_by: Mapped[Optional[int]] = mapped_column(BigInteger, nullable=True)  # ID админа
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=func.now())
+    started_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    finished_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+
+    def __repr__(self) -> str:
+        return f"<Broadcast(id={self.id}, status={self.status}, sent={self.sent}/{self.total})>"
+
+
+class UserCounters(Base):
+    """
+    Счётчики сообщений пользователя.
+    Обновляются в той же транзакции, что и сохранение сообщения
+    (ConversationRepository.save_message) — вместо COUNT(*) по messages.
+    """
+
+    __tablename__ = "user_counters"
+
+    user_id: Mapped[int] = mapped_column(
+        BigInteger,
+        ForeignKey("users.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    total_messages: Mapped[int] = mapped_column(Integer, default=0)
+    user_messages: Mapped[int] = mapped_column(Integer, default=0)  # role='user'
+    voice_messages: Mapped[int] = mapped_column(Integer, default=0)  # message_type='voice'
+    photo_messages: Mapped[int] = mapped_column(Integer, default=0)  # фото от пользователя
+    crisis_messages: Mapped[int] = mapped_column(Integer, default=0)  # тег 'crisis'
+    last_message_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=func.now(), onupdate=func.now())
+
+    def __repr__(self) -> str:
+        return f"<UserCounters(user_id={self.user_id}, total={self.total_messages})>"
+
+
+class UserTagCounter(Base):
+    """Количество сообщений пользователя с тегом."""
+
+    __tablename__ = "user_tag_counters"
+
+    user_id: Mapped[int] = mapped_column(
+        BigInteger,
+        ForeignKey("users.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    tag: Mapped[str] = mapped_column(String(100), primary_key=True)
+    count: Mapped[int] = mapped_column(Integer, default=0)
+    last_seen_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+
+    def __repr__(self) -> str:
+        return f"<UserTagCounter(user_id={self.user_id}, tag={self.tag}, count={self.count})>"
+
+
+class UserDailyCounter(Base):
+    """Количество сообщений пользователя за день (для «за неделю» и числа сессий)."""
+
+    __tablename__ = "user_daily_counters"
+
+    user_id: Mapped[int] = mapped_column(
+        BigInteger,
+        ForeignKey("users.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    messages: Mapped[int] = mapped_column(Integer, default=0)
+
+    def __repr__(self) -> str:
+        return f"<UserDailyCounter(user_id={self.user_id}, day={self.day}, messages={self.messages})>"
+
+
+class SchedulerRun(Base):
+    """
+    Запуск общей задачи планировщика (поздравления, напоминания, очистка).
+    Первичный ключ (job, slot) — за один слот задачу выполняет один воркер.
+    """
+
+    __tablename__ = "scheduler_runs"
+
+    job: Mapped[str] = mapped_column(String(50), primary_key=True)
+    # Начало слота: день для ежедневных задач, час для ежечасных
+    slot: Mapped[datetime] = mapped_column(DateTime, primary_key=True)
+    worker: Mapped[str] = mapped_column(String(100), nullable=False)  # host:pid
+    started_at: Mapped[datetime] = mapped_column(DateTime, default=func.now())
+
+    def __repr__(self) -> str:
+        return f"<SchedulerRun(job={self.job}, slot={self.slot}, worker={self.worker})>"
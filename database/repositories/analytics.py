@@ -0,0 +1,212 @@
+"""
+Analytics repository.
+Агрегаты для графиков админки: каждый график — один GROUP BY
+по дням (date_trunc в PostgreSQL, date() в SQLite) вместо запросов
+на каждый день. Результаты кэшируются на ANALYTICS_CACHE_TTL секунд.
+"""
+
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import select, func, and_, case, literal_column
+
+from config.settings import settings
+from database.session import get_session_context, is_sqlite
+from database.models import User, Message, MessageTag, MoodEntry
+from utils.ttl_cache import ttl_cache
+
+
+def _cache_ttl() -> float:
+    return settings.ANALYTICS_CACHE_TTL
+
+
+def _day(column):
+    """Начало дня для GROUP BY."""
+    if is_sqlite:
+        return func.date(column)
+    # Литерал, а не параметр: иначе GROUP BY не совпадёт с выражением в SELECT
+    return func.date_trunc(literal_column("'day'"), column)
+
+
+def _as_date(value: Any) -> date:
+    """Ключ бакета -> date (SQLite возвращает строку, PostgreSQL — datetime)."""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, str):
+        return date.fromisoformat(value[:10])
+    return value
+
+
+def _count_if(condition):
+    """COUNT(*) FILTER (WHERE ...) в переносимом виде."""
+    return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+
+def day_range(days: int, today: Optional[date] = None) -> List[date]:
+    """Последние days дней по возрастанию, включая сегодня."""
+    today = today or date.today()
+    return [today - timedelta(days=i) for i in range(days - 1, -1, -1)]
+
+
+class AnalyticsRepository:
+    """Агрегированная аналитика для админки."""
+
+    @ttl_cache(_cache_ttl)
+    async def get_activity(self, days: int) -> Dict[str, Any]:
+        """
+        Активность по дням и ключевые метрики.
+
+        Returns:
+            {
+                'days': [(date, active_users, messages), ...],
+                'today_active', 'week_active', 'month_active', 'total_users',
+                'total_messages', 'text_messages', 'voice_messages',
+                'emotion_messages'
+            }
+        """
+        buckets = day_range(days)
+        start = datetime.combine(buckets[0], datetime.min.time())
+        today_start = datetime.combine(date.today(), datetime.min.time())
+
+        async with get_session_context() as session:
+            # Сообщения по дням
+            message_day = _day(Message.created_at)
+            result = await session.execute(
+                select(message_day, func.count(Message.id))
+                .where(Message.created_at >= start)
+                .group_by(message_day)
+            )
+            messages_by_day = {_as_date(day): count for day, count in result.all()}
+
+            # Пользователи по дню последней активности
+            active_day = _day(User.last_active_at)
+            result = await session.execute(
+                select(active_day, func.count(User.id))
+                .where(User.last_active_at >= start)
+                .group_by(active_day)
+            )
+            active_by_day = {_as_date(day): count for day, count in result.all()}
+
+            # Ключевые метрики пользователей — одним проходом
+            users = (await session.execute(
+                select(
+                    func.count(User.id),
+                    _count_if(User.last_active_at >= today_start),
+                    _count_if(User.last_active_at >= today_start - timedelta(days=7)),
+                    _count_if(User.last_active_at >= today_start - timedelta(days=30)),
+                )
+            )).one()
+
+            # Сообщения по типам + количество записей настроения
+            totals = (await session.execute(
+                select(
+                    func.count(Message.id),
+                    _count_if(Message.message_type == "text"),
+                    _count_if(Message.message_type == "voice"),
+                    select(func.count(MoodEntry.id)).scalar_subquery(),
+                )
+            )).one()
+
+        return {
+            "days": [
+                (day, active_by_day.get(day, 0), messages_by_day.get(day, 0))
+                for day in buckets
+            ],
+            "total_users": users[0] or 0,
+            "today_active": int(users[1]),
+            "week_active": int(users[2]),
+            "month_active": int(users[3]),
+            "total_messages": totals[0] or 0,
+            "text_messages": int(totals[1]),
+            "voice_messages": int(totals[2]),
+            "emotion_messages": totals[3] or 0,
+        }
+
+    @ttl_cache(_cache_ttl)
+    async def get_mood_by_day(self, days: int) -> List[Tuple[date, Optional[float], int]]:
+        """Средний mood_score и количество записей по дням: [(date, avg, count), ...]."""
+        buckets = day_range(days)
+        start = datetime.combine(buckets[0], datetime.min.time())
+
+        async with get_session_context() as session:
+            mood_day = _day(MoodEntry.created_at)
+            result = await session.execute(
+                select(mood_day, func.avg(MoodEntry.mood_score), func.count(MoodEntry.id))
+                .where(MoodEntry.created_at >= start)
+                .group_by(mood_day)
+            )
+            by_day = {_as_date(day): (avg, count) for day, avg, count in result.all()}
+
+        return [
+            (day, *(by_day.get(day) or (None, 0)))
+            for day in buckets
+        ]
+
+    @ttl_cache(_cache_ttl)
+    async def get_emotion_counts(self, days: int) -> List[Tuple[str, int]]:
+        """Количество записей по основной эмоции, по убыванию."""
+        cutoff = datetime.now() - timedelta(days=days)
+
+        async with get_session_context() as session:
+            result = await session.execute(
+                select(MoodEntry.primary_emotion, func.count(MoodEntry.id))
+                .where(MoodEntry.created_at >= cutoff)
+                .group_by(MoodEntry.primary_emotion)
+                .order_by(func.count(MoodEntry.id).desc())
+            )
+            return [(emotion, count) for emotion, count in result.all()]
+
+    @ttl_cache(_cache_ttl)
+    async def get_tag_counts(
+        self,
+        days: int,
+        tags: Optional[Sequence[str]] = None,
+        limit: Optional[int] = None,
+    ) -> List[Tuple[str, int]]:
+        """
+        Количество сообщений по тегам, по убыванию.
+
+        Args:
+            days: Период в днях
+            tags: Учитывать только эти теги (tuple — аргумент кэша)
+            limit: Топ-N тегов
+        """
+        cutoff = datetime.now() - timedelta(days=days)
+
+        conditions = [MessageTag.created_at >= cutoff]
+        if tags:
+            conditions.append(MessageTag.tag.in_(list(tags)))
+
+        count = func.count().label("count")
+        query = (
+            select(MessageTag.tag, count)
+            .where(and_(*conditions))
+            .group_by(MessageTag.tag)
+            .order_by(count.desc())
+        )
+        if limit:
+            query = query.limit(limit)
+
+        async with get_session_context() as session:
+            result = await session.execute(query)
+            return [(name, count) for name, count in result.all()]
+
+    @ttl_cache(_cache_ttl)
+    async def get_active_user_counts(self) -> Dict[str, int]:
+        """DAU / WAU / MAU по last_active_at одним запросом."""
+        now = datetime.now()
+
+        async with get_session_context() as session:
+            row = (await session.execute(
+                select(
+                    _count_if(User.last_active_at >= now - timedelta(days=1)),
+                    _count_if(User.last_active_at >= now - timedelta(days=7)),
+                    _count_if(User.last_active_at >= now - timedelta(days=30)),
+                )
+            )).one()
+
+        return {"dau": int(row[0]), "wau": int(row[1]), "mau": int(row[2])}
+
+
+# Глобальный экземпляр
+analytics_repo = AnalyticsRepository()
@@ -2,11 +2,54 @@
 Репозиторий для работы с расходами на API.
 """
 
-from typing import List, Optional, Dict, Tuple
+from typing import Any, List, Optional, Dict, Tuple
 from datetime import datetime, timedelta
-from sqlalchemy import select, func, and_, desc
+from sqlalchemy import select, func, and_, desc, insert
 from database.models import ApiCost, User
 from database.session import get_session_context
+from config.settings import settings
+from config.constants import CLAUDE_PRICES, CLAUDE_DEFAULT_PRICE_MODEL
+
+
+def get_claude_prices(model: Optional[str] = None) -> Dict[str, float]:
+    """
+    Цены модели Claude (USD за 1M токенов) из таблицы CLAUDE_PRICES.
+    Для неизвестной модели — цены CLAUDE_DEFAULT_PRICE_MODEL.
+    """
+    return CLAUDE_PRICES.get(model or CLAUDE_DEFAULT_PRICE_MODEL) or CLAUDE_PRICES[CLAUDE_DEFAULT_PRICE_MODEL]
+
+
+def calculate_claude_cost(
+    model: Optional[str],
+    input_tokens: int,
+    output_tokens: int,
+    cache_read_tokens: int = 0,
+    cache_write_tokens: int = 0,
+) -> float:
+    """Стоимость запроса к Claude в USD."""
+    prices = get_claude_prices(model)
+    cost = (
+        input_tokens * prices["input"]
+        + output_tokens * prices["output"]
+        + cache_write_tokens * prices["cache_write"]
+        + cache_read_tokens * prices["cache_read"]
+    )
+    return round(cost / 1_000_000, 6)
+
+
+def calculate_cache_savings(
+    cache_read_tokens: int,
+    cache_write_tokens: int,
+    model: Optional[str] = None,
+) -> float:
+    """
+    Экономия от prompt caching в USD относительно запросов без кэша.
+    Чтения дешевле обычного входа, записи — дороже (наценка вычитается).
+    """
+    prices = get_claude_prices(model)
+    saved = cache_read_tokens * (prices["input"] - prices["cache_read"])
+    overhead = cache_write_tokens * (prices["cache_write"] - prices["input"])
+    return round((saved - overhead) / 1_000_000, 6)
 
 
 class ApiCostRepository:
@@ -26,6 +69,8 @@ class ApiCostRepository:
         model: Optional[str] = None,
         message_id: Optional[int] = None,
         admin_user_id: Optional[int] = None,
+        cache_read_tokens: Optional[int] = None,
+        cache_write_tokens: Optional[int] = None,
     ) -> ApiCost:
         """
         Создать запись о расходе на API.
@@ -43,6 +88,8 @@ class ApiCostRepository:
             model: Модель API
             message_id: ID сообщения (опционально)
             admin_user_id: ID админа (опционально)
+            cache_read_tokens: Токены, прочитанные из кэша промпта (для Claude)
+            cache_write_tokens: Токены, записанные в кэш промпта (для Claude)
 
         Returns:
             Созданная запись ApiCost
@@ -61,12 +108,36 @@ class ApiCostRepository:
                 model=model,
                 message_id=message_id,
                 admin_user_id=admin_user_id,
+                cache_read_tokens=cache_read_tokens,
+                cache_write_tokens=cache_write_tokens,
             )
             session.add(api_cost)
             await session.commit()
             await session.refresh(api_cost)
             return api_cost
 
+    async def create_many(self, records: List[Dict[str, Any]]) -> int:
+        """
+        Вставить пачку записей о расходах одним multi-row INSERT.
+
+        Args:
+            records: Словари с полями ApiCost (как аргументы create)
+
+        Returns:
+            Количество вставленных записей
+        """
+        if not records:
+            return 0
+
+        # executemany требует одинаковый набор ключей во всех строках
+        columns = set().union(*records)
+        rows = [{column: record.get(column) for column in columns} for record in records]
+
+        async with get_session_context() as session:
+            await session.execute(insert(ApiCost), rows)
+            await session.commit()
+        return len(rows)
+
     async def get_total_cost_by_user(self, user_id: int) -> float:
         """
         Получить общие расходы на API для пользователя.
@@ -247,7 +318,10 @@ class ApiCostRepository:
                 'total_cost': float,
                 'total_tokens': int,
                 'by_provider': {provider: cost, ...},
-                'unique_users': int
+                'unique_users': int,
+                'cache_read_tokens': int,
+                'cache_write_tokens': int,
+                'cache_savings_usd': float
             }
         """
         async with get_session_context() as session:
@@ -261,7 +335,9 @@ class ApiCostRepository:
             query = select(
                 func.sum(ApiCost.cost_usd).label('total_cost'),
                 func.sum(ApiCost.total_tokens).label('total_tokens'),
-                func.count(func.distinct(ApiCost.user_id)).label('unique_users')
+                func.count(func.distinct(ApiCost.user_id)).label('unique_users'),
+                func.sum(ApiCost.cache_read_tokens).label('cache_read_tokens'),
+                func.sum(ApiCost.cache_write_tokens).label('cache_write_tokens'),
             )
 
             if conditions:
@@ -284,11 +360,19 @@ class ApiCostRepository:
             provider_result = await session.execute(provider_query)
             by_provider = {r.provider: float(r.total_cost) for r in provider_result}
 
+            cache_read = int(row.cache_read_tokens or 0)
+            cache_write = int(row.cache_write_tokens or 0)
+
             return {
                 'total_cost': float(row.total_cost) if row.total_cost else 0.0,
                 'total_tokens': int(row.total_tokens) if row.total_tokens else 0,
                 'by_provider': by_provider,
-                'unique_users': int(row.unique_users) if row.unique_users else 0
+                'unique_users': int(row.unique_users) if row.unique_users else 0,
+                'cache_read_tokens': cache_read,
+                'cache_write_tokens': cache_write,
+                'cache_savings_usd': calculate_cache_savings(
+                    cache_read, cache_write, settings.CLAUDE_MODEL
+                ),
             }
 
     async def get_top_users_by_cost(
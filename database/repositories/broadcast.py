@@ -0,0 +1,155 @@
+"""
+Broadcast repository.
+Прогресс массовых рассылок из админки.
+
+Рассылку отправляет один процесс — владелец (owner). Он обновляет
+heartbeat_at при каждом сохранении прогресса; другой процесс может
+захватить рассылку (claim), только если владельца нет или пульс устарел.
+"""
+
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import select, update, or_
+
+from database.session import get_session_context
+from database.models import Broadcast
+
+
+class BroadcastRepository:
+    """Репозиторий для работы с рассылками."""
+
+    async def create(
+        self,
+        broadcast_id: str,
+        message: str,
+        target_group: str,
+        total: int,
+        parse_mode: Optional[str] = "Markdown",
+        created_by: Optional[int] = None,
+        owner: Optional[str] = None,
+    ) -> Broadcast:
+        """Создать рассылку в статусе pending (сразу за владельцем owner)."""
+        async with get_session_context() as session:
+            broadcast = Broadcast(
+                id=broadcast_id,
+                message=message,
+                target_group=target_group,
+                parse_mode=parse_mode,
+                status="pending",
+                total=total,
+                created_by=created_by,
+                owner=owner,
+                heartbeat_at=datetime.now() if owner else None,
+            )
+            session.add(broadcast)
+            await session.commit()
+            await session.refresh(broadcast)
+            return broadcast
+
+    async def get(self, broadcast_id: str) -> Optional[Broadcast]:
+        """Получить рассылку по ID."""
+        async with get_session_context() as session:
+            result = await session.execute(
+                select(Broadcast).where(Broadcast.id == broadcast_id)
+            )
+            return result.scalar_one_or_none()
+
+    async def get_unfinished(self) -> List[Broadcast]:
+        """Рассылки, прерванные перезапуском (pending/running)."""
+        async with get_session_context() as session:
+            result = await session.execute(
+                select(Broadcast)
+                .where(Broadcast.status.in_(("pending", "running")))
+                .order_by(Broadcast.created_at)
+            )
+            return list(result.scalars().all())
+
+    async def claim(self, broadcast_id: str, owner: str, stale_before: datetime) -> bool:
+        """
+        Захватить незавершённую рассылку для продолжения.
+        Условный UPDATE: строку получит только один процесс, и только
+        если у неё нет владельца или его пульс старше stale_before.
+
+        Returns:
+            True, если рассылка досталась owner
+        """
+        async with get_session_context() as session:
+            result = await session.execute(
+                update(Broadcast)
+                .where(
+                    Broadcast.id == broadcast_id,
+                    Broadcast.status.in_(("pending", "running")),
+                    or_(
+                        Broadcast.owner.is_(None),
+                        Broadcast.heartbeat_at.is_(None),
+                        Broadcast.heartbeat_at < stale_before,
+                    ),
+                )
+                .values(owner=owner, heartbeat_at=datetime.now())
+            )
+            await session.commit()
+            return result.rowcount == 1
+
+    async def mark_running(self, broadcast_id: str) -> None:
+        """Отметить начало (или продолжение) отправки."""
+        async with get_session_context() as session:
+            await session.execute(
+                update(Broadcast)
+                .where(Broadcast.id == broadcast_id)
+                .values(status="running", started_at=datetime.now())
+            )
+            await session.commit()
+
+    async def save_progress(
+        self,
+        broadcast_id: str,
+        sent: int,
+        failed: int,
+        blocked: int,
+        last_user_id: int,
+        last_error: Optional[str] = None,
+        status: Optional[str] = None,
+        owner: Optional[str] = None,
+        release: bool = False,
+    ) -> bool:
+        """
+        Сохранить прогресс рассылки одним UPDATE.
+        Если передан конечный status, проставляется finished_at.
+
+        Args:
+            owner: Сохранять, только пока рассылка за этим владельцем
+                (заодно обновляется пульс)
+            release: Снять владельца (остановка или конец рассылки)
+
+        Returns:
+            False, если рассылку уже захватил другой процесс
+        """
+        values = {
+            "sent": sent,
+            "failed": failed,
+            "blocked": blocked,
+            "last_user_id": last_user_id,
+        }
+        if last_error:
+            values["last_error"] = last_error[:1000]
+        if status:
+            values["status"] = status
+            if status in ("completed", "failed"):
+                values["finished_at"] = datetime.now()
+
+        query = update(Broadcast).where(Broadcast.id == broadcast_id)
+        if owner is not None:
+            query = query.where(Broadcast.owner == owner)
+            values["heartbeat_at"] = datetime.now()
+        if release:
+            values["owner"] = None
+
+        async with get_session_context() as session:
+            result = await session.execute(query.values(**values))
+            await session.commit()
+            return result.rowcount == 1
+
+
+# Глобальный экземпляр
+broadcast_repo = BroadcastRepository()
@@ -3,13 +3,23 @@ Conversation repository.
 CRUD операции для сообщений и истории диалогов.
 """
 
+import uuid
 from datetime import datetime
-from typing import Optional, List, Tuple
+from typing import Optional, List, Tuple, Any, AsyncGenerator
 from sqlalchemy import select, func, and_, desc
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from database.session import get_session_context
-from database.models import Message
+from database.session import get_session_context, dialect_insert
+from database.history_summary_cache import history_summary_cache
+from database.context_cache import context_cache, SECTION_RECENT_TOPICS
+from database.models import Message, MessageTag
+from database.repositories.counters import counters_repo
+from database.repositories.message_tag import message_tag_repo
+
+
+def new_message_key() -> str:
+    """Ключ идемпотентной записи сообщения (см. save_message)."""
+    return uuid.uuid4().hex
 
 
 class ConversationRepository:
@@ -24,23 +34,52 @@ class ConversationRepository:
         tokens_used: Optional[int] = None,
         response_time_ms: Optional[int] = None,
         message_type: str = "text",
+        idempotency_key: Optional[str] = None,
     ) -> Message:
-        """Сохранить сообщение."""
+        """
+        Сохранить сообщение.
+
+        Args:
+            idempotency_key: Ключ записи (new_message_key()), выданный до
+                первой попытки. Фоновая задача повторяет запись с тем же
+                ключом: если коммит прошёл, а ответ потерялся, повтор вернёт
+                уже сохранённое сообщение и не посчитает его второй раз.
+        """
+        key = idempotency_key or new_message_key()
         async with get_session_context() as session:
-            message = Message(
-                user_id=user_id,
-                role=role,
-                content=content,
-                tags=tags or [],
-                tokens_used=tokens_used,
-                response_time_ms=response_time_ms,
-                message_type=message_type,
+            stmt = (
+                dialect_insert(Message)
+                .values(
+                    user_id=user_id,
+                    role=role,
+                    content=content,
+                    tags=tags or [],
+                    tokens_used=tokens_used,
+                    response_time_ms=response_time_ms,
+                    message_type=message_type,
+                    idempotency_key=key,
+                )
+                .on_conflict_do_nothing(index_elements=[Message.idempotency_key])
+                .returning(Message)
             )
-            session.add(message)
+            message = (await session.execute(stmt)).scalar_one_or_none()
+            if message is None:
+                # Повтор уже сохранённой записи
+                await session.rollback()
+                result = await session.execute(
+                    select(Message).where(Message.idempotency_key == key)
+                )
+                return result.scalar_one()
+
+            # Теги и счётчики — в той же транзакции, что и сообщение
+            await message_tag_repo.add(session, message)
+            await counters_repo.record_message(session, user_id, role, message_type, tags)
             await session.commit()
             await session.refresh(message)
-            
-            return message
+
+        if any(isinstance(tag, str) and tag.startswith("topic:") for tag in tags or []):
+            await context_cache.invalidate(user_id, SECTION_RECENT_TOPICS)
+        return message
     
     async def get_recent(
         self,
@@ -114,6 +153,10 @@ class ConversationRepository:
     
     async def count_by_user(self, user_id: int) -> int:
         """Общее количество сообщений пользователя."""
+        counters = await counters_repo.get(user_id)
+        if counters is not None:
+            return counters.total_messages
+
         async with get_session_context() as session:
             result = await session.execute(
                 select(func.count(Message.id)).where(Message.user_id == user_id)
@@ -121,7 +164,13 @@ class ConversationRepository:
             return result.scalar() or 0
 
     async def count_by_user_since(self, user_id: int, since: datetime) -> int:
-        """Количество сообщений пользователя с определённой даты."""
+        """
+        Количество сообщений пользователя с определённой даты.
+        По дневным счётчикам — с точностью до дня.
+        """
+        if await counters_repo.get(user_id) is not None:
+            return await counters_repo.count_since(user_id, since)
+
         async with get_session_context() as session:
             result = await session.execute(
                 select(func.count(Message.id)).where(
@@ -135,6 +184,10 @@ class ConversationRepository:
 
     async def count_user_messages(self, user_id: int) -> int:
         """Количество сообщений от пользователя (только role='user')."""
+        counters = await counters_repo.get(user_id)
+        if counters is not None:
+            return counters.user_messages
+
         async with get_session_context() as session:
             result = await session.execute(
                 select(func.count(Message.id)).where(
@@ -148,6 +201,11 @@ class ConversationRepository:
 
     async def count_by_user_and_type(self, user_id: int, message_type: str) -> int:
         """Количество сообщений пользователя определённого типа (voice, photo, etc)."""
+        if message_type == "voice":
+            counters = await counters_repo.get(user_id)
+            if counters is not None:
+                return counters.voice_messages
+
         async with get_session_context() as session:
             result = await session.execute(
                 select(func.count(Message.id)).where(
@@ -163,6 +221,9 @@ class ConversationRepository:
         """
         Количество сессий (дней с активностью).
         """
+        if await counters_repo.get(user_id) is not None:
+            return await counters_repo.count_days(user_id)
+
         async with get_session_context() as session:
             result = await session.execute(
                 select(func.count(func.distinct(func.date(Message.created_at)))).where(
@@ -181,43 +242,35 @@ class ConversationRepository:
         
         return round(total_messages / total_sessions, 2)
     
-    async def get_top_tags(self, user_id: int, limit: int = 5) -> List[dict]:
-        """Топ тегов пользователя."""
-        # TODO: Реализовать для SQLite (jsonb_array_elements_text только в PostgreSQL)
-        # Для SQLite временно возвращаем пустой список
-        from config.settings import settings
-        if settings.DATABASE_URL.startswith("sqlite"):
-            return []
+    async def get_top_tags(
+        self,
+        user_id: int,
+        limit: int = 5,
+        prefix: Optional[str] = None,
+        since: Optional[datetime] = None,
+    ) -> List[dict]:
+        """
+        Топ тегов пользователя.
 
-        async with get_session_context() as session:
-            from sqlalchemy import text
-            # PostgreSQL специфичный запрос для работы с JSONB массивами
-            result = await session.execute(
-                text("""
-                SELECT tag, COUNT(*) as count
-                FROM messages, jsonb_array_elements_text(tags) as tag
-                WHERE user_id = :user_id
-                GROUP BY tag
-                ORDER BY count DESC
-                LIMIT :limit
-                """),
-                {"user_id": user_id, "limit": limit}
-            )
+        Args:
+            user_id: ID пользователя
+            limit: Топ-N тегов
+            prefix: Только теги с префиксом (например 'topic:')
+            since: Только сообщения начиная с since (окно недавних тем)
+        """
+        # За всю историю — готовые счётчики, за окно — индекс message_tags
+        if since is None and await counters_repo.get(user_id) is not None:
+            return await counters_repo.get_top_tags(user_id, limit=limit, prefix=prefix)
+
+        return await message_tag_repo.get_top_tags(user_id, since=since, prefix=prefix, limit=limit)
 
-            return [{"tag": row[0], "count": row[1]} for row in result.fetchall()]
-    
     async def count_crisis_episodes(self, user_id: int) -> int:
         """Количество кризисных эпизодов."""
-        async with get_session_context() as session:
-            result = await session.execute(
-                select(func.count(Message.id)).where(
-                    and_(
-                        Message.user_id == user_id,
-                        Message.tags.contains(["crisis"])
-                    )
-                )
-            )
-            return result.scalar() or 0
+        counters = await counters_repo.get(user_id)
+        if counters is not None:
+            return counters.crisis_messages
+
+        return await message_tag_repo.count_with_tag("crisis", user_id=user_id)
     
     async def get_messages_count_since(self, since: datetime) -> int:
         """Количество сообщений с определённой даты."""
@@ -235,20 +288,51 @@ class ConversationRepository:
         limit: int = 100,
         since: Optional[datetime] = None,
     ) -> List[Message]:
-        """Получить сообщения с определённым тегом."""
+        """Получить сообщения с определённым тегом (по индексу message_tags)."""
         async with get_session_context() as session:
-            query = select(Message).where(
-                Message.tags.contains([tag])
+            query = (
+                select(Message)
+                .join(MessageTag, MessageTag.message_id == Message.id)
+                .where(MessageTag.tag == tag)
             )
             
             if since:
-                query = query.where(Message.created_at >= since)
+                query = query.where(MessageTag.created_at >= since)
             
-            query = query.order_by(Message.created_at.desc()).limit(limit)
+            query = query.order_by(MessageTag.created_at.desc()).limit(limit)
             
             result = await session.execute(query)
             return list(result.scalars().all())
     
+    async def stream_history(
+        self,
+        user_id: int,
+        chunk_size: int = 1000,
+    ) -> AsyncGenerator[List[Any], None]:
+        """
+        Вся история пользователя в хронологическом порядке, пачками.
+        Строки читаются серверным курсором (yield_per) — память не зависит
+        от длины истории. Соединение занято, пока вызывающий код читает.
+
+        Yields:
+            Списки строк (created_at, role, content, message_type, tags)
+        """
+        async with get_session_context() as session:
+            result = await session.stream(
+                select(
+                    Message.created_at,
+                    Message.role,
+                    Message.content,
+                    Message.message_type,
+                    Message.tags,
+                )
+                .where(Message.user_id == user_id)
+                .order_by(Message.created_at.asc(), Message.id.asc())
+                .execution_options(yield_per=chunk_size)
+            )
+            async for partition in result.partitions():
+                yield partition
+
     async def get_user_message_stats(
         self,
         user_id: int,
@@ -345,7 +429,8 @@ class ConversationRepository:
             if not keep_ids:
                 return 0
             
-            # Удаляем остальные
+            # Удаляем остальные (сначала их теги)
+            await message_tag_repo.delete_for_user(session, user_id, keep_message_ids=keep_ids)
             delete_query = (
                 Message.__table__.delete()
                 .where(
@@ -357,9 +442,12 @@ class ConversationRepository:
             )
             
             result = await session.execute(delete_query)
+            await counters_repo.rebuild(session, [user_id])
             await session.commit()
 
-            return result.rowcount
+        # Резюме могло описывать удалённые сообщения
+        await history_summary_cache.invalidate(user_id)
+        return result.rowcount
 
     async def delete_all_user_conversations(self, user_id: int) -> int:
         """
@@ -374,12 +462,15 @@ class ConversationRepository:
         async with get_session_context() as session:
             from sqlalchemy import delete
 
+            await message_tag_repo.delete_for_user(session, user_id)
             delete_query = (
                 Message.__table__.delete()
                 .where(Message.user_id == user_id)
             )
 
             result = await session.execute(delete_query)
+            await counters_repo.delete_for_user(session, user_id)
             await session.commit()
 
-            return result.rowcount
+        await history_summary_cache.invalidate(user_id)
+        return result.rowcount
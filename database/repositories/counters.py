@@ -0,0 +1,342 @@
+"""
+Counters repository.
+Счётчики сообщений по пользователям: итоги, теги и дни.
+Обновляются инкрементально в транзакции ConversationRepository.save_message
+и читаются одним запросом по первичному ключу вместо COUNT(*) по messages.
+Ночной reconcile() пересчитывает их по истории и исправляет расхождения.
+"""
+
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence
+
+from sqlalchemy import select, func, update, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.session import get_session_context, dialect_insert
+from database.models import User, Message, UserCounters, UserTagCounter, UserDailyCounter
+from database.repositories.message_tag import clean_tags
+
+
+TOTAL_FIELDS = (
+    "total_messages",
+    "user_messages",
+    "voice_messages",
+    "photo_messages",
+    "crisis_messages",
+)
+
+RECONCILE_CHUNK_USERS = 500
+# Пользователей в одной транзакции исправления (счётчики заблокированы)
+RECONCILE_REPAIR_USERS = 20
+HISTORY_CHUNK_ROWS = 5000
+
+
+def classify_message(role: str, message_type: Optional[str], tags: Sequence[str]) -> Dict[str, int]:
+    """
+    Вклад одного сообщения в итоговые счётчики.
+    Общая логика для записи и для пересчёта — иначе reconcile
+    находил бы «расхождения» там, где их нет.
+    """
+    is_user = role == "user"
+    return {
+        "total_messages": 1,
+        "user_messages": int(is_user),
+        "voice_messages": int(message_type == "voice"),
+        # Фото сохраняются как текст с тегом 'photo'
+        "photo_messages": int(is_user and (message_type == "photo" or "photo" in tags)),
+        "crisis_messages": int("crisis" in tags),
+    }
+
+
+@dataclass
+class _Tally:
+    """Счётчики одного пользователя; время последнего сообщения в сравнении не участвует."""
+
+    totals: Dict[str, int] = field(default_factory=lambda: dict.fromkeys(TOTAL_FIELDS, 0))
+    tags: Counter = field(default_factory=Counter)
+    days: Counter = field(default_factory=Counter)
+    last_message_at: Optional[datetime] = field(default=None, compare=False)
+    tag_seen: Dict[str, datetime] = field(default_factory=dict, compare=False)
+
+    def add(self, role: str, message_type: Optional[str], tags: List[str], created_at: datetime) -> None:
+        for name, value in classify_message(role, message_type, tags).items():
+            self.totals[name] += value
+        for tag in set(tags):
+            self.tags[tag] += 1
+            self.tag_seen[tag] = max(self.tag_seen.get(tag, created_at), created_at)
+        self.days[created_at.date()] += 1
+        if self.last_message_at is None or created_at > self.last_message_at:
+            self.last_message_at = created_at
+
+
+class CountersRepository:
+    """Репозиторий счётчиков сообщений."""
+
+    async def record_message(
+        self,
+        session: AsyncSession,
+        user_id: int,
+        role: str,
+        message_type: Optional[str],
+        tags: Optional[List[str]],
+    ) -> None:
+        """
+        Учесть новое сообщение. Вызывается в транзакции сохранения
+        сообщения (после flush), коммит — на стороне вызывающего кода.
+        """
+        tags = clean_tags(tags)
+        delta = classify_message(role, message_type, tags)
+
+        result = await session.execute(
+            update(UserCounters)
+            .where(UserCounters.user_id == user_id)
+            .values(
+                last_message_at=func.now(),
+                updated_at=func.now(),
+                **{
+                    name: getattr(UserCounters, name) + value
+                    for name, value in delta.items()
+                    if value
+                },
+            )
+        )
+        if result.rowcount == 0:
+            # Счётчиков ещё нет (история до их появления) — считаем по истории,
+            # новое сообщение уже в ней
+            await self.rebuild(session, [user_id])
+            return
+
+        # Счётчик тега — число сообщений с ним (как в message_tags)
+        if tags:
+            stmt = dialect_insert(UserTagCounter).values([
+                {"user_id": user_id, "tag": tag, "count": 1, "last_seen_at": func.now()}
+                for tag in sorted(set(tags))
+            ])
+            await session.execute(stmt.on_conflict_do_update(
+                index_elements=[UserTagCounter.user_id, UserTagCounter.tag],
+                set_={
+                    "count": UserTagCounter.count + stmt.excluded.count,
+                    "last_seen_at": stmt.excluded.last_seen_at,
+                },
+            ))
+
+        # CURRENT_DATE и now() считаются в одной зоне с Message.created_at
+        stmt = dialect_insert(UserDailyCounter).values(user_id=user_id, day=func.current_date(), messages=1)
+        await session.execute(stmt.on_conflict_do_update(
+            index_elements=[UserDailyCounter.user_id, UserDailyCounter.day],
+            set_={"messages": UserDailyCounter.messages + 1},
+        ))
+
+    async def get(self, user_id: int) -> Optional[UserCounters]:
+        """Итоговые счётчики пользователя (None — ещё не заведены)."""
+        async with get_session_context() as session:
+            return await session.get(UserCounters, user_id)
+
+    async def count_since(self, user_id: int, since: datetime) -> int:
+        """Количество сообщений начиная с дня since (с точностью до дня)."""
+        async with get_session_context() as session:
+            result = await session.execute(
+                select(func.coalesce(func.sum(UserDailyCounter.messages), 0)).where(
+                    UserDailyCounter.user_id == user_id,
+                    UserDailyCounter.day >= since.date(),
+                )
+            )
+            return int(result.scalar() or 0)
+
+    async def count_days(self, user_id: int) -> int:
+        """Количество дней с сообщениями."""
+        async with get_session_context() as session:
+            result = await session.execute(
+                select(func.count()).where(UserDailyCounter.user_id == user_id)
+            )
+            return result.scalar() or 0
+
+    async def get_top_tags(
+        self,
+        user_id: int,
+        limit: int = 5,
+        prefix: Optional[str] = None,
+    ) -> List[dict]:
+        """Самые частые теги пользователя (только с префиксом prefix, если задан)."""
+        conditions = [UserTagCounter.user_id == user_id, UserTagCounter.count > 0]
+        if prefix:
+            conditions.append(UserTagCounter.tag.startswith(prefix, autoescape=True))
+
+        async with get_session_context() as session:
+            result = await session.execute(
+                select(UserTagCounter.tag, UserTagCounter.count)
+                .where(*conditions)
+                .order_by(UserTagCounter.count.desc(), UserTagCounter.tag)
+                .limit(limit)
+            )
+            return [{"tag": tag, "count": count} for tag, count in result.all()]
+
+    async def delete_for_user(self, session: AsyncSession, user_id: int) -> None:
+        """Удалить счётчики пользователя (в транзакции вызывающего кода)."""
+        await self._delete(session, [user_id])
+
+    async def rebuild(self, session: AsyncSession, user_ids: Sequence[int]) -> None:
+        """Пересчитать счётчики пользователей по истории сообщений."""
+        await self._lock(session, user_ids)
+        tallies = await self._collect(session, user_ids)
+        await self._delete(session, user_ids)
+        await self._write(session, tallies)
+
+    async def reconcile(self, chunk_size: int = RECONCILE_CHUNK_USERS) -> int:
+        """
+        Сверить счётчики с историей и переписать расходящиеся.
+        Идёт по пользователям пачками (keyset по users.id) и сравнивает
+        без блокировок. Расходящихся пересчитывает заново через rebuild
+        небольшими пачками по RECONCILE_REPAIR_USERS, каждая — в своей
+        короткой транзакции под блокировкой: параллельный record_message
+        ждёт записи и прибавляет своё сообщение к исправленным значениям,
+        а горячий путь не стоит за всей пачкой сверки. Заодно заполняет
+        счётчики для истории, накопленной до их появления.
+
+        Returns:
+            Количество пользователей, чьи счётчики были исправлены
+        """
+        repaired = 0
+        last_id = 0
+
+        while True:
+            async with get_session_context() as session:
+                result = await session.execute(
+                    select(User.id)
+                    .where(User.id > last_id)
+                    .order_by(User.id)
+                    .limit(chunk_size)
+                )
+                user_ids = list(result.scalars())
+                if not user_ids:
+                    break
+                last_id = user_ids[-1]
+
+                expected = await self._collect(session, user_ids)
+                actual = await self._load(session, user_ids)
+                drifted = [uid for uid in user_ids if expected.get(uid) != actual.get(uid)]
+
+            # Сравнение без блокировок могло попасть между записью сообщения
+            # и чтением счётчиков — rebuild под блокировкой считает заново
+            for start in range(0, len(drifted), RECONCILE_REPAIR_USERS):
+                part = drifted[start:start + RECONCILE_REPAIR_USERS]
+                async with get_session_context() as session:
+                    await self.rebuild(session, part)
+                    await session.commit()
+                repaired += len(part)
+
+        return repaired
+
+    async def _lock(self, session: AsyncSession, user_ids: Sequence[int]) -> None:
+        """
+        Заблокировать счётчики пользователей до конца транзакции (FOR UPDATE).
+        История читается уже после блокировки: сообщения, закоммиченные
+        раньше, в ней есть, а record_message остальных ждёт на UPDATE.
+        У кого счётчиков ещё нет, блокируется строка users — её же берёт
+        rebuild из record_message, заводя счётчики.
+        """
+        result = await session.execute(
+            select(UserCounters.user_id)
+            .where(UserCounters.user_id.in_(user_ids))
+            .order_by(UserCounters.user_id)
+            .with_for_update()
+        )
+        existing = set(result.scalars())
+        missing = [user_id for user_id in user_ids if user_id not in existing]
+        if missing:
+            await session.execute(
+                select(User.id)
+                .where(User.id.in_(missing))
+                .order_by(User.id)
+                .with_for_update()
+            )
+
+    async def _collect(self, session: AsyncSession, user_ids: Sequence[int]) -> Dict[int, _Tally]:
+        """Счётчики по истории сообщений (серверный курсор, без загрузки текстов)."""
+        tallies: Dict[int, _Tally] = {}
+        result = await session.stream(
+            select(Message.user_id, Message.role, Message.message_type, Message.tags, Message.created_at)
+            .where(Message.user_id.in_(user_ids))
+            .execution_options(yield_per=HISTORY_CHUNK_ROWS)
+        )
+        async for partition in result.partitions():
+            for user_id, role, message_type, tags, created_at in partition:
+                tally = tallies.setdefault(user_id, _Tally())
+                tally.add(role, message_type, clean_tags(tags), created_at)
+        return tallies
+
+    async def _load(self, session: AsyncSession, user_ids: Sequence[int]) -> Dict[int, _Tally]:
+        """Текущие счётчики из таблиц."""
+        tallies: Dict[int, _Tally] = {}
+
+        result = await session.execute(
+            select(UserCounters).where(UserCounters.user_id.in_(user_ids))
+        )
+        for row in result.scalars():
+            tallies[row.user_id] = _Tally(
+                totals={name: getattr(row, name) for name in TOTAL_FIELDS},
+                last_message_at=row.last_message_at,
+            )
+
+        result = await session.execute(
+            select(UserTagCounter.user_id, UserTagCounter.tag, UserTagCounter.count)
+            .where(UserTagCounter.user_id.in_(user_ids))
+        )
+        for user_id, tag, count in result.all():
+            if count:
+                tallies.setdefault(user_id, _Tally()).tags[tag] = count
+
+        result = await session.execute(
+            select(UserDailyCounter.user_id, UserDailyCounter.day, UserDailyCounter.messages)
+            .where(UserDailyCounter.user_id.in_(user_ids))
+        )
+        for user_id, day, messages in result.all():
+            if messages:
+                tallies.setdefault(user_id, _Tally()).days[day] = messages
+
+        return tallies
+
+    async def _delete(self, session: AsyncSession, user_ids: Sequence[int]) -> None:
+        for model in (UserCounters, UserTagCounter, UserDailyCounter):
+            await session.execute(delete(model).where(model.user_id.in_(user_ids)))
+
+    async def _write(self, session: AsyncSession, tallies: Dict[int, _Tally]) -> None:
+        """
+        Записать пересчитанные счётчики. Upsert с заменой значений:
+        параллельный record_message мог успеть завести строку.
+        """
+        counters = [
+            {"user_id": user_id, "last_message_at": tally.last_message_at, **tally.totals}
+            for user_id, tally in tallies.items()
+        ]
+        tags = [
+            {"user_id": user_id, "tag": tag, "count": count, "last_seen_at": tally.tag_seen.get(tag)}
+            for user_id, tally in tallies.items()
+            for tag, count in tally.tags.items()
+        ]
+        days = [
+            {"user_id": user_id, "day": day, "messages": messages}
+            for user_id, tally in tallies.items()
+            for day, messages in tally.days.items()
+        ]
+
+        await self._replace(session, UserCounters, [UserCounters.user_id], counters)
+        await self._replace(session, UserTagCounter, [UserTagCounter.user_id, UserTagCounter.tag], tags)
+        await self._replace(session, UserDailyCounter, [UserDailyCounter.user_id, UserDailyCounter.day], days)
+
+    async def _replace(self, session: AsyncSession, model, keys: List[Any], rows: List[dict]) -> None:
+        if not rows:
+            return
+        stmt = dialect_insert(model)
+        key_names = {key.key for key in keys}
+        stmt = stmt.on_conflict_do_update(
+            index_elements=keys,
+            set_={name: stmt.excluded[name] for name in rows[0] if name not in key_names},
+        )
+        await session.execute(stmt, rows)
+
+
+# Глобальный экземпляр
+counters_repo = CountersRepository()
@@ -5,10 +5,11 @@
 from datetime import datetime, timedelta
 from typing import Optional, List
 
-from sqlalchemy import select, and_, or_
+from sqlalchemy import select, and_, or_, update
 from loguru import logger
 
 from database.session import get_session_context
+from database.leases import claim_due, lease_until
 from database.models import UserFollowUp
 
 
@@ -116,20 +117,42 @@ class FollowUpRepository:
             Список follow-ups готовых к отправке
         """
         async with get_session_context() as session:
-            now = datetime.utcnow()
+            result = await session.execute(self._due_query(datetime.utcnow(), limit))
+            return list(result.scalars().all())
 
-            query = select(UserFollowUp).where(
-                and_(
-                    UserFollowUp.status == "pending",
-                    UserFollowUp.followup_date <= now,
-                )
-            ).order_by(UserFollowUp.priority.desc(), UserFollowUp.followup_date.asc())
+    async def claim_followups_due(
+        self,
+        limit: Optional[int] = None,
+    ) -> List[UserFollowUp]:
+        """
+        Захватывает follow-ups, у которых пришло время (см. database.leases).
+        followup_date захваченных сдвигается на срок аренды.
 
-            if limit:
-                query = query.limit(limit)
+        Args:
+            limit: Максимальное количество
 
-            result = await session.execute(query)
-            return list(result.scalars().all())
+        Returns:
+            Список follow-ups, которые отправляет этот воркер
+        """
+        now = datetime.utcnow()
+        return await claim_due(
+            self._due_query(now, limit),
+            UserFollowUp.followup_date,
+            lease_until(now),
+        )
+
+    @staticmethod
+    def _due_query(now: datetime, limit: Optional[int]):
+        query = select(UserFollowUp).where(
+            and_(
+                UserFollowUp.status == "pending",
+                UserFollowUp.followup_date <= now,
+            )
+        ).order_by(UserFollowUp.priority.desc(), UserFollowUp.followup_date.asc())
+
+        if limit:
+            query = query.limit(limit)
+        return query
 
     async def get_by_date_range(
         self,
@@ -179,6 +202,30 @@ class FollowUpRepository:
             logger.info(f"Marked follow-up {followup_id} as asked")
             return followup
 
+    async def mark_as_asked_many(self, followups: List[UserFollowUp]) -> int:
+        """
+        Отмечает пачку follow-ups как "задан вопрос" одним UPDATE.
+
+        Args:
+            followups: Follow-ups, по которым вопрос отправлен
+
+        Returns:
+            Количество обновлённых записей
+        """
+        if not followups:
+            return 0
+
+        async with get_session_context() as session:
+            result = await session.execute(
+                update(UserFollowUp)
+                .where(UserFollowUp.id.in_([followup.id for followup in followups]))
+                .values(status="asked", asked_at=datetime.utcnow())
+            )
+            await session.commit()
+
+        logger.info(f"Marked {result.rowcount} follow-ups as asked")
+        return result.rowcount
+
     async def mark_as_completed(
         self,
         followup_id: int,
@@ -5,11 +5,24 @@ CRUD операции для целей пользователя.
 
 from datetime import datetime, timedelta
 from typing import Optional, List, Dict, Any
+import pytz
 from sqlalchemy import select, and_, or_, desc
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from config.settings import settings
 from database.session import get_session_context
-from database.models import UserGoal
+from database.leases import claim_due, lease_until
+from database.models import User, UserGoal
+from database.context_cache import context_cache, SECTION_ACTIVE_GOALS
+from utils.fire_time import next_fire_time
+
+
+# Частота напоминаний -> дней до следующего check-in
+CHECKIN_INTERVAL_DAYS = {
+    "daily": 1,
+    "weekly": 7,
+    "biweekly": 14,
+}
 
 
 class GoalRepository:
@@ -45,11 +58,15 @@ class GoalRepository:
 
             # Автоматически устанавливаем next_check_in на основе reminder_frequency
             if reminder_frequency:
-                goal.next_check_in = self._calculate_next_checkin(reminder_frequency)
+                timezones = await self._timezones(session, [user_id])
+                goal.next_check_in = self._calculate_next_checkin(
+                    reminder_frequency, user_id, timezones.get(user_id)
+                )
 
             session.add(goal)
             await session.commit()
             await session.refresh(goal)
+            await context_cache.invalidate(goal.user_id, SECTION_ACTIVE_GOALS)
 
             return goal
 
@@ -102,26 +119,44 @@ class GoalRepository:
             )
             return list(result.scalars().all())
 
+    @staticmethod
+    def _checkin_query(now: datetime, limit: Optional[int]):
+        query = select(UserGoal).where(
+            and_(
+                UserGoal.status == "active",
+                UserGoal.next_check_in <= now,
+                UserGoal.next_check_in.isnot(None)
+            )
+        ).order_by(UserGoal.next_check_in)
+
+        if limit:
+            query = query.limit(limit)
+        return query
+
     async def get_goals_needing_checkin(
         self,
         limit: Optional[int] = None,
     ) -> List[UserGoal]:
         """Получить цели, которым нужен check-in."""
         async with get_session_context() as session:
-            query = select(UserGoal).where(
-                and_(
-                    UserGoal.status == "active",
-                    UserGoal.next_check_in <= datetime.utcnow(),
-                    UserGoal.next_check_in.isnot(None)
-                )
-            ).order_by(UserGoal.next_check_in)
-
-            if limit:
-                query = query.limit(limit)
-
-            result = await session.execute(query)
+            result = await session.execute(self._checkin_query(datetime.utcnow(), limit))
             return list(result.scalars().all())
 
+    async def claim_goals_needing_checkin(
+        self,
+        limit: Optional[int] = None,
+    ) -> List[UserGoal]:
+        """
+        Захватить цели, которым нужен check-in (см. database.leases).
+        next_check_in захваченных сдвигается на срок аренды.
+        """
+        now = datetime.utcnow()
+        return await claim_due(
+            self._checkin_query(now, limit),
+            UserGoal.next_check_in,
+            lease_until(now),
+        )
+
     async def update_progress(
         self,
         goal_id: int,
@@ -158,13 +193,47 @@ class GoalRepository:
 
             # Обновляем next_check_in
             if goal.reminder_frequency and goal.status == "active":
-                goal.next_check_in = self._calculate_next_checkin(goal.reminder_frequency)
+                timezones = await self._timezones(session, [goal.user_id])
+                goal.next_check_in = self._calculate_next_checkin(
+                    goal.reminder_frequency, goal.user_id, timezones.get(goal.user_id)
+                )
 
             await session.commit()
             await session.refresh(goal)
+            await context_cache.invalidate(goal.user_id, SECTION_ACTIVE_GOALS)
 
             return goal
 
+    async def record_checkins(self, goals: List[UserGoal]) -> int:
+        """
+        Отметить отправленные check-in пачки целей (одна транзакция).
+        Сдвигает last_check_in и next_check_in, прогресс не меняет.
+        """
+        if not goals:
+            return 0
+
+        async with get_session_context() as session:
+            result = await session.execute(
+                select(UserGoal).where(UserGoal.id.in_([goal.id for goal in goals]))
+            )
+            updated = list(result.scalars().all())
+            timezones = await self._timezones(session, [goal.user_id for goal in updated])
+
+            now = datetime.utcnow()
+            for goal in updated:
+                goal.last_check_in = now
+                if goal.reminder_frequency and goal.status == "active":
+                    goal.next_check_in = self._calculate_next_checkin(
+                        goal.reminder_frequency, goal.user_id, timezones.get(goal.user_id)
+                    )
+
+            await session.commit()
+
+        for user_id in {goal.user_id for goal in updated}:
+            await context_cache.invalidate(user_id, SECTION_ACTIVE_GOALS)
+
+        return len(updated)
+
     async def update_milestone(
         self,
         goal_id: int,
@@ -200,6 +269,7 @@ class GoalRepository:
 
                 await session.commit()
                 await session.refresh(goal)
+                await context_cache.invalidate(goal.user_id, SECTION_ACTIVE_GOALS)
 
             return goal
 
@@ -220,6 +290,7 @@ class GoalRepository:
 
             await session.commit()
             await session.refresh(goal)
+            await context_cache.invalidate(goal.user_id, SECTION_ACTIVE_GOALS)
 
             return goal
 
@@ -251,6 +322,7 @@ class GoalRepository:
 
             await session.commit()
             await session.refresh(goal)
+            await context_cache.invalidate(goal.user_id, SECTION_ACTIVE_GOALS)
 
             return goal
 
@@ -265,8 +337,10 @@ class GoalRepository:
             if not goal:
                 return False
 
+            user_id = goal.user_id
             await session.delete(goal)
             await session.commit()
+            await context_cache.invalidate(user_id, SECTION_ACTIVE_GOALS)
 
             return True
 
@@ -305,16 +379,28 @@ class GoalRepository:
                 "categories": categories,
             }
 
-    def _calculate_next_checkin(self, frequency: str) -> datetime:
-        """Вычисляет следующую дату check-in на основе частоты."""
-        now = datetime.utcnow()
-
-        if frequency == "daily":
-            return now + timedelta(days=1)
-        elif frequency == "weekly":
-            return now + timedelta(days=7)
-        elif frequency == "biweekly":
-            return now + timedelta(days=14)
-        else:
-            # По умолчанию - раз в неделю
-            return now + timedelta(days=7)
+    def _calculate_next_checkin(
+        self,
+        frequency: str,
+        user_id: int,
+        timezone: Optional[str] = None,
+    ) -> datetime:
+        """
+        Вычисляет следующую дату check-in на основе частоты.
+        Check-in приходит в GOAL_CHECKIN_TIME по местному времени пользователя.
+        """
+        # По умолчанию - раз в неделю
+        days = CHECKIN_INTERVAL_DAYS.get(frequency, 7)
+        # Ближайшее к «через N дней» местное время check-in (±12 часов)
+        after = datetime.now(pytz.utc) + timedelta(days=days, hours=-12)
+        return next_fire_time(
+            timezone, settings.GOAL_CHECKIN_TIME, user_id, now=after, utc=True
+        )
+
+    @staticmethod
+    async def _timezones(session: AsyncSession, user_ids: List[int]) -> Dict[int, str]:
+        """Часовые пояса пользователей (user_id -> User.timezone)."""
+        result = await session.execute(
+            select(User.id, User.timezone).where(User.id.in_(set(user_ids)))
+        )
+        return {user_id: timezone for user_id, timezone in result.all()}
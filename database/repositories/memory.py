@@ -5,11 +5,12 @@ CRUD операции для долговременной памяти.
 
 from datetime import datetime
 from typing import Optional, List
-from sqlalchemy import select, func, and_, or_
+from sqlalchemy import select, func, and_, or_, insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from database.session import get_session_context
 from database.models import MemoryEntry
+from database.context_cache import context_cache, SECTION_LONG_TERM_MEMORY
 
 
 class MemoryRepository:
@@ -37,9 +38,38 @@ class MemoryRepository:
             session.add(entry)
             await session.commit()
             await session.refresh(entry)
+            await context_cache.invalidate(user_id, SECTION_LONG_TERM_MEMORY)
             
             return entry
     
+    async def create_many(self, entries: List[dict]) -> int:
+        """
+        Создать пачку записей одним INSERT.
+
+        Args:
+            entries: Словари с user_id, category, content, importance
+
+        Returns:
+            Количество созданных записей
+        """
+        if not entries:
+            return 0
+        async with get_session_context() as session:
+            await session.execute(insert(MemoryEntry), [
+                {
+                    "user_id": entry["user_id"],
+                    "category": entry["category"],
+                    "content": entry["content"],
+                    "importance": entry.get("importance", 5),
+                }
+                for entry in entries
+            ])
+            await session.commit()
+
+        for user_id in {entry["user_id"] for entry in entries}:
+            await context_cache.invalidate(user_id, SECTION_LONG_TERM_MEMORY)
+        return len(entries)
+
     async def get(self, entry_id: int) -> Optional[MemoryEntry]:
         """Получить запись по ID."""
         async with get_session_context() as session:
@@ -123,6 +153,7 @@ class MemoryRepository:
             entry.updated_at = datetime.now()
             await session.commit()
             await session.refresh(entry)
+            await context_cache.invalidate(entry.user_id, SECTION_LONG_TERM_MEMORY)
             
             return entry
     
@@ -135,8 +166,10 @@ class MemoryRepository:
             entry = result.scalar_one_or_none()
             
             if entry:
+                user_id = entry.user_id
                 await session.delete(entry)
                 await session.commit()
+                await context_cache.invalidate(user_id, SECTION_LONG_TERM_MEMORY)
                 return True
             
             return False
@@ -213,6 +246,7 @@ class MemoryRepository:
                 entry.updated_at = datetime.now()
                 await session.commit()
                 await session.refresh(entry)
+                await context_cache.invalidate(user_id, SECTION_LONG_TERM_MEMORY)
                 return entry
             else:
                 # Создаём новую
@@ -225,6 +259,7 @@ class MemoryRepository:
                 session.add(entry)
                 await session.commit()
                 await session.refresh(entry)
+                await context_cache.invalidate(user_id, SECTION_LONG_TERM_MEMORY)
                 return entry
 
     async def get_recent_topics(
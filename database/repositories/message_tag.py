@@ -0,0 +1,129 @@
+"""
+Message tag repository.
+Нормализованные теги сообщений (message_tags): пишутся вместе
+с сообщением, читаются по индексам (tag, created_at) и
+(user_id, created_at) вместо разбора JSON в messages.tags.
+"""
+
+from datetime import datetime
+from typing import Any, Iterable, List, Optional, Sequence
+
+from sqlalchemy import select, func, and_, delete, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.session import get_session_context
+from database.models import Message, MessageTag
+
+
+# Длина колонки message_tags.tag / user_tag_counters.tag
+TAG_MAX_LENGTH = 100
+
+
+def clean_tags(tags: Optional[Iterable[Any]]) -> List[str]:
+    """Теги сообщения без мусора (JSON null, не-строки, слишком длинные)."""
+    return [
+        tag for tag in tags or []
+        if isinstance(tag, str) and len(tag) <= TAG_MAX_LENGTH
+    ]
+
+
+class MessageTagRepository:
+    """Репозиторий нормализованных тегов сообщений."""
+
+    async def add(self, session: AsyncSession, message: Message) -> None:
+        """
+        Записать теги сообщения. Вызывается в транзакции сохранения
+        сообщения после flush (нужны id и created_at).
+        """
+        tags = sorted(set(clean_tags(message.tags)))
+        if not tags:
+            return
+        await session.execute(insert(MessageTag), [
+            {
+                "message_id": message.id,
+                "tag": tag,
+                "user_id": message.user_id,
+                "created_at": message.created_at,
+            }
+            for tag in tags
+        ])
+
+    async def delete_for_user(
+        self,
+        session: AsyncSession,
+        user_id: int,
+        keep_message_ids: Optional[Sequence[int]] = None,
+    ) -> None:
+        """Удалить теги сообщений пользователя (кроме keep_message_ids)."""
+        query = delete(MessageTag).where(MessageTag.user_id == user_id)
+        if keep_message_ids:
+            query = query.where(~MessageTag.message_id.in_(keep_message_ids))
+        await session.execute(query)
+
+    async def get_top_tags(
+        self,
+        user_id: int,
+        since: Optional[datetime] = None,
+        prefix: Optional[str] = None,
+        limit: int = 5,
+    ) -> List[dict]:
+        """
+        Частые теги пользователя (за период, если задан since).
+
+        Args:
+            user_id: ID пользователя
+            since: Начало окна (None — вся история)
+            prefix: Только теги с префиксом (например 'topic:')
+            limit: Топ-N тегов
+        """
+        conditions = [MessageTag.user_id == user_id]
+        if since:
+            conditions.append(MessageTag.created_at >= since)
+        if prefix:
+            conditions.append(MessageTag.tag.startswith(prefix, autoescape=True))
+
+        count = func.count().label("count")
+        async with get_session_context() as session:
+            result = await session.execute(
+                select(MessageTag.tag, count)
+                .where(and_(*conditions))
+                .group_by(MessageTag.tag)
+                .order_by(count.desc(), MessageTag.tag)
+                .limit(limit)
+            )
+            return [{"tag": tag, "count": count} for tag, count in result.all()]
+
+    async def count_with_tag(
+        self,
+        tag: str,
+        since: Optional[datetime] = None,
+        user_id: Optional[int] = None,
+    ) -> int:
+        """Количество сообщений с тегом (за период / у пользователя)."""
+        conditions = [MessageTag.tag == tag]
+        if since:
+            conditions.append(MessageTag.created_at >= since)
+        if user_id is not None:
+            conditions.append(MessageTag.user_id == user_id)
+
+        async with get_session_context() as session:
+            result = await session.execute(
+                select(func.count()).select_from(MessageTag).where(and_(*conditions))
+            )
+            return result.scalar() or 0
+
+    async def count_users_with_tag(self, tag: str, since: Optional[datetime] = None) -> int:
+        """Количество пользователей с сообщениями с тегом за период."""
+        conditions = [MessageTag.tag == tag]
+        if since:
+            conditions.append(MessageTag.created_at >= since)
+
+        async with get_session_context() as session:
+            result = await session.execute(
+                select(func.count(func.distinct(MessageTag.user_id))).where(and_(*conditions))
+            )
+            return result.scalar() or 0
+
+
+# Глобальный экземпляр
+message_tag_repo = MessageTagRepository()
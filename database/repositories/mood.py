@@ -1,15 +1,88 @@
 """
 Mood repository.
 CRUD операции для записей настроения.
+Сводки читаются из дневных агрегатов (mood_daily), которые
+обновляются при создании записи, а не пересчитываются по записям.
 """
 
-from datetime import datetime, timedelta
-from typing import Optional, List, Dict, Any
-from sqlalchemy import select, func, and_, desc
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from typing import Optional, List, Dict, Any, Iterable, Tuple
+from sqlalchemy import select, func, and_, desc, delete
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from database.session import get_session_context
-from database.models import MoodEntry
+from database.session import get_session_context, dialect_insert
+from database.models import MoodEntry, MoodDaily
+from database.context_cache import context_cache, SECTION_MOOD_SUMMARY
+
+
+@dataclass
+class MoodDay:
+    """Настроение за день (или за период — см. combine_mood_days)."""
+
+    day: Optional[date] = None
+    entries: int = 0
+    score_sum: int = 0
+    anxiety_sum: int = 0
+    anxiety_entries: int = 0
+    emotions: Dict[str, int] = field(default_factory=dict)
+    last_score: Optional[int] = None
+    last_emotion: Optional[str] = None
+    last_entry_at: Optional[datetime] = None
+
+    @property
+    def average_score(self) -> Optional[float]:
+        return self.score_sum / self.entries if self.entries else None
+
+    @property
+    def average_anxiety(self) -> Optional[float]:
+        return self.anxiety_sum / self.anxiety_entries if self.anxiety_entries else None
+
+    @property
+    def dominant_emotion(self) -> Optional[str]:
+        if not self.emotions:
+            return None
+        return max(self.emotions.items(), key=lambda item: item[1])[0]
+
+    def top_emotions(self, limit: int) -> List[Tuple[str, int]]:
+        return sorted(self.emotions.items(), key=lambda item: item[1], reverse=True)[:limit]
+
+    def add(self, other: "MoodDay") -> None:
+        """Влить другой агрегат (строку или день)."""
+        self.entries += other.entries
+        self.score_sum += other.score_sum
+        self.anxiety_sum += other.anxiety_sum
+        self.anxiety_entries += other.anxiety_entries
+        for emotion, count in other.emotions.items():
+            self.emotions[emotion] = self.emotions.get(emotion, 0) + count
+        if other.last_entry_at and (self.last_entry_at is None or other.last_entry_at > self.last_entry_at):
+            self.last_score = other.last_score
+            self.last_emotion = other.last_emotion
+            self.last_entry_at = other.last_entry_at
+
+
+def combine_mood_days(days: Iterable[MoodDay]) -> MoodDay:
+    """Агрегат за несколько дней."""
+    total = MoodDay()
+    for day in days:
+        total.add(day)
+    return total
+
+
+def split_mood_days(days: List[MoodDay]) -> Tuple[MoodDay, MoodDay]:
+    """
+    Делит период (дни по возрастанию) на раннюю и позднюю половины
+    примерно поровну по числу записей, не разрывая дни.
+    """
+    half = sum(day.entries for day in days) / 2
+    earlier: List[MoodDay] = []
+    seen = 0
+    for day in days[:-1]:
+        if earlier and seen + day.entries > half:
+            break
+        earlier.append(day)
+        seen += day.entries
+    return combine_mood_days(earlier), combine_mood_days(days[len(earlier):])
 
 
 class MoodRepository:
@@ -41,11 +114,73 @@ class MoodRepository:
                 context_tags=context_tags or [],
             )
             session.add(entry)
+            await session.flush()
+            # Дневной агрегат — в той же транзакции
+            await self._add_to_daily(session, entry)
             await session.commit()
             await session.refresh(entry)
+            await context_cache.invalidate(user_id, SECTION_MOOD_SUMMARY)
 
             return entry
 
+    async def _add_to_daily(self, session: AsyncSession, entry: MoodEntry) -> None:
+        """Учесть запись в mood_daily (created_at уже получен при flush)."""
+        anxiety = entry.anxiety_level or 0
+        stmt = dialect_insert(MoodDaily).values(
+            user_id=entry.user_id,
+            day=entry.created_at.date(),
+            emotion=entry.primary_emotion,
+            entries=1,
+            score_sum=entry.mood_score,
+            anxiety_sum=anxiety,
+            anxiety_entries=1 if anxiety else 0,
+            last_score=entry.mood_score,
+            last_entry_at=entry.created_at,
+        )
+        await session.execute(stmt.on_conflict_do_update(
+            index_elements=[MoodDaily.user_id, MoodDaily.day, MoodDaily.emotion],
+            set_={
+                "entries": MoodDaily.entries + 1,
+                "score_sum": MoodDaily.score_sum + stmt.excluded.score_sum,
+                "anxiety_sum": MoodDaily.anxiety_sum + stmt.excluded.anxiety_sum,
+                "anxiety_entries": MoodDaily.anxiety_entries + stmt.excluded.anxiety_entries,
+                "last_score": stmt.excluded.last_score,
+                "last_entry_at": stmt.excluded.last_entry_at,
+            },
+        ))
+
+    async def get_daily(self, user_id: int, days: int) -> List[MoodDay]:
+        """
+        Дневные агрегаты настроения за последние days дней
+        (по возрастанию, только дни с записями).
+        """
+        since = (datetime.now() - timedelta(days=days)).date()
+        async with get_session_context() as session:
+            result = await session.execute(
+                select(MoodDaily)
+                .where(and_(MoodDaily.user_id == user_id, MoodDaily.day >= since))
+                .order_by(MoodDaily.day, MoodDaily.emotion)
+            )
+            rows = list(result.scalars().all())
+
+        by_day: Dict[date, MoodDay] = {}
+        for row in rows:
+            by_day.setdefault(row.day, MoodDay(day=row.day)).add(MoodDay(
+                entries=row.entries,
+                score_sum=row.score_sum,
+                anxiety_sum=row.anxiety_sum,
+                anxiety_entries=row.anxiety_entries,
+                emotions={row.emotion: row.entries},
+                last_score=row.last_score,
+                last_emotion=row.emotion,
+                last_entry_at=row.last_entry_at,
+            ))
+        return list(by_day.values())
+
+    async def delete_daily_for_user(self, session: AsyncSession, user_id: int) -> None:
+        """Удалить дневные агрегаты пользователя (в транзакции вызывающего кода)."""
+        await session.execute(delete(MoodDaily).where(MoodDaily.user_id == user_id))
+
     async def get(self, entry_id: int) -> Optional[MoodEntry]:
         """Получить запись по ID."""
         async with get_session_context() as session:
@@ -178,62 +313,43 @@ class MoodRepository:
     ) -> Dict[str, Any]:
         """
         Получить сводку по настроению за период.
-        Используется для контекста в промптах.
+        Используется для контекста в промптах. Считается по дневным
+        агрегатам — один запрос по (user_id, day) без загрузки записей.
         """
-        entries = await self.get_recent(user_id, limit=50, days=days)
+        daily = await self.get_daily(user_id, days)
+        period = combine_mood_days(daily)
 
-        if not entries:
+        if not period.entries:
             return {
                 "has_data": False,
                 "period_days": days,
             }
 
-        scores = [e.mood_score for e in entries]
-        emotions = [e.primary_emotion for e in entries]
-
-        # Средний score
-        avg_score = sum(scores) / len(scores)
-
-        # Тренд
-        if len(scores) >= 4:
-            mid = len(scores) // 2
-            first_half_avg = sum(scores[:mid]) / mid
-            second_half_avg = sum(scores[mid:]) / len(scores[mid:])
-
-            if second_half_avg > first_half_avg + 0.5:
+        # Тренд: поздняя половина периода против ранней
+        trend = "insufficient_data"
+        if period.entries >= 4 and len(daily) >= 2:
+            earlier, later = split_mood_days(daily)
+            if later.average_score > earlier.average_score + 0.5:
                 trend = "improving"
-            elif second_half_avg < first_half_avg - 0.5:
+            elif later.average_score < earlier.average_score - 0.5:
                 trend = "declining"
             else:
                 trend = "stable"
-        else:
-            trend = "insufficient_data"
-
-        # Доминирующая эмоция
-        emotion_counts = {}
-        for e in emotions:
-            emotion_counts[e] = emotion_counts.get(e, 0) + 1
-        dominant_emotion = max(emotion_counts.items(), key=lambda x: x[1])[0]
-
-        # Тревожность (если есть данные)
-        anxiety_values = [e.anxiety_level for e in entries if e.anxiety_level]
-        avg_anxiety = sum(anxiety_values) / len(anxiety_values) if anxiety_values else None
 
-        # Последнее настроение
-        latest = entries[0]
+        avg_anxiety = period.average_anxiety
 
         return {
             "has_data": True,
             "period_days": days,
-            "entries_count": len(entries),
-            "average_score": round(avg_score, 1),
+            "entries_count": period.entries,
+            "average_score": round(period.average_score, 1),
             "trend": trend,
-            "dominant_emotion": dominant_emotion,
+            "dominant_emotion": period.dominant_emotion,
             "avg_anxiety": round(avg_anxiety, 1) if avg_anxiety else None,
             "latest_mood": {
-                "score": latest.mood_score,
-                "emotion": latest.primary_emotion,
-                "when": latest.created_at,
+                "score": period.last_score,
+                "emotion": period.last_emotion,
+                "when": period.last_entry_at,
             },
         }
 
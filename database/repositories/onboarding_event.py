@@ -5,7 +5,7 @@ Onboarding Event repository.
 
 from datetime import datetime
 from typing import Optional, List, Dict, Any
-from sqlalchemy import select, func
+from sqlalchemy import select, func, insert
 from loguru import logger
 
 from database.session import get_session_context
@@ -45,6 +45,61 @@ class OnboardingEventRepository:
             logger.info(f"Logged onboarding event: user_id={user_id}, event={event_name}")
             return event
 
+    async def log_events(self, events: List[Dict[str, Any]]) -> int:
+        """
+        Записать пачку событий одним INSERT.
+
+        Args:
+            events: Словари с user_id, event_name, event_data
+
+        Returns:
+            Количество записанных событий
+        """
+        if not events:
+            return 0
+        async with get_session_context() as session:
+            await session.execute(insert(OnboardingEvent), [
+                {
+                    "user_id": event["user_id"],
+                    "event_name": event["event_name"],
+                    "event_data": event.get("event_data") or {},
+                }
+                for event in events
+            ])
+            await session.commit()
+
+        logger.info(f"Logged {len(events)} onboarding events")
+        return len(events)
+
+    async def get_events_for_users(
+        self,
+        user_ids: List[int],
+        event_names: Optional[List[str]] = None,
+    ) -> Dict[int, List[OnboardingEvent]]:
+        """
+        Получить события онбординга нескольких пользователей одним запросом.
+
+        Args:
+            user_ids: ID пользователей
+            event_names: Только эти события (по умолчанию все)
+
+        Returns:
+            user_id -> события (от новых к старым)
+        """
+        events: Dict[int, List[OnboardingEvent]] = {user_id: [] for user_id in user_ids}
+        if not user_ids:
+            return events
+
+        async with get_session_context() as session:
+            query = select(OnboardingEvent).where(OnboardingEvent.user_id.in_(user_ids))
+            if event_names:
+                query = query.where(OnboardingEvent.event_name.in_(event_names))
+            result = await session.execute(query.order_by(OnboardingEvent.created_at.desc()))
+
+            for event in result.scalars().all():
+                events[event.user_id].append(event)
+        return events
+
     async def get_user_events(
         self,
         user_id: int,
@@ -10,6 +10,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from database.models import UserProfile
 from database.session import async_session
+from database.context_cache import context_cache, SECTION_USER_PROFILE
 
 
 class UserProfileRepository:
@@ -34,6 +35,7 @@ class UserProfileRepository:
             session.add(profile)
             await session.commit()
             await session.refresh(profile)
+            await context_cache.invalidate(user_id, SECTION_USER_PROFILE)
             return profile
 
     async def update_profile(
@@ -74,6 +76,7 @@ class UserProfileRepository:
                 .values(**update_data, updated_at=datetime.utcnow())
             )
             await session.commit()
+        await context_cache.invalidate(user_id, SECTION_USER_PROFILE)
 
         return await self.get_by_user_id(user_id)
 
@@ -287,54 +290,62 @@ class UserProfileRepository:
     async def get_profile_summary(self, user_id: int) -> Dict[str, Any]:
         """Возвращает краткое резюме профиля для промпта."""
         profile = await self.get_by_user_id(user_id)
-
-        if not profile:
-            return {}
-
-        summary = {}
-
-        # Локация
-        location_parts = []
-        if profile.city:
-            location_parts.append(profile.city)
-        if profile.country:
-            location_parts.append(profile.country)
-        if location_parts:
-            summary['location'] = ', '.join(location_parts)
-
-        # Возраст и работа
-        if profile.age:
-            summary['age'] = profile.age
-        if profile.occupation:
-            summary['occupation'] = profile.occupation
-
-        # Партнёр
-        if profile.has_partner and profile.partner_name:
-            partner_info = f"{profile.partner_name}"
-            if profile.partner_age:
-                partner_info += f", {profile.partner_age} лет"
-            if profile.partner_occupation:
-                partner_info += f", {profile.partner_occupation}"
-            summary['partner'] = partner_info
-
-            if profile.how_met:
-                summary['how_met'] = profile.how_met
-
-        # Дети
-        if profile.has_children and profile.children:
-            children_info = []
-            for child in profile.children:
-                child_str = child.get('name', 'ребёнок')
-                if child.get('age'):
-                    child_str += f" ({child['age']} лет)"
-                children_info.append(child_str)
-            summary['children'] = ', '.join(children_info)
-
-        # Увлечения
-        if profile.hobbies:
-            summary['hobbies'] = profile.hobbies
-
-        return summary
+        return build_profile_summary(profile)
+
+
+def build_profile_summary(profile: Optional[UserProfile]) -> Dict[str, Any]:
+    """
+    Формирует краткое резюме профиля для промпта.
+    Вынесено отдельно, чтобы переиспользовать уже загруженный профиль
+    (например, из UserTurnSnapshot) без повторного запроса.
+    """
+    if not profile:
+        return {}
+
+    summary = {}
+
+    # Локация
+    location_parts = []
+    if profile.city:
+        location_parts.append(profile.city)
+    if profile.country:
+        location_parts.append(profile.country)
+    if location_parts:
+        summary['location'] = ', '.join(location_parts)
+
+    # Возраст и работа
+    if profile.age:
+        summary['age'] = profile.age
+    if profile.occupation:
+        summary['occupation'] = profile.occupation
+
+    # Партнёр
+    if profile.has_partner and profile.partner_name:
+        partner_info = f"{profile.partner_name}"
+        if profile.partner_age:
+            partner_info += f", {profile.partner_age} лет"
+        if profile.partner_occupation:
+            partner_info += f", {profile.partner_occupation}"
+        summary['partner'] = partner_info
+
+        if profile.how_met:
+            summary['how_met'] = profile.how_met
+
+    # Дети
+    if profile.has_children and profile.children:
+        children_info = []
+        for child in profile.children:
+            child_str = child.get('name', 'ребёнок')
+            if child.get('age'):
+                child_str += f" ({child['age']} лет)"
+            children_info.append(child_str)
+        summary['children'] = ', '.join(children_info)
+
+    # Увлечения
+    if profile.hobbies:
+        summary['hobbies'] = profile.hobbies
+
+    return summary
 
 
 # Глобальный экземпляр
@@ -10,6 +10,7 @@ from sqlalchemy.orm import selectinload
 from loguru import logger
 
 from database.session import get_session_context
+from database.leases import claim_due, lease_until
 from database.models import UserProgram
 
 
@@ -129,18 +130,34 @@ class ProgramRepository:
             Список программ с наступившим временем следующего задания
         """
         async with get_session_context() as session:
-            now = datetime.now()
-            result = await session.execute(
-                select(UserProgram).where(
-                    and_(
-                        UserProgram.status == "active",
-                        UserProgram.reminder_enabled == True,
-                        UserProgram.next_task_at <= now,
-                    )
-                ).limit(limit)
-            )
+            result = await session.execute(self._task_due_query(datetime.now(), limit))
             return list(result.scalars().all())
 
+    async def claim_programs_needing_task(self, limit: int = 50) -> List[UserProgram]:
+        """
+        Захватывает программы, которым пора отправить задание (см. database.leases).
+        next_task_at захваченных сдвигается на срок аренды.
+
+        Returns:
+            Список программ, задания которых отправляет этот воркер
+        """
+        now = datetime.now()
+        return await claim_due(
+            self._task_due_query(now, limit),
+            UserProgram.next_task_at,
+            lease_until(now),
+        )
+
+    @staticmethod
+    def _task_due_query(now: datetime, limit: int):
+        return select(UserProgram).where(
+            and_(
+                UserProgram.status == "active",
+                UserProgram.reminder_enabled == True,
+                UserProgram.next_task_at <= now,
+            )
+        ).order_by(UserProgram.next_task_at).limit(limit)
+
     async def complete_day(
         self,
         program_entry_id: int,
@@ -334,22 +351,36 @@ class ProgramRepository:
 
     async def mark_task_sent(self, program_entry_id: int) -> None:
         """Отмечает что задание отправлено."""
+        await self.mark_tasks_sent([program_entry_id])
+
+    async def mark_tasks_sent(self, program_entry_ids: List[int]) -> int:
+        """
+        Отмечает отправку заданий пачки программ (одна транзакция).
+
+        Returns:
+            Количество обновлённых программ
+        """
+        if not program_entry_ids:
+            return 0
+
         async with get_session_context() as session:
             result = await session.execute(
-                select(UserProgram).where(UserProgram.id == program_entry_id)
+                select(UserProgram).where(UserProgram.id.in_(program_entry_ids))
             )
-            program = result.scalar_one_or_none()
+            programs = list(result.scalars().all())
 
-            if program:
-                program.last_task_sent_at = datetime.now()
+            now = datetime.now()
+            for program in programs:
+                program.last_task_sent_at = now
                 # Следующее задание — завтра в то же время
                 if program.reminder_time:
                     hour, minute = map(int, program.reminder_time.split(":"))
-                    next_task = datetime.now().replace(
+                    next_task = now.replace(
                         hour=hour, minute=minute, second=0, microsecond=0
                     ) + timedelta(days=1)
                 else:
-                    next_task = datetime.now() + timedelta(days=1)
+                    next_task = now + timedelta(days=1)
                 program.next_task_at = next_task
 
-                await session.commit()
+            await session.commit()
+            return len(programs)
@@ -5,10 +5,11 @@ CRUD операции для запланированных сообщений (
 
 from datetime import datetime, timedelta
 from typing import Optional, List
-from sqlalchemy import select, func, and_
+from sqlalchemy import select, func, and_, insert, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from database.session import get_session_context
+from database.leases import claim_due, lease_until
 from database.models import ScheduledMessage
 
 
@@ -47,18 +48,32 @@ class ScheduledMessageRepository:
             )
             return result.scalar_one_or_none()
     
+    @staticmethod
+    def _pending_query(now: datetime, limit: int):
+        return select(ScheduledMessage).where(
+            and_(
+                ScheduledMessage.status == "pending",
+                ScheduledMessage.scheduled_for <= now
+            )
+        ).order_by(ScheduledMessage.scheduled_for).limit(limit)
+
     async def get_pending(self, limit: int = 100) -> List[ScheduledMessage]:
         """Получить сообщения, готовые к отправке."""
         async with get_session_context() as session:
-            result = await session.execute(
-                select(ScheduledMessage).where(
-                    and_(
-                        ScheduledMessage.status == "pending",
-                        ScheduledMessage.scheduled_for <= datetime.now()
-                    )
-                ).order_by(ScheduledMessage.scheduled_for).limit(limit)
-            )
+            result = await session.execute(self._pending_query(datetime.now(), limit))
             return list(result.scalars().all())
+
+    async def claim_pending(self, limit: int = 100) -> List[ScheduledMessage]:
+        """
+        Захватить сообщения, готовые к отправке (см. database.leases).
+        scheduled_for захваченных сдвигается на срок аренды.
+        """
+        now = datetime.now()
+        return await claim_due(
+            self._pending_query(now, limit),
+            ScheduledMessage.scheduled_for,
+            lease_until(now),
+        )
     
     async def get_by_user(
         self,
@@ -102,6 +117,59 @@ class ScheduledMessageRepository:
             
             return message
     
+    async def create_many(self, rows: List[dict]) -> int:
+        """
+        Создать пачку запланированных сообщений одним INSERT.
+
+        Args:
+            rows: Словари с user_id, type, scheduled_for (как аргументы create)
+
+        Returns:
+            Количество созданных сообщений
+        """
+        if not rows:
+            return 0
+        async with get_session_context() as session:
+            await session.execute(insert(ScheduledMessage), [
+                {
+                    "user_id": row["user_id"],
+                    "type": row["type"],
+                    "scheduled_for": row["scheduled_for"],
+                    "content": row.get("content"),
+                    "context": row.get("context"),
+                    "status": "pending",
+                }
+                for row in rows
+            ])
+            await session.commit()
+        return len(rows)
+
+    async def mark_sent_many(self, message_ids: List[int]) -> int:
+        """Отметить пачку сообщений отправленными одним UPDATE."""
+        if not message_ids:
+            return 0
+        async with get_session_context() as session:
+            result = await session.execute(
+                update(ScheduledMessage)
+                .where(ScheduledMessage.id.in_(message_ids))
+                .values(status="sent", sent_at=datetime.now())
+            )
+            await session.commit()
+            return result.rowcount
+
+    async def cancel_many(self, message_ids: List[int]) -> int:
+        """Отменить пачку сообщений одним UPDATE."""
+        if not message_ids:
+            return 0
+        async with get_session_context() as session:
+            result = await session.execute(
+                update(ScheduledMessage)
+                .where(ScheduledMessage.id.in_(message_ids))
+                .values(status="cancelled")
+            )
+            await session.commit()
+            return result.rowcount
+
     async def cancel(self, message_id: int) -> Optional[ScheduledMessage]:
         """Отменить сообщение."""
         async with get_session_context() as session:
@@ -0,0 +1,42 @@
+"""
+Scheduler run repository.
+Захват общих задач планировщика, когда воркеров несколько.
+"""
+
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete
+
+from database.session import get_session_context, dialect_insert
+from database.models import SchedulerRun
+
+
+class SchedulerRunRepository:
+    """Репозиторий запусков задач планировщика."""
+
+    async def claim(self, job: str, slot: datetime, worker: str) -> bool:
+        """
+        Захватить запуск задачи в слоте.
+        INSERT ... ON CONFLICT DO NOTHING: строку вставит только один воркер.
+
+        Returns:
+            True, если запуск достался этому воркеру
+        """
+        async with get_session_context() as session:
+            result = await session.execute(
+                dialect_insert(SchedulerRun)
+                .values(job=job, slot=slot, worker=worker, started_at=datetime.now())
+                .on_conflict_do_nothing(index_elements=["job", "slot"])
+            )
+            await session.commit()
+            return result.rowcount == 1
+
+    async def delete_old(self, days: int = 30) -> int:
+        """Удалить записи о запусках старше N дней."""
+        cutoff = datetime.now() - timedelta(days=days)
+        async with get_session_context() as session:
+            result = await session.execute(
+                delete(SchedulerRun).where(SchedulerRun.started_at < cutoff)
+            )
+            await session.commit()
+            return result.rowcount
@@ -10,6 +10,7 @@ from loguru import logger
 
 from database.session import get_session_context
 from database.models import UserTrigger
+from database.context_cache import context_cache, SECTION_SENSITIVE_TOPICS
 
 
 class TriggerRepository:
@@ -46,6 +47,7 @@ class TriggerRepository:
                 existing.updated_at = datetime.utcnow()
                 await session.commit()
                 await session.refresh(existing)
+                await context_cache.invalidate(user_id, SECTION_SENSITIVE_TOPICS)
                 return existing
 
             trigger = UserTrigger(
@@ -58,6 +60,7 @@ class TriggerRepository:
             session.add(trigger)
             await session.commit()
             await session.refresh(trigger)
+            await context_cache.invalidate(user_id, SECTION_SENSITIVE_TOPICS)
 
             logger.info(f"Created trigger for user {user_id}: {topic} (severity={severity})")
             return trigger
@@ -145,10 +148,15 @@ class TriggerRepository:
                 update(UserTrigger)
                 .where(UserTrigger.id == trigger_id)
                 .values(is_active=False, updated_at=datetime.utcnow())
+                .returning(UserTrigger.user_id)
             )
-            await session.execute(stmt)
+            result = await session.execute(stmt)
+            user_id = result.scalar_one_or_none()
             await session.commit()
 
+            if user_id is not None:
+                await context_cache.invalidate(user_id, SECTION_SENSITIVE_TOPICS)
+
             logger.info(f"Deactivated trigger {trigger_id}")
 
     async def reactivate(self, trigger_id: int) -> None:
@@ -163,10 +171,15 @@ class TriggerRepository:
                 update(UserTrigger)
                 .where(UserTrigger.id == trigger_id)
                 .values(is_active=True, updated_at=datetime.utcnow())
+                .returning(UserTrigger.user_id)
             )
-            await session.execute(stmt)
+            result = await session.execute(stmt)
+            user_id = result.scalar_one_or_none()
             await session.commit()
 
+            if user_id is not None:
+                await context_cache.invalidate(user_id, SECTION_SENSITIVE_TOPICS)
+
             logger.info(f"Reactivated trigger {trigger_id}")
 
     async def delete(self, trigger_id: int) -> None:
@@ -182,6 +195,8 @@ class TriggerRepository:
             trigger = result.scalar_one_or_none()
 
             if trigger:
+                user_id = trigger.user_id
                 await session.delete(trigger)
                 await session.commit()
+                await context_cache.invalidate(user_id, SECTION_SENSITIVE_TOPICS)
                 logger.info(f"Deleted trigger {trigger_id}")
@@ -3,13 +3,57 @@ User repository.
 CRUD операции для пользователей.
 """
 
-from datetime import datetime, timedelta
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, date
 from typing import Optional, List, Tuple, Any, Dict, AsyncGenerator
-from sqlalchemy import select, func, or_, and_
+from sqlalchemy import select, func, or_, and_, update, case
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import noload
 
 from database.session import get_session_context
-from database.models import User, Subscription, Message
+from database.models import User, Subscription, Message, UserProfile, Referral
+from database.repositories.profile import build_profile_summary
+
+
+# Коллекции User помечены lazy="selectin" — на горячем пути они не нужны
+# (иначе каждый select(User) подтягивает всю историю сообщений).
+_TURN_SNAPSHOT_OPTIONS = (
+    noload(User.subscription),
+    noload(User.messages),
+    noload(User.memory_entries),
+    noload(User.payments),
+    noload(User.reports),
+    noload(User.onboarding_events),
+)
+
+
+@dataclass
+class UserTurnSnapshot:
+    """
+    Снимок пользователя для обработки одного сообщения.
+    Загружается одним запросом: пользователь, активная подписка, профиль.
+    """
+
+    user: User
+    subscription: Optional[Subscription]
+    profile_summary: Dict[str, Any]
+    created: bool = False
+    # Изменения username/first_name, которые применятся вместе с record_turn
+    pending_user_updates: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def is_premium(self) -> bool:
+        """Premium или trial подписка."""
+        return bool(self.subscription and self.subscription.plan in ("premium", "trial"))
+
+    @property
+    def messages_today(self) -> int:
+        """Счётчик сообщений за сегодня (вчерашнее значение считается нулём)."""
+        if not self.subscription:
+            return 0
+        if self.subscription.messages_reset_at != date.today():
+            return 0
+        return self.subscription.messages_today or 0
 
 
 class UserRepository:
@@ -23,6 +67,23 @@ class UserRepository:
             )
             return result.scalar_one_or_none()
     
+    async def get_many(self, user_ids: List[int]) -> Dict[int, User]:
+        """
+        Получить пользователей по списку ID одним запросом (без коллекций).
+
+        Returns:
+            user_id -> User (отсутствующих в словаре нет)
+        """
+        if not user_ids:
+            return {}
+        async with get_session_context() as session:
+            result = await session.execute(
+                select(User)
+                .where(User.id.in_(set(user_ids)))
+                .options(*_TURN_SNAPSHOT_OPTIONS)
+            )
+            return {user.id: user for user in result.scalars().all()}
+
     async def get_by_telegram_id(self, telegram_id: int) -> Optional[User]:
         """Получить пользователя по Telegram ID."""
         async with get_session_context() as session:
@@ -79,6 +140,100 @@ class UserRepository:
             
             return user, True
     
+    async def get_turn_snapshot(
+        self,
+        telegram_id: int,
+        username: Optional[str] = None,
+        first_name: Optional[str] = None,
+    ) -> UserTurnSnapshot:
+        """
+        Загружает пользователя, активную подписку и профиль одним запросом.
+        Для нового пользователя создаёт его (с trial) через get_or_create.
+        """
+        async with get_session_context() as session:
+            result = await session.execute(
+                select(User, Subscription, UserProfile)
+                .outerjoin(
+                    Subscription,
+                    and_(
+                        Subscription.user_id == User.id,
+                        Subscription.status == "active",
+                    ),
+                )
+                .outerjoin(UserProfile, UserProfile.user_id == User.id)
+                .where(User.telegram_id == telegram_id)
+                .options(*_TURN_SNAPSHOT_OPTIONS)
+                .order_by(Subscription.id.desc())
+                .limit(1)
+            )
+            row = result.first()
+
+        if row is None:
+            await self.get_or_create(
+                telegram_id=telegram_id,
+                username=username,
+                first_name=first_name,
+            )
+            snapshot = await self.get_turn_snapshot(telegram_id)
+            snapshot.created = True
+            return snapshot
+
+        user, subscription, profile = row
+
+        pending_user_updates = {}
+        if username and user.username != username:
+            pending_user_updates["username"] = username
+        if first_name and user.first_name != first_name:
+            pending_user_updates["first_name"] = first_name
+
+        return UserTurnSnapshot(
+            user=user,
+            subscription=subscription,
+            profile_summary=build_profile_summary(profile),
+            pending_user_updates=pending_user_updates,
+        )
+
+    async def record_turn(
+        self,
+        snapshot: UserTurnSnapshot,
+        count_message: bool = False,
+    ) -> None:
+        """
+        Фиксирует обработанное сообщение одной транзакцией:
+        last_active_at (+ изменения username/first_name) и, если нужно,
+        атомарный инкремент messages_today со сбросом при смене дня.
+        """
+        now = datetime.now()
+        today = now.date()
+
+        async with get_session_context() as session:
+            await session.execute(
+                update(User)
+                .where(User.id == snapshot.user.id)
+                .values(last_active_at=now, **snapshot.pending_user_updates)
+            )
+
+            if count_message and snapshot.subscription:
+                await session.execute(
+                    update(Subscription)
+                    .where(Subscription.id == snapshot.subscription.id)
+                    .values(
+                        messages_today=case(
+                            (
+                                Subscription.messages_reset_at == today,
+                                Subscription.messages_today + 1,
+                            ),
+                            else_=1,
+                        ),
+                        messages_reset_at=today,
+                    )
+                )
+
+        snapshot.user.last_active_at = now
+        for key, value in snapshot.pending_user_updates.items():
+            setattr(snapshot.user, key, value)
+        snapshot.pending_user_updates = {}
+
     async def update(self, user_id: int, **kwargs) -> Optional[User]:
         """Обновить данные пользователя."""
         async with get_session_context() as session:
@@ -291,13 +446,138 @@ class UserRepository:
 
             return list(users), total
 
-    async def get_all_telegram_ids(
+    @staticmethod
+    def _segment_conditions(segment: str = "all", exclude_blocked: bool = True) -> List[Any]:
+        """
+        Условия сегмента рассылки из бот-админки.
+        Подписки проверяются через EXISTS — без JOIN-дублей и без
+        выгрузки user_id в Python.
+        """
+        conditions = []
+        if exclude_blocked:
+            conditions.append(User.is_blocked == False)
+
+        if segment == "premium":
+            conditions.append(
+                select(Subscription.id).where(
+                    and_(
+                        Subscription.user_id == User.id,
+                        Subscription.plan == "premium",
+                        Subscription.status == "active",
+                    )
+                ).exists()
+            )
+        elif segment == "free":
+            conditions.append(
+                select(Subscription.id).where(
+                    and_(
+                        Subscription.user_id == User.id,
+                        Subscription.plan == "free",
+                    )
+                ).exists()
+            )
+        elif segment == "active_week":
+            week_ago = datetime.now() - timedelta(days=7)
+            conditions.append(User.last_active_at >= week_ago)
+        elif segment == "active_month":
+            month_ago = datetime.now() - timedelta(days=30)
+            conditions.append(User.last_active_at >= month_ago)
+        elif segment == "inactive":
+            month_ago = datetime.now() - timedelta(days=30)
+            conditions.append(
+                or_(
+                    User.last_active_at < month_ago,
+                    User.last_active_at.is_(None),
+                )
+            )
+
+        return conditions
+
+    @staticmethod
+    def _target_group_conditions(target_group: str = "all") -> List[Any]:
+        """
+        Условия целевой группы рассылки из веб-админки.
+        "premium"/"trial" — активная (не истёкшая) подписка плана,
+        "free" — нет ни одной активной подписки.
+        """
+        now = datetime.now()
+        conditions = [User.is_blocked == False]
+
+        def has_active_subscription(*plan_filter):
+            return select(Subscription.id).where(
+                and_(
+                    Subscription.user_id == User.id,
+                    Subscription.expires_at > now,
+                    *plan_filter,
+                )
+            ).exists()
+
+        if target_group == "premium":
+            conditions.append(has_active_subscription(Subscription.plan == "premium"))
+        elif target_group == "trial":
+            conditions.append(has_active_subscription(Subscription.plan == "trial"))
+        elif target_group == "free":
+            conditions.append(~has_active_subscription())
+        elif target_group == "active_today":
+            today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+            conditions.append(User.last_active_at >= today_start)
+        elif target_group == "active_week":
+            conditions.append(User.last_active_at >= now - timedelta(days=7))
+        elif target_group == "inactive":
+            conditions.append(
+                or_(
+                    User.last_active_at < now - timedelta(days=30),
+                    User.last_active_at.is_(None),
+                )
+            )
+        # "all" - без дополнительных фильтров
+
+        return conditions
+
+    async def _iter_keyset(
+        self,
+        conditions: List[Any],
+        after_user_id: int = 0,
+        chunk_size: int = 1000,
+    ) -> AsyncGenerator[List[Tuple[int, int]], None]:
+        """
+        Обходит пользователей по возрастанию users.id пачками (keyset pagination).
+        На каждую пачку — отдельная короткая сессия: соединение не держится,
+        пока вызывающий код отправляет сообщения.
+        """
+        last_id = after_user_id
+        while True:
+            async with get_session_context() as session:
+                result = await session.execute(
+                    select(User.id, User.telegram_id)
+                    .where(and_(User.id > last_id, *conditions))
+                    .order_by(User.id)
+                    .limit(chunk_size)
+                )
+                chunk = [(user_id, telegram_id) for user_id, telegram_id in result.all()]
+
+            if not chunk:
+                return
+            yield chunk
+            if len(chunk) < chunk_size:
+                return
+            last_id = chunk[-1][0]
+
+    async def _count(self, conditions: List[Any], after_user_id: int = 0) -> int:
+        async with get_session_context() as session:
+            result = await session.execute(
+                select(func.count(User.id)).where(and_(User.id > after_user_id, *conditions))
+            )
+            return result.scalar() or 0
+
+    async def iter_telegram_ids(
         self,
         segment: str = "all",
         exclude_blocked: bool = True,
-    ) -> List[int]:
+        chunk_size: int = 1000,
+    ) -> AsyncGenerator[List[int], None]:
         """
-        Получить список telegram_id для рассылки.
+        Telegram_id сегмента для рассылки, пачками по chunk_size.
 
         Args:
             segment: Сегмент пользователей:
@@ -308,105 +588,121 @@ class UserRepository:
                 - "active_month" — активные за последний месяц
                 - "inactive" — неактивные более месяца
             exclude_blocked: Исключить заблокированных
+            chunk_size: Размер пачки
+        """
+        conditions = self._segment_conditions(segment, exclude_blocked)
+        async for chunk in self._iter_keyset(conditions, chunk_size=chunk_size):
+            yield [telegram_id for _, telegram_id in chunk]
 
-        Returns:
-            Список telegram_id
+    async def get_all_telegram_ids(
+        self,
+        segment: str = "all",
+        exclude_blocked: bool = True,
+    ) -> List[int]:
         """
-        async with get_session_context() as session:
-            query = select(User.telegram_id)
+        Получить список telegram_id для рассылки (сегменты — см. iter_telegram_ids).
+        Для больших сегментов используйте iter_telegram_ids.
+        """
+        telegram_ids = []
+        async for chunk in self.iter_telegram_ids(segment, exclude_blocked):
+            telegram_ids.extend(chunk)
+        return telegram_ids
 
-            # Исключаем заблокированных
-            if exclude_blocked:
-                query = query.where(User.is_blocked == False)
+    async def iter_broadcast_recipients(
+        self,
+        target_group: str = "all",
+        after_user_id: int = 0,
+        chunk_size: int = 1000,
+    ) -> AsyncGenerator[List[Tuple[int, int]], None]:
+        """
+        Получатели рассылки из веб-админки пачками.
 
-            # Фильтры по сегментам
-            if segment == "premium":
-                query = query.join(Subscription).where(
-                    and_(
-                        Subscription.plan == "premium",
-                        Subscription.status == "active",
-                    )
-                )
-            elif segment == "free":
-                query = query.join(Subscription).where(
-                    Subscription.plan == "free"
-                )
-            elif segment == "active_week":
-                week_ago = datetime.now() - timedelta(days=7)
-                query = query.where(User.last_active_at >= week_ago)
-            elif segment == "active_month":
-                month_ago = datetime.now() - timedelta(days=30)
-                query = query.where(User.last_active_at >= month_ago)
-            elif segment == "inactive":
-                month_ago = datetime.now() - timedelta(days=30)
-                query = query.where(
-                    or_(
-                        User.last_active_at < month_ago,
-                        User.last_active_at.is_(None),
-                    )
-                )
+        Args:
+            target_group: "all", "premium", "trial", "free",
+                "active_today", "active_week", "inactive"
+            after_user_id: Только users.id > after_user_id
+                (продолжение рассылки после перезапуска)
+            chunk_size: Размер пачки
+
+        Yields:
+            Списки (user_id, telegram_id) по возрастанию user_id
+        """
+        conditions = self._target_group_conditions(target_group)
+        async for chunk in self._iter_keyset(conditions, after_user_id, chunk_size):
+            yield chunk
 
-            result = await session.execute(query)
-            return [row[0] for row in result.fetchall()]
+    async def count_broadcast_recipients(
+        self,
+        target_group: str = "all",
+        after_user_id: int = 0,
+    ) -> int:
+        """Количество получателей рассылки из веб-админки."""
+        return await self._count(self._target_group_conditions(target_group), after_user_id)
 
     async def count_by_segment(self, segment: str = "all") -> int:
         """
         Подсчитать количество пользователей в сегменте.
 
         Args:
-            segment: Сегмент (см. get_all_telegram_ids)
+            segment: Сегмент (см. iter_telegram_ids)
 
         Returns:
             Количество пользователей
         """
+        return await self._count(self._segment_conditions(segment))
+
+    async def stream_export_rows(self, chunk_size: int = 1000) -> AsyncGenerator[List[Any], None]:
+        """
+        Пользователи для выгрузки в админке, пачками (серверный курсор).
+        Подписка, статистика сообщений и рефералы — коррелированными
+        подзапросами в том же SELECT, а не отдельными запросами на пользователя.
+
+        Yields:
+            Списки строк (User, is_premium, messages_total, messages_text,
+            messages_voice, referral_count)
+        """
+        def user_messages(*conditions):
+            return (
+                select(func.count(Message.id))
+                .where(Message.user_id == User.id, Message.role == "user", *conditions)
+                .scalar_subquery()
+            )
+
+        is_premium = (
+            select(Subscription.id)
+            .where(
+                Subscription.user_id == User.id,
+                Subscription.status == "active",
+                Subscription.plan == "premium",
+            )
+            .exists()
+        )
+        referral_count = (
+            select(func.count(Referral.id))
+            .where(
+                Referral.referrer_id == User.id,
+                Referral.status.in_(["activated", "rewarded"]),
+            )
+            .scalar_subquery()
+        )
+
         async with get_session_context() as session:
-            query = select(func.count(User.id)).where(User.is_blocked == False)
-
-            if segment == "premium":
-                query = (
-                    select(func.count(User.id))
-                    .select_from(User)
-                    .join(Subscription)
-                    .where(
-                        and_(
-                            User.is_blocked == False,
-                            Subscription.plan == "premium",
-                            Subscription.status == "active",
-                        )
-                    )
-                )
-            elif segment == "free":
-                query = (
-                    select(func.count(User.id))
-                    .select_from(User)
-                    .join(Subscription)
-                    .where(
-                        and_(
-                            User.is_blocked == False,
-                            Subscription.plan == "free",
-                        )
-                    )
-                )
-            elif segment == "active_week":
-                week_ago = datetime.now() - timedelta(days=7)
-                query = query.where(User.last_active_at >= week_ago)
-            elif segment == "active_month":
-                month_ago = datetime.now() - timedelta(days=30)
-                query = query.where(User.last_active_at >= month_ago)
-            elif segment == "inactive":
-                month_ago = datetime.now() - timedelta(days=30)
-                query = select(func.count(User.id)).where(
-                    and_(
-                        User.is_blocked == False,
-                        or_(
-                            User.last_active_at < month_ago,
-                            User.last_active_at.is_(None),
-                        ),
-                    )
+            result = await session.stream(
+                select(
+                    User,
+                    is_premium,
+                    user_messages(),
+                    user_messages(Message.message_type == "text"),
+                    user_messages(Message.message_type == "voice"),
+                    referral_count,
                 )
+                .options(*_TURN_SNAPSHOT_OPTIONS)
+                .order_by(User.id)
+                .execution_options(yield_per=chunk_size)
+            )
+            async for partition in result.partitions():
+                yield partition
 
-            result = await session.execute(query)
-            return result.scalar() or 0
     async def get_by_celebration_date(
         self,
         field: str,
@@ -475,6 +771,41 @@ class UserRepository:
                 user.updated_at = datetime.now()
                 await session.commit()
 
+    async def get_style_state(self, user_id: int) -> Tuple[Optional[dict], Optional[dict]]:
+        """
+        Агрегаты и текущий стиль общения пользователя.
+
+        Returns:
+            (style_stats, communication_style)
+        """
+        async with get_session_context() as session:
+            result = await session.execute(
+                select(User.style_stats, User.communication_style).where(User.id == user_id)
+            )
+            row = result.one_or_none()
+            return (row[0], row[1]) if row else (None, None)
+
+    async def update_style_state(
+        self,
+        user_id: int,
+        stats: dict,
+        style: Optional[dict] = None,
+    ) -> None:
+        """
+        Сохранить агрегаты стиля (и стиль, если он изменился) одним UPDATE.
+
+        Args:
+            user_id: ID пользователя
+            stats: Скользящие агрегаты (StyleAnalyzer.observe)
+            style: Новый стиль общения или None, если не изменился
+        """
+        values: Dict[str, Any] = {"style_stats": stats}
+        if style is not None:
+            values["communication_style"] = style
+        async with get_session_context() as session:
+            await session.execute(update(User).where(User.id == user_id).values(**values))
+            await session.commit()
+
     async def get_active_users(self, days: int = 14) -> List[User]:
         """
         Получить активных пользователей за последние N дней.
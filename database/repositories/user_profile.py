@@ -10,6 +10,7 @@ from loguru import logger
 
 from database.session import get_session_context
 from database.models import UserProfile
+from database.context_cache import context_cache, SECTION_USER_PROFILE
 
 
 class UserProfileRepository:
@@ -43,6 +44,7 @@ class UserProfileRepository:
             session.add(profile)
             await session.commit()
             await session.refresh(profile)
+            await context_cache.invalidate(user_id, SECTION_USER_PROFILE)
 
             logger.info(f"Created new profile for user_id={user_id}")
             return profile
@@ -77,6 +79,7 @@ class UserProfileRepository:
             profile.updated_at = datetime.now()
             await session.commit()
             await session.refresh(profile)
+            await context_cache.invalidate(user_id, SECTION_USER_PROFILE)
 
             logger.info(f"Updated profile for user_id={user_id}: {kwargs}")
             return profile
@@ -102,6 +105,7 @@ class UserProfileRepository:
 
             await session.delete(profile)
             await session.commit()
+            await context_cache.invalidate(user_id, SECTION_USER_PROFILE)
 
             logger.info(f"Deleted profile for user_id={user_id}")
             return True
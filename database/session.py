@@ -11,6 +11,8 @@ from sqlalchemy.ext.asyncio import (
     async_sessionmaker,
 )
 from sqlalchemy.pool import StaticPool, QueuePool
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from contextlib import asynccontextmanager
 from typing import AsyncGenerator
 
@@ -21,6 +23,9 @@ from loguru import logger
 # Определяем параметры в зависимости от типа БД
 is_sqlite = settings.DATABASE_URL.startswith("sqlite")
 
+# INSERT ... ON CONFLICT есть в обоих диалектах, но строится разными классами
+dialect_insert = sqlite_insert if is_sqlite else pg_insert
+
 engine_kwargs = {
     "echo": False,  # True для отладки SQL запросов
     "future": True,
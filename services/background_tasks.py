@@ -0,0 +1,268 @@
+"""
+Background tasks service.
+Очередь фоновых задач для хвоста обработки сообщения.
+
+Всё, что не нужно пользователю для получения ответа (сохранение истории,
+детекторы, профиль, стоимость API, настроение, стикеры), выполняется
+после ответа в воркерах этого процесса:
+
+- задачи с одним ключом (user_id) выполняются строго по порядку: первый
+  взявший ключ воркер выполняет и все его задачи, пришедшие следом
+  (очередь ключа), а свободные воркеры берут задачи других ключей;
+- очередь ограничена: если она переполнена дольше BACKGROUND_ENQUEUE_TIMEOUT,
+  задача выполняется сразу в вызывающем коде (backpressure без потерь);
+- упавшая задача повторяется с экспоненциальной задержкой;
+- wait_idle(key) позволяет следующему сообщению дождаться записи предыдущего.
+"""
+
+import asyncio
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, List, Optional
+
+from loguru import logger
+
+from config.settings import settings
+
+
+@dataclass
+class _Task:
+    """Задача в очереди."""
+    name: str
+    func: Callable[..., Awaitable[Any]]
+    args: tuple
+    kwargs: dict
+    key: Optional[Hashable] = None
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+
+class BackgroundTaskQueue:
+    """Ограниченная очередь фоновых задач на asyncio-воркерах."""
+
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        maxsize: Optional[int] = None,
+        max_retries: Optional[int] = None,
+        retry_delay: Optional[float] = None,
+        enqueue_timeout: Optional[float] = None,
+    ):
+        self.workers = workers or settings.BACKGROUND_WORKERS
+        self.maxsize = maxsize or settings.BACKGROUND_QUEUE_SIZE
+        self.max_retries = max_retries if max_retries is not None else settings.BACKGROUND_MAX_RETRIES
+        self.retry_delay = retry_delay if retry_delay is not None else settings.BACKGROUND_RETRY_DELAY
+        self.enqueue_timeout = (
+            enqueue_timeout if enqueue_timeout is not None else settings.BACKGROUND_ENQUEUE_TIMEOUT
+        )
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        # Незавершённые задачи по ключу и ожидание для ключа
+        self._pending: Dict[Hashable, int] = {}
+        self._idle: Dict[Hashable, asyncio.Event] = {}
+        # Ключи, которые сейчас выполняет какой-то воркер, и их задачи,
+        # пришедшие из общей очереди, пока воркер занят (по порядку)
+        self._backlog: Dict[Hashable, Deque[_Task]] = {}
+
+        # Метрики
+        self.processed = 0
+        self.failed = 0
+        self.retried = 0
+        self.inline = 0
+        self.max_depth = 0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self._lag_total = 0.0
+        self._dequeued = 0
+
+    @property
+    def is_running(self) -> bool:
+        return bool(self._workers)
+
+    async def start(self) -> None:
+        """Запускает воркеры."""
+        if self.is_running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.maxsize)
+        self._workers = [
+            asyncio.create_task(self._worker(i), name=f"background-worker-{i}")
+            for i in range(self.workers)
+        ]
+        logger.info(
+            f"Background task queue started: workers={self.workers}, maxsize={self.maxsize}"
+        )
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """Дожидается выполнения очереди (не дольше timeout) и останавливает воркеры."""
+        if not self.is_running:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning(
+                f"Background task queue: {self._queue.qsize()} tasks dropped on shutdown"
+            )
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._queue = None
+        logger.info("Background task queue stopped")
+
+    async def submit(
+        self,
+        name: str,
+        func: Callable[..., Awaitable[Any]],
+        *args: Any,
+        key: Optional[Hashable] = None,
+        **kwargs: Any,
+    ) -> None:
+        """
+        Ставит задачу в очередь.
+
+        Args:
+            name: Имя задачи (для логов)
+            func: Корутинная функция
+            key: Ключ упорядочивания (обычно user_id)
+
+        Если воркеры не запущены (скрипты, тесты) или очередь переполнена,
+        задача выполняется сразу.
+        """
+        task = _Task(name=name, func=func, args=args, kwargs=kwargs, key=key)
+
+        if not self.is_running:
+            await self._run_inline(task)
+            return
+
+        self._acquire_key(key)
+        try:
+            await asyncio.wait_for(self._queue.put(task), timeout=self.enqueue_timeout)
+        except asyncio.TimeoutError:
+            self._release_key(key)
+            logger.warning(
+                f"Background queue full ({self._queue.qsize()}), running '{name}' inline"
+            )
+            await self._run_inline(task)
+            return
+
+        self.max_depth = max(self.max_depth, self._queue.qsize())
+
+    async def wait_idle(self, key: Hashable, timeout: Optional[float] = None) -> bool:
+        """
+        Ждёт, пока выполнятся все задачи с ключом key.
+        Возвращает False, если не дождались за timeout.
+        """
+        event = self._idle.get(key)
+        if event is None:
+            return True
+        try:
+            await asyncio.wait_for(event.wait(), timeout=timeout)
+            return True
+        except asyncio.TimeoutError:
+            logger.warning(f"Background tasks for key {key} still pending after {timeout}s")
+            return False
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Метрики очереди для /health."""
+        return {
+            "running": self.is_running,
+            "workers": len(self._workers),
+            "depth": self._queue.qsize() if self._queue else 0,
+            "max_depth": self.max_depth,
+            "maxsize": self.maxsize,
+            "processed": self.processed,
+            "failed": self.failed,
+            "retried": self.retried,
+            "inline": self.inline,
+            "lag_ms": {
+                "last": round(self.last_lag * 1000, 1),
+                "avg": round(self._lag_total / self._dequeued * 1000, 1) if self._dequeued else 0.0,
+                "max": round(self.max_lag * 1000, 1),
+            },
+        }
+
+    def _acquire_key(self, key: Optional[Hashable]) -> None:
+        if key is None:
+            return
+        self._pending[key] = self._pending.get(key, 0) + 1
+        if key not in self._idle:
+            self._idle[key] = asyncio.Event()
+
+    def _release_key(self, key: Optional[Hashable]) -> None:
+        if key is None:
+            return
+        self._pending[key] -= 1
+        if self._pending[key] <= 0:
+            del self._pending[key]
+            self._idle.pop(key).set()
+
+    async def _worker(self, index: int) -> None:
+        while True:
+            task = await self._queue.get()
+            lag = time.monotonic() - task.enqueued_at
+            self._dequeued += 1
+            self.last_lag = lag
+            self.max_lag = max(self.max_lag, lag)
+            self._lag_total += lag
+
+            if task.key is None:
+                await self._finish(task)
+                continue
+
+            backlog = self._backlog.get(task.key)
+            if backlog is not None:
+                # Ключ уже выполняет другой воркер — он и доберёт задачу,
+                # а этот воркер свободен для других пользователей
+                backlog.append(task)
+                continue
+
+            backlog = self._backlog[task.key] = deque()
+            try:
+                await self._finish(task)
+                while backlog:
+                    await self._finish(backlog.popleft())
+            finally:
+                del self._backlog[task.key]
+
+    async def _finish(self, task: _Task) -> None:
+        """Выполняет задачу из очереди и отмечает её выполненной."""
+        try:
+            await self._execute(task)
+        finally:
+            self._release_key(task.key)
+            self._queue.task_done()
+
+    async def _run_inline(self, task: _Task) -> None:
+        self.inline += 1
+        if task.key is not None:
+            # Не обгоняем задачи этого ключа, уже стоящие в очереди
+            await self.wait_idle(task.key, timeout=settings.BACKGROUND_BARRIER_TIMEOUT)
+        await self._execute(task)
+
+    async def _execute(self, task: _Task) -> None:
+        """Выполняет задачу с повторами. Исключения не пробрасываются."""
+        delay = self.retry_delay
+        for attempt in range(1, self.max_retries + 2):
+            try:
+                await task.func(*task.args, **task.kwargs)
+                self.processed += 1
+                return
+            except Exception as e:
+                if attempt > self.max_retries:
+                    self.failed += 1
+                    logger.error(
+                        f"Background task '{task.name}' failed after {attempt} attempts: {e}"
+                    )
+                    return
+                self.retried += 1
+                logger.warning(
+                    f"Background task '{task.name}' attempt {attempt} failed: {e}. "
+                    f"Retrying in {delay:.1f}s..."
+                )
+                await asyncio.sleep(delay)
+                delay *= 2
+
+
+# Глобальный экземпляр
+background_tasks = BackgroundTaskQueue()
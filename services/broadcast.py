@@ -0,0 +1,394 @@
+"""
+Broadcast engine.
+Массовые рассылки из админки.
+
+- N параллельных отправителей под общим rate limiter (глобальный лимит
+  бота + интервал на чат), 429 retry_after приостанавливает всех;
+- получатели читаются из БД пачками (keyset по users.id) — память
+  не зависит от размера сегмента;
+- прогресс хранится в таблице broadcasts: last_user_id — граница,
+  до которой все получатели обработаны, счётчики sent/failed/blocked
+  считают только их;
+- после перезапуска незавершённые рассылки продолжаются с last_user_id
+  (повторно могут получить сообщение только те, кто был «в полёте»);
+- рассылку отправляет один процесс-владелец: сохраняя прогресс, он
+  обновляет пульс, а остальные процессы веб-приложения раз в
+  BROADCAST_LEASE_SECONDS захватывают (claim) только рассылки без
+  владельца или с устаревшим пульсом — второй воркер или новый экземпляр
+  при плавном перезапуске не отправит ту же рассылку параллельно.
+"""
+
+import asyncio
+import os
+import socket
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Tuple
+
+import httpx
+from loguru import logger
+
+from config.settings import settings
+from database.models import Broadcast
+from database.repositories.broadcast import broadcast_repo
+from database.repositories.user import UserRepository
+from services.telegram_rate_limiter import TelegramRateLimiter, telegram_rate_limiter
+
+
+# Размер пачки получателей, читаемой из БД
+RECIPIENTS_CHUNK_SIZE = 1000
+
+# Результаты отправки одному получателю
+RESULT_SENT = "sent"
+RESULT_FAILED = "failed"
+RESULT_BLOCKED = "blocked"
+
+# Владелец рассылок этого процесса в broadcasts.owner
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+class _TakenOver(Exception):
+    """Рассылку захватил другой процесс (пульс этого процесса устарел)."""
+
+
+@dataclass
+class _Progress:
+    """Прогресс рассылки в памяти процесса."""
+    sent: int = 0
+    failed: int = 0
+    blocked: int = 0
+    last_user_id: int = 0
+    last_error: Optional[str] = None
+    processed_in_run: int = 0
+    started_at: float = field(default_factory=time.monotonic)
+    # Завершённые индексы выше границы last_user_id: (user_id, результат)
+    done: Dict[int, Tuple[int, str]] = field(default_factory=dict)
+    next_index: int = 0
+
+    def complete(self, index: int, user_id: int, result: str) -> None:
+        """
+        Отмечает получателя и сдвигает границу по непрерывному префиксу.
+        Счётчики растут вместе с границей: после перезапуска получатели
+        за last_user_id отправляются снова и не должны быть уже посчитаны.
+        """
+        self.done[index] = (user_id, result)
+        while self.next_index in self.done:
+            self.last_user_id, result = self.done.pop(self.next_index)
+            self.next_index += 1
+            if result == RESULT_SENT:
+                self.sent += 1
+            elif result == RESULT_BLOCKED:
+                self.blocked += 1
+            else:
+                self.failed += 1
+
+    @property
+    def rate(self) -> float:
+        elapsed = time.monotonic() - self.started_at
+        return round(self.processed_in_run / elapsed, 1) if elapsed > 0 else 0.0
+
+
+class BroadcastEngine:
+    """Запуск, выполнение и продолжение рассылок."""
+
+    def __init__(
+        self,
+        concurrency: Optional[int] = None,
+        rate_limiter: Optional[TelegramRateLimiter] = None,
+        api_base_url: Optional[str] = None,
+        max_attempts: Optional[int] = None,
+        checkpoint_every: Optional[int] = None,
+        lease_seconds: Optional[int] = None,
+    ):
+        self.concurrency = concurrency or settings.BROADCAST_CONCURRENCY
+        self.rate_limiter = rate_limiter or telegram_rate_limiter
+        self.api_base_url = (api_base_url or settings.TELEGRAM_API_BASE_URL).rstrip("/")
+        self.max_attempts = max_attempts or settings.BROADCAST_MAX_ATTEMPTS
+        self.checkpoint_every = checkpoint_every or settings.BROADCAST_CHECKPOINT_EVERY
+        self.lease_seconds = lease_seconds or settings.BROADCAST_LEASE_SECONDS
+        self.worker_id = WORKER_ID
+        self.user_repo = UserRepository()
+
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._progress: Dict[str, _Progress] = {}
+        self._watcher: Optional[asyncio.Task] = None
+
+    async def start_broadcast(
+        self,
+        message: str,
+        target_group: str,
+        created_by: Optional[int] = None,
+        parse_mode: Optional[str] = "Markdown",
+    ) -> Broadcast:
+        """Создаёт рассылку и запускает её в фоне."""
+        total = await self.user_repo.count_broadcast_recipients(target_group)
+        broadcast = await broadcast_repo.create(
+            broadcast_id=str(uuid.uuid4()),
+            message=message,
+            target_group=target_group,
+            total=total,
+            parse_mode=parse_mode,
+            created_by=created_by,
+            owner=self.worker_id,
+        )
+        self._launch(broadcast)
+        return broadcast
+
+    def start(self) -> None:
+        """
+        Запускает наблюдение за незавершёнными рассылками: сразу и затем
+        раз в lease_seconds продолжает те, что остались без владельца.
+        """
+        if self._watcher is None or self._watcher.done():
+            self._watcher = asyncio.create_task(self._watch(), name="broadcast-watcher")
+
+    async def resume_unfinished(self) -> int:
+        """
+        Продолжает рассылки, прерванные перезапуском или оставленные
+        другим процессом (нет владельца или пульс устарел).
+
+        Returns:
+            Количество продолженных рассылок
+        """
+        resumed = 0
+        stale_before = datetime.now() - timedelta(seconds=self.lease_seconds)
+        for broadcast in await broadcast_repo.get_unfinished():
+            if broadcast.id in self._tasks:
+                continue
+            if not await broadcast_repo.claim(broadcast.id, self.worker_id, stale_before):
+                continue
+            # Прогресс перечитываем после захвата: прежний владелец мог
+            # сохранить его между выборкой и claim
+            broadcast = await broadcast_repo.get(broadcast.id)
+            if broadcast is None:
+                continue
+            logger.info(
+                f"Resuming broadcast {broadcast.id} after user {broadcast.last_user_id}"
+            )
+            self._launch(broadcast)
+            resumed += 1
+        return resumed
+
+    async def stop(self) -> None:
+        """Останавливает рассылки, сохраняя прогресс (продолжит любой процесс)."""
+        if self._watcher is not None:
+            self._watcher.cancel()
+            await asyncio.gather(self._watcher, return_exceptions=True)
+            self._watcher = None
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def get_live_progress(self, broadcast_id: str) -> Optional[Dict[str, Any]]:
+        """Текущий прогресс, если рассылка выполняется в этом процессе."""
+        progress = self._progress.get(broadcast_id)
+        if progress is None:
+            return None
+        return {
+            "sent": progress.sent,
+            "failed": progress.failed,
+            "blocked": progress.blocked,
+            "last_user_id": progress.last_user_id,
+            "rate_per_second": progress.rate,
+        }
+
+    def _launch(self, broadcast: Broadcast) -> None:
+        progress = _Progress(
+            sent=broadcast.sent or 0,
+            failed=broadcast.failed or 0,
+            blocked=broadcast.blocked or 0,
+            last_user_id=broadcast.last_user_id or 0,
+        )
+        self._progress[broadcast.id] = progress
+        task = asyncio.create_task(
+            self._run(broadcast, progress), name=f"broadcast-{broadcast.id}"
+        )
+        self._tasks[broadcast.id] = task
+        task.add_done_callback(lambda _: self._forget(broadcast.id))
+
+    async def _watch(self) -> None:
+        while True:
+            try:
+                await self.resume_unfinished()
+            except Exception as e:
+                logger.error(f"Failed to resume broadcasts: {e}")
+            await asyncio.sleep(self.lease_seconds)
+
+    def _forget(self, broadcast_id: str) -> None:
+        self._tasks.pop(broadcast_id, None)
+        self._progress.pop(broadcast_id, None)
+
+    async def _run(
+        self,
+        broadcast: Broadcast,
+        progress: _Progress,
+    ) -> None:
+        """Рассылает сообщение получателям N параллельными отправителями."""
+        logger.info(
+            f"Starting broadcast {broadcast.id} ({broadcast.target_group}, "
+            f"{broadcast.total} users) after user {progress.last_user_id}"
+        )
+        await broadcast_repo.mark_running(broadcast.id)
+
+        # Ограниченная очередь: в памяти не больше пары пачек получателей
+        pending: asyncio.Queue = asyncio.Queue(maxsize=RECIPIENTS_CHUNK_SIZE * 2)
+        limits = httpx.Limits(
+            max_connections=self.concurrency,
+            max_keepalive_connections=self.concurrency,
+        )
+
+        async def producer() -> None:
+            index = 0
+            async for chunk in self.user_repo.iter_broadcast_recipients(
+                broadcast.target_group,
+                after_user_id=progress.last_user_id,
+                chunk_size=RECIPIENTS_CHUNK_SIZE,
+            ):
+                for user_id, telegram_id in chunk:
+                    await pending.put((index, user_id, telegram_id))
+                    index += 1
+            # По одному стоп-сигналу на отправителя
+            for _ in range(self.concurrency):
+                await pending.put(None)
+
+        async def sender(client: httpx.AsyncClient) -> None:
+            while (item := await pending.get()) is not None:
+                index, user_id, telegram_id = item
+                result = await self._send(client, broadcast, telegram_id, progress)
+                progress.complete(index, user_id, result)
+                progress.processed_in_run += 1
+
+                if progress.processed_in_run % self.checkpoint_every == 0:
+                    if not await self._checkpoint(broadcast.id, progress):
+                        raise _TakenOver()
+
+        async def heartbeat() -> None:
+            # Пульс и во время пауз (429, медленная выборка получателей)
+            while True:
+                await asyncio.sleep(self.lease_seconds / 3)
+                if not await self._checkpoint(broadcast.id, progress):
+                    raise _TakenOver()
+
+        try:
+            async with httpx.AsyncClient(limits=limits, timeout=10.0) as client:
+                tasks = [asyncio.create_task(producer())] + [
+                    asyncio.create_task(sender(client)) for _ in range(self.concurrency)
+                ]
+                work = asyncio.gather(*tasks)
+                keeper = asyncio.create_task(heartbeat())
+                try:
+                    await asyncio.wait({work, keeper}, return_when=asyncio.FIRST_COMPLETED)
+                    if keeper.done():
+                        keeper.result()
+                    await work
+                finally:
+                    # Ошибка, захват или остановка — гасим всех, прежде чем сохранять прогресс
+                    for task in (*tasks, keeper):
+                        task.cancel()
+                    await asyncio.gather(*tasks, keeper, return_exceptions=True)
+        except asyncio.CancelledError:
+            # Остановка процесса: статус остаётся running, владелец снимается —
+            # продолжит первый процесс, который её захватит
+            await self._checkpoint(broadcast.id, progress, release=True)
+            logger.info(
+                f"Broadcast {broadcast.id} paused at user {progress.last_user_id}"
+            )
+            raise
+        except _TakenOver:
+            logger.warning(
+                f"Broadcast {broadcast.id} was taken over by another process, stopping"
+            )
+            return
+        except Exception as e:
+            logger.error(f"Broadcast {broadcast.id} failed: {e}")
+            progress.last_error = str(e)
+            await self._checkpoint(broadcast.id, progress, status="failed", release=True)
+            return
+
+        await self._checkpoint(broadcast.id, progress, status="completed", release=True)
+        logger.info(
+            f"Broadcast {broadcast.id} completed: {progress.sent} sent, "
+            f"{progress.failed} failed, {progress.blocked} blocked, "
+            f"{progress.rate} msg/s"
+        )
+
+    async def _send(
+        self,
+        client: httpx.AsyncClient,
+        broadcast: Broadcast,
+        telegram_id: int,
+        progress: _Progress,
+    ) -> str:
+        """Отправляет сообщение одному получателю с повторами."""
+        payload = {"chat_id": telegram_id, "text": broadcast.message}
+        if broadcast.parse_mode:
+            payload["parse_mode"] = broadcast.parse_mode
+        url = f"{self.api_base_url}/bot{settings.TELEGRAM_BOT_TOKEN}/sendMessage"
+
+        for attempt in range(1, self.max_attempts + 1):
+            await self.rate_limiter.acquire(telegram_id)
+            try:
+                response = await client.post(url, json=payload)
+                data = response.json()
+            except (httpx.HTTPError, ValueError) as e:
+                progress.last_error = f"{type(e).__name__}: {e}"
+                await asyncio.sleep(min(2 ** attempt, 30))
+                continue
+
+            if data.get("ok"):
+                return RESULT_SENT
+
+            error_code = data.get("error_code")
+            description = data.get("description", "")
+            progress.last_error = f"{error_code}: {description}"
+
+            if error_code == 429:
+                retry_after = (data.get("parameters") or {}).get("retry_after", 1)
+                logger.warning(f"Broadcast {broadcast.id}: flood limit, retry after {retry_after}s")
+                self.rate_limiter.retry_after(retry_after)
+                continue
+            if error_code == 403:
+                # Бот заблокирован или пользователь удалён
+                return RESULT_BLOCKED
+            if error_code and error_code < 500:
+                logger.warning(f"Failed to send broadcast to {telegram_id}: {description}")
+                return RESULT_FAILED
+
+            await asyncio.sleep(min(2 ** attempt, 30))
+
+        logger.warning(f"Failed to send broadcast to {telegram_id}: {progress.last_error}")
+        return RESULT_FAILED
+
+    async def _checkpoint(
+        self,
+        broadcast_id: str,
+        progress: _Progress,
+        status: Optional[str] = None,
+        release: bool = False,
+    ) -> bool:
+        """
+        Сохраняет прогресс и пульс, пока рассылка за этим процессом.
+        False — её захватил другой процесс; ошибка БД захватом не считается.
+        """
+        try:
+            return await broadcast_repo.save_progress(
+                broadcast_id,
+                sent=progress.sent,
+                failed=progress.failed,
+                blocked=progress.blocked,
+                last_user_id=progress.last_user_id,
+                last_error=progress.last_error,
+                status=status,
+                owner=self.worker_id,
+                release=release,
+            )
+        except Exception as e:
+            logger.error(f"Failed to save broadcast {broadcast_id} progress: {e}")
+            return True
+
+
+# Глобальный экземпляр
+broadcast_engine = BroadcastEngine()
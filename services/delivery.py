@@ -0,0 +1,300 @@
+"""
+Delivery dispatcher.
+Единая доставка проактивных сообщений из задач планировщика.
+
+Задача (ритуалы, напоминания, follow-up, программы, ...) собирает список
+Delivery и отдаёт его диспетчеру:
+
+- получатели загружаются одним запросом (UserRepository.get_many);
+- DELIVERY_CONCURRENCY отправителей на все задачи сразу, под общим
+  telegram_rate_limiter — тот же бюджет, что у рассылок и стриминга;
+- тексты, которым нужна генерация (Claude), собираются в отдельных
+  DELIVERY_BUILD_CONCURRENCY слотах — медленная генерация не держит
+  отправителей, и готовое сообщение уходит сразу, не дожидаясь пачки
+  (бюджет самой генерации — ai.batch_generator);
+- 429 retry_after приостанавливает всех, 403 — пользователь заблокировал бота;
+- сетевая ошибка повторяется, только если запрос точно не ушёл (не удалось
+  соединиться); таймаут ответа — «отправлено без подтверждения»: повтор мог
+  бы продублировать сообщение;
+- каждое отправленное сообщение сразу передаётся задаче (on_sent), чтобы
+  она отметила его до конца пачки — пачка может отправляться дольше
+  аренды строк (database.leases), а упавший воркер не повторит
+  уже отмеченное;
+- итог возвращается задаче списками (sent/failed/blocked/skipped);
+- метрики по задачам (очередь, отправлено, ошибки, скорость) — в /health.
+"""
+
+import asyncio
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import httpx
+from loguru import logger
+from telegram import Bot
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter, TelegramError
+
+from config.settings import settings
+from database.models import User
+from database.repositories.user import UserRepository
+from services.broadcast import RESULT_BLOCKED, RESULT_FAILED, RESULT_SENT
+from services.telegram_rate_limiter import TelegramRateLimiter, telegram_rate_limiter
+
+
+# Не отправлено: получателя нет, он отключил проактивные сообщения,
+# заблокирован админом или текст не собрался
+RESULT_SKIPPED = "skipped"
+
+# Ошибки httpx (причина NetworkError/TimedOut в PTB), при которых запрос
+# до Telegram не дошёл и его можно повторить
+_NOT_SENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+@dataclass
+class Delivery:
+    """Одно проактивное сообщение."""
+
+    user_id: int
+    text: Optional[str] = None
+    # Сборка текста для получателя (если text не задан); None — не отправлять
+    build: Optional[Callable[[User], Awaitable[Optional[str]]]] = None
+    reply_markup: Any = None
+    parse_mode: Optional[str] = None
+    # Исходная запись задачи (ScheduledMessage, UserFollowUp, ...)
+    ref: Any = None
+    # Заполняются диспетчером
+    user: Optional[User] = None
+    result: Optional[str] = None
+    # False — запрос ушёл, но ответа не было (таймаут, обрыв): считается
+    # отправленным, чтобы не продублировать
+    confirmed: bool = True
+
+
+@dataclass
+class DeliveryReport:
+    """Итог одного запуска задачи."""
+
+    job: str
+    sent: List[Delivery] = field(default_factory=list)
+    failed: List[Delivery] = field(default_factory=list)
+    blocked: List[Delivery] = field(default_factory=list)
+    skipped: List[Delivery] = field(default_factory=list)
+    duration: float = 0.0
+
+    def add(self, delivery: Delivery) -> None:
+        {
+            RESULT_SENT: self.sent,
+            RESULT_FAILED: self.failed,
+            RESULT_BLOCKED: self.blocked,
+            RESULT_SKIPPED: self.skipped,
+        }[delivery.result].append(delivery)
+
+
+@dataclass
+class _JobStats:
+    """Метрики задачи в памяти процесса."""
+    runs: int = 0
+    sent: int = 0
+    failed: int = 0
+    blocked: int = 0
+    skipped: int = 0
+    unconfirmed: int = 0
+    # Сообщений в последнем запуске и ещё не обработанных из него
+    last_batch: int = 0
+    pending: int = 0
+    last_duration: float = 0.0
+    last_run_at: Optional[str] = None
+
+
+class DeliveryDispatcher:
+    """Отправка проактивных сообщений пачками под общим лимитом Telegram."""
+
+    def __init__(
+        self,
+        concurrency: Optional[int] = None,
+        rate_limiter: Optional[TelegramRateLimiter] = None,
+        max_attempts: Optional[int] = None,
+        build_concurrency: Optional[int] = None,
+    ):
+        self.concurrency = concurrency or settings.DELIVERY_CONCURRENCY
+        self.build_concurrency = build_concurrency or settings.DELIVERY_BUILD_CONCURRENCY
+        self.rate_limiter = rate_limiter or telegram_rate_limiter
+        self.max_attempts = max_attempts or settings.DELIVERY_MAX_ATTEMPTS
+        self.user_repo = UserRepository()
+        self.bot: Optional[Bot] = None
+
+        # Слоты отправки общие для всех задач
+        self._slots = asyncio.Semaphore(self.concurrency)
+        self._build_slots = asyncio.Semaphore(self.build_concurrency)
+        self._stats: Dict[str, _JobStats] = {}
+
+    def set_bot(self, bot: Bot) -> None:
+        """Устанавливает бота (при старте планировщика)."""
+        self.bot = bot
+
+    async def dispatch(
+        self,
+        job: str,
+        deliveries: List[Delivery],
+        users: Optional[Dict[int, User]] = None,
+        require_proactive: bool = False,
+        on_sent: Optional[Callable[[Delivery], Awaitable[None]]] = None,
+    ) -> DeliveryReport:
+        """
+        Доставляет пачку сообщений.
+
+        Args:
+            job: Имя задачи (для метрик и логов)
+            deliveries: Сообщения
+            users: Уже загруженные получатели (иначе — одним запросом)
+            require_proactive: Пропускать пользователей с выключенными
+                проактивными сообщениями
+            on_sent: Отметка отправленного сообщения (вызывается сразу
+                после отправки; ошибки логируются)
+
+        Returns:
+            Отчёт со списками sent/failed/blocked/skipped
+        """
+        report = DeliveryReport(job=job)
+        stats = self._stats.setdefault(job, _JobStats())
+        stats.runs += 1
+        stats.last_batch = len(deliveries)
+        stats.last_run_at = datetime.now().isoformat()
+        if not deliveries:
+            return report
+
+        if self.bot is None:
+            raise RuntimeError("DeliveryDispatcher: bot is not set")
+
+        started = time.monotonic()
+        if users is None:
+            users = await self.user_repo.get_many([d.user_id for d in deliveries])
+        stats.pending += len(deliveries)
+
+        async def deliver(delivery: Delivery) -> None:
+            try:
+                delivery.result = await self._deliver(
+                    job, delivery, users.get(delivery.user_id), require_proactive
+                )
+                if delivery.result == RESULT_SENT and on_sent is not None:
+                    try:
+                        await on_sent(delivery)
+                    except Exception as e:
+                        logger.error(f"Delivery '{job}': failed to record message to user {delivery.user_id}: {e}")
+                report.add(delivery)
+            finally:
+                stats.pending -= 1
+
+        try:
+            await asyncio.gather(*(deliver(delivery) for delivery in deliveries))
+        finally:
+            report.duration = time.monotonic() - started
+            stats.last_duration = report.duration
+            stats.sent += len(report.sent)
+            stats.failed += len(report.failed)
+            stats.blocked += len(report.blocked)
+            stats.skipped += len(report.skipped)
+            stats.unconfirmed += sum(1 for d in report.sent if not d.confirmed)
+
+        logger.info(
+            f"Delivery '{job}': {len(report.sent)} sent, {len(report.failed)} failed, "
+            f"{len(report.blocked)} blocked, {len(report.skipped)} skipped "
+            f"in {report.duration:.1f}s"
+        )
+        return report
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Метрики по задачам для /health."""
+        return {
+            "concurrency": self.concurrency,
+            "build_concurrency": self.build_concurrency,
+            "jobs": {
+                job: {
+                    "runs": stats.runs,
+                    "last_batch": stats.last_batch,
+                    "pending": stats.pending,
+                    "sent": stats.sent,
+                    "failed": stats.failed,
+                    "blocked": stats.blocked,
+                    "skipped": stats.skipped,
+                    "unconfirmed": stats.unconfirmed,
+                    "last_duration_s": round(stats.last_duration, 2),
+                    "last_rate_per_second": (
+                        round(stats.last_batch / stats.last_duration, 1)
+                        if stats.last_duration > 0 else 0.0
+                    ),
+                    "last_run_at": stats.last_run_at,
+                }
+                for job, stats in self._stats.items()
+            },
+        }
+
+    async def _deliver(
+        self,
+        job: str,
+        delivery: Delivery,
+        user: Optional[User],
+        require_proactive: bool,
+    ) -> str:
+        """Собирает текст и отправляет одно сообщение. Исключения не пробрасываются."""
+        if user is None or user.is_blocked:
+            return RESULT_SKIPPED
+        if require_proactive and not user.proactive_messages:
+            return RESULT_SKIPPED
+        delivery.user = user
+
+        try:
+            if delivery.text is None and delivery.build is not None:
+                async with self._build_slots:
+                    delivery.text = await delivery.build(user)
+            if not delivery.text:
+                return RESULT_SKIPPED
+            async with self._slots:
+                return await self._send(user.telegram_id, delivery)
+        except Exception as e:
+            logger.error(f"Delivery '{job}' to user {user.id} failed: {e}")
+            return RESULT_FAILED
+
+    async def _send(self, chat_id: int, delivery: Delivery) -> str:
+        """
+        Отправляет сообщение с повторами при 429 и ошибках соединения.
+        Остальные сетевые ошибки (в том числе TimedOut) возникают, когда
+        запрос мог уже дойти до Telegram: сообщение считается отправленным
+        без подтверждения и не повторяется.
+        """
+        for attempt in range(1, self.max_attempts + 1):
+            await self.rate_limiter.acquire(chat_id)
+            try:
+                await self.bot.send_message(
+                    chat_id=chat_id,
+                    text=delivery.text,
+                    reply_markup=delivery.reply_markup,
+                    parse_mode=delivery.parse_mode,
+                )
+                return RESULT_SENT
+            except RetryAfter as e:
+                logger.warning(f"Delivery: flood limit, retry after {e.retry_after}s")
+                self.rate_limiter.retry_after(e.retry_after)
+            except Forbidden:
+                # Бот заблокирован или пользователь удалён
+                return RESULT_BLOCKED
+            except BadRequest as e:
+                logger.warning(f"Failed to deliver message to {chat_id}: {e}")
+                return RESULT_FAILED
+            except NetworkError as e:
+                if not isinstance(e.__cause__, _NOT_SENT_ERRORS):
+                    logger.warning(f"Delivery to {chat_id}: {e!r}, sent without confirmation")
+                    delivery.confirmed = False
+                    return RESULT_SENT
+                logger.debug(f"Delivery to {chat_id}: {e}, attempt {attempt}")
+                await asyncio.sleep(min(2 ** attempt, 30))
+            except TelegramError as e:
+                logger.warning(f"Failed to deliver message to {chat_id}: {e}")
+                return RESULT_FAILED
+
+        return RESULT_FAILED
+
+
+# Глобальный экземпляр
+delivery_dispatcher = DeliveryDispatcher()
@@ -1,12 +1,20 @@
 """
 Export Service.
 Экспорт статистики в CSV и Excel форматы.
+
+Большие выгрузки (история сообщений, пользователи) пишутся потоково:
+строки читаются из БД пачками серверного курсора и сразу кодируются
+в чанки CSV (опционально gzip) — память не зависит от числа строк.
+XLSX собирается openpyxl в write-only режиме во временный файл.
 """
 
+import asyncio
 import csv
 import io
+import tempfile
+import zlib
 from datetime import datetime, timedelta
-from typing import List, Dict, Any
+from typing import List, Dict, Any, AsyncIterable, AsyncIterator, BinaryIO, Iterable, Sequence, Tuple
 from loguru import logger
 
 from database.repositories.user import UserRepository
@@ -15,6 +23,140 @@ from database.repositories.conversation import ConversationRepository
 from database.repositories.referral import ReferralRepository
 
 
+# Размер чанка ответа (байт) — буфер CSV сбрасывается по достижении
+EXPORT_CHUNK_BYTES = 64 * 1024
+
+# Выше этого размера временный файл выгрузки уходит из памяти на диск
+EXPORT_SPOOL_BYTES = 8 * 1024 * 1024
+
+HISTORY_HEADER = ["Дата", "Роль", "Сообщение", "Тип", "Теги"]
+
+USERS_HEADER = [
+    "Telegram ID",
+    "Username",
+    "Имя",
+    "Персона",
+    "Подписка",
+    "Дата регистрации",
+    "Последняя активность",
+    "Сообщений всего",
+    "Текст",
+    "Голос",
+    "Рефералов",
+    "Заблокирован",
+]
+
+RowChunks = AsyncIterable[Iterable[Sequence[Any]]]
+
+
+async def stream_csv(
+    header: Sequence[str],
+    rows: RowChunks,
+    compress: bool = False,
+) -> AsyncIterator[bytes]:
+    """
+    Кодирует пачки строк в CSV (UTF-8 с BOM для Excel) чанками.
+
+    Args:
+        header: Заголовок
+        rows: Асинхронный поток пачек строк
+        compress: Сжимать в gzip
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # wbits=31 — zlib с gzip-заголовком
+    compressor = zlib.compressobj(wbits=31) if compress else None
+
+    def drain() -> bytes:
+        data = buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+        return compressor.compress(data) if compressor else data
+
+    buffer.write("\ufeff")
+    writer.writerow(header)
+    async for chunk in rows:
+        writer.writerows(chunk)
+        if buffer.tell() >= EXPORT_CHUNK_BYTES:
+            data = drain()
+            if data:
+                yield data
+
+    data = drain()
+    if compressor:
+        data += compressor.flush()
+    if data:
+        yield data
+
+
+async def stream_xlsx(
+    header: Sequence[str],
+    rows: RowChunks,
+    title: str = "Export",
+) -> AsyncIterator[bytes]:
+    """
+    Собирает XLSX в write-only режиме и отдаёт файл чанками.
+    Формат ZIP не позволяет отдавать файл до окончания записи,
+    поэтому книга пишется во временный файл (память не растёт).
+    """
+    output = await build_xlsx(header, rows, title)
+    try:
+        while data := output.read(EXPORT_CHUNK_BYTES):
+            yield data
+    finally:
+        output.close()
+
+
+async def build_xlsx(
+    header: Sequence[str],
+    rows: RowChunks,
+    title: str = "Export",
+) -> BinaryIO:
+    """XLSX во временном файле (openpyxl write-only), позиция — в начале."""
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font, PatternFill, Alignment
+    from openpyxl.utils import get_column_letter
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title)
+
+    # В write-only режиме ширину задаём до первой строки (автоширина невозможна)
+    for col, name in enumerate(header, 1):
+        ws.column_dimensions[get_column_letter(col)].width = min(max(len(name) + 2, 14), 50)
+
+    header_font = Font(bold=True, color="FFFFFF")
+    header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
+    header_alignment = Alignment(horizontal="center")
+    header_cells = []
+    for name in header:
+        cell = WriteOnlyCell(ws, value=name)
+        cell.font = header_font
+        cell.fill = header_fill
+        cell.alignment = header_alignment
+        header_cells.append(cell)
+    ws.append(header_cells)
+
+    async for chunk in rows:
+        for row in chunk:
+            ws.append(row)
+
+    output = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_BYTES)
+    # Упаковка ZIP — блокирующая и долгая для больших книг
+    await asyncio.to_thread(wb.save, output)
+    output.seek(0)
+    return output
+
+
+async def spool(stream: AsyncIterable[bytes]) -> BinaryIO:
+    """Собирает поток во временный файл (для отправки документом в Telegram)."""
+    output = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_BYTES)
+    async for data in stream:
+        output.write(data)
+    output.seek(0)
+    return output
+
+
 class ExportService:
     """Сервис экспорта статистики."""
 
@@ -83,157 +225,95 @@ class ExportService:
         logger.info("Exported summary statistics to CSV")
         return bytes_io
 
-    async def export_users_csv(self) -> io.BytesIO:
+    async def iter_history_rows(
+        self,
+        user_id: int,
+        role_labels: Tuple[str, str] = ("Вы", "Мира"),
+    ) -> AsyncIterator[List[List[Any]]]:
         """
-        Экспорт списка пользователей в CSV.
+        История сообщений пользователя в хронологическом порядке, пачками строк.
 
-        Returns:
-            BytesIO с CSV данными
+        Args:
+            user_id: ID пользователя
+            role_labels: Подписи ролей (user, assistant)
         """
-        # Получаем всех пользователей
-        users, total = await self.user_repo.get_paginated(page=1, per_page=10000)
-
-        output = io.StringIO()
-        writer = csv.writer(output)
-
-        # Заголовки
-        writer.writerow([
-            "Telegram ID",
-            "Username",
-            "Имя",
-            "Персона",
-            "Подписка",
-            "Дата регистрации",
-            "Последняя активность",
-            "Сообщений всего",
-            "Текст",
-            "Голос",
-            "Рефералов",
-            "Заблокирован",
-        ])
-
-        # Данные
-        for user in users:
-            # Получаем подписку
-            sub = await self.subscription_repo.get_active(user.id)
-            plan = "Premium" if sub and sub.plan == "premium" else "Free"
-
-            # Получаем статистику сообщений
-            stats = await self.conversation_repo.get_user_message_stats(user.id)
-
-            # Получаем рефералов
-            referral_count = await self.referral_repo.count_by_referrer(user.id)
+        user_label, assistant_label = role_labels
+        async for chunk in self.conversation_repo.stream_history(user_id):
+            yield [
+                [
+                    created_at.strftime("%Y-%m-%d %H:%M:%S"),
+                    user_label if role == "user" else assistant_label,
+                    content,
+                    message_type or "text",
+                    ", ".join(tags) if tags else "",
+                ]
+                for created_at, role, content, message_type, tags in chunk
+            ]
+
+    def stream_history(
+        self,
+        user_id: int,
+        export_format: str = "csv",
+        role_labels: Tuple[str, str] = ("Вы", "Мира"),
+        compress: bool = False,
+    ) -> AsyncIterator[bytes]:
+        """
+        Поток файла истории сообщений без ограничения на число сообщений.
 
-            writer.writerow([
-                user.telegram_id,
-                user.username or "",
-                user.display_name or user.first_name or "",
-                user.persona or "mira",
-                plan,
-                user.created_at.strftime("%Y-%m-%d %H:%M") if user.created_at else "",
-                user.last_active_at.strftime("%Y-%m-%d %H:%M") if user.last_active_at else "",
-                stats["total"],
-                stats["text"],
-                stats["voice"],
-                referral_count,
-                "Да" if user.is_blocked else "Нет",
-            ])
+        Args:
+            user_id: ID пользователя
+            export_format: csv или xlsx
+            role_labels: Подписи ролей (user, assistant)
+            compress: gzip (только для CSV)
+        """
+        rows = self.iter_history_rows(user_id, role_labels)
+        if export_format == "xlsx":
+            return stream_xlsx(HISTORY_HEADER, rows, title="История")
+        return stream_csv(HISTORY_HEADER, rows, compress=compress)
+
+    async def iter_user_rows(self) -> AsyncIterator[List[List[Any]]]:
+        """Все пользователи для выгрузки, пачками строк (по колонкам USERS_HEADER)."""
+        async for chunk in self.user_repo.stream_export_rows():
+            yield [
+                [
+                    user.telegram_id,
+                    user.username or "",
+                    user.display_name or user.first_name or "",
+                    user.persona or "mira",
+                    "Premium" if is_premium else "Free",
+                    user.created_at.strftime("%Y-%m-%d %H:%M") if user.created_at else "",
+                    user.last_active_at.strftime("%Y-%m-%d %H:%M") if user.last_active_at else "",
+                    total,
+                    text,
+                    voice,
+                    referral_count,
+                    "Да" if user.is_blocked else "Нет",
+                ]
+                for user, is_premium, total, text, voice, referral_count in chunk
+            ]
+
+    async def export_users_csv(self) -> BinaryIO:
+        """
+        Экспорт списка пользователей в CSV.
 
-        output.seek(0)
-        bytes_io = io.BytesIO(output.getvalue().encode("utf-8-sig"))
-        bytes_io.seek(0)
+        Returns:
+            Файл с CSV данными (позиция — в начале)
+        """
+        output = await spool(stream_csv(USERS_HEADER, self.iter_user_rows()))
 
-        logger.info(f"Exported {total} users to CSV")
-        return bytes_io
+        logger.info("Exported users to CSV")
+        return output
 
-    async def export_users_excel(self) -> io.BytesIO:
+    async def export_users_excel(self) -> BinaryIO:
         """
         Экспорт списка пользователей в Excel.
 
         Returns:
-            BytesIO с Excel данными
+            Файл с Excel данными (позиция — в начале)
         """
-        from openpyxl import Workbook
-        from openpyxl.styles import Font, PatternFill, Alignment
-
-        # Получаем всех пользователей
-        users, total = await self.user_repo.get_paginated(page=1, per_page=10000)
-
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Пользователи"
-
-        # Стили
-        header_font = Font(bold=True, color="FFFFFF")
-        header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
-        header_alignment = Alignment(horizontal="center")
-
-        # Заголовки
-        headers = [
-            "Telegram ID",
-            "Username",
-            "Имя",
-            "Персона",
-            "Подписка",
-            "Дата регистрации",
-            "Последняя активность",
-            "Сообщений всего",
-            "Текст",
-            "Голос",
-            "Рефералов",
-            "Заблокирован",
-        ]
-
-        for col, header in enumerate(headers, 1):
-            cell = ws.cell(row=1, column=col, value=header)
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = header_alignment
-
-        # Данные
-        for row, user in enumerate(users, 2):
-            # Получаем подписку
-            sub = await self.subscription_repo.get_active(user.id)
-            plan = "Premium" if sub and sub.plan == "premium" else "Free"
-
-            # Получаем статистику сообщений
-            stats = await self.conversation_repo.get_user_message_stats(user.id)
-
-            # Получаем рефералов
-            referral_count = await self.referral_repo.count_by_referrer(user.id)
-
-            ws.cell(row=row, column=1, value=user.telegram_id)
-            ws.cell(row=row, column=2, value=user.username or "")
-            ws.cell(row=row, column=3, value=user.display_name or user.first_name or "")
-            ws.cell(row=row, column=4, value=user.persona or "mira")
-            ws.cell(row=row, column=5, value=plan)
-            ws.cell(row=row, column=6, value=user.created_at.strftime("%Y-%m-%d %H:%M") if user.created_at else "")
-            ws.cell(row=row, column=7, value=user.last_active_at.strftime("%Y-%m-%d %H:%M") if user.last_active_at else "")
-            ws.cell(row=row, column=8, value=stats["total"])
-            ws.cell(row=row, column=9, value=stats["text"])
-            ws.cell(row=row, column=10, value=stats["voice"])
-            ws.cell(row=row, column=11, value=referral_count)
-            ws.cell(row=row, column=12, value="Да" if user.is_blocked else "Нет")
-
-        # Автоширина колонок
-        for column in ws.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)
-            ws.column_dimensions[column_letter].width = adjusted_width
-
-        # Сохраняем в BytesIO
-        output = io.BytesIO()
-        wb.save(output)
-        output.seek(0)
+        output = await build_xlsx(USERS_HEADER, self.iter_user_rows(), title="Пользователи")
 
-        logger.info(f"Exported {total} users to Excel")
+        logger.info("Exported users to Excel")
         return output
 
     async def export_referrals_csv(self) -> io.BytesIO:
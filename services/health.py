@@ -12,6 +12,12 @@ from loguru import logger
 from config.settings import settings
 from services.redis_client import redis_client
 from database.session import async_session, get_pool_status
+from database.context_cache import context_cache
+from services.background_tasks import background_tasks
+from database.api_cost_recorder import api_cost_recorder
+from bot.update_processor import update_processor
+from services.delivery import delivery_dispatcher
+from ai.batch_generator import batch_generator
 from sqlalchemy import text
 
 
@@ -102,6 +108,24 @@ class HealthCheckServer:
         pool_status = get_pool_status()
         checks["checks"]["db_pool"] = pool_status
 
+        # Попадания в кэш контекста (сколько секций не пошло в БД)
+        checks["checks"]["context_cache"] = context_cache.get_stats()
+
+        # Очередь фоновых задач: глубина и задержка
+        checks["checks"]["background_tasks"] = background_tasks.get_stats()
+
+        # Буфер записи расходов на API
+        checks["checks"]["api_cost_recorder"] = api_cost_recorder.get_stats()
+
+        # Обработка апдейтов: занятые слоты и очереди чатов
+        checks["checks"]["updates"] = update_processor.get_stats()
+
+        # Проактивные сообщения: очередь и скорость по задачам планировщика
+        checks["checks"]["delivery"] = delivery_dispatcher.get_stats()
+
+        # Генерация проактивных текстов: бюджет Claude, дедупликация, кэш
+        checks["checks"]["generation"] = batch_generator.get_stats()
+
         # Общий статус
         if not all_healthy:
             checks["status"] = "unhealthy"
@@ -4,7 +4,7 @@ Redis client service.
 """
 
 import redis.asyncio as redis
-from typing import Optional, Any
+from typing import Any, List, Optional
 from loguru import logger
 
 from config.settings import settings
@@ -135,6 +135,66 @@ class RedisClient:
             logger.error(f"Redis SETEX error: {e}")
             return False
 
+    async def hgetall(self, key: str) -> dict:
+        """Получает все поля хэша."""
+        if not self._redis:
+            return {}
+        try:
+            return await self._redis.hgetall(key)
+        except Exception as e:
+            logger.error(f"Redis HGETALL error: {e}")
+            return {}
+
+    async def hset(
+        self,
+        key: str,
+        field: str,
+        value: Any,
+        expire: Optional[int] = None,
+    ) -> bool:
+        """
+        Устанавливает поле хэша.
+
+        Args:
+            key: Ключ хэша
+            field: Поле
+            value: Значение
+            expire: Время жизни всего хэша в секундах
+        """
+        if not self._redis:
+            return False
+        try:
+            async with self._redis.pipeline(transaction=False) as pipe:
+                pipe.hset(key, field, value)
+                if expire:
+                    pipe.expire(key, expire)
+                await pipe.execute()
+            return True
+        except Exception as e:
+            logger.error(f"Redis HSET error: {e}")
+            return False
+
+    async def hdel(self, key: str, *fields: str) -> bool:
+        """Удаляет поля хэша."""
+        if not self._redis:
+            return False
+        try:
+            await self._redis.hdel(key, *fields)
+            return True
+        except Exception as e:
+            logger.error(f"Redis HDEL error: {e}")
+            return False
+
+    async def eval(self, script: str, keys: List[str], args: List[Any]) -> Any:
+        """Выполняет Lua-скрипт (атомарно на стороне Redis)."""
+        if not self._redis:
+            return None
+        try:
+            return await self._redis.eval(script, len(keys), *keys, *args)
+        except Exception as e:
+            logger.error(f"Redis EVAL error: {e}")
+            return None
+
 
 # Глобальный экземпляр
 redis_client = RedisClient()
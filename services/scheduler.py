@@ -1,10 +1,30 @@
 """
 Scheduler Service.
 Планировщик задач для ритуалов и напоминаний.
+
+Планировщик работает в процессе бота или в отдельных воркерах
+(python -m bot.worker, SCHEDULER_ENABLED=false у бота). Воркеров может
+быть несколько:
+
+- очереди (ритуалы, check-in целей, follow-up, задания программ) разбираются
+  параллельно — каждый воркер захватывает свои строки арендой
+  (database.leases, FOR UPDATE SKIP LOCKED), продлевает её, пока пачка
+  отправляется, и отмечает каждое сообщение сразу после отправки;
+- общие задачи (поздравления, напоминания, сводки, очистка) за свой слот
+  выполняет один воркер — первый, кто записал запуск в scheduler_runs.
+
+Проактивные сообщения уходят в местное время пользователя
+(utils.fire_time): ритуалы, поздравления и сводки заранее ставятся
+в scheduled_messages, check-in целей — в user_goals.next_check_in, и
+частые задачи забирают наступившие равномерным потоком.
 """
 
-from datetime import datetime, timedelta
+import os
 import random
+import socket
+from datetime import datetime, timedelta
+from functools import partial
+from typing import Awaitable, Callable, Optional
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
 from apscheduler.triggers.interval import IntervalTrigger
@@ -14,19 +34,33 @@ from loguru import logger
 from database.repositories.user import UserRepository
 from database.repositories.scheduled_message import ScheduledMessageRepository
 from database.repositories.subscription import SubscriptionRepository
+from database.repositories.scheduler_run import SchedulerRunRepository
+from database.leases import Lease
+from database.models import ScheduledMessage, UserFollowUp, UserGoal, UserProgram
 from ai.prompts.rituals import MORNING_CHECKIN_PROMPTS, EVENING_CHECKIN_PROMPTS
+from config.settings import settings
+from services.delivery import Delivery, delivery_dispatcher
+from utils.fire_time import fire_time_on, next_fire_time
 
 
 # Глобальный планировщик
 scheduler: AsyncIOScheduler = None
 app: Application = None
 
+# Идентификатор воркера в scheduler_runs
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+HOUR = timedelta(hours=1)
+DAY = timedelta(days=1)
+WEEK = timedelta(weeks=1)
+
 
 def start_scheduler(application: Application) -> None:
     """Запускает планировщик задач."""
     global scheduler, app
     
     app = application
+    delivery_dispatcher.set_bot(application.bot)
     scheduler = AsyncIOScheduler()
     
     # Обработка запланированных сообщений — каждую минуту
@@ -39,48 +73,58 @@ def start_scheduler(application: Application) -> None:
     
     # Очистка старых сообщений — раз в день в 3:00
     scheduler.add_job(
-        cleanup_old_messages,
+        partial(run_exclusive, "cleanup_messages", DAY, cleanup_old_messages),
         trigger=CronTrigger(hour=3, minute=0),
         id="cleanup_messages",
         replace_existing=True,
     )
     
+    # Сверка счётчиков сообщений с историей — раз в день в 3:30
+    scheduler.add_job(
+        partial(run_exclusive, "reconcile_counters", DAY, reconcile_message_counters),
+        trigger=CronTrigger(hour=3, minute=30),
+        id="reconcile_counters",
+        replace_existing=True,
+    )
+
     # Напоминания об истечении подписки — раз в день в 10:00
     scheduler.add_job(
-        send_expiration_reminders,
+        partial(run_exclusive, "expiration_reminders", DAY, send_expiration_reminders),
         trigger=CronTrigger(hour=10, minute=0),
         id="expiration_reminders",
         replace_existing=True,
     )
 
-    # Проверка праздников (дни рождения, годовщины) — каждое утро в 9:00
+    # Планирование поздравлений на завтра (уходят в CELEBRATION_TIME по местному времени)
     scheduler.add_job(
-        check_celebrations,
-        trigger=CronTrigger(hour=9, minute=0),
+        partial(run_exclusive, "check_celebrations", DAY, check_celebrations),
+        trigger=CronTrigger(hour=12, minute=0),
         id="check_celebrations",
         replace_existing=True,
     )
 
     # Конвертация истёкших trial подписок в free — каждый час
     scheduler.add_job(
-        convert_expired_trials,
-        trigger=IntervalTrigger(hours=1),
+        partial(run_exclusive, "convert_trials", HOUR, convert_expired_trials),
+        trigger=CronTrigger(minute=0),
         id="convert_trials",
         replace_existing=True,
     )
 
-    # Bi-weekly прогресс-сводки — каждый понедельник в 19:00
+    # Планирование bi-weekly сводок на понедельник — каждое воскресенье
+    # (уходят в BIWEEKLY_SUMMARY_TIME по местному времени)
     scheduler.add_job(
-        send_biweekly_summaries,
-        trigger=CronTrigger(day_of_week='mon', hour=19, minute=0),
+        partial(run_exclusive, "biweekly_summaries", WEEK, send_biweekly_summaries),
+        trigger=CronTrigger(day_of_week='sun', hour=12, minute=0),
         id="biweekly_summaries",
         replace_existing=True,
     )
 
-    # Check-in по целям — каждый день в 20:00
+    # Check-in по целям — next_check_in уже в местном GOAL_CHECKIN_TIME,
+    # забираем наступившие каждые 5 минут
     scheduler.add_job(
         send_goal_checkins,
-        trigger=CronTrigger(hour=20, minute=0),
+        trigger=IntervalTrigger(minutes=5),
         id="goal_checkins",
         replace_existing=True,
     )
@@ -103,7 +147,7 @@ def start_scheduler(application: Application) -> None:
 
     # Очистка старых файлов в GCS — раз в день в 4:00
     scheduler.add_job(
-        cleanup_expired_files,
+        partial(run_exclusive, "cleanup_gcs_files", DAY, cleanup_expired_files),
         trigger=CronTrigger(hour=4, minute=0),
         id="cleanup_gcs_files",
         replace_existing=True,
@@ -111,8 +155,8 @@ def start_scheduler(application: Application) -> None:
 
     # Напоминания о незавершённом онбординге — каждый час
     scheduler.add_job(
-        send_onboarding_reminders,
-        trigger=IntervalTrigger(hours=1),
+        partial(run_exclusive, "onboarding_reminders", HOUR, send_onboarding_reminders),
+        trigger=CronTrigger(minute=5),
         id="onboarding_reminders",
         replace_existing=True,
     )
@@ -130,6 +174,37 @@ def stop_scheduler() -> None:
         logger.info("Scheduler stopped")
 
 
+def run_slot(period: timedelta, now: Optional[datetime] = None) -> datetime:
+    """
+    Начало слота, в который попадает now.
+    Слоты отсчитываются от 0001-01-01 (понедельник): дни с полуночи,
+    часы с :00, недели с понедельника.
+    """
+    now = now or datetime.now()
+    return datetime.min + ((now - datetime.min) // period) * period
+
+
+async def run_exclusive(
+    job: str,
+    period: timedelta,
+    func: Callable[[], Awaitable[None]],
+) -> bool:
+    """
+    Выполняет общую задачу, если запуск в текущем слоте достался этому воркеру.
+    Остальные воркеры, сработавшие по тому же расписанию, её пропускают.
+
+    Returns:
+        True, если задача выполнялась здесь
+    """
+    slot = run_slot(period)
+    if not await SchedulerRunRepository().claim(job, slot, WORKER_ID):
+        logger.debug(f"Scheduler job '{job}' for {slot} is run by another worker")
+        return False
+
+    await func()
+    return True
+
+
 async def process_scheduled_messages() -> None:
     """Обрабатывает запланированные сообщения."""
     global app
@@ -138,43 +213,59 @@ async def process_scheduled_messages() -> None:
         return
     
     scheduled_repo = ScheduledMessageRepository()
-    user_repo = UserRepository()
     
-    pending = await scheduled_repo.get_pending()
+    # Захватываем пачку — другие воркеры её не возьмут
+    pending = await scheduled_repo.claim_pending(limit=settings.DELIVERY_BATCH_SIZE)
+    _log_backlog("scheduled_messages", pending)
     
-    for msg in pending:
-        try:
-            user = await user_repo.get(msg.user_id)
-            
-            if not user:
-                await scheduled_repo.cancel(msg.id)
-                continue
-            
-            # Проверяем, включены ли проактивные сообщения
-            if not user.proactive_messages:
-                await scheduled_repo.cancel(msg.id)
-                continue
-            
-            # Определяем текст сообщения
-            content = msg.content
-            if not content:
-                content = await _generate_ritual_content(msg.type, user)
-            
-            # Отправляем
-            await app.bot.send_message(
-                chat_id=user.telegram_id,
-                text=content,
-            )
-            
-            await scheduled_repo.mark_sent(msg.id)
-            
-            # Планируем следующее сообщение этого типа
-            await _reschedule_ritual(user, msg.type)
-            
-            logger.debug(f"Sent scheduled message {msg.id} to user {user.id}")
-            
-        except Exception as e:
-            logger.error(f"Failed to send scheduled message {msg.id}: {e}")
+    deliveries = [
+        Delivery(
+            user_id=msg.user_id,
+            text=msg.content or None,
+            # Без готового текста — собираем при отправке
+            build=None if msg.content else _content_builder(msg.type),
+            ref=msg,
+        )
+        for msg in pending
+    ]
+    async def on_sent(delivery: Delivery) -> None:
+        await scheduled_repo.mark_sent_many([delivery.ref.id])
+        lease.release(delivery.ref.id)
+        # Планируем следующее сообщение этого типа (разовые не повторяются)
+        if delivery.ref.type not in ONE_OFF_TYPES:
+            await scheduled_repo.create_many([_next_ritual(delivery.user, delivery.ref.type)])
+
+    async with Lease(ScheduledMessage.scheduled_for, pending) as lease:
+        report = await delivery_dispatcher.dispatch(
+            "scheduled_messages", deliveries, require_proactive=True, on_sent=on_sent
+        )
+        # Пользователя нет, проактивные выключены или бот заблокирован — не повторяем
+        await scheduled_repo.cancel_many([d.ref.id for d in report.skipped + report.blocked])
+
+    summaries = [d for d in report.sent if d.ref.type == "biweekly_summary"]
+    if summaries:
+        await _remember_summaries(summaries)
+
+
+# Разовые сообщения, которые ставят check_celebrations и send_biweekly_summaries
+ONE_OFF_TYPES = ("birthday", "anniversary", "biweekly_summary")
+
+
+def _content_builder(message_type: str):
+    """Сборка текста запланированного сообщения по типу."""
+    builders = {
+        "birthday": _generate_birthday_message,
+        "anniversary": _generate_anniversary_message,
+        "biweekly_summary": _build_biweekly_summary,
+    }
+    # Остальное — персонализированный ритуал
+    return builders.get(message_type) or partial(_generate_ritual_content, message_type)
+
+
+def _log_backlog(job: str, batch: list) -> None:
+    """Пачка задачи заполнена целиком — остаток уйдёт в следующий запуск."""
+    if len(batch) >= settings.DELIVERY_BATCH_SIZE:
+        logger.warning(f"Scheduler job '{job}': batch of {len(batch)} is full, backlog carries over")
 
 
 async def _generate_ritual_content(ritual_type: str, user) -> str:
@@ -187,7 +278,7 @@ async def _generate_ritual_content(ritual_type: str, user) -> str:
             from database.repositories.mood import MoodRepository
             from database.repositories.conversation import ConversationRepository
             from ai.prompts.checkin import build_checkin_prompt
-            from ai.claude_client import ClaudeClient
+            from ai.batch_generator import batch_generator
 
             memory_repo = MemoryRepository()
             mood_repo = MoodRepository()
@@ -207,12 +298,12 @@ async def _generate_ritual_content(ritual_type: str, user) -> str:
                 last_message=last_message,
             )
 
-            # Генерируем через Claude
-            claude = ClaudeClient()
-            result = await claude.generate_simple(
-                system_prompt=prompt["system"],
-                user_prompt=prompt["user"],
+            # Генерируем через Claude; без личного контекста промпт шаблонный
+            result = await batch_generator.generate(
+                prompt["system"],
+                prompt["user"],
                 max_tokens=200,
+                cacheable=not (recent_topics or recent_mood or last_message),
             )
 
             logger.debug(f"Generated personalized check-in for user {user.id}")
@@ -235,39 +326,29 @@ async def _generate_ritual_content(ritual_type: str, user) -> str:
         return "Привет 💛 Как ты сегодня?"
 
 
-async def _reschedule_ritual(user, ritual_type: str) -> None:
-    """Планирует следующее сообщение ритуала."""
-    
-    from config.settings import settings
-    
-    scheduled_repo = ScheduledMessageRepository()
-    
-    now = datetime.now()
+def _next_ritual(user, ritual_type: str) -> dict:
+    """Следующее сообщение ритуала (строка для create_many)."""
     
     if ritual_type == "morning_checkin":
-        # Следующее утро (через 1-2 дня, случайно)
+        # Следующее утро (через 1-3 дня, случайно) по местному времени
         days_ahead = random.choice([1, 2, 3])
         time_str = user.preferred_time_morning or settings.RITUAL_MORNING_DEFAULT
-        hour, minute = map(int, time_str.split(":"))
-        
-        next_time = now.replace(hour=hour, minute=minute, second=0) + timedelta(days=days_ahead)
+        next_time = next_fire_time(user.timezone, time_str, user.id, days_ahead=days_ahead)
         
     elif ritual_type == "evening_checkin":
         # Следующий вечер
         time_str = user.preferred_time_evening or settings.RITUAL_EVENING_DEFAULT
-        hour, minute = map(int, time_str.split(":"))
-        
-        next_time = now.replace(hour=hour, minute=minute, second=0) + timedelta(days=1)
+        next_time = next_fire_time(user.timezone, time_str, user.id, days_ahead=1)
         
     else:
         # Дефолт — через день
-        next_time = now + timedelta(days=1)
+        next_time = datetime.now() + timedelta(days=1)
     
-    await scheduled_repo.create(
-        user_id=user.id,
-        type=ritual_type,
-        scheduled_for=next_time,
-    )
+    return {
+        "user_id": user.id,
+        "type": ritual_type,
+        "scheduled_for": next_time,
+    }
 
 
 async def cleanup_old_messages() -> None:
@@ -280,6 +361,43 @@ async def cleanup_old_messages() -> None:
     if deleted > 0:
         logger.info(f"Cleaned up {deleted} old scheduled messages")
 
+    await SchedulerRunRepository().delete_old(days=30)
+
+
+async def reconcile_message_counters() -> None:
+    """
+    Пересчитывает счётчики сообщений (user_counters) по истории
+    и исправляет расхождения. Запускается раз в день в 3:30.
+    """
+    from database.repositories.counters import counters_repo
+
+    try:
+        repaired = await counters_repo.reconcile()
+        if repaired > 0:
+            logger.info(f"Message counters reconciled: {repaired} users repaired")
+    except Exception as e:
+        logger.error(f"Message counters reconcile failed: {e}")
+
+
+# Напоминания об истечении подписки: за сколько дней -> текст
+EXPIRATION_REMINDERS = {
+    7: (
+        "💛 Привет! Хотела напомнить — твоя подписка заканчивается через неделю.\n\n"
+        "Если хочешь продолжить общаться без ограничений — можешь продлить заранее. "
+        "А если что-то не так — напиши, я выслушаю."
+    ),
+    3: (
+        "Твоя подписка заканчивается через 3 дня.\n\n"
+        "Напиши /subscription, чтобы продлить.\n"
+        "Или, если хочешь, включи автоплатёж — так не придётся каждый раз помнить 💛"
+    ),
+    1: (
+        "⏰ Завтра заканчивается твоя Premium подписка.\n\n"
+        "После этого я по-прежнему буду рядом, но с ограничениями free-плана.\n"
+        "Напиши /subscription, если хочешь продлить."
+    ),
+}
+
 
 async def send_expiration_reminders() -> None:
     """Отправляет напоминания об истечении подписки."""
@@ -289,68 +407,22 @@ async def send_expiration_reminders() -> None:
         return
     
     subscription_repo = SubscriptionRepository()
-    user_repo = UserRepository()
-    
-    # За 7 дней
-    expiring_7 = await subscription_repo.get_expiring(days=7, exact=True)
-    for sub in expiring_7:
-        if sub.auto_renew:
-            continue
-        
-        user = await user_repo.get(sub.user_id)
-        if user:
-            text = (
-                "💛 Привет! Хотела напомнить — твоя подписка заканчивается через неделю.\n\n"
-                "Если хочешь продолжить общаться без ограничений — можешь продлить заранее. "
-                "А если что-то не так — напиши, я выслушаю."
-            )
-            try:
-                await app.bot.send_message(chat_id=user.telegram_id, text=text)
-            except Exception as e:
-                logger.error(f"Failed to send reminder to user {user.id}: {e}")
     
-    # За 3 дня
-    expiring_3 = await subscription_repo.get_expiring(days=3, exact=True)
-    for sub in expiring_3:
-        if sub.auto_renew:
-            continue
-        
-        user = await user_repo.get(sub.user_id)
-        if user:
-            text = (
-                "Твоя подписка заканчивается через 3 дня.\n\n"
-                "Напиши /subscription, чтобы продлить.\n"
-                "Или, если хочешь, включи автоплатёж — так не придётся каждый раз помнить 💛"
-            )
-            try:
-                await app.bot.send_message(chat_id=user.telegram_id, text=text)
-            except Exception as e:
-                logger.error(f"Failed to send reminder to user {user.id}: {e}")
+    deliveries = []
+    for days, text in EXPIRATION_REMINDERS.items():
+        expiring = await subscription_repo.get_expiring(days=days, exact=True)
+        deliveries.extend(
+            Delivery(user_id=sub.user_id, text=text)
+            for sub in expiring
+            if not sub.auto_renew
+        )
     
-    # За 1 день
-    expiring_1 = await subscription_repo.get_expiring(days=1, exact=True)
-    for sub in expiring_1:
-        if sub.auto_renew:
-            continue
-        
-        user = await user_repo.get(sub.user_id)
-        if user:
-            text = (
-                "⏰ Завтра заканчивается твоя Premium подписка.\n\n"
-                "После этого я по-прежнему буду рядом, но с ограничениями free-плана.\n"
-                "Напиши /subscription, если хочешь продлить."
-            )
-            try:
-                await app.bot.send_message(chat_id=user.telegram_id, text=text)
-            except Exception as e:
-                logger.error(f"Failed to send reminder to user {user.id}: {e}")
+    await delivery_dispatcher.dispatch("expiration_reminders", deliveries)
 
 
 async def schedule_user_rituals(user_id: int) -> None:
     """Планирует ритуалы для пользователя."""
     
-    from config.settings import settings
-    
     user_repo = UserRepository()
     scheduled_repo = ScheduledMessageRepository()
     
@@ -361,17 +433,10 @@ async def schedule_user_rituals(user_id: int) -> None:
     
     rituals = user.rituals_enabled or []
     
-    now = datetime.now()
-    
-    # Утренний check-in
+    # Утренний check-in — ближайшее утро по местному времени
     if "morning" in rituals:
         time_str = user.preferred_time_morning or settings.RITUAL_MORNING_DEFAULT
-        hour, minute = map(int, time_str.split(":"))
-        
-        # Выбираем случайные дни недели (2-3 раза)
-        next_time = now.replace(hour=hour, minute=minute, second=0)
-        if next_time <= now:
-            next_time += timedelta(days=1)
+        next_time = next_fire_time(user.timezone, time_str, user_id)
         
         await scheduled_repo.create(
             user_id=user_id,
@@ -382,11 +447,7 @@ async def schedule_user_rituals(user_id: int) -> None:
     # Вечерний check-in
     if "evening" in rituals:
         time_str = user.preferred_time_evening or settings.RITUAL_EVENING_DEFAULT
-        hour, minute = map(int, time_str.split(":"))
-        
-        next_time = now.replace(hour=hour, minute=minute, second=0)
-        if next_time <= now:
-            next_time += timedelta(days=1)
+        next_time = next_fire_time(user.timezone, time_str, user_id)
         
         await scheduled_repo.create(
             user_id=user_id,
@@ -415,52 +476,45 @@ async def cancel_user_ritual(user_id: int, ritual_type: str) -> int:
 
 async def check_celebrations() -> None:
     """
-    Проверяет дни рождения и годовщины.
-    Отправляет персонализированные поздравления.
+    Планирует поздравления с днями рождения и годовщинами на завтра.
+    Каждое уходит в CELEBRATION_TIME по местному времени пользователя;
+    текст генерируется при отправке (process_scheduled_messages).
+    Запускается в полдень: завтрашнее утро ещё не наступило ни в одном поясе.
     """
-    global app
-
-    if not app:
-        return
-
     user_repo = UserRepository()
+    scheduled_repo = ScheduledMessageRepository()
 
-    today = datetime.now()
-    month = today.month
-    day = today.day
-
-    logger.info(f"Checking celebrations for {day:02d}.{month:02d}")
-
-    # Дни рождения
-    birthday_users = await user_repo.get_by_celebration_date("birthday", month, day)
+    tomorrow = (datetime.now() + timedelta(days=1)).date()
 
-    for user in birthday_users:
-        try:
-            content = await _generate_birthday_message(user)
-            await app.bot.send_message(chat_id=user.telegram_id, text=content)
-            logger.info(f"Sent birthday greeting to user {user.id}")
-        except Exception as e:
-            logger.error(f"Failed to send birthday greeting to user {user.id}: {e}")
+    logger.info(f"Planning celebrations for {tomorrow.day:02d}.{tomorrow.month:02d}")
 
-    # Годовщины
-    anniversary_users = await user_repo.get_by_celebration_date("anniversary", month, day)
+    # Дни рождения и годовщины (у пользователя может совпасть и то, и другое)
+    rows = []
+    for celebration in ("birthday", "anniversary"):
+        users = await user_repo.get_by_celebration_date(
+            celebration, tomorrow.month, tomorrow.day
+        )
+        rows.extend(
+            {
+                "user_id": user.id,
+                "type": celebration,
+                "scheduled_for": fire_time_on(
+                    user.timezone, tomorrow, settings.CELEBRATION_TIME, user.id
+                ),
+            }
+            for user in users
+        )
 
-    for user in anniversary_users:
-        try:
-            content = await _generate_anniversary_message(user)
-            await app.bot.send_message(chat_id=user.telegram_id, text=content)
-            logger.info(f"Sent anniversary greeting to user {user.id}")
-        except Exception as e:
-            logger.error(f"Failed to send anniversary greeting to user {user.id}: {e}")
+    planned = await scheduled_repo.create_many(rows)
 
-    logger.info(f"Celebrations check complete: {len(birthday_users)} birthdays, {len(anniversary_users)} anniversaries")
+    logger.info(f"Celebrations planned: {planned} greetings for {tomorrow.isoformat()}")
 
 
 async def _generate_birthday_message(user) -> str:
     """Генерирует поздравление с днём рождения."""
     try:
         from ai.prompts.celebrations import build_birthday_prompt
-        from ai.claude_client import ClaudeClient
+        from ai.batch_generator import batch_generator
         from database.repositories.memory import MemoryRepository
 
         # Получаем контекст из памяти
@@ -470,11 +524,11 @@ async def _generate_birthday_message(user) -> str:
 
         prompt = build_birthday_prompt(user=user, context=context)
 
-        claude = ClaudeClient()
-        result = await claude.generate_simple(
-            system_prompt=prompt["system"],
-            user_prompt=prompt["user"],
+        result = await batch_generator.generate(
+            prompt["system"],
+            prompt["user"],
             max_tokens=300,
+            cacheable=context is None,
         )
 
         return result
@@ -490,7 +544,7 @@ async def _generate_anniversary_message(user) -> str:
     """Генерирует поздравление с годовщиной."""
     try:
         from ai.prompts.celebrations import build_anniversary_prompt
-        from ai.claude_client import ClaudeClient
+        from ai.batch_generator import batch_generator
         from database.repositories.memory import MemoryRepository
 
         # Получаем контекст о браке из памяти
@@ -509,11 +563,11 @@ async def _generate_anniversary_message(user) -> str:
 
         prompt = build_anniversary_prompt(user=user, years=years, context=context)
 
-        claude = ClaudeClient()
-        result = await claude.generate_simple(
-            system_prompt=prompt["system"],
-            user_prompt=prompt["user"],
+        result = await batch_generator.generate(
+            prompt["system"],
+            prompt["user"],
             max_tokens=300,
+            cacheable=context is None,
         )
 
         return result
@@ -560,71 +614,68 @@ async def convert_expired_trials() -> None:
 
 async def send_biweekly_summaries() -> None:
     """
-    Отправляет bi-weekly сводки прогресса активным пользователям.
-    Запускается каждый понедельник.
+    Планирует bi-weekly сводки прогресса активным пользователям на понедельник.
+    Каждая уходит в BIWEEKLY_SUMMARY_TIME по местному времени; нужна ли
+    сводка и её текст решаются при отправке (_build_biweekly_summary).
+    Запускается каждое воскресенье.
     """
-    global app
-
-    if not app:
-        return
-
-    from ai.summary_generator import summary_generator
-    from database.repositories.memory import MemoryRepository
-
     user_repo = UserRepository()
-    memory_repo = MemoryRepository()
+    scheduled_repo = ScheduledMessageRepository()
 
     # Получаем всех активных пользователей
     active_users = await user_repo.get_active_users(days=14)
 
-    summaries_sent = 0
+    planned = await scheduled_repo.create_many([
+        {
+            "user_id": user.id,
+            "type": "biweekly_summary",
+            "scheduled_for": next_fire_time(
+                user.timezone, settings.BIWEEKLY_SUMMARY_TIME, user.id, weekday=0
+            ),
+        }
+        for user in active_users
+    ])
 
-    for user in active_users:
-        try:
-            # Проверяем нужно ли отправлять сводку
-            should_send = await summary_generator.should_send_summary(user.id)
+    logger.info(f"Bi-weekly summaries planned: {planned} users")
 
-            if not should_send:
-                logger.debug(f"Skipping summary for user {user.id}: not eligible")
-                continue
 
-            # Генерируем сводку
-            summary_text = await summary_generator.generate_biweekly_summary(
-                user_id=user.id,
-                period_days=14,
-            )
-
-            if not summary_text:
-                logger.debug(f"Could not generate summary for user {user.id}")
-                continue
+async def _remember_summaries(summaries: list) -> None:
+    """Сохраняет в память, что сводка отправлена."""
+    from database.repositories.memory import MemoryRepository
 
-            # Отправляем пользователю
-            await app.bot.send_message(
-                chat_id=user.telegram_id,
-                text=summary_text,
-            )
+    await MemoryRepository().create_many([
+        {
+            "user_id": d.user_id,
+            "category": "progress_summary",
+            "content": f"Bi-weekly summary sent: {d.text[:100]}...",
+            "importance": 7,
+        }
+        for d in summaries
+    ])
 
-            # Сохраняем в память что отправили сводку
-            await memory_repo.create(
-                user_id=user.id,
-                category="progress_summary",
-                content=f"Bi-weekly summary sent: {summary_text[:100]}...",
-                importance=7,
-            )
 
-            summaries_sent += 1
-            logger.info(f"Sent bi-weekly summary to user {user.id}")
+async def _build_biweekly_summary(user) -> Optional[str]:
+    """Сводка за 14 дней или None, если пользователю её не отправляем."""
+    from ai.summary_generator import summary_generator
 
-        except Exception as e:
-            logger.error(f"Failed to send summary to user {user.id}: {e}")
+    # Проверяем нужно ли отправлять сводку
+    if not await summary_generator.should_send_summary(user.id):
+        logger.debug(f"Skipping summary for user {user.id}: not eligible")
+        return None
 
-    logger.info(f"Bi-weekly summaries job complete: {summaries_sent} summaries sent")
+    summary_text = await summary_generator.generate_biweekly_summary(
+        user_id=user.id,
+        period_days=14,
+    )
+    if not summary_text:
+        logger.debug(f"Could not generate summary for user {user.id}")
+    return summary_text
 
 
 async def send_goal_checkins() -> None:
     """
     Отправляет check-in сообщения по активным целям.
-    Запускается каждый день.
+    Запускается каждые 5 минут: next_check_in уже стоит на местное время.
     """
     global app
 
@@ -632,59 +683,27 @@ async def send_goal_checkins() -> None:
         return
 
     from database.repositories.goal import GoalRepository
-    from database.repositories.user import UserRepository
 
     goal_repo = GoalRepository()
-    user_repo = UserRepository()
 
     # Получаем цели которым нужен check-in
-    goals_needing_checkin = await goal_repo.get_goals_needing_checkin(limit=50)
-
-    checkins_sent = 0
-
-    for goal in goals_needing_checkin:
-        try:
-            # Получаем пользователя
-            user = await user_repo.get(goal.user_id)
-
-            if not user:
-                continue
-
-            # Формируем сообщение check-in
-            checkin_message = _build_checkin_message(goal)
-
-            # Отправляем пользователю
-            await app.bot.send_message(
-                chat_id=user.telegram_id,
-                text=checkin_message,
-            )
-
-            # Обновляем last_check_in и next_check_in
-            goal.last_check_in = datetime.utcnow()
-
-            # Вычисляем следующий check-in
-            if goal.reminder_frequency:
-                if goal.reminder_frequency == "daily":
-                    goal.next_check_in = datetime.utcnow() + timedelta(days=1)
-                elif goal.reminder_frequency == "weekly":
-                    goal.next_check_in = datetime.utcnow() + timedelta(days=7)
-                elif goal.reminder_frequency == "biweekly":
-                    goal.next_check_in = datetime.utcnow() + timedelta(days=14)
-
-            # Сохраняем изменения (через update_progress чтобы триггерить updated_at)
-            await goal_repo.update_progress(
-                goal_id=goal.id,
-                progress=goal.progress,
-                notes=None,
-            )
+    goals_needing_checkin = await goal_repo.claim_goals_needing_checkin(
+        limit=settings.DELIVERY_BATCH_SIZE
+    )
+    _log_backlog("goal_checkins", goals_needing_checkin)
 
-            checkins_sent += 1
-            logger.info(f"Sent goal check-in to user {user.id} for goal {goal.id}")
+    async def on_sent(delivery: Delivery) -> None:
+        # Обновляем last_check_in и next_check_in
+        await goal_repo.record_checkins([delivery.ref])
+        lease.release(delivery.ref.id)
 
-        except Exception as e:
-            logger.error(f"Failed to send goal check-in for goal {goal.id}: {e}")
+    async with Lease(UserGoal.next_check_in, goals_needing_checkin) as lease:
+        report = await delivery_dispatcher.dispatch("goal_checkins", [
+            Delivery(user_id=goal.user_id, text=_build_checkin_message(goal), ref=goal)
+            for goal in goals_needing_checkin
+        ], on_sent=on_sent)
 
-    logger.info(f"Goal check-ins job complete: {checkins_sent} check-ins sent")
+    logger.info(f"Goal check-ins job complete: {len(report.sent)} check-ins sent")
 
 
 def _build_checkin_message(goal) -> str:
@@ -733,44 +752,26 @@ async def send_followup_questions() -> None:
         return
 
     from database.repositories.followup import FollowUpRepository
-    from database.repositories.user import UserRepository
 
     followup_repo = FollowUpRepository()
-    user_repo = UserRepository()
 
     # Получаем follow-ups которым пришло время
-    followups_due = await followup_repo.get_followups_due(limit=30)
-
-    followups_sent = 0
+    followups_due = await followup_repo.claim_followups_due(limit=settings.DELIVERY_BATCH_SIZE)
+    _log_backlog("followup_questions", followups_due)
 
-    for followup in followups_due:
-        try:
-            # Получаем пользователя
-            user = await user_repo.get(followup.user_id)
-
-            if not user:
-                continue
+    async def on_sent(delivery: Delivery) -> None:
+        # Отмечаем что вопрос задан
+        await followup_repo.mark_as_asked_many([delivery.ref])
+        lease.release(delivery.ref.id)
 
-            # Формируем сообщение follow-up
-            followup_message = _build_followup_message(followup)
+    async with Lease(UserFollowUp.followup_date, followups_due) as lease:
+        report = await delivery_dispatcher.dispatch("followup_questions", [
+            Delivery(user_id=followup.user_id, text=_build_followup_message(followup), ref=followup)
+            for followup in followups_due
+        ], on_sent=on_sent)
 
-            # Отправляем пользователю
-            await app.bot.send_message(
-                chat_id=user.telegram_id,
-                text=followup_message,
-            )
-
-            # Отмечаем что вопрос задан
-            await followup_repo.mark_as_asked(followup.id)
-
-            followups_sent += 1
-            logger.info(f"Sent follow-up question to user {user.id} for action: {followup.action[:30]}...")
-
-        except Exception as e:
-            logger.error(f"Failed to send follow-up to user {followup.user_id}: {e}")
-
-    if followups_sent > 0:
-        logger.info(f"Follow-up questions job complete: {followups_sent} follow-ups sent")
+    if report.sent:
+        logger.info(f"Follow-up questions job complete: {len(report.sent)} follow-ups sent")
 
 
 def _build_followup_message(followup) -> str:
@@ -819,70 +820,64 @@ async def send_program_tasks() -> None:
         return
 
     from database.repositories.program import ProgramRepository
-    from database.repositories.user import UserRepository
-    from ai.programs.catalog import get_program_morning_message, get_program_completion_message
+    from ai.programs.catalog import get_program_morning_message
     from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 
     program_repo = ProgramRepository()
-    user_repo = UserRepository()
 
     # Получаем программы которым пора отправить задание
-    programs_due = await program_repo.get_programs_needing_task(limit=50)
-
-    tasks_sent = 0
+    programs_due = await program_repo.claim_programs_needing_task(limit=settings.DELIVERY_BATCH_SIZE)
+    _log_backlog("program_tasks", programs_due)
 
+    deliveries = []
+    # Задания без текста просто сдвигаем на следующий день
+    missing = []
     for program in programs_due:
-        try:
-            # Получаем пользователя
-            user = await user_repo.get(program.user_id)
-
-            if not user:
-                continue
-
-            # Получаем задание на текущий день
-            morning_message = get_program_morning_message(
-                program.program_id,
-                program.current_day
-            )
+        # Получаем задание на текущий день
+        morning_message = get_program_morning_message(
+            program.program_id,
+            program.current_day
+        )
 
-            if not morning_message:
-                logger.warning(f"No morning message for program {program.program_id} day {program.current_day}")
-                await program_repo.mark_task_sent(program.id)
-                continue
+        if not morning_message:
+            logger.warning(f"No morning message for program {program.program_id} day {program.current_day}")
+            missing.append(program.id)
+            continue
 
-            # Формируем сообщение
-            text = f"""🌸 **{program.program_name}**
+        # Формируем сообщение
+        text = f"""🌸 **{program.program_name}**
 День {program.current_day} из {program.total_days}
 
 —
 
 {morning_message}"""
 
-            # Кнопки
-            keyboard = [
-                [InlineKeyboardButton("✅ Сделала!", callback_data=f"program:done:{program.id}")],
-                [InlineKeyboardButton("⏸ Пауза", callback_data=f"program:pause:{program.id}")],
-            ]
-
-            # Отправляем пользователю
-            await app.bot.send_message(
-                chat_id=user.telegram_id,
-                text=text,
-                reply_markup=InlineKeyboardMarkup(keyboard),
-                parse_mode="Markdown",
-            )
+        # Кнопки
+        keyboard = [
+            [InlineKeyboardButton("✅ Сделала!", callback_data=f"program:done:{program.id}")],
+            [InlineKeyboardButton("⏸ Пауза", callback_data=f"program:pause:{program.id}")],
+        ]
 
-            # Отмечаем что задание отправлено
-            await program_repo.mark_task_sent(program.id)
+        deliveries.append(Delivery(
+            user_id=program.user_id,
+            text=text,
+            reply_markup=InlineKeyboardMarkup(keyboard),
+            parse_mode="Markdown",
+            ref=program,
+        ))
 
-            tasks_sent += 1
-            logger.info(f"Sent program task to user {user.id} for {program.program_id} day {program.current_day}")
+    await program_repo.mark_tasks_sent(missing)
 
-        except Exception as e:
-            logger.error(f"Failed to send program task for program {program.id}: {e}")
+    async def on_sent(delivery: Delivery) -> None:
+        # Отмечаем что задание отправлено
+        await program_repo.mark_tasks_sent([delivery.ref.id])
+        lease.release(delivery.ref.id)
+
+    async with Lease(UserProgram.next_task_at, [d.ref for d in deliveries]) as lease:
+        report = await delivery_dispatcher.dispatch("program_tasks", deliveries, on_sent=on_sent)
 
-    if tasks_sent > 0:
-        logger.info(f"Program tasks job complete: {tasks_sent} tasks sent")
+    if report.sent:
+        logger.info(f"Program tasks job complete: {len(report.sent)} tasks sent")
 
 
 async def cleanup_expired_files() -> None:
@@ -891,7 +886,6 @@ async def cleanup_expired_files() -> None:
     Запускается раз в день в 4:00.
     """
     from services.storage.file_storage import file_storage_service
-    from config.settings import settings
 
     if not settings.USE_GCS:
         return
@@ -940,7 +934,6 @@ async def send_onboarding_reminders() -> None:
     if not app:
         return
 
-    from database.repositories.user import UserRepository
     from database.repositories.onboarding_event import OnboardingEventRepository
 
     user_repo = UserRepository()
@@ -951,58 +944,56 @@ async def send_onboarding_reminders() -> None:
         hours_since_start=24
     )
 
-    reminders_sent = 0
+    # События всех кандидатов — одним запросом
+    events_by_user = await onboarding_event_repo.get_events_for_users(
+        [user.id for user in users_needing_reminder],
+        event_names=["onboarding_started", "onboarding_reminder_sent"],
+    )
 
+    now = datetime.utcnow()
+    deliveries = []
     for user in users_needing_reminder:
-        try:
-            # Проверяем что пользователь действительно начал онбординг
-            events = await onboarding_event_repo.get_by_user(user.id)
-
-            if not events:
-                continue
-
-            # Проверяем что уже прошло 24 часа
-            started_event = next((e for e in events if e.event_name == "onboarding_started"), None)
+        events = events_by_user.get(user.id) or []
 
-            if not started_event:
-                continue
+        # Проверяем что пользователь действительно начал онбординг
+        started_event = next((e for e in events if e.event_name == "onboarding_started"), None)
 
-            hours_since_start = (datetime.utcnow() - started_event.created_at).total_seconds() / 3600
+        if not started_event:
+            continue
 
-            if hours_since_start < 24:
-                continue
+        # Проверяем что уже прошло 24 часа
+        hours_since_start = (now - started_event.created_at).total_seconds() / 3600
 
-            # Проверяем что напоминание ещё не отправлялось
-            reminder_sent = next((e for e in events if e.event_name == "onboarding_reminder_sent"), None)
+        if hours_since_start < 24:
+            continue
 
-            if reminder_sent:
-                # Уже отправляли напоминание
-                continue
+        # Проверяем что напоминание ещё не отправлялось
+        if any(e.event_name == "onboarding_reminder_sent" for e in events):
+            continue
 
-            # Формируем напоминание
-            user_name = user.display_name or "дорогая"
-            reminder_text = f"Привет, {user_name}! 💛 Это Мира.\n\n" \
-                          f"Мы не закончили знакомство. Готова продолжить?\n\n" \
-                          f"Просто напиши /start и продолжим с того места, где остановились."
+        # Формируем напоминание
+        user_name = user.display_name or "дорогая"
+        reminder_text = f"Привет, {user_name}! 💛 Это Мира.\n\n" \
+                      f"Мы не закончили знакомство. Готова продолжить?\n\n" \
+                      f"Просто напиши /start и продолжим с того места, где остановились."
 
-            # Отправляем напоминание
-            await app.bot.send_message(
-                chat_id=user.telegram_id,
-                text=reminder_text,
-            )
+        deliveries.append(Delivery(user_id=user.id, text=reminder_text, ref=int(hours_since_start)))
 
-            # Логируем отправку напоминания
-            await onboarding_event_repo.log_event(
-                user_id=user.id,
-                event_name="onboarding_reminder_sent",
-                event_data={"hours_since_start": int(hours_since_start)}
-            )
-
-            reminders_sent += 1
-            logger.info(f"Sent onboarding reminder to user {user.id}")
+    report = await delivery_dispatcher.dispatch(
+        "onboarding_reminders",
+        deliveries,
+        users={user.id: user for user in users_needing_reminder},
+    )
 
-        except Exception as e:
-            logger.error(f"Failed to send onboarding reminder to user {user.id}: {e}")
+    # Логируем отправку напоминаний
+    await onboarding_event_repo.log_events([
+        {
+            "user_id": d.user_id,
+            "event_name": "onboarding_reminder_sent",
+            "event_data": {"hours_since_start": d.ref},
+        }
+        for d in report.sent
+    ])
 
-    if reminders_sent > 0:
-        logger.info(f"Onboarding reminders job complete: {reminders_sent} reminders sent")
+    if report.sent:
+        logger.info(f"Onboarding reminders job complete: {len(report.sent)} reminders sent")
@@ -0,0 +1,172 @@
+"""
+Telegram rate limiter.
+Ограничение скорости исходящих сообщений бота.
+
+Telegram допускает ~30 сообщений в секунду на бота и ~1 сообщение
+в секунду в один чат. При превышении Bot API отвечает 429 с retry_after —
+тогда вся отправка приостанавливается на указанное время.
+
+Лимит бота один на все процессы (бот, воркер планировщика, воркеры
+веб-приложения), поэтому глобальный bucket живёт в Redis: каждый процесс
+бронирует в нём слот отправки. Без Redis каждый процесс держит свой
+bucket с тем же TELEGRAM_GLOBAL_RATE_LIMIT — суммарный темп тогда
+кратен числу процессов, и бюджет нужно делить между ними в настройках.
+Интервал на чат остаётся в памяти процесса.
+"""
+
+import asyncio
+import time
+from typing import Dict, Hashable, Optional
+
+from config.settings import settings
+from services.redis_client import redis_client
+
+
+# Ключ общего bucket в Redis
+GLOBAL_BUCKET_KEY = "tg:rate:global"
+
+# Бронирует слот: возвращает, сколько микросекунд ждать до отправки.
+# Ключ хранит время (по часам Redis), с которого свободен следующий слот;
+# ARGV[2] — пауза 429 этого процесса, она сдвигает слоты всех процессов.
+_RESERVE = """
+local now = redis.call('TIME')
+local now_us = tonumber(now[1]) * 1000000 + tonumber(now[2])
+local free_at = tonumber(redis.call('GET', KEYS[1]) or '0')
+local slot = math.max(free_at, now_us + tonumber(ARGV[2]))
+local next_free = slot + tonumber(ARGV[1])
+redis.call('SET', KEYS[1], string.format('%d', next_free), 'PX', math.floor((next_free - now_us) / 1000) + 1000)
+return slot - now_us
+"""
+
+
+class TokenBucket:
+    """
+    Token bucket: rate токенов в секунду, не больше capacity в запасе.
+    По умолчанию capacity=1 — ровный темп без всплесков: Telegram считает
+    лимит по скользящему окну, и запас в rate токенов дал бы 2×rate за первую секунду.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        # Ожидающие обслуживаются по очереди (Lock в asyncio справедливый)
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, amount: float = 1.0) -> None:
+        """
+        Ждёт и забирает amount токенов.
+        Запрос больше capacity ждёт полного запаса и уводит баланс в минус —
+        следующие подождут, средний темп сохраняется.
+        """
+        need = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+
+                self._refill(now)
+                if self._tokens >= need:
+                    self._tokens -= amount
+                    return
+
+                await asyncio.sleep((need - self._tokens) / self.rate)
+
+    def pause(self, seconds: float) -> None:
+        """Останавливает выдачу токенов на seconds (429 retry_after)."""
+        now = time.monotonic()
+        self._paused_until = max(self._paused_until, now + seconds)
+        self._tokens = 0
+        self._updated = now
+
+
+class SharedTokenBucket(TokenBucket):
+    """
+    Ровный темп rate сообщений в секунду на все процессы (слоты в Redis).
+    Если Redis недоступен — работает как обычный TokenBucket процесса.
+    """
+
+    def __init__(self, rate: float, key: str = GLOBAL_BUCKET_KEY):
+        super().__init__(rate)
+        self.key = key
+
+    async def acquire(self, amount: float = 1.0) -> None:
+        """Бронирует слот в общем bucket и ждёт его."""
+        if redis_client.is_connected:
+            pause = max(0.0, self._paused_until - time.monotonic())
+            wait_us = await redis_client.eval(
+                _RESERVE,
+                [self.key],
+                [int(amount / self.rate * 1_000_000), int(pause * 1_000_000)],
+            )
+            if wait_us is not None:
+                if wait_us > 0:
+                    await asyncio.sleep(wait_us / 1_000_000)
+                return
+
+        await super().acquire(amount)
+
+
+class TelegramRateLimiter:
+    """Глобальный лимит бота + минимальный интервал на чат."""
+
+    # Сколько чатов помнить, прежде чем чистить устаревшие записи
+    _MAX_TRACKED_CHATS = 10_000
+
+    def __init__(
+        self,
+        global_rate: Optional[float] = None,
+        per_chat_interval: Optional[float] = None,
+    ):
+        self.bucket = SharedTokenBucket(global_rate or settings.TELEGRAM_GLOBAL_RATE_LIMIT)
+        self.per_chat_interval = (
+            per_chat_interval if per_chat_interval is not None else settings.TELEGRAM_PER_CHAT_INTERVAL
+        )
+        # Время, раньше которого в чат отправлять нельзя
+        self._chat_next: Dict[Hashable, float] = {}
+        self.throttled = 0
+
+    async def acquire(self, chat_id: Hashable) -> None:
+        """Ждёт разрешения отправить одно сообщение в chat_id."""
+        now = time.monotonic()
+        slot = max(now, self._chat_next.get(chat_id, 0.0))
+        # Резервируем слот сразу — параллельные отправки в тот же чат встанут за ним
+        self._chat_next[chat_id] = slot + self.per_chat_interval
+        if len(self._chat_next) > self._MAX_TRACKED_CHATS:
+            self._prune(now)
+
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+        await self.bucket.acquire()
+
+    def retry_after(self, seconds: float) -> None:
+        """Обрабатывает 429: пауза для всех отправителей."""
+        self.throttled += 1
+        self.bucket.pause(seconds)
+
+    def defer(self, chat_id: Hashable, seconds: float) -> None:
+        """
+        Обрабатывает 429 по одному чату (flood control на правки):
+        следующая отправка в chat_id — не раньше чем через seconds.
+        """
+        self.throttled += 1
+        now = time.monotonic()
+        self._chat_next[chat_id] = max(self._chat_next.get(chat_id, 0.0), now + seconds)
+
+    def _prune(self, now: float) -> None:
+        self._chat_next = {
+            chat_id: slot for chat_id, slot in self._chat_next.items() if slot > now
+        }
+
+
+# Глобальный экземпляр
+telegram_rate_limiter = TelegramRateLimiter()
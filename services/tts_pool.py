@@ -0,0 +1,70 @@
+"""
+TTS connection pool.
+Общая aiohttp-сессия для синтеза речи на весь процесс: один keep-alive пул
+HTTP-соединений (TLS-рукопожатие не повторяется на каждый фрагмент)
+и ограничение одновременных запросов для каждого провайдера.
+"""
+
+import asyncio
+from typing import Dict, Optional
+
+import aiohttp
+from loguru import logger
+
+from config.settings import settings
+
+
+_session: Optional[aiohttp.ClientSession] = None
+_semaphores: Dict[str, asyncio.Semaphore] = {}
+
+
+def get_tts_session() -> aiohttp.ClientSession:
+    """
+    Возвращает общую сессию TTS (создаётся лениво, внутри event loop).
+
+    Соединения с API синтеза держатся открытыми между запросами
+    и фрагментами одного текста.
+    """
+    global _session
+
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=settings.TTS_MAX_CONNECTIONS,
+            keepalive_timeout=settings.TTS_KEEPALIVE_TIMEOUT,
+            ttl_dns_cache=300,
+        )
+        _session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=settings.TTS_REQUEST_TIMEOUT),
+        )
+        logger.info(f"TTS pool created: max_connections={settings.TTS_MAX_CONNECTIONS}")
+
+    return _session
+
+
+def get_tts_semaphore(provider: str, limit: int) -> asyncio.Semaphore:
+    """Семафор одновременных запросов к провайдеру TTS (лимит — из его настройки)."""
+    if provider not in _semaphores:
+        _semaphores[provider] = asyncio.Semaphore(limit)
+
+    return _semaphores[provider]
+
+
+def get_pool_status() -> dict:
+    """Статистика использования пула (для health check и логов)."""
+    return {
+        "session_initialized": _session is not None and not _session.closed,
+        "available_slots": {provider: semaphore._value for provider, semaphore in _semaphores.items()},
+    }
+
+
+async def close_tts_session() -> None:
+    """Закрывает общую сессию. Вызывается при остановке бота."""
+    global _session
+
+    if _session is not None:
+        await _session.close()
+        _session = None
+        logger.info("TTS pool closed")
+
+    _semaphores.clear()
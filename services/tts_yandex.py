@@ -3,7 +3,6 @@ Yandex SpeechKit TTS Service.
 Генерация голосовых сообщений для медитаций и ответов бота.
 """
 
-import aiohttp
 import asyncio
 import tempfile
 from pathlib import Path
@@ -12,7 +11,9 @@ from loguru import logger
 from telegram import Bot
 
 from config.settings import settings
-from database.repositories.api_cost import ApiCostRepository
+from database.api_cost_recorder import api_cost_recorder
+from config.constants import YANDEX_TTS_PRICE_PER_MILLION_CHARS
+from services.tts_pool import close_tts_session, get_tts_session, get_tts_semaphore
 
 
 class YandexTTS:
@@ -43,7 +44,6 @@ class YandexTTS:
         self.default_voice = getattr(settings, "TTS_VOICE", "alena")
         self.default_emotion = getattr(settings, "TTS_EMOTION", "good")
         self.default_speed = getattr(settings, "TTS_SPEED", 1.0)
-        self.api_cost_repo = ApiCostRepository()
 
     async def _track_api_cost(
         self,
@@ -60,12 +60,12 @@ class YandexTTS:
             operation: Операция (text_to_speech)
         """
         try:
-            # Цена Yandex TTS: $0.12 за 1 миллион символов
+            # Цена Yandex TTS за 1 миллион символов
             # https://cloud.yandex.ru/docs/speechkit/pricing
             characters = len(text)
-            cost_usd = (characters / 1_000_000) * 0.12
+            cost_usd = (characters / 1_000_000) * YANDEX_TTS_PRICE_PER_MILLION_CHARS
 
-            await self.api_cost_repo.create(
+            await api_cost_recorder.record(
                 user_id=user_id,
                 provider='yandex_tts',
                 operation=operation,
@@ -111,18 +111,17 @@ class YandexTTS:
 
         # Разбиваем текст на части (лимит 5000 символов)
         chunks = self._split_text(text, max_length=4500)
+        logger.debug(f"Synthesizing {len(chunks)} chunks")
 
-        audio_parts = []
-        for i, chunk in enumerate(chunks):
-            logger.debug(f"Synthesizing chunk {i+1}/{len(chunks)}")
+        # Части синтезируются параллельно (в пределах YANDEX_TTS_MAX_CONCURRENCY),
+        # gather сохраняет их порядок
+        audio_parts = await asyncio.gather(*(
+            self._synthesize_chunk(chunk, voice, emotion, speed, format)
+            for chunk in chunks
+        ))
 
-            audio_data = await self._synthesize_chunk(
-                chunk, voice, emotion, speed, format
-            )
-
-            if audio_data:
-                audio_parts.append(audio_data)
-            else:
+        for i, audio_data in enumerate(audio_parts):
+            if not audio_data:
                 logger.error(f"Failed to synthesize chunk {i+1}")
                 return False
 
@@ -168,12 +167,12 @@ class YandexTTS:
         }
 
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
+            # Общая keep-alive сессия процесса вместо новой на каждый фрагмент
+            async with get_tts_semaphore("yandex", settings.YANDEX_TTS_MAX_CONCURRENCY):
+                async with get_tts_session().post(
                     self.API_URL,
                     headers=headers,
                     data=data,
-                    timeout=aiohttp.ClientTimeout(total=60),
                 ) as response:
                     if response.status == 200:
                         return await response.read()
@@ -422,22 +421,25 @@ async def generate_all_meditations():
     output_dir = Path(__file__).parent.parent / "data" / "meditations"
     output_dir.mkdir(parents=True, exist_ok=True)
 
-    for meditation in MEDITATIONS:
-        logger.info(f"Generating audio for: {meditation.name}")
+    try:
+        for meditation in MEDITATIONS:
+            logger.info(f"Generating audio for: {meditation.name}")
 
-        output_path = await yandex_tts.generate_meditation_audio(
-            meditation_id=meditation.id,
-            script=meditation.script,
-            output_dir=output_dir,
-        )
+            output_path = await yandex_tts.generate_meditation_audio(
+                meditation_id=meditation.id,
+                script=meditation.script,
+                output_dir=output_dir,
+            )
 
-        if output_path:
-            logger.info(f"✓ Created: {output_path}")
-        else:
-            logger.error(f"✗ Failed: {meditation.id}")
+            if output_path:
+                logger.info(f"✓ Created: {output_path}")
+            else:
+                logger.error(f"✗ Failed: {meditation.id}")
 
-        # Пауза между запросами
-        await asyncio.sleep(2)
+            # Пауза между запросами
+            await asyncio.sleep(2)
+    finally:
+        await close_tts_session()
 
 
 if __name__ == "__main__":
@@ -2,8 +2,13 @@
 Pytest fixtures and configuration.
 """
 
+from contextlib import asynccontextmanager
+
 import pytest
+import pytest_asyncio
 from unittest.mock import Mock, AsyncMock
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.schema import CreateIndex, CreateTable
 
 
 @pytest.fixture
@@ -52,3 +57,38 @@ def sample_user_data():
         "marriage_years": None,
         "communication_style": "balanced",
     }
+
+
+@pytest_asyncio.fixture
+async def sqlite_db(tmp_path, monkeypatch):
+    """
+    Factory for a file SQLite database behind repositories.
+
+    make(models, modules) creates the models' tables (with indexes),
+    patches get_session_context in each module and returns the session
+    context manager for the test's own reads and writes.
+    """
+    engines = []
+
+    async def make(models, modules):
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / f'db{len(engines)}.sqlite'}")
+        engines.append(engine)
+        async with engine.begin() as conn:
+            for model in models:
+                await conn.execute(CreateTable(model.__table__))
+                for index in model.__table__.indexes:
+                    await conn.execute(CreateIndex(index))
+        factory = async_sessionmaker(engine, expire_on_commit=False)
+
+        @asynccontextmanager
+        async def context():
+            async with factory() as session:
+                yield session
+
+        for module in modules:
+            monkeypatch.setattr(module, "get_session_context", context)
+        return context
+
+    yield make
+    for engine in engines:
+        await engine.dispose()
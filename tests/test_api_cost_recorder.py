@@ -0,0 +1,88 @@
+"""
+Tests for database.api_cost_recorder module.
+"""
+
+import pytest
+from unittest.mock import AsyncMock
+
+from database.api_cost_recorder import ApiCostRecorder
+from database.repositories.api_cost import calculate_claude_cost
+
+
+@pytest.fixture
+def recorder():
+    """Рекордер с замоканной записью в БД."""
+    recorder = ApiCostRecorder(batch_size=3, flush_interval=60, max_buffer=4)
+    recorder.repo.create_many = AsyncMock(side_effect=lambda rows: len(rows))
+    return recorder
+
+
+def _cost(user_id: int) -> dict:
+    return {"user_id": user_id, "provider": "claude", "operation": "chat_completion", "cost_usd": 0.01}
+
+
+@pytest.mark.asyncio
+class TestApiCostRecorder:
+    """Tests for ApiCostRecorder batching."""
+
+    async def test_flushes_full_batch(self, recorder):
+        """Records should be written in one insert once the batch is full."""
+        await recorder.start()
+        try:
+            for user_id in range(1, 5):
+                await recorder.record(**_cost(user_id))
+
+            recorder.repo.create_many.assert_awaited_once()
+            rows = recorder.repo.create_many.await_args.args[0]
+            assert [row["user_id"] for row in rows] == [1, 2, 3]
+            assert all("created_at" in row for row in rows)
+            assert recorder.get_stats()["buffered"] == 1
+        finally:
+            await recorder.stop()
+
+        # Остаток сброшен при остановке
+        assert recorder.repo.create_many.await_count == 2
+        assert recorder.get_stats()["flushed"] == 4
+
+    async def test_writes_immediately_when_not_started(self, recorder):
+        """Without the flush loop every record goes straight to the DB."""
+        await recorder.record(**_cost(1))
+
+        recorder.repo.create_many.assert_awaited_once()
+        assert recorder.get_stats()["buffered"] == 0
+
+    async def test_failed_flush_keeps_records(self, recorder):
+        """A failed insert should keep records buffered up to max_buffer."""
+        recorder.repo.create_many = AsyncMock(side_effect=RuntimeError("db down"))
+        await recorder.start()
+        try:
+            for user_id in range(1, 7):
+                await recorder.record(**_cost(user_id))
+
+            stats = recorder.get_stats()
+            assert stats["failed_flushes"] == 4
+            assert stats["buffered"] == 4
+            assert stats["dropped"] == 2
+        finally:
+            recorder.repo.create_many = AsyncMock(side_effect=lambda rows: len(rows))
+            await recorder.stop()
+
+        rows = recorder.repo.create_many.await_args.args[0]
+        assert [row["user_id"] for row in rows] == [3, 4, 5, 6]
+
+
+class TestClaudePrices:
+    """Tests for the per-model Claude price table."""
+
+    def test_known_model(self):
+        """Haiku should be cheaper than Sonnet for the same usage."""
+        sonnet = calculate_claude_cost("claude-sonnet-4-20250514", 1_000_000, 1_000_000)
+        haiku = calculate_claude_cost("claude-3-5-haiku-20241022", 1_000_000, 1_000_000)
+
+        assert sonnet == 18.0
+        assert haiku < sonnet
+
+    def test_unknown_model_uses_default_prices(self):
+        """Unknown models should fall back to the default price row."""
+        assert calculate_claude_cost("claude-future", 1000, 0, cache_read_tokens=1000) == \
+            calculate_claude_cost("claude-sonnet-4-20250514", 1000, 0, cache_read_tokens=1000)
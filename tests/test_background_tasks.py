@@ -0,0 +1,105 @@
+"""
+Tests for services.background_tasks module.
+"""
+
+import asyncio
+
+import pytest
+import pytest_asyncio
+
+from services.background_tasks import BackgroundTaskQueue
+
+
+@pytest_asyncio.fixture
+async def queue():
+    """Запущенная очередь с быстрыми повторами."""
+    queue = BackgroundTaskQueue(
+        workers=4, maxsize=100, max_retries=2, retry_delay=0.01, enqueue_timeout=0.1
+    )
+    await queue.start()
+    yield queue
+    await queue.stop(timeout=1)
+
+
+@pytest.mark.asyncio
+class TestBackgroundTaskQueue:
+    """Tests for BackgroundTaskQueue."""
+
+    async def test_same_key_runs_in_order(self, queue):
+        """Tasks with one key should run sequentially in submit order."""
+        done = []
+
+        async def record(value, delay):
+            await asyncio.sleep(delay)
+            done.append(value)
+
+        await queue.submit("first", record, 1, 0.05, key=42)
+        await queue.submit("second", record, 2, 0.0, key=42)
+        await queue.submit("third", record, 3, 0.01, key=42)
+
+        assert await queue.wait_idle(42, timeout=1)
+        assert done == [1, 2, 3]
+
+    async def test_keys_run_concurrently(self, queue):
+        """A busy user should occupy one worker, not hold back other users."""
+        release = asyncio.Event()
+        done = []
+
+        async def slow(value):
+            await release.wait()
+            done.append(value)
+
+        async def fast(value):
+            done.append(value)
+
+        # Один ход пользователя — шесть задач с его ключом, больше, чем воркеров
+        for i in range(6):
+            await queue.submit(f"turn-{i}", slow, ("a", i), key="a")
+        await queue.submit("other", fast, ("b", 0), key="b")
+
+        assert await queue.wait_idle("b", timeout=1)
+        assert done == [("b", 0)]
+
+        release.set()
+        assert await queue.wait_idle("a", timeout=1)
+        assert done[1:] == [("a", i) for i in range(6)]
+
+    async def test_failed_task_is_retried(self, queue):
+        """A failing task should be retried until it succeeds."""
+        attempts = []
+
+        async def flaky():
+            attempts.append(1)
+            if len(attempts) < 3:
+                raise RuntimeError("db down")
+
+        await queue.submit("flaky", flaky, key=1)
+        await queue.wait_idle(1, timeout=1)
+
+        assert len(attempts) == 3
+        stats = queue.get_stats()
+        assert stats["retried"] == 2
+        assert stats["failed"] == 0
+
+    async def test_runs_inline_when_not_started(self):
+        """Without workers the task should run before submit returns."""
+        queue = BackgroundTaskQueue(workers=1, maxsize=1)
+        done = []
+
+        async def record():
+            done.append(True)
+
+        await queue.submit("inline", record, key=1)
+
+        assert done == [True]
+        assert queue.get_stats()["inline"] == 1
+
+    async def test_wait_idle_times_out(self, queue):
+        """wait_idle should report False if the key is still busy."""
+        release = asyncio.Event()
+
+        await queue.submit("blocked", release.wait, key=7)
+
+        assert await queue.wait_idle(7, timeout=0.05) is False
+        release.set()
+        assert await queue.wait_idle(7, timeout=1) is True
@@ -0,0 +1,141 @@
+"""
+Tests for ai.batch_generator module.
+"""
+
+import asyncio
+import time
+
+import pytest
+from unittest.mock import AsyncMock
+
+from ai.batch_generator import BatchGenerator
+
+
+def _generator(**kwargs):
+    options = dict(concurrency=4, rpm=60_000, tpm=10_000_000, cache_ttl=60)
+    options.update(kwargs)
+    generator = BatchGenerator(**options)
+    generator._request = AsyncMock(side_effect=lambda system, prompt, max_tokens: (f"re: {prompt}", 10))
+    return generator
+
+
+@pytest.mark.asyncio
+class TestBatchGenerator:
+    """Tests for BatchGenerator."""
+
+    async def test_identical_prompts_in_flight_run_once(self):
+        """Concurrent identical prompts should share one Claude request."""
+        generator = _generator()
+        release = asyncio.Event()
+
+        async def request(system, prompt, max_tokens):
+            await release.wait()
+            return f"re: {prompt}", 10
+
+        generator._request.side_effect = request
+
+        tasks = [asyncio.create_task(generator.generate("sys", "same")) for _ in range(5)]
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(*tasks)
+
+        assert results == ["re: same"] * 5
+        assert generator._request.await_count == 1
+        assert generator.get_stats()["deduplicated"] == 4
+        assert generator.get_stats()["in_flight"] == 0
+
+    async def test_failure_reaches_every_waiter(self):
+        """An error should be raised to all callers of the shared prompt, then retried later."""
+        generator = _generator()
+        release = asyncio.Event()
+
+        async def request(system, prompt, max_tokens):
+            await release.wait()
+            raise RuntimeError("boom")
+
+        generator._request.side_effect = request
+
+        tasks = [asyncio.create_task(generator.generate("sys", "same")) for _ in range(3)]
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+
+        assert all(isinstance(result, RuntimeError) for result in results)
+        assert generator.get_stats()["failed"] == 1
+
+        generator._request.side_effect = lambda system, prompt, max_tokens: ("ok", 1)
+        assert await generator.generate("sys", "same") == "ok"
+
+    async def test_cacheable_prompts_are_reused(self):
+        """Template-only prompts should be answered from the cache."""
+        generator = _generator()
+
+        first = await generator.generate("sys", "template", cacheable=True)
+        second = await generator.generate("sys", "template", cacheable=True)
+
+        assert first == second
+        assert generator._request.await_count == 1
+        assert generator.get_stats()["cache_hits"] == 1
+
+    async def test_personal_prompts_are_not_cached(self):
+        """Prompts with user data should be generated every time."""
+        generator = _generator()
+
+        await generator.generate("sys", "personal")
+        await generator.generate("sys", "personal")
+
+        assert generator._request.await_count == 2
+
+    async def test_cache_expires(self):
+        """Cached texts should expire after the TTL."""
+        generator = _generator(cache_ttl=0)
+
+        await generator.generate("sys", "template", cacheable=True)
+        await generator.generate("sys", "template", cacheable=True)
+
+        assert generator._request.await_count == 2
+
+    async def test_concurrency_cap(self):
+        """No more than `concurrency` requests should run at once."""
+        generator = _generator(concurrency=3)
+        running = []
+        peak = []
+
+        async def request(system, prompt, max_tokens):
+            running.append(1)
+            peak.append(len(running))
+            await asyncio.sleep(0.01)
+            running.pop()
+            return prompt, 1
+
+        generator._request.side_effect = request
+
+        await asyncio.gather(*(generator.generate("sys", f"user {i}") for i in range(10)))
+
+        assert max(peak) == 3
+        assert generator._request.await_count == 10
+
+    async def test_requests_per_minute_budget(self):
+        """Requests should be paced by the RPM budget."""
+        generator = _generator(rpm=6000)  # 100 в секунду
+
+        started = time.monotonic()
+        await asyncio.gather(*(generator.generate("sys", f"user {i}") for i in range(6)))
+
+        # Первый запрос сразу, остальные пять — по 10 мс
+        assert time.monotonic() - started >= 0.045
+
+    async def test_results_arrive_as_completed(self):
+        """A fast prompt should not wait for a slow one."""
+        generator = _generator()
+
+        async def request(system, prompt, max_tokens):
+            await asyncio.sleep(0.2 if prompt == "slow" else 0)
+            return prompt, 1
+
+        generator._request.side_effect = request
+
+        slow = asyncio.create_task(generator.generate("sys", "slow"))
+        assert await generator.generate("sys", "fast") == "fast"
+        assert not slow.done()
+        assert await slow == "slow"
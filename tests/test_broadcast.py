@@ -0,0 +1,209 @@
+"""
+Tests for services.broadcast and services.telegram_rate_limiter modules.
+"""
+
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+import pytest
+import pytest_asyncio
+from unittest.mock import AsyncMock
+
+import database.repositories.broadcast as broadcast_module
+from database.models import Broadcast
+from database.repositories.broadcast import broadcast_repo
+from services.broadcast import (
+    RESULT_BLOCKED,
+    RESULT_FAILED,
+    RESULT_SENT,
+    BroadcastEngine,
+    _Progress,
+)
+import services.telegram_rate_limiter as rate_limiter_module
+from services.telegram_rate_limiter import SharedTokenBucket, TelegramRateLimiter, TokenBucket
+
+
+class TestBroadcastProgress:
+    """Tests for the resume watermark."""
+
+    def test_watermark_follows_contiguous_prefix(self):
+        """last_user_id should only move past recipients that are all done."""
+        progress = _Progress(last_user_id=0)
+
+        progress.complete(1, 20, RESULT_SENT)
+        assert progress.last_user_id == 0
+
+        progress.complete(0, 10, RESULT_SENT)
+        assert progress.last_user_id == 20
+
+        progress.complete(3, 40, RESULT_SENT)
+        progress.complete(2, 30, RESULT_SENT)
+        assert progress.last_user_id == 40
+        assert progress.done == {}
+
+    def test_counters_follow_watermark(self):
+        """Recipients past last_user_id are resent on resume, so they must not be counted yet."""
+        progress = _Progress(sent=5, last_user_id=100)
+
+        progress.complete(1, 120, RESULT_SENT)
+        progress.complete(2, 130, RESULT_BLOCKED)
+        assert (progress.sent, progress.failed, progress.blocked) == (5, 0, 0)
+
+        progress.complete(0, 110, RESULT_FAILED)
+        assert (progress.sent, progress.failed, progress.blocked) == (6, 1, 1)
+        assert progress.last_user_id == 130
+
+
+@pytest_asyncio.fixture
+async def broadcasts(sqlite_db):
+    """BroadcastRepository on a file SQLite database."""
+    return await sqlite_db([Broadcast], [broadcast_module])
+
+
+def _engine(worker_id):
+    engine = BroadcastEngine(concurrency=1, lease_seconds=60)
+    engine.worker_id = worker_id
+    engine.launched = []
+    engine._launch = lambda broadcast: engine.launched.append(broadcast)
+    return engine
+
+
+@pytest.mark.asyncio
+class TestBroadcastClaim:
+    """Only one process may resume an unfinished broadcast."""
+
+    async def test_one_of_two_processes_resumes(self, broadcasts):
+        """Two processes resuming at once should not both send the broadcast."""
+        await broadcast_repo.create("b1", "привет", "all", total=10)
+        first, second = _engine("host:1"), _engine("host:2")
+
+        await asyncio.gather(first.resume_unfinished(), second.resume_unfinished())
+
+        assert len(first.launched) + len(second.launched) == 1
+        owner = (await broadcast_repo.get("b1")).owner
+        assert owner == ("host:1" if first.launched else "host:2")
+
+    async def test_only_stale_heartbeat_is_claimed(self, broadcasts):
+        """A live owner keeps its broadcast; a silent one loses it."""
+        await broadcast_repo.create("live", "привет", "all", total=10, owner="host:1")
+        await broadcast_repo.create("stale", "привет", "all", total=10, owner="host:3")
+        async with broadcasts() as session:
+            stale = await session.get(Broadcast, "stale")
+            stale.heartbeat_at = datetime.now() - timedelta(seconds=120)
+            await session.commit()
+
+        engine = _engine("host:2")
+        assert await engine.resume_unfinished() == 1
+        assert [b.id for b in engine.launched] == ["stale"]
+        assert (await broadcast_repo.get("live")).owner == "host:1"
+        assert (await broadcast_repo.get("stale")).owner == "host:2"
+
+    async def test_previous_owner_cannot_save_progress(self, broadcasts):
+        """After a takeover the old owner's checkpoint should be rejected."""
+        await broadcast_repo.create("b1", "привет", "all", total=10, owner="host:1")
+        assert await broadcast_repo.claim("b1", "host:2", stale_before=datetime.now() + timedelta(seconds=1))
+
+        assert not await broadcast_repo.save_progress("b1", 5, 0, 0, 50, owner="host:1")
+        assert await broadcast_repo.save_progress("b1", 3, 0, 0, 30, owner="host:2")
+        assert (await broadcast_repo.get("b1")).last_user_id == 30
+
+
+@pytest.mark.asyncio
+class TestTelegramRateLimiter:
+    """Tests for global and per-chat limits."""
+
+    async def test_global_rate(self):
+        """Messages to different chats should be paced by the global rate."""
+        limiter = TelegramRateLimiter(global_rate=50, per_chat_interval=0)
+
+        started = time.perf_counter()
+        for chat_id in range(11):
+            await limiter.acquire(chat_id)
+
+        assert time.perf_counter() - started >= 0.18
+
+    async def test_per_chat_interval(self):
+        """Two messages to one chat should be spaced by the interval."""
+        limiter = TelegramRateLimiter(global_rate=1000, per_chat_interval=0.1)
+
+        started = time.perf_counter()
+        await limiter.acquire(1)
+        await limiter.acquire(1)
+
+        assert time.perf_counter() - started >= 0.09
+
+    async def test_retry_after_pauses_bucket(self):
+        """A 429 retry_after should hold back every sender."""
+        bucket = TokenBucket(rate=1000)
+        bucket.pause(0.1)
+
+        started = time.perf_counter()
+        await bucket.acquire()
+
+        assert time.perf_counter() - started >= 0.09
+
+
+class _FakeRedis:
+    """Redis stand-in that runs the slot reservation script in Python."""
+
+    is_connected = True
+
+    def __init__(self):
+        self.free_at = {}
+
+    async def eval(self, script, keys, args):
+        interval, pause = args
+        now = int(time.monotonic() * 1_000_000)
+        slot = max(self.free_at.get(keys[0], 0), now + pause)
+        self.free_at[keys[0]] = slot + interval
+        return slot - now
+
+
+@pytest.mark.asyncio
+class TestSharedTokenBucket:
+    """Tests for the global bucket shared through Redis."""
+
+    async def test_processes_share_the_rate(self, monkeypatch):
+        """Two limiters (two processes) together should keep to one global rate."""
+        monkeypatch.setattr(rate_limiter_module, "redis_client", _FakeRedis())
+        first = TelegramRateLimiter(global_rate=50, per_chat_interval=0)
+        second = TelegramRateLimiter(global_rate=50, per_chat_interval=0)
+
+        started = time.perf_counter()
+        await asyncio.gather(
+            *(first.acquire(chat_id) for chat_id in range(6)),
+            *(second.acquire(chat_id) for chat_id in range(6, 11)),
+        )
+
+        assert time.perf_counter() - started >= 0.18
+
+    async def test_retry_after_holds_other_processes(self, monkeypatch):
+        """A 429 seen by one process should delay the next send of another."""
+        monkeypatch.setattr(rate_limiter_module, "redis_client", _FakeRedis())
+        first = TelegramRateLimiter(global_rate=1000, per_chat_interval=0)
+        second = TelegramRateLimiter(global_rate=1000, per_chat_interval=0)
+
+        started = time.perf_counter()
+        first.retry_after(0.1)
+        # Повтор после 429 бронирует слот уже с паузой
+        retry = asyncio.create_task(first.acquire(1))
+        await asyncio.sleep(0)
+        await second.acquire(2)
+
+        assert time.perf_counter() - started >= 0.09
+        await retry
+
+    async def test_falls_back_to_local_bucket(self, monkeypatch):
+        """If the script fails, the bucket should pace within the process."""
+        redis = _FakeRedis()
+        redis.eval = AsyncMock(return_value=None)
+        monkeypatch.setattr(rate_limiter_module, "redis_client", redis)
+        bucket = SharedTokenBucket(rate=50)
+
+        started = time.perf_counter()
+        for _ in range(11):
+            await bucket.acquire()
+
+        assert time.perf_counter() - started >= 0.18
+        assert redis.eval.await_count == 11
@@ -0,0 +1,167 @@
+"""
+Tests for ai.memory.context_builder module.
+"""
+
+import asyncio
+import time
+
+import pytest
+from unittest.mock import AsyncMock, patch
+
+import ai.memory.context_builder as context_builder_module
+from ai.memory.context_builder import ContextBuilder
+from database.context_cache import ContextCache
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    """Чистый кэш контекста (локальный LRU, без Redis)."""
+    cache = ContextCache(ttl=60, local_max_users=10)
+    monkeypatch.setattr(context_builder_module, "context_cache", cache)
+    return cache
+
+
+@pytest.fixture
+def builder(cache):
+    """ContextBuilder с замоканными секциями."""
+    builder = ContextBuilder()
+    builder._get_time_context = AsyncMock(return_value={"weekday": "понедельник"})
+    builder._detect_conversation_patterns = AsyncMock(return_value=None)
+    builder._get_recent_topics = AsyncMock(return_value=["дети"])
+    builder._get_mood_summary = AsyncMock(return_value={"has_data": False})
+    builder._get_sensitive_topics = AsyncMock(return_value=None)
+    builder._get_active_goals = AsyncMock(return_value=None)
+    builder._get_pending_followups = AsyncMock(return_value=None)
+    builder._get_user_profile_summary = AsyncMock(return_value={"job": "врач"})
+    builder._get_long_term_memory = AsyncMock(return_value=[])
+    builder._get_communication_style = AsyncMock(return_value={"formality": "informal"})
+    return builder
+
+
+@pytest.mark.asyncio
+class TestContextBuilderBuild:
+    """Tests for ContextBuilder.build fan-out."""
+
+    async def test_collects_sections(self, builder, sample_user_data):
+        """Should put non-empty sections into the context."""
+        with patch.object(context_builder_module, "is_sqlite", False):
+            context = await builder.build(user_id=1, user_data=sample_user_data)
+
+        assert context["recent_topics"] == ["дети"]
+        assert context["user_profile"] == {"job": "врач"}
+        assert "mood_summary" not in context
+        assert "sensitive_topics" not in context
+        assert "time_context" in context["section_timings"]
+
+    async def test_sections_run_concurrently(self, builder, sample_user_data):
+        """Slow sections should overlap instead of adding up."""
+
+        async def slow_section(*args, **kwargs):
+            await asyncio.sleep(0.1)
+            return None
+
+        builder._get_active_goals = slow_section
+        builder._get_pending_followups = slow_section
+        builder._get_sensitive_topics = slow_section
+
+        started = time.perf_counter()
+        with patch.object(context_builder_module, "is_sqlite", False):
+            await builder.build(user_id=1, user_data=sample_user_data)
+
+        assert time.perf_counter() - started < 0.25
+
+    async def test_slow_section_is_skipped(self, builder, sample_user_data):
+        """A section over budget should be dropped, not fail the build."""
+
+        async def hanging_section(*args, **kwargs):
+            await asyncio.sleep(5)
+            return ["never"]
+
+        builder._get_recent_topics = hanging_section
+
+        with patch.object(context_builder_module, "is_sqlite", False), \
+                patch.object(context_builder_module.settings, "CONTEXT_SECTION_TIMEOUT", 0.05):
+            context = await builder.build(user_id=1, user_data=sample_user_data)
+
+        assert "recent_topics" not in context
+        assert context["user_profile"] == {"job": "врач"}
+
+    async def test_failing_section_is_skipped(self, builder, sample_user_data):
+        """An exception in one section should not break others."""
+        builder._get_user_profile_summary = AsyncMock(side_effect=RuntimeError("db down"))
+
+        with patch.object(context_builder_module, "is_sqlite", False):
+            context = await builder.build(user_id=1, user_data=sample_user_data)
+
+        assert "user_profile" not in context
+        assert context["recent_topics"] == ["дети"]
+
+
+@pytest.mark.asyncio
+class TestContextBuilderCache:
+    """Tests for the per-user context cache."""
+
+    async def test_second_build_hits_cache(self, builder, cache, sample_user_data):
+        """Cached sections should not be reloaded on the next turn."""
+        with patch.object(context_builder_module, "is_sqlite", False):
+            await builder.build(user_id=1, user_data=sample_user_data)
+            context = await builder.build(user_id=1, user_data=sample_user_data)
+
+        assert builder._get_active_goals.await_count == 1
+        assert builder._get_recent_topics.await_count == 1
+        assert context["recent_topics"] == ["дети"]
+        # Время и стиль не кэшируются
+        assert builder._get_time_context.await_count == 2
+
+        stats = cache.get_stats()
+        assert stats["sections"]["active_goals"] == {"hits": 1, "misses": 1}
+
+    async def test_invalidate_reloads_section(self, builder, cache, sample_user_data):
+        """A writer's invalidation should force a reload of that section only."""
+        with patch.object(context_builder_module, "is_sqlite", False):
+            await builder.build(user_id=1, user_data=sample_user_data)
+            await cache.invalidate(1, "active_goals")
+            await builder.build(user_id=1, user_data=sample_user_data)
+
+        assert builder._get_active_goals.await_count == 2
+        assert builder._get_recent_topics.await_count == 1
+
+    async def test_pending_followups_are_not_cached(self, builder, cache, sample_user_data):
+        """Follow-ups depend on the current time and should be loaded every turn."""
+        with patch.object(context_builder_module, "is_sqlite", False):
+            await builder.build(user_id=1, user_data=sample_user_data)
+            await builder.build(user_id=1, user_data=sample_user_data)
+
+        assert builder._get_pending_followups.await_count == 2
+
+    async def test_invalidate_during_load_drops_stale_value(self, builder, cache, sample_user_data):
+        """A value loaded before a write must not be cached after the writer's invalidate."""
+        async def load_then_write():
+            # Загрузчик прочитал старые цели, писатель закоммитил и сбросил секцию
+            await cache.invalidate(1, "active_goals")
+            return [{"goal": "старая"}]
+
+        builder._get_active_goals = AsyncMock(side_effect=load_then_write)
+        with patch.object(context_builder_module, "is_sqlite", False):
+            await builder.build(user_id=1, user_data=sample_user_data)
+
+        sections = await cache.get_sections(1)
+        assert "active_goals" not in sections
+
+    async def test_set_section_compares_generation(self, cache):
+        """set_section with a stale generation should be rejected."""
+        _, generation = await cache.snapshot(1)
+        await cache.invalidate(1)
+
+        assert await cache.set_section(1, "active_goals", [], generation) is False
+        _, current = await cache.snapshot(1)
+        assert await cache.set_section(1, "active_goals", [], current) is True
+        assert await cache.get_sections(1) == {"active_goals": []}
+
+    async def test_expired_sections_are_ignored(self, cache):
+        """Sections older than TTL should be treated as misses."""
+        await cache.set_section(1, "mood_summary", {"has_data": True})
+        assert await cache.get_sections(1) == {"mood_summary": {"has_data": True}}
+
+        cache.ttl = 0
+        assert await cache.get_sections(1) == {}
@@ -0,0 +1,145 @@
+"""
+Tests for ConversationRepository.save_message.
+"""
+
+from contextlib import asynccontextmanager
+from unittest.mock import AsyncMock
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import func, select
+
+import database.repositories.conversation as conversation_module
+import database.repositories.counters as counters_module
+from database.models import (
+    Message,
+    MessageTag,
+    User,
+    UserCounters,
+    UserDailyCounter,
+    UserTagCounter,
+)
+from database.context_cache import SECTION_RECENT_TOPICS
+from database.repositories.conversation import ConversationRepository, new_message_key
+
+
+@pytest_asyncio.fixture
+async def sqlite_session(sqlite_db):
+    """Messages, tags and counters on a file SQLite database."""
+    context = await sqlite_db(
+        [User, Message, MessageTag, UserCounters, UserTagCounter, UserDailyCounter],
+        [conversation_module, counters_module],
+    )
+    async with context() as session:
+        await session.execute(User.__table__.insert().values(id=1, telegram_id=1001))
+        await session.commit()
+    return context
+
+
+async def _stored(sqlite_session):
+    async with sqlite_session() as session:
+        messages = (await session.execute(select(func.count(Message.id)))).scalar()
+        tags = (await session.execute(select(func.count()).select_from(MessageTag))).scalar()
+        counters = await session.get(UserCounters, 1)
+        return messages, tags, counters
+
+
+@pytest.mark.asyncio
+class TestSaveMessageIdempotency:
+    """Retrying a write with the same key must not duplicate the message."""
+
+    async def test_retry_with_same_key(self, sqlite_session):
+        """The second write returns the stored message and counts nothing."""
+        repo = ConversationRepository()
+        key = new_message_key()
+
+        first = await repo.save_message(1, "user", "привет", tags=["crisis"], idempotency_key=key)
+        second = await repo.save_message(1, "user", "привет", tags=["crisis"], idempotency_key=key)
+
+        assert second.id == first.id
+        messages, tags, counters = await _stored(sqlite_session)
+        assert (messages, tags) == (1, 1)
+        assert counters.total_messages == 1
+        assert counters.crisis_messages == 1
+
+    async def test_retry_after_lost_commit_response(self, sqlite_session, monkeypatch):
+        """A commit that succeeded but raised should not be written twice by the retry."""
+        repo = ConversationRepository()
+        key = new_message_key()
+
+        @asynccontextmanager
+        async def flaky_context():
+            async with sqlite_session() as session:
+                commit = session.commit
+
+                async def commit_then_fail():
+                    await commit()
+                    raise ConnectionResetError("connection lost after COMMIT")
+
+                session.commit = commit_then_fail
+                yield session
+
+        monkeypatch.setattr(conversation_module, "get_session_context", flaky_context)
+        with pytest.raises(ConnectionResetError):
+            await repo.save_message(1, "assistant", "ответ", tags=["topic:work"], idempotency_key=key)
+
+        monkeypatch.setattr(conversation_module, "get_session_context", sqlite_session)
+        await repo.save_message(1, "assistant", "ответ", tags=["topic:work"], idempotency_key=key)
+
+        messages, tags, counters = await _stored(sqlite_session)
+        assert (messages, tags) == (1, 1)
+        assert counters.total_messages == 1
+
+    async def test_distinct_keys_are_separate_messages(self, sqlite_session):
+        """Without a key, or with different keys, every call is a new message."""
+        repo = ConversationRepository()
+
+        await repo.save_message(1, "user", "раз")
+        await repo.save_message(1, "user", "раз")
+        await repo.save_message(1, "user", "раз", idempotency_key=new_message_key())
+
+        messages, _, counters = await _stored(sqlite_session)
+        assert messages == 3
+        assert counters.total_messages == 3
+
+
+@pytest.mark.asyncio
+class TestRecentTopicsInvalidation:
+    """save_message resets the cached recent topics when a topic tag is saved."""
+
+    async def test_topic_tag_invalidates_recent_topics(self, sqlite_session, monkeypatch):
+        """Only messages with topic:* tags should drop the recent_topics section."""
+        invalidate = AsyncMock()
+        monkeypatch.setattr(conversation_module.context_cache, "invalidate", invalidate)
+        repo = ConversationRepository()
+
+        await repo.save_message(1, "user", "раз", tags=["crisis"])
+        invalidate.assert_not_awaited()
+
+        await repo.save_message(1, "assistant", "два", tags=["topic:work"])
+        invalidate.assert_awaited_once_with(1, SECTION_RECENT_TOPICS)
+
+
+@pytest.mark.asyncio
+class TestReconcileWithWrites:
+    """CountersRepository.reconcile against messages written through save_message."""
+
+    async def test_repairs_drift_and_keeps_later_writes(self, sqlite_session):
+        """Drifted counters are rewritten from history; later messages add on top."""
+        repo = ConversationRepository()
+        await repo.save_message(1, "user", "раз", tags=["crisis"])
+        await repo.save_message(1, "assistant", "два")
+
+        async with sqlite_session() as session:
+            counters = await session.get(UserCounters, 1)
+            counters.total_messages = 10
+            await session.commit()
+
+        assert await counters_module.counters_repo.reconcile() == 1
+        await repo.save_message(1, "user", "три")
+
+        _, _, counters = await _stored(sqlite_session)
+        assert counters.total_messages == 3
+        assert counters.user_messages == 2
+        assert counters.crisis_messages == 1
+        assert await counters_module.counters_repo.reconcile() == 0
@@ -0,0 +1,142 @@
+"""
+Tests for database.repositories.counters helpers.
+"""
+
+from contextlib import asynccontextmanager
+from datetime import date, datetime
+
+import pytest
+from unittest.mock import AsyncMock, Mock
+from sqlalchemy.dialects import postgresql
+
+import database.repositories.counters as counters_module
+from database.repositories.counters import CountersRepository, classify_message, _Tally
+
+
+class TestClassifyMessage:
+    """Tests for classify_message."""
+
+    def test_user_voice_message(self):
+        """Voice message from user should count as total, user and voice."""
+        delta = classify_message("user", "voice", ["voice"])
+
+        assert delta == {
+            "total_messages": 1,
+            "user_messages": 1,
+            "voice_messages": 1,
+            "photo_messages": 0,
+            "crisis_messages": 0,
+        }
+
+    def test_photo_is_detected_by_tag(self):
+        """Photos are saved as text with a 'photo' tag; only user ones count."""
+        assert classify_message("user", "text", ["photo"])["photo_messages"] == 1
+        assert classify_message("assistant", "text", ["photo"])["photo_messages"] == 0
+
+    def test_crisis_counts_for_any_role(self):
+        """Crisis tag should be counted like the old COUNT over tags."""
+        assert classify_message("assistant", "text", ["crisis"])["crisis_messages"] == 1
+        assert classify_message("assistant", "text", ["crisis"])["user_messages"] == 0
+
+
+class TestTally:
+    """Tests for per-user tallies used by reconcile."""
+
+    def test_aggregates_totals_tags_and_days(self):
+        """Tally should sum message deltas, tags and day buckets."""
+        tally = _Tally()
+        tally.add("user", "text", ["crisis"], datetime(2026, 10, 15, 23, 59))
+        tally.add("assistant", "text", ["crisis", "topic:work"], datetime(2026, 10, 16, 0, 1))
+
+        assert tally.totals["total_messages"] == 2
+        assert tally.totals["user_messages"] == 1
+        assert tally.totals["crisis_messages"] == 2
+        assert tally.tags == {"crisis": 2, "topic:work": 1}
+        assert tally.days == {date(2026, 10, 15): 1, date(2026, 10, 16): 1}
+        assert tally.last_message_at == datetime(2026, 10, 16, 0, 1)
+
+    def test_comparison_ignores_timestamps(self):
+        """Only counts should decide whether counters drifted."""
+        history = _Tally()
+        history.add("user", "text", ["x"], datetime(2026, 10, 16, 12, 0, 0))
+        stored = _Tally()
+        stored.add("user", "text", ["x"], datetime(2026, 10, 16, 12, 0, 1))
+
+        assert history == stored
+
+        stored.tags["x"] += 1
+        assert history != stored
+
+    def test_repeated_tag_counts_once_per_message(self):
+        """Tag counters count messages with the tag, like message_tags."""
+        tally = _Tally()
+        tally.add("user", "text", ["topic:work", "topic:work"], datetime(2026, 10, 16, 12, 0))
+
+        assert tally.tags == {"topic:work": 1}
+
+
+class _Result:
+    """Minimal execute() result for the mocked session."""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def scalars(self):
+        return iter(self.rows)
+
+
+@pytest.mark.asyncio
+class TestReconcileLocking:
+    """reconcile compares without locks and locks only drifted users."""
+
+    @staticmethod
+    def _sql(statement):
+        return str(statement.compile(dialect=postgresql.dialect()))
+
+    @pytest.fixture
+    def session(self, monkeypatch):
+        session = Mock()
+        session.commit = AsyncMock()
+        session.execute = AsyncMock(side_effect=[
+            _Result([1, 2]),  # пачка пользователей
+            _Result([]),      # у 2 счётчиков нет — блокировка user_counters
+            _Result([2]),     # ... и строки users
+            _Result([]),      # следующая пачка пуста
+        ])
+
+        @asynccontextmanager
+        async def context():
+            yield session
+
+        monkeypatch.setattr(counters_module, "get_session_context", context)
+        return session
+
+    async def test_locks_only_drifted_users(self, session):
+        """Comparison takes no locks; the drifted user is locked FOR UPDATE and recounted."""
+        repo = CountersRepository()
+        collected = []
+
+        async def collect(session_, user_ids):
+            collected.append((list(user_ids), session.execute.await_count))
+            return {uid: _Tally(totals={**_Tally().totals, "total_messages": 1}) for uid in user_ids}
+
+        async def load(session_, user_ids):
+            return {1: _Tally(totals={**_Tally().totals, "total_messages": 1})}
+
+        repo._collect = collect
+        repo._load = load
+        repo._delete = AsyncMock()
+        repo._write = AsyncMock()
+
+        assert await repo.reconcile(chunk_size=2) == 1
+
+        statements = [self._sql(call.args[0]) for call in session.execute.await_args_list]
+        assert "FOR UPDATE" not in statements[0]
+        assert "FROM user_counters" in statements[1]
+        assert statements[1].endswith("FOR UPDATE")
+        assert "FROM users" in statements[2]
+        assert statements[2].endswith("FOR UPDATE")
+        # Сверка пачки — до блокировок, пересчёт пользователя 2 — после
+        assert collected == [([1, 2], 1), ([2], 3)]
+        repo._delete.assert_awaited_once_with(session, [2])
+        session.commit.assert_awaited_once()
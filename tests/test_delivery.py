@@ -0,0 +1,202 @@
+"""
+Tests for services.delivery module.
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+import httpx
+from unittest.mock import AsyncMock, Mock
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter, TimedOut
+
+from services.delivery import Delivery, DeliveryDispatcher
+from services.telegram_rate_limiter import TelegramRateLimiter
+
+
+def _caused_by(error, cause):
+    """PTB error raised from an httpx error, as HTTPXRequest does."""
+    error.__cause__ = cause
+    return error
+
+
+def _user(user_id, proactive=True, blocked=False):
+    return SimpleNamespace(
+        id=user_id,
+        telegram_id=1_000_000 + user_id,
+        proactive_messages=proactive,
+        is_blocked=blocked,
+    )
+
+
+@pytest.fixture
+def limiter():
+    return TelegramRateLimiter(global_rate=1000, per_chat_interval=0)
+
+
+@pytest.fixture
+def dispatcher(mock_bot, limiter):
+    dispatcher = DeliveryDispatcher(concurrency=4, rate_limiter=limiter, max_attempts=3)
+    dispatcher.set_bot(mock_bot)
+    dispatcher.user_repo = Mock()
+    dispatcher.user_repo.get_many = AsyncMock(return_value={})
+    return dispatcher
+
+
+@pytest.mark.asyncio
+class TestDeliveryDispatcher:
+    """Tests for DeliveryDispatcher."""
+
+    async def test_loads_users_in_one_query(self, dispatcher, mock_bot):
+        """Recipients should be loaded with a single get_many call."""
+        users = {i: _user(i) for i in range(1, 6)}
+        dispatcher.user_repo.get_many.return_value = users
+
+        report = await dispatcher.dispatch("test", [Delivery(user_id=i, text="hi") for i in users])
+
+        dispatcher.user_repo.get_many.assert_awaited_once()
+        assert len(report.sent) == 5
+        assert mock_bot.send_message.await_count == 5
+        assert report.sent[0].user is users[report.sent[0].user_id]
+
+    async def test_skips_missing_blocked_and_opted_out(self, dispatcher, mock_bot):
+        """Missing, admin-blocked and opted-out users should be skipped."""
+        users = {1: _user(1), 2: _user(2, blocked=True), 3: _user(3, proactive=False)}
+        deliveries = [Delivery(user_id=i, text="hi") for i in (1, 2, 3, 4)]
+
+        report = await dispatcher.dispatch("test", deliveries, users=users, require_proactive=True)
+
+        assert [d.user_id for d in report.sent] == [1]
+        assert sorted(d.user_id for d in report.skipped) == [2, 3, 4]
+        dispatcher.user_repo.get_many.assert_not_awaited()
+
+    async def test_build_text_per_user(self, dispatcher, mock_bot):
+        """build() should produce the text; None means do not send."""
+        async def build(user):
+            return f"hi {user.id}" if user.id == 1 else None
+
+        report = await dispatcher.dispatch(
+            "test",
+            [Delivery(user_id=1, build=build), Delivery(user_id=2, build=build)],
+            users={1: _user(1), 2: _user(2)},
+        )
+
+        assert [d.text for d in report.sent] == ["hi 1"]
+        assert [d.user_id for d in report.skipped] == [2]
+
+    async def test_retry_after_pauses_limiter(self, dispatcher, mock_bot, limiter):
+        """A 429 should pause the shared limiter and retry the message."""
+        mock_bot.send_message.side_effect = [RetryAfter(0), None]
+        limiter.retry_after = Mock(wraps=limiter.retry_after)
+
+        report = await dispatcher.dispatch("test", [Delivery(user_id=1, text="hi")], users={1: _user(1)})
+
+        assert len(report.sent) == 1
+        limiter.retry_after.assert_called_once_with(0)
+        assert mock_bot.send_message.await_count == 2
+
+    async def test_timeout_is_not_resent(self, dispatcher, mock_bot):
+        """A request that may have reached Telegram must not be sent again."""
+        mock_bot.send_message.side_effect = [
+            _caused_by(TimedOut(), httpx.ReadTimeout("read timeout")),
+            _caused_by(NetworkError("httpx.RemoteProtocolError"), httpx.RemoteProtocolError("closed")),
+        ]
+        on_sent = AsyncMock()
+
+        report = await dispatcher.dispatch(
+            "test",
+            [Delivery(user_id=1, text="hi"), Delivery(user_id=2, text="hi")],
+            users={1: _user(1), 2: _user(2)},
+            on_sent=on_sent,
+        )
+
+        assert mock_bot.send_message.await_count == 2
+        assert len(report.sent) == 2
+        assert not any(d.confirmed for d in report.sent)
+        assert on_sent.await_count == 2
+        assert dispatcher.get_stats()["jobs"]["test"]["unconfirmed"] == 2
+
+    async def test_connection_errors_are_retried(self, dispatcher, mock_bot, monkeypatch):
+        """Errors raised before the request was sent should be retried."""
+        monkeypatch.setattr(asyncio, "sleep", AsyncMock())
+        mock_bot.send_message.side_effect = [
+            _caused_by(NetworkError("httpx.ConnectError"), httpx.ConnectError("refused")),
+            _caused_by(TimedOut("Pool timeout"), httpx.PoolTimeout("pool")),
+            None,
+        ]
+
+        report = await dispatcher.dispatch("test", [Delivery(user_id=1, text="hi")], users={1: _user(1)})
+
+        assert mock_bot.send_message.await_count == 3
+        assert len(report.sent) == 1
+        assert report.sent[0].confirmed
+
+    async def test_forbidden_and_bad_request(self, dispatcher, mock_bot):
+        """403 should be reported as blocked, other client errors as failed."""
+        mock_bot.send_message.side_effect = [Forbidden("bot was blocked"), BadRequest("chat not found")]
+
+        report = await dispatcher.dispatch(
+            "test",
+            [Delivery(user_id=1, text="hi"), Delivery(user_id=2, text="hi")],
+            users={1: _user(1), 2: _user(2)},
+        )
+
+        assert len(report.blocked) == 1
+        assert len(report.failed) == 1
+        assert mock_bot.send_message.await_count == 2
+
+    async def test_concurrency_shared_across_jobs(self, dispatcher, mock_bot):
+        """Sends from concurrent jobs should share one concurrency cap."""
+        running = []
+        peak = []
+
+        async def send_message(**kwargs):
+            running.append(1)
+            peak.append(len(running))
+            await asyncio.sleep(0.01)
+            running.pop()
+
+        mock_bot.send_message.side_effect = send_message
+        users = {i: _user(i) for i in range(10)}
+
+        await asyncio.gather(
+            dispatcher.dispatch("a", [Delivery(user_id=i, text="a") for i in range(5)], users=users),
+            dispatcher.dispatch("b", [Delivery(user_id=i, text="b") for i in range(5, 10)], users=users),
+        )
+
+        assert max(peak) == 4
+        assert mock_bot.send_message.await_count == 10
+
+    async def test_slow_build_does_not_hold_send_slots(self, dispatcher, mock_bot):
+        """Ready texts should be sent while slow builds are still generating."""
+        release = asyncio.Event()
+
+        async def slow_build(user):
+            await release.wait()
+            return "generated"
+
+        users = {i: _user(i) for i in range(10)}
+        slow = [Delivery(user_id=i, build=slow_build) for i in range(6)]
+        ready = [Delivery(user_id=i, text="ready") for i in range(6, 10)]
+
+        task = asyncio.create_task(dispatcher.dispatch("mixed", slow + ready, users=users))
+        await asyncio.sleep(0.1)
+
+        # Шесть сборок висят, но все четыре готовых текста уже отправлены
+        assert mock_bot.send_message.await_count == 4
+        assert not task.done()
+
+        release.set()
+        report = await task
+        assert len(report.sent) == 10
+
+    async def test_stats_per_job(self, dispatcher, mock_bot):
+        """Metrics should be kept per job."""
+        await dispatcher.dispatch("followups", [Delivery(user_id=1, text="hi")], users={1: _user(1)})
+        await dispatcher.dispatch("followups", [Delivery(user_id=2, text="hi")], users={})
+
+        stats = dispatcher.get_stats()["jobs"]["followups"]
+        assert stats["runs"] == 2
+        assert stats["sent"] == 1
+        assert stats["skipped"] == 1
+        assert stats["pending"] == 0
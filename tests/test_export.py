@@ -0,0 +1,77 @@
+"""
+Tests for services.export streaming helpers.
+"""
+
+import csv
+import gzip
+import io
+
+import pytest
+
+from services import export
+from services.export import stream_csv, stream_xlsx
+
+
+async def _chunks(rows, size):
+    """Пачки строк, как из серверного курсора."""
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+async def _collect(stream):
+    return [data async for data in stream]
+
+
+@pytest.mark.asyncio
+class TestStreamCsv:
+    """Tests for stream_csv."""
+
+    async def test_writes_bom_header_and_all_rows(self):
+        """Output should be UTF-8 with BOM and contain every row in order."""
+        rows = [[i, f"сообщение {i}"] for i in range(250)]
+
+        data = b"".join(await _collect(stream_csv(["id", "text"], _chunks(rows, 100))))
+
+        assert data.startswith(b"\xef\xbb\xbf")
+        parsed = list(csv.reader(io.StringIO(data.decode("utf-8-sig"))))
+        assert parsed[0] == ["id", "text"]
+        assert parsed[1:] == [[str(i), text] for i, text in rows]
+
+    async def test_yields_bounded_chunks(self, monkeypatch):
+        """Large exports should be emitted in several chunks, not one blob."""
+        monkeypatch.setattr(export, "EXPORT_CHUNK_BYTES", 1024)
+        rows = [[i, "x" * 50] for i in range(1000)]
+
+        chunks = await _collect(stream_csv(["id", "text"], _chunks(rows, 10)))
+
+        assert len(chunks) > 10
+        # Буфер сбрасывается после пачки, перешагнувшей порог
+        assert max(len(chunk) for chunk in chunks) < 1024 + 10 * 60
+
+    async def test_gzip_round_trip(self):
+        """Compressed stream should decompress to the plain CSV."""
+        rows = [[i, "тег"] for i in range(500)]
+
+        plain = b"".join(await _collect(stream_csv(["id", "tag"], _chunks(rows, 50))))
+        packed = b"".join(await _collect(stream_csv(["id", "tag"], _chunks(rows, 50), compress=True)))
+
+        assert gzip.decompress(packed) == plain
+
+
+@pytest.mark.asyncio
+class TestStreamXlsx:
+    """Tests for stream_xlsx."""
+
+    async def test_workbook_contains_header_and_rows(self):
+        """Write-only workbook should open with all rows in place."""
+        from openpyxl import load_workbook
+
+        rows = [[i, f"row {i}"] for i in range(30)]
+
+        data = b"".join(await _collect(stream_xlsx(["id", "text"], _chunks(rows, 7), title="Export")))
+
+        sheet = load_workbook(io.BytesIO(data)).active
+        values = [[cell.value for cell in row] for row in sheet.iter_rows()]
+        assert sheet.title == "Export"
+        assert values[0] == ["id", "text"]
+        assert values[1:] == rows
@@ -0,0 +1,101 @@
+"""
+Tests for utils.fire_time module.
+"""
+
+from datetime import date, datetime, timedelta
+
+import pytest
+import pytz
+
+from config.settings import settings
+from utils.fire_time import fire_time_on, next_fire_time, spread_offset
+
+
+@pytest.fixture
+def no_spread(monkeypatch):
+    monkeypatch.setattr(settings, "SCHEDULER_SPREAD_MINUTES", 0)
+
+
+def _utc(*args):
+    return pytz.utc.localize(datetime(*args))
+
+
+class TestSpreadOffset:
+    """Tests for spread_offset."""
+
+    def test_stable_and_inside_window(self):
+        """Each user should get the same offset every time, within the window."""
+        offsets = [spread_offset(user_id, minutes=30) for user_id in range(1, 200)]
+
+        assert offsets == [spread_offset(user_id, minutes=30) for user_id in range(1, 200)]
+        assert all(timedelta(0) <= offset < timedelta(minutes=30) for offset in offsets)
+
+    def test_neighbours_spread_over_window(self):
+        """Consecutive user ids should not bunch up at the start of the window."""
+        offsets = [spread_offset(user_id, minutes=30) for user_id in range(1, 301)]
+        buckets = {int(offset.total_seconds() // 300) for offset in offsets}
+
+        assert buckets == set(range(6))
+
+    def test_zero_window(self):
+        """A zero window should disable spreading."""
+        assert spread_offset(42, minutes=0) == timedelta(0)
+
+
+@pytest.mark.usefixtures("no_spread")
+class TestNextFireTime:
+    """Tests for next_fire_time."""
+
+    def test_local_time_in_each_timezone(self):
+        """09:00 should mean the user's own 09:00, not the server's."""
+        now = _utc(2026, 10, 16, 0, 0)
+
+        moscow = next_fire_time("Europe/Moscow", "09:00", 1, now=now, utc=True)
+        vladivostok = next_fire_time("Asia/Vladivostok", "09:00", 2, now=now, utc=True)
+
+        assert moscow == datetime(2026, 10, 16, 6, 0)
+        assert vladivostok == datetime(2026, 10, 16, 23, 0)
+
+    def test_passed_time_moves_to_next_day(self):
+        """If today's local time has passed, the next day should be used."""
+        now = _utc(2026, 10, 16, 10, 0)  # 13:00 в Москве
+
+        assert next_fire_time("Europe/Moscow", "09:00", 1, now=now, utc=True) == datetime(2026, 10, 17, 6, 0)
+
+    def test_days_ahead_and_weekday(self):
+        """days_ahead counts local days; weekday picks the next matching day."""
+        now = _utc(2026, 10, 16, 0, 0)  # пятница
+
+        in_three_days = next_fire_time("Europe/Moscow", "20:00", 1, days_ahead=3, now=now, utc=True)
+        monday = next_fire_time("Europe/Moscow", "19:00", 1, weekday=0, now=now, utc=True)
+
+        assert in_three_days == datetime(2026, 10, 19, 17, 0)
+        assert monday == datetime(2026, 10, 19, 16, 0)
+
+    def test_unknown_timezone_falls_back_to_moscow(self):
+        """Invalid or empty timezones should behave like Europe/Moscow."""
+        now = _utc(2026, 10, 16, 0, 0)
+
+        assert next_fire_time("Mars/Olympus", "09:00", 1, now=now, utc=True) == datetime(2026, 10, 16, 6, 0)
+        assert next_fire_time(None, "09:00", 1, now=now, utc=True) == datetime(2026, 10, 16, 6, 0)
+
+    def test_server_time_column(self):
+        """Without utc=True the value should be naive server local time."""
+        now = _utc(2026, 10, 16, 0, 0)
+
+        value = next_fire_time("Europe/Moscow", "09:00", 1, now=now)
+
+        assert value.tzinfo is None
+        assert value == _utc(2026, 10, 16, 6, 0).astimezone().replace(tzinfo=None)
+
+
+class TestFireTimeOn:
+    """Tests for fire_time_on."""
+
+    def test_spread_is_added(self, monkeypatch):
+        """The user's offset should be added to the local time."""
+        monkeypatch.setattr(settings, "SCHEDULER_SPREAD_MINUTES", 30)
+
+        value = fire_time_on("Europe/Moscow", date(2026, 10, 17), "09:00", 7, utc=True)
+
+        assert value == datetime(2026, 10, 17, 6, 0) + spread_offset(7, minutes=30)
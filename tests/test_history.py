@@ -0,0 +1,130 @@
+"""
+Tests for ai.memory.history module.
+"""
+
+from types import SimpleNamespace
+
+import pytest
+from unittest.mock import AsyncMock, patch
+
+import ai.memory.context_builder as context_builder_module
+import ai.memory.history as history_module
+from ai.memory.context_builder import ContextBuilder
+from ai.memory.history import HistoryBuilder, CONVERSATION_PATTERNS_WINDOW
+from database.context_cache import ContextCache
+from database.history_summary_cache import HistorySummaryCache
+
+
+def _messages(count, length=10):
+    """История из count сообщений по length символов (чередование ролей)."""
+    return [
+        SimpleNamespace(
+            id=index + 1,
+            role="user" if index % 2 == 0 else "assistant",
+            content=f"{index:03d}" + "я" * (length - 3),
+            tags=["topic:work"],
+        )
+        for index in range(count)
+    ]
+
+
+@pytest.fixture
+def summary_cache(monkeypatch):
+    """Чистый кэш резюме (локальный, без Redis)."""
+    cache = HistorySummaryCache(ttl=60, local_max_users=10)
+    monkeypatch.setattr(history_module, "history_summary_cache", cache)
+    return cache
+
+
+@pytest.fixture
+def builder(summary_cache):
+    """HistoryBuilder с замоканными БД и суммаризатором; токен = символ."""
+    builder = HistoryBuilder(budget=100)
+    builder.conversation_repo.get_recent = AsyncMock(return_value=_messages(40))
+    builder.summarizer.summarize_history = AsyncMock(return_value="резюме")
+    builder.count_tokens = AsyncMock(side_effect=lambda text: len(text))
+    return builder
+
+
+@pytest.mark.asyncio
+class TestHistoryBuilder:
+    """Tests for the token-budgeted history window."""
+
+    async def test_fetches_history_once_for_all_consumers(self, builder):
+        """One query should cover both memory depth and the patterns window."""
+        window = await builder.load(user_id=1, current_message="привет", depth=10)
+
+        builder.conversation_repo.get_recent.assert_awaited_once_with(
+            user_id=1, limit=CONVERSATION_PATTERNS_WINDOW,
+        )
+        assert len(window.history) == 40
+
+    async def test_everything_fits_in_budget(self, builder):
+        """Within budget the last depth messages go verbatim, no summary."""
+        window = await builder.load(user_id=1, current_message="привет", depth=6)
+
+        assert [m["content"][:3] for m in window.messages[:-1]] == ["034", "035", "036", "037", "038", "039"]
+        assert window.messages[-1] == {"role": "user", "content": "привет"}
+        assert window.summary is None
+        assert window.tokens == 66
+        builder.summarizer.summarize_history.assert_not_awaited()
+
+    async def test_older_turns_are_summarized(self, builder, summary_cache):
+        """Turns over budget should be summarized in background and reused next turn."""
+        window = await builder.load(user_id=1, current_message="привет", depth=20)
+
+        # 94 токена: 9 последних сообщений + текущее
+        assert len(window.messages) == 10
+        assert window.tokens <= builder.budget
+        assert window.summary is None  # резюме ещё не было — ход его не ждёт
+
+        builder.summarizer.summarize_history.assert_awaited_once()
+        previous, messages = builder.summarizer.summarize_history.await_args.args
+        assert previous is None
+        assert [m["content"][:3] for m in messages] == [f"{i:03d}" for i in range(20, 31)]
+        assert await summary_cache.get(1) == {"until_id": 31, "summary": "резюме"}
+
+        window = await builder.load(user_id=1, current_message="привет", depth=20)
+        assert window.summary == "резюме"
+        assert builder.summarizer.summarize_history.await_count == 1
+
+    async def test_summary_rolls_forward(self, builder, summary_cache):
+        """Only turns newer than the stored summary should be sent to the summarizer."""
+        await summary_cache.set(1, until_id=28, summary="старое резюме")
+
+        window = await builder.load(user_id=1, current_message="привет", depth=20)
+
+        assert window.summary == "старое резюме"
+        previous, messages = builder.summarizer.summarize_history.await_args.args
+        assert previous == "старое резюме"
+        assert [m["content"][:3] for m in messages] == ["028", "029", "030"]
+        assert (await summary_cache.get(1))["until_id"] == 31
+
+    async def test_counts_tokens_locally(self, summary_cache):
+        """Token counting should work without a network call."""
+        builder = HistoryBuilder()
+
+        assert await builder.count_tokens("Сегодня был тяжёлый день") > 0
+        assert await builder.count_tokens("") == 0
+
+
+@pytest.mark.asyncio
+class TestContextBuilderHistory:
+    """ContextBuilder should reuse the turn history."""
+
+    async def test_patterns_use_loaded_history(self, monkeypatch, builder, sample_user_data):
+        """Conversation patterns should not query history again."""
+        monkeypatch.setattr(context_builder_module, "context_cache", ContextCache(ttl=60))
+        context_builder = ContextBuilder()
+        context_builder.conversation_repo.get_recent = AsyncMock()
+        window = await builder.load(user_id=1, current_message="привет", depth=10)
+        window.summary = "резюме"
+
+        with patch.object(context_builder_module, "is_sqlite", True):
+            context = await context_builder.build(
+                user_id=1, user_data=sample_user_data, history=window,
+            )
+
+        context_builder.conversation_repo.get_recent.assert_not_awaited()
+        assert context["conversation_patterns"]["stuck_on_topic"] == "topic:work"
+        assert context["history_summary"] == "резюме"
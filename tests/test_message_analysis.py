@@ -0,0 +1,134 @@
+"""
+Tests for ai.message_analysis module.
+"""
+
+from contextlib import ExitStack
+from types import SimpleNamespace
+
+import pytest
+from unittest.mock import AsyncMock, Mock, patch
+
+import ai.claude_client as claude_client_module
+import ai.memory.context_builder as context_builder_module
+from ai.claude_client import ClaudeClient
+from ai.crisis_detector import crisis_detector
+from ai.memory.history import HistoryWindow
+from ai.message_analysis import analyze_message
+from ai.mood_analyzer import mood_analyzer
+from ai.question_type_detector import question_type_detector
+from database.context_cache import ContextCache
+
+
+class _FakeStream:
+    """Потоковый ответ Claude из готовых кусков."""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    @property
+    async def text_stream(self):
+        for chunk in self.chunks:
+            yield chunk
+
+    async def get_final_message(self):
+        return SimpleNamespace(usage=SimpleNamespace(input_tokens=10, output_tokens=5))
+
+
+@pytest.fixture
+def analyzer_calls():
+    """Счётчики вызовов анализаторов хода (сами анализаторы настоящие)."""
+    with ExitStack() as stack:
+        spies = {
+            name: stack.enter_context(patch.object(obj, method, wraps=getattr(obj, method)))
+            for name, obj, method in (
+                ("crisis", crisis_detector, "check"),
+                ("mood", mood_analyzer, "analyze"),
+                ("question", question_type_detector, "detect"),
+            )
+        }
+        yield spies
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """ClaudeClient без сети и БД: секции контекста и история замоканы."""
+    monkeypatch.setattr(context_builder_module, "context_cache", ContextCache(ttl=60))
+    monkeypatch.setattr(context_builder_module, "is_sqlite", True)
+    monkeypatch.setattr(claude_client_module.background_tasks, "submit", AsyncMock())
+
+    client = ClaudeClient()
+    client.client = Mock()
+    client.client.messages.stream = Mock(return_value=_FakeStream(["Понимаю", ", расскажи?"]))
+    client.history_builder.load = AsyncMock(side_effect=lambda user_id, current_message, depth: HistoryWindow(
+        history=[], messages=[{"role": "user", "content": current_message}],
+    ))
+
+    builder = client.context_builder
+    for section in (
+        "_get_time_context", "_detect_conversation_patterns", "_get_recent_topics",
+        "_get_mood_summary", "_get_sensitive_topics", "_get_active_goals",
+        "_get_pending_followups", "_get_user_profile_summary", "_get_long_term_memory",
+        "_get_communication_style",
+    ):
+        setattr(builder, section, AsyncMock(return_value=None))
+    builder.build = AsyncMock(wraps=builder.build)
+    return client
+
+
+class TestAnalyzeMessage:
+    """Tests for the per-turn analysis."""
+
+    def test_runs_each_analyzer_once(self, analyzer_calls):
+        """One analysis should call every analyzer exactly once."""
+        analysis = analyze_message("Я так устала... что мне делать?")
+
+        for name, spy in analyzer_calls.items():
+            assert spy.call_count == 1, name
+        assert analysis.question_type["type"] == "open"
+        assert analysis.current_mood["primary_emotion"] == analysis.mood.primary_emotion
+
+    def test_crisis_shortcuts(self):
+        """Crisis fields should come straight from the detector result."""
+        analysis = analyze_message("не хочу жить")
+
+        assert analysis.is_crisis
+        assert analysis.crisis_level == "critical"
+
+
+@pytest.mark.asyncio
+class TestTurnAnalysisReuse:
+    """The turn analysis should be shared, not recomputed downstream."""
+
+    async def test_stream_turn_runs_each_analyzer_once(self, client, analyzer_calls, sample_user_data):
+        """Handler analysis → ClaudeClient → ContextBuilder: each analyzer once per turn."""
+        message = "Муж опять не слышит меня. Что мне делать?"
+        analysis = analyze_message(message)
+
+        result = await client.generate_response_stream(
+            user_id=1,
+            user_message=message,
+            user_data=sample_user_data,
+            analysis=analysis,
+        )
+
+        for name, spy in analyzer_calls.items():
+            assert spy.call_count == 1, name
+        assert client.context_builder.build.await_args.kwargs["analysis"] is analysis
+        assert result["is_crisis"] is False
+
+    async def test_analyzes_when_caller_did_not(self, client, analyzer_calls, sample_user_data):
+        """Callers without an analysis (callbacks, voice) still get one pass."""
+        await client.generate_response_stream(
+            user_id=1,
+            user_message="Почему всё так?",
+            user_data=sample_user_data,
+        )
+
+        for name, spy in analyzer_calls.items():
+            assert spy.call_count == 1, name
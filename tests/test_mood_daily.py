@@ -0,0 +1,67 @@
+"""
+Tests for daily mood aggregates in database.repositories.mood.
+"""
+
+from datetime import date, datetime
+
+from database.repositories.mood import MoodDay, combine_mood_days, split_mood_days
+
+
+def _day(day: int, scores, emotion="sad", anxiety=None) -> MoodDay:
+    return MoodDay(
+        day=date(2026, 10, day),
+        entries=len(scores),
+        score_sum=sum(scores),
+        anxiety_sum=anxiety or 0,
+        anxiety_entries=1 if anxiety else 0,
+        emotions={emotion: len(scores)},
+        last_score=scores[-1],
+        last_emotion=emotion,
+        last_entry_at=datetime(2026, 10, day, 12, 0),
+    )
+
+
+class TestCombineMoodDays:
+    """Tests for combine_mood_days."""
+
+    def test_matches_aggregation_over_entries(self):
+        """Combined buckets should give the same numbers as raw entries."""
+        days = [_day(10, [-3, -1], anxiety=8), _day(12, [2], "happy"), _day(14, [4, 3], "happy", anxiety=4)]
+
+        period = combine_mood_days(days)
+
+        assert period.entries == 5
+        assert period.average_score == 1.0
+        assert period.average_anxiety == 6.0
+        assert period.emotions == {"sad": 2, "happy": 3}
+        assert period.dominant_emotion == "happy"
+        assert (period.last_score, period.last_emotion) == (3, "happy")
+
+    def test_empty_period(self):
+        """No buckets means no averages."""
+        period = combine_mood_days([])
+
+        assert period.entries == 0
+        assert period.average_score is None
+        assert period.dominant_emotion is None
+
+
+class TestSplitMoodDays:
+    """Tests for split_mood_days."""
+
+    def test_splits_by_entries_in_time_order(self):
+        """Earlier half should hold the older days with about half the entries."""
+        days = [_day(10, [-3, -2]), _day(11, [-1]), _day(12, [1]), _day(13, [3, 4])]
+
+        earlier, later = split_mood_days(days)
+
+        assert earlier.entries == 3
+        assert later.entries == 3
+        assert later.average_score > earlier.average_score
+
+    def test_keeps_both_halves_non_empty(self):
+        """A heavy first day should not swallow the whole period."""
+        earlier, later = split_mood_days([_day(10, [1] * 10), _day(11, [2])])
+
+        assert earlier.entries == 10
+        assert later.entries == 1
@@ -0,0 +1,223 @@
+"""
+Tests for running scheduler jobs in several workers.
+"""
+
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+import pytest_asyncio
+from unittest.mock import AsyncMock, Mock
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql
+
+import database.leases as leases
+import database.repositories.scheduled_message as scheduled_message_module
+import services.scheduler as scheduler
+from config.settings import settings
+from database.models import ScheduledMessage, UserFollowUp
+from database.repositories.followup import FollowUpRepository
+from services.delivery import DeliveryDispatcher
+from services.telegram_rate_limiter import TelegramRateLimiter
+
+
+class TestRunSlot:
+    """Tests for run_slot."""
+
+    def test_day_and_hour_slots(self):
+        """Daily slots start at midnight, hourly slots at :00."""
+        now = datetime(2026, 10, 16, 9, 0, 7)
+
+        assert scheduler.run_slot(scheduler.DAY, now) == datetime(2026, 10, 16)
+        assert scheduler.run_slot(scheduler.HOUR, now) == datetime(2026, 10, 16, 9)
+
+    def test_week_slot_starts_on_monday(self):
+        """Weekly slots should start on Monday, so all workers agree on Monday 19:00."""
+        slot = scheduler.run_slot(scheduler.WEEK, datetime(2026, 10, 19, 19, 0, 2))
+
+        assert slot == datetime(2026, 10, 19)
+        assert slot.weekday() == 0
+
+    def test_workers_firing_apart_share_slot(self):
+        """Workers whose cron fires seconds apart should compete for the same slot."""
+        first = scheduler.run_slot(scheduler.HOUR, datetime(2026, 10, 16, 10, 0, 0))
+        late = scheduler.run_slot(scheduler.HOUR, datetime(2026, 10, 16, 10, 0, 40))
+
+        assert first == late
+
+
+@pytest.mark.asyncio
+class TestRunExclusive:
+    """Tests for run_exclusive."""
+
+    @pytest.fixture
+    def runs(self, monkeypatch):
+        repo = Mock()
+        repo.claim = AsyncMock()
+        monkeypatch.setattr(scheduler, "SchedulerRunRepository", lambda: repo)
+        return repo
+
+    async def test_runs_when_claimed(self, runs):
+        """The worker that claims the slot should run the job."""
+        runs.claim.return_value = True
+        job = AsyncMock()
+
+        assert await scheduler.run_exclusive("celebrations", scheduler.DAY, job) is True
+
+        job.assert_awaited_once()
+        name, slot, worker = runs.claim.await_args.args
+        assert name == "celebrations"
+        assert slot == scheduler.run_slot(scheduler.DAY)
+        assert worker == scheduler.WORKER_ID
+
+    async def test_skips_when_claimed_elsewhere(self, runs):
+        """Other workers should skip a job already claimed for the slot."""
+        runs.claim.return_value = False
+        job = AsyncMock()
+
+        assert await scheduler.run_exclusive("celebrations", scheduler.DAY, job) is False
+
+        job.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+class TestClaimDue:
+    """Tests for database.leases.claim_due."""
+
+    @pytest.fixture
+    def session(self, monkeypatch):
+        rows = [SimpleNamespace(id=1), SimpleNamespace(id=2)]
+        session = Mock()
+        session.execute = AsyncMock(return_value=Mock(
+            scalars=Mock(return_value=Mock(all=Mock(return_value=rows)))
+        ))
+        session.commit = AsyncMock()
+
+        @asynccontextmanager
+        async def context():
+            yield session
+
+        monkeypatch.setattr(leases, "get_session_context", context)
+        return session
+
+    @staticmethod
+    def _sql(statement):
+        return str(statement.compile(dialect=postgresql.dialect()))
+
+    async def test_selects_with_skip_locked_and_moves_due_time(self, session):
+        """Rows should be locked with SKIP LOCKED and pushed out by the lease in one transaction."""
+        now = datetime(2026, 10, 16, 12, 0)
+        until = leases.lease_until(now, 600)
+
+        rows = await leases.claim_due(
+            FollowUpRepository._due_query(now, 100),
+            UserFollowUp.followup_date,
+            until,
+        )
+
+        assert [row.id for row in rows] == [1, 2]
+        select_sql = self._sql(session.execute.await_args_list[0].args[0])
+        update_stmt = session.execute.await_args_list[1].args[0]
+        assert select_sql.endswith("FOR UPDATE SKIP LOCKED")
+        assert "UPDATE user_followups SET followup_date" in self._sql(update_stmt)
+        assert update_stmt.compile().params["followup_date"] == now + timedelta(seconds=600)
+        session.commit.assert_awaited_once()
+
+    async def test_nothing_due(self, session):
+        """With nothing due there should be no UPDATE."""
+        session.execute.return_value.scalars.return_value.all.return_value = []
+
+        rows = await leases.claim_due(
+            FollowUpRepository._due_query(datetime.now(), 100),
+            UserFollowUp.followup_date,
+            datetime.now(),
+        )
+
+        assert rows == []
+        assert session.execute.await_count == 1
+
+
+@pytest_asyncio.fixture
+async def sqlite_session(sqlite_db):
+    """Repositories and leases on a file SQLite database."""
+    return await sqlite_db([ScheduledMessage], [leases, scheduled_message_module])
+
+
+@pytest.mark.asyncio
+class TestLeaseOutlastingDispatch:
+    """Two workers claiming while a slow dispatch runs past the lease."""
+
+    @pytest.fixture
+    def worker(self, monkeypatch, mock_bot):
+        async def slow_send(**kwargs):
+            await asyncio.sleep(0.2)
+
+        mock_bot.send_message.side_effect = slow_send
+        dispatcher = DeliveryDispatcher(
+            concurrency=1,
+            rate_limiter=TelegramRateLimiter(global_rate=1000, per_chat_interval=0),
+        )
+        dispatcher.set_bot(mock_bot)
+        dispatcher.user_repo = Mock()
+        dispatcher.user_repo.get_many = AsyncMock(return_value={
+            user_id: SimpleNamespace(id=user_id, telegram_id=user_id, proactive_messages=True, is_blocked=False)
+            for user_id in (1, 2, 3)
+        })
+        monkeypatch.setattr(scheduler, "delivery_dispatcher", dispatcher)
+        monkeypatch.setattr(scheduler, "app", Mock())
+        monkeypatch.setattr(settings, "SCHEDULER_LEASE_SECONDS", 0.3)
+        return mock_bot
+
+    async def test_each_message_sent_once(self, sqlite_session, worker):
+        """A second worker must not re-claim rows while the first is still sending them."""
+        async with sqlite_session() as session:
+            session.add_all([
+                ScheduledMessage(
+                    user_id=user_id,
+                    type="birthday",
+                    content="С днём рождения!",
+                    status="pending",
+                    scheduled_for=datetime.now() - timedelta(minutes=1),
+                )
+                for user_id in (1, 2, 3)
+            ])
+            await session.commit()
+
+        # Пачка отправляется ~0.6 с при аренде 0.3 с
+        first = asyncio.create_task(scheduler.process_scheduled_messages())
+        while not first.done():
+            await asyncio.sleep(0.1)
+            await scheduler.process_scheduled_messages()
+        await first
+
+        assert worker.send_message.await_count == 3
+        async with sqlite_session() as session:
+            statuses = (await session.execute(select(ScheduledMessage.status))).scalars().all()
+        assert statuses == ["sent"] * 3
+
+    async def test_sent_rows_are_marked_before_batch_ends(self, sqlite_session, worker):
+        """Each message should be marked as soon as it is sent, not after the whole batch."""
+        async with sqlite_session() as session:
+            session.add_all([
+                ScheduledMessage(
+                    user_id=user_id,
+                    type="birthday",
+                    content="С днём рождения!",
+                    status="pending",
+                    scheduled_for=datetime.now() - timedelta(minutes=1),
+                )
+                for user_id in (1, 2, 3)
+            ])
+            await session.commit()
+
+        task = asyncio.create_task(scheduler.process_scheduled_messages())
+        await asyncio.sleep(0.3)
+        async with sqlite_session() as session:
+            sent = (await session.execute(
+                select(ScheduledMessage).where(ScheduledMessage.status == "sent")
+            )).scalars().all()
+        await task
+
+        assert 1 <= len(sent) < 3
@@ -0,0 +1,184 @@
+"""
+Tests for bot.utils.stream_renderer module.
+"""
+
+import asyncio
+import time
+
+import pytest
+from unittest.mock import AsyncMock, Mock
+from telegram.error import BadRequest, RetryAfter
+
+from bot.utils.stream_renderer import CURSOR, StreamRenderer
+from services.telegram_rate_limiter import TelegramRateLimiter
+
+
+def _messages(edit_side_effect=None):
+    """Сообщение пользователя и ответ бота (заглушки Bot API)."""
+    bot_message = Mock()
+    bot_message.edit_text = AsyncMock(side_effect=edit_side_effect)
+    bot_message.delete = AsyncMock()
+
+    user_message = Mock()
+    user_message.chat_id = 42
+    user_message.reply_text = AsyncMock(return_value=bot_message)
+    return user_message, bot_message
+
+
+def _renderer(user_message, **kwargs):
+    kwargs.setdefault("limiter", TelegramRateLimiter(global_rate=1000, per_chat_interval=0))
+    kwargs.setdefault("interval", 0.05)
+    kwargs.setdefault("max_interval", 0.4)
+    kwargs.setdefault("min_chars", 5)
+    return StreamRenderer(user_message, **kwargs)
+
+
+@pytest.mark.asyncio
+class TestStreamRenderer:
+    """Tests for StreamRenderer."""
+
+    async def test_coalesces_chunks(self):
+        """Chunks arriving between edits should go out as one edit."""
+        user_message, bot_message = _messages()
+        renderer = _renderer(user_message, interval=0.2)
+
+        await renderer.feed("Первая фраза. ")
+        await asyncio.sleep(0.02)
+        for _ in range(20):
+            await renderer.feed("ещё ")
+        await asyncio.sleep(0.3)
+        await renderer.finish("готово")
+
+        user_message.reply_text.assert_awaited_once_with("Первая фраза. " + CURSOR)
+        intermediate = [c.args[0] for c in bot_message.edit_text.await_args_list[:-1]]
+        assert intermediate == ["Первая фраза. " + "ещё " * 20 + CURSOR]
+
+    async def test_waits_for_min_chars(self):
+        """Nothing should be shown before min_chars are accumulated."""
+        user_message, _ = _messages()
+        renderer = _renderer(user_message, min_chars=50)
+
+        await renderer.feed("Коротко")
+        await asyncio.sleep(0.1)
+
+        user_message.reply_text.assert_not_awaited()
+        await renderer.abort()
+
+    async def test_thinking_delay_not_before(self):
+        """Text should not appear before the thinking delay, even if ready."""
+        user_message, _ = _messages()
+        renderer = _renderer(user_message, delay=0.2)
+
+        await renderer.feed("Уже готовый текст")
+        await asyncio.sleep(0.1)
+        user_message.reply_text.assert_not_awaited()
+
+        await asyncio.sleep(0.2)
+        user_message.reply_text.assert_awaited_once()
+        assert renderer.first_visible_at >= 0.2
+        await renderer.abort()
+
+    async def test_backoff_on_retry_after(self):
+        """RetryAfter should defer the chat in the limiter and double the interval."""
+        user_message, bot_message = _messages(edit_side_effect=[RetryAfter(0), None, None])
+        limiter = TelegramRateLimiter(global_rate=1000, per_chat_interval=0)
+        limiter.defer = Mock(wraps=limiter.defer)
+        renderer = _renderer(user_message, limiter=limiter)
+
+        await renderer.feed("Первая фраза. ")
+        await asyncio.sleep(0.02)
+        await renderer.feed("вторая")
+        await asyncio.sleep(0.08)
+
+        assert renderer.flood_errors == 1
+        limiter.defer.assert_called_once_with(42, 0)
+        # Повтор после бэкоффа показывает свежий текст, интервал вернулся к базовому
+        assert bot_message.edit_text.await_args.args[0] == "Первая фраза. вторая" + CURSOR
+        assert renderer.interval == renderer.base_interval
+        await renderer.finish("Первая фраза. вторая")
+
+    async def test_backoff_doubles_interval(self):
+        """Each flood error should double the edit interval and push the next edit."""
+        user_message, _ = _messages()
+        renderer = _renderer(user_message)
+
+        renderer._backoff(0.3)
+
+        assert renderer.interval == pytest.approx(0.1)
+        assert renderer._next_edit >= time.monotonic() + 0.2
+
+    async def test_interval_capped(self):
+        """Repeated floods should not grow the interval past max_interval."""
+        user_message, _ = _messages()
+        renderer = _renderer(user_message)
+
+        for _ in range(10):
+            renderer._backoff(0)
+
+        assert renderer.interval == renderer.max_interval
+
+    async def test_finish_shows_final_text_with_markup(self):
+        """The final text should replace the cursor version and carry the keyboard."""
+        user_message, bot_message = _messages()
+        renderer = _renderer(user_message)
+        markup = object()
+
+        await renderer.feed("Промежуточный текст")
+        await asyncio.sleep(0.02)
+        shown = await renderer.finish("Финальный текст", reply_markup=markup)
+
+        assert shown is True
+        bot_message.edit_text.assert_awaited_with(
+            "Финальный текст", reply_markup=markup, parse_mode="Markdown",
+        )
+
+    async def test_finish_without_stream_replies(self):
+        """A short answer never shown mid-stream should be sent as a reply."""
+        user_message, bot_message = _messages()
+        renderer = _renderer(user_message, min_chars=100)
+
+        await renderer.feed("Да")
+        assert await renderer.finish("Да") is True
+
+        user_message.reply_text.assert_awaited_once_with("Да", reply_markup=None, parse_mode="Markdown")
+        bot_message.edit_text.assert_not_awaited()
+
+    async def test_finish_falls_back_to_plain_text(self):
+        """Broken Markdown in the final text should be retried without parse_mode."""
+        user_message, bot_message = _messages()
+        renderer = _renderer(user_message)
+
+        await renderer.feed("Промежуточный текст")
+        await asyncio.sleep(0.02)
+        bot_message.edit_text.side_effect = [BadRequest("Can't parse entities"), None]
+        assert await renderer.finish("*сломано") is True
+
+        bot_message.edit_text.assert_awaited_with("*сломано", reply_markup=None)
+
+    async def test_finish_retries_after_flood(self):
+        """The final edit should survive a RetryAfter instead of being dropped."""
+        user_message, bot_message = _messages()
+        renderer = _renderer(user_message)
+
+        await renderer.feed("Промежуточный текст")
+        await asyncio.sleep(0.02)
+        bot_message.edit_text.side_effect = [RetryAfter(0), None]
+        started = time.monotonic()
+
+        assert await renderer.finish("Финал") is True
+        assert renderer.flood_errors == 1
+        assert time.monotonic() - started < 1.0
+
+    async def test_abort_deletes_message(self):
+        """abort() should stop edits and delete the started answer."""
+        user_message, bot_message = _messages()
+        renderer = _renderer(user_message)
+
+        await renderer.feed("Начало ответа")
+        await asyncio.sleep(0.02)
+        await renderer.abort()
+        await renderer.feed(" и продолжение")
+        await asyncio.sleep(0.1)
+
+        bot_message.delete.assert_awaited_once()
+        bot_message.edit_text.assert_not_awaited()
@@ -0,0 +1,74 @@
+"""
+Tests for ai.style_analyzer module.
+"""
+
+from ai.style_analyzer import StyleAnalyzer, STYLE_WINDOW
+
+
+def _observe_all(analyzer, texts, stats=None):
+    for text in texts:
+        stats = analyzer.observe(stats, text)
+    return stats
+
+
+class TestStyleAnalyzerIncremental:
+    """Tests for running style aggregates."""
+
+    def setup_method(self):
+        self.analyzer = StyleAnalyzer()
+
+    def test_matches_batch_analysis_on_uniform_history(self):
+        """Running aggregates should agree with a batch pass over the same messages."""
+        texts = ["блин, ты прикинь 😂 хаха, короче опять поругались"] * STYLE_WINDOW
+        messages = [{"role": "user", "content": text} for text in texts]
+
+        batch = self.analyzer.analyze_messages(messages)
+        incremental = self.analyzer.style_from_stats(_observe_all(self.analyzer, texts))
+
+        for field in ("formality", "emoji_preference", "message_length", "humor_level"):
+            assert incremental[field] == batch[field], field
+
+    def test_recent_messages_outweigh_old_ones(self):
+        """Style should follow the latest window, not the whole history."""
+        formal = ["Извините, будьте добры, подскажите пожалуйста, как Вам кажется?"] * 50
+        informal = ["блин ты чё, короче ваще лол"] * (STYLE_WINDOW * 2)
+
+        stats = _observe_all(self.analyzer, formal)
+        assert self.analyzer.style_from_stats(stats)["formality"] == "formal"
+
+        stats = _observe_all(self.analyzer, informal, stats)
+        assert self.analyzer.style_from_stats(stats)["formality"] == "informal"
+        assert stats["messages"] == 50 + STYLE_WINDOW * 2
+
+    def test_trigger_expires_after_window(self):
+        """A sensitive topic should be dropped once it leaves the window."""
+        stats = self.analyzer.observe(None, "муж опять говорит про развод")
+        assert self.analyzer.style_from_stats(stats)["triggers"] == ["развод"]
+
+        stats = _observe_all(self.analyzer, ["всё нормально"] * (STYLE_WINDOW + 1), stats)
+        assert self.analyzer.style_from_stats(stats)["triggers"] == []
+
+    def test_keeps_explicit_user_settings(self):
+        """User-set fields should survive re-derivation of the style."""
+        existing = {
+            "topics_avoided": ["работа"],
+            "support_style": "tough",
+            "support_style_explicit": True,
+        }
+        stats = self.analyzer.observe(None, "хаха лол ржу 😂😂")
+
+        style = self.analyzer.style_from_stats(stats, existing)
+
+        assert style["topics_avoided"] == ["работа"]
+        assert style["support_style"] == "tough"
+        assert style["support_style_explicit"] is True
+
+    def test_style_changed_ignores_timestamp(self):
+        """Only derived fields should count as a change."""
+        stats = self.analyzer.observe(None, "привет")
+        first = self.analyzer.style_from_stats(stats)
+        second = self.analyzer.style_from_stats(stats, first)
+
+        assert not self.analyzer.style_changed(first, second)
+        assert self.analyzer.style_changed(None, first)
+        assert self.analyzer.style_changed(first, {**second, "humor_level": "frequent"})
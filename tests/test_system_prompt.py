@@ -0,0 +1,59 @@
+"""
+Tests for ai.prompts.system_prompt module.
+"""
+
+import pytest
+
+from ai.prompts.system_prompt import (
+    build_system_blocks,
+    build_system_prompt,
+    get_static_prompt,
+)
+
+
+@pytest.fixture
+def user_context():
+    """Контекст пользователя в том виде, в каком его отдаёт ContextBuilder."""
+    return {
+        "display_name": "Тестовая",
+        "persona": "mira",
+        "partner_name": "Тест",
+        "recent_topics": ["дети"],
+    }
+
+
+class TestBuildSystemBlocks:
+    """Tests for the cacheable prompt split."""
+
+    def test_static_block_is_cacheable(self, user_context):
+        """The first block should carry cache_control, the second should not."""
+        static, dynamic = build_system_blocks("mira", user_context)
+
+        assert static["cache_control"] == {"type": "ephemeral"}
+        assert "cache_control" not in dynamic
+        assert static["text"] == get_static_prompt("mira")
+
+    def test_static_block_has_no_user_data(self, user_context):
+        """User-specific data must stay out of the cached prefix."""
+        other_user = {**user_context, "display_name": "Другая", "partner_name": "Олег"}
+
+        first = build_system_blocks("mira", user_context, is_crisis=True)
+        second = build_system_blocks("mira", other_user)
+
+        assert first[0]["text"] == second[0]["text"]
+        assert "Тестовая" not in first[0]["text"]
+        assert "Тестовая" in first[1]["text"]
+        assert "Олег" in second[1]["text"]
+
+    def test_static_block_depends_on_persona(self):
+        """Each persona should get its own memoized prefix."""
+        assert "МАРК" in get_static_prompt("mark")
+        assert "МИРА" in get_static_prompt("mira")
+        assert get_static_prompt("mira") is get_static_prompt("mira")
+
+    def test_string_prompt_joins_blocks(self, user_context):
+        """build_system_prompt should still return the full prompt as text."""
+        prompt = build_system_prompt("mira", user_context)
+
+        assert prompt.startswith(get_static_prompt("mira"))
+        assert "**ИМЯ СОБЕСЕДНИЦЫ: Тестовая**" in prompt
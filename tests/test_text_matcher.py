@@ -0,0 +1,114 @@
+"""
+Tests for ai.text_matcher module.
+"""
+
+import pytest
+
+from ai.text_matcher import TextMatcher, normalize
+from ai.crisis_detector import CrisisDetector
+from ai.medical_filter import MedicalFilter
+
+
+class TestTextMatcher:
+    """Tests for the shared phrase matcher."""
+
+    def setup_method(self):
+        self.matcher = TextMatcher()
+
+    def test_normalize_collapses_whitespace(self):
+        """Text should be lowercased with whitespace runs collapsed."""
+        assert normalize("Не  хочу\nЖить") == "не хочу жить"
+        assert normalize("уже нормально") == "уже нормально"
+
+    def test_register_rejects_unnormalized_phrases(self):
+        """A phrase that can never match normalized text is an error."""
+        with pytest.raises(ValueError):
+            self.matcher.register(["Нет сил"])
+        with pytest.raises(ValueError):
+            self.matcher.register(["нет  сил"])
+        with pytest.raises(ValueError):
+            self.matcher.register([""])
+
+    def test_finds_overlapping_and_nested_phrases(self):
+        """Phrases sharing a start or overlapping each other are all found."""
+        phrases = self.matcher.register(["нет", "нет сил", "сил нет", "сил"])
+
+        matches = self.matcher.scan("Сил нет совсем, нет сил")
+
+        assert set(matches.found(phrases)) == {"нет", "нет сил", "сил нет", "сил"}
+        assert matches.first(("плохо", "сил нет", "нет")) == "сил нет"
+        assert matches.count(phrases) == 4
+        assert not matches.any(("плохо",))
+
+    def test_phrases_match_across_line_breaks(self):
+        """Whitespace runs in the message should not hide a phrase."""
+        self.matcher.register(["не хочу жить"])
+
+        assert "не хочу жить" in self.matcher.scan("Не хочу\n   жить")
+
+    def test_finite_pattern_is_expanded_into_phrases(self):
+        """A regex with a finite language should become plain phrases."""
+        pattern = self.matcher.pattern(r"так\s+устала?|(?:очень|так) плохо")
+
+        assert set(pattern.phrases) == {
+            "так устал", "так устала", "очень плохо", "так плохо",
+        }
+        assert not pattern.regexes
+        assert self.matcher.scan("Я так   устала").search(pattern) in pattern.phrases
+        assert self.matcher.scan("Я так устаю").search(pattern) is None
+
+    def test_infinite_pattern_runs_behind_gate(self):
+        """Unbounded branches stay regexes and run only when a gate phrase is present."""
+        pattern = self.matcher.pattern(r"принимай.*\d+.*мг")
+        ((gate, regex),) = pattern.regexes
+
+        assert gate
+        assert self.matcher.scan("Принимай по 200 мг").search(pattern) == "принимай по 200 мг"
+        assert not self.matcher.scan("просто 200 мг").allows(gate)
+
+    def test_gate_for_capturing_regex(self):
+        """Gate phrases should be necessary for the source regex to match."""
+        source = r"дочь\s+(?:зовут\s+)?([А-ЯЁ][а-яё]+)"
+        gate = self.matcher.gate(source)
+
+        assert gate
+        assert self.matcher.scan("Дочь зовут Маша").allows(gate)
+        assert not self.matcher.scan("Сын зовут Петя").allows(gate)
+        assert self.matcher.gate(r"\w+") == ()
+
+    def test_scan_joined_matches_concatenation(self):
+        """Joined scan should find phrases split across the two parts."""
+        phrases = self.matcher.register(["обратись к врачу", "врач", "боль"])
+        first, second = "Если боль не проходит, обратись", "к врачу завтра"
+
+        joined = self.matcher.scan_joined(first, second)
+
+        assert joined == self.matcher.scan(f"{first} {second}")
+        assert set(joined.found(phrases)) == {"обратись к врачу", "врач", "боль"}
+
+    def test_register_invalidates_cache(self):
+        """A phrase registered after a scan should be found by the next scan."""
+        self.matcher.register(["усталость"])
+        assert "тревога" not in self.matcher.scan("усталость и тревога")
+
+        self.matcher.register(["тревога"])
+
+        assert "тревога" in self.matcher.scan("усталость и тревога")
+
+
+class TestAnalyzersOnMatcher:
+    """Analyzer behavior kept on top of the shared matcher."""
+
+    def test_crisis_pattern_signal_keeps_source(self):
+        """Crisis pattern signals should still name the original regex."""
+        result = CrisisDetector().check("Иногда думаю, что не хочу\n жить")
+
+        assert result["is_crisis"]
+        assert r"pattern:(не\s+хочу|устала)\s+жить" in result["matched_keywords"]
+
+    def test_medical_dosage_is_flagged(self):
+        """A dosage in a bot response should still be detected as dangerous."""
+        medical = MedicalFilter()
+
+        assert medical.has_dangerous_advice("Принимай по 2 таблетки в день")[0]
+        assert medical.has_dangerous_advice("Попробуй выспаться") == (False, None)
@@ -0,0 +1,75 @@
+"""
+Tests for utils.ttl_cache module.
+"""
+
+import asyncio
+
+import pytest
+
+from utils.ttl_cache import ttl_cache
+
+
+@pytest.mark.asyncio
+class TestTtlCache:
+    """Tests for ttl_cache decorator."""
+
+    async def test_caches_by_arguments(self):
+        """Repeated calls with the same arguments should hit the cache."""
+        calls = []
+
+        @ttl_cache(default_ttl=60)
+        async def load(days, limit=None):
+            calls.append((days, limit))
+            return days * 2
+
+        assert await load(7) == 14
+        assert await load(7) == 14
+        assert await load(30, limit=5) == 60
+        assert calls == [(7, None), (30, 5)]
+
+    async def test_expires_after_ttl(self):
+        """Entries older than ttl should be reloaded."""
+        ttl = 60.0
+        calls = []
+
+        @ttl_cache(ttl=lambda: ttl)
+        async def load():
+            calls.append(1)
+            return len(calls)
+
+        assert await load() == 1
+        ttl = 0.0
+        assert await load() == 2
+
+    async def test_concurrent_calls_share_one_request(self):
+        """Concurrent callers with the same key should await a single call."""
+        calls = []
+
+        @ttl_cache(default_ttl=60)
+        async def load(days):
+            calls.append(days)
+            await asyncio.sleep(0.02)
+            return days
+
+        results = await asyncio.gather(*(load(7) for _ in range(5)))
+
+        assert results == [7] * 5
+        assert calls == [7]
+
+    async def test_errors_are_not_cached(self):
+        """A failed call should propagate to all waiters and not be cached."""
+        attempts = []
+
+        @ttl_cache(default_ttl=60)
+        async def load():
+            attempts.append(1)
+            await asyncio.sleep(0.01)
+            if len(attempts) == 1:
+                raise RuntimeError("db down")
+            return "ok"
+
+        results = await asyncio.gather(load(), load(), return_exceptions=True)
+
+        assert all(isinstance(result, RuntimeError) for result in results)
+        assert await load() == "ok"
+        assert len(attempts) == 2
@@ -0,0 +1,105 @@
+"""
+Tests for services.tts_yandex module.
+"""
+
+import asyncio
+
+import pytest
+import pytest_asyncio
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from config.settings import settings
+from services.tts_pool import close_tts_session
+from services.tts_yandex import YandexTTS
+
+
+class _FakeSpeechKit:
+    """Local TTS endpoint: returns the text as audio, records connections and concurrency."""
+
+    def __init__(self, latency: float = 0.02, status: int = 200):
+        self.latency = latency
+        self.status = status
+        self.delays = {}
+        self.peers = set()
+        self.running = 0
+        self.peak = 0
+
+    async def handler(self, request: web.Request) -> web.Response:
+        data = await request.post()
+        self.peers.add(request.transport.get_extra_info("peername"))
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        await asyncio.sleep(self.delays.get(data["text"], self.latency))
+        self.running -= 1
+        if self.status != 200:
+            return web.Response(status=self.status, text="quota exceeded")
+        return web.Response(body=f"[{data['text']}]".encode())
+
+
+@pytest_asyncio.fixture
+async def speechkit():
+    fake = _FakeSpeechKit()
+    app = web.Application()
+    app.router.add_post("/tts", fake.handler)
+    server = TestServer(app)
+    await server.start_server()
+    fake.url = str(server.make_url("/tts"))
+    yield fake
+    await close_tts_session()
+    await server.close()
+
+
+@pytest.fixture
+def tts(speechkit):
+    service = YandexTTS()
+    service.api_key = "key"
+    service.folder_id = "folder"
+    service.API_URL = speechkit.url
+    return service
+
+
+@pytest.mark.asyncio
+class TestYandexTTS:
+    """Tests for YandexTTS synthesis over the shared session."""
+
+    async def test_chunks_in_parallel_keep_order(self, tts, speechkit, tmp_path, monkeypatch):
+        """Chunks should be synthesized concurrently and joined in text order."""
+        monkeypatch.setattr(settings, "YANDEX_TTS_MAX_CONCURRENCY", 10)
+        monkeypatch.setattr(tts, "_split_text", lambda text, max_length: text.split(" | "))
+        text = " | ".join(f"chunk{i}" for i in range(6))
+        # Первые фрагменты отвечают последними
+        speechkit.delays = {f"chunk{i}": 0.01 * (6 - i) for i in range(6)}
+        output = tmp_path / "out.ogg"
+
+        assert await tts.synthesize(text, output) is True
+
+        assert output.read_bytes() == b"".join(f"[chunk{i}]".encode() for i in range(6))
+        assert speechkit.peak > 1
+
+    async def test_concurrency_limit_per_provider(self, tts, speechkit, tmp_path, monkeypatch):
+        """No more than YANDEX_TTS_MAX_CONCURRENCY requests should run at once."""
+        monkeypatch.setattr(settings, "YANDEX_TTS_MAX_CONCURRENCY", 2)
+        monkeypatch.setattr(tts, "_split_text", lambda text, max_length: text.split(" | "))
+
+        await tts.synthesize(" | ".join(f"chunk{i}" for i in range(8)), tmp_path / "out.ogg")
+
+        assert speechkit.peak == 2
+
+    async def test_connections_are_reused(self, tts, speechkit, monkeypatch):
+        """Sequential requests should go over one keep-alive connection."""
+        monkeypatch.setattr(settings, "YANDEX_TTS_MAX_CONCURRENCY", 1)
+
+        for i in range(5):
+            assert await tts._synthesize_chunk(f"text {i}", "jane", "neutral", 1.0, "oggopus") == f"[text {i}]".encode()
+
+        assert len(speechkit.peers) == 1
+
+    async def test_failed_chunk_fails_synthesis(self, tts, speechkit, tmp_path, monkeypatch):
+        """An API error on any chunk should fail the whole file."""
+        speechkit.status = 429
+        monkeypatch.setattr(tts, "_split_text", lambda text, max_length: text.split(" | "))
+        output = tmp_path / "out.ogg"
+
+        assert await tts.synthesize("a | b", output) is False
+        assert not output.exists()
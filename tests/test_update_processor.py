@@ -0,0 +1,141 @@
+"""
+Tests for bot.update_processor module.
+"""
+
+import asyncio
+
+import pytest
+from unittest.mock import Mock
+from telegram import Update
+
+from bot.update_processor import ChatOrderedUpdateProcessor
+
+
+def _update(chat_id):
+    """Апдейт из чата chat_id."""
+    update = Mock(spec=Update)
+    update.effective_chat = Mock(id=chat_id)
+    update.effective_user = Mock(id=chat_id)
+    return update
+
+
+@pytest.mark.asyncio
+class TestChatOrderedUpdateProcessor:
+    """Tests for ChatOrderedUpdateProcessor."""
+
+    async def test_same_chat_in_order(self):
+        """Updates of one chat should run sequentially in arrival order."""
+        processor = ChatOrderedUpdateProcessor(max_concurrent_updates=8, max_queue_per_chat=10)
+        done = []
+
+        async def handle(value, delay):
+            await asyncio.sleep(delay)
+            done.append(value)
+
+        for value, delay in ((1, 0.05), (2, 0.0), (3, 0.01)):
+            await processor.process_update(_update(1), handle(value, delay))
+        await processor.shutdown()
+
+        assert done == [1, 2, 3]
+
+    async def test_chats_run_concurrently(self):
+        """A slow turn in one chat should not delay other chats."""
+        processor = ChatOrderedUpdateProcessor(max_concurrent_updates=8, max_queue_per_chat=10)
+        done = []
+
+        async def handle(chat_id, delay):
+            await asyncio.sleep(delay)
+            done.append(chat_id)
+
+        await processor.process_update(_update(1), handle(1, 0.2))
+        await processor.process_update(_update(2), handle(2, 0.0))
+        await asyncio.sleep(0.05)
+
+        assert done == [2]
+        await processor.shutdown()
+        assert done == [2, 1]
+
+    async def test_global_concurrency_cap(self):
+        """No more than max_concurrent_updates handlers should run at once."""
+        processor = ChatOrderedUpdateProcessor(max_concurrent_updates=2, max_queue_per_chat=10)
+        running = []
+        peak = []
+
+        async def handle():
+            running.append(1)
+            peak.append(len(running))
+            await asyncio.sleep(0.02)
+            running.pop()
+
+        for chat_id in range(6):
+            await processor.process_update(_update(chat_id), handle())
+        await processor.shutdown()
+
+        assert max(peak) == 2
+        assert processor.processed == 6
+
+    async def test_waiting_update_does_not_hold_slot(self):
+        """Updates queued behind a busy chat should not block other chats."""
+        processor = ChatOrderedUpdateProcessor(max_concurrent_updates=1, max_queue_per_chat=10)
+        release = asyncio.Event()
+        done = []
+
+        async def slow():
+            await release.wait()
+            done.append("slow")
+
+        async def fast(name):
+            done.append(name)
+
+        await processor.process_update(_update(1), slow())
+        await processor.process_update(_update(1), fast("same chat"))
+        await asyncio.sleep(0.01)
+        assert processor.depth(1) == 1
+
+        release.set()
+        await processor.process_update(_update(2), fast("other chat"))
+        await processor.shutdown()
+
+        assert done[0] == "slow"
+        assert set(done[1:]) == {"same chat", "other chat"}
+
+    async def test_full_queue_drops_update(self):
+        """Updates beyond the per-chat queue bound should be dropped."""
+        processor = ChatOrderedUpdateProcessor(max_concurrent_updates=4, max_queue_per_chat=2)
+        release = asyncio.Event()
+        done = []
+
+        async def handle(value):
+            await release.wait()
+            done.append(value)
+
+        for value in range(5):
+            await processor.process_update(_update(1), handle(value))
+            await asyncio.sleep(0)
+
+        stats = processor.get_stats()
+        assert stats["queued"] == 2
+        assert stats["dropped"] == 2
+
+        release.set()
+        await processor.shutdown()
+        assert done == [0, 1, 2]
+        assert processor.get_stats()["busy_chats"] == 0
+
+    async def test_failed_update_does_not_stop_chat(self):
+        """An exception in one update should not break the chat's queue."""
+        processor = ChatOrderedUpdateProcessor(max_concurrent_updates=4, max_queue_per_chat=10)
+        done = []
+
+        async def broken():
+            raise RuntimeError("boom")
+
+        async def handle():
+            done.append(1)
+
+        await processor.process_update(_update(1), broken())
+        await processor.process_update(_update(1), handle())
+        await processor.shutdown()
+
+        assert done == [1]
+        assert processor.failed == 1
@@ -0,0 +1,269 @@
+"""
+Tests for broadcast segments and keyset pagination in UserRepository.
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import and_, or_, select
+
+import database.repositories.user as user_module
+from database.models import Subscription, User
+from database.repositories.user import UserRepository
+
+
+SEGMENTS = ["all", "premium", "free", "active_week", "active_month", "inactive"]
+TARGET_GROUPS = ["all", "premium", "trial", "free", "active_today", "active_week", "inactive"]
+
+
+async def legacy_segment(session, segment, exclude_blocked=True):
+    """get_all_telegram_ids до keyset-пагинации (JOIN на подписки)."""
+    query = select(User.telegram_id)
+    if exclude_blocked:
+        query = query.where(User.is_blocked == False)
+
+    if segment == "premium":
+        query = query.join(Subscription).where(
+            and_(Subscription.plan == "premium", Subscription.status == "active")
+        )
+    elif segment == "free":
+        query = query.join(Subscription).where(Subscription.plan == "free")
+    elif segment == "active_week":
+        query = query.where(User.last_active_at >= datetime.now() - timedelta(days=7))
+    elif segment == "active_month":
+        query = query.where(User.last_active_at >= datetime.now() - timedelta(days=30))
+    elif segment == "inactive":
+        query = query.where(
+            or_(
+                User.last_active_at < datetime.now() - timedelta(days=30),
+                User.last_active_at.is_(None),
+            )
+        )
+
+    result = await session.execute(query)
+    return [row[0] for row in result.fetchall()]
+
+
+async def legacy_target_group(session, target_group, after_user_id=0):
+    """get_broadcast_recipients до keyset-пагинации (IN / NOT IN по user_id)."""
+    query = select(User.id, User.telegram_id).where(
+        and_(User.is_blocked == False, User.id > after_user_id)
+    )
+
+    async def active_user_ids(*conditions):
+        result = await session.execute(
+            select(Subscription.user_id).where(
+                and_(Subscription.expires_at > datetime.now(), *conditions)
+            )
+        )
+        return [uid for (uid,) in result.all()]
+
+    if target_group == "premium":
+        query = query.where(User.id.in_(await active_user_ids(Subscription.plan == "premium")))
+    elif target_group == "trial":
+        query = query.where(User.id.in_(await active_user_ids(Subscription.plan == "trial")))
+    elif target_group == "free":
+        query = query.where(User.id.notin_(await active_user_ids()))
+    elif target_group == "active_today":
+        today_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        query = query.where(User.last_active_at >= today_start)
+    elif target_group == "active_week":
+        query = query.where(User.last_active_at >= datetime.now() - timedelta(days=7))
+    elif target_group == "inactive":
+        query = query.where(
+            or_(
+                User.last_active_at < datetime.now() - timedelta(days=30),
+                User.last_active_at.is_(None),
+            )
+        )
+
+    result = await session.execute(query.order_by(User.id))
+    return [(user_id, telegram_id) for user_id, telegram_id in result.all()]
+
+
+@pytest_asyncio.fixture
+async def sqlite_session(sqlite_db):
+    """UserRepository on a file SQLite database."""
+    return await sqlite_db([User, Subscription], [user_module])
+
+
+@pytest_asyncio.fixture
+async def population(sqlite_session):
+    """
+    Users covering every segment: blocked, never active, active today/this
+    week/long ago, and users with several subscriptions of different plans.
+    """
+    now = datetime.now()
+    activity = [
+        None,
+        now,
+        now - timedelta(days=3),
+        now - timedelta(days=20),
+        now - timedelta(days=60),
+    ]
+    subscriptions = [
+        [],
+        [("free", "active", None)],
+        [("premium", "active", now + timedelta(days=30))],
+        [("premium", "expired", now - timedelta(days=1))],
+        [("trial", "active", now + timedelta(days=3))],
+        [("free", "active", None), ("premium", "active", now + timedelta(days=30))],
+        [("premium", "active", now + timedelta(days=30)), ("premium", "active", now + timedelta(days=60))],
+        [("free", "active", None), ("free", "cancelled", None)],
+        [("trial", "expired", now - timedelta(days=2)), ("free", "active", None)],
+    ]
+
+    async with sqlite_session() as session:
+        for i in range(45):
+            session.add(User(
+                telegram_id=5_000_000 + i,
+                is_blocked=i % 7 == 3,
+                last_active_at=activity[i % len(activity)],
+            ))
+        await session.flush()
+
+        users = (await session.execute(select(User.id).order_by(User.id))).scalars().all()
+        for i, user_id in enumerate(users):
+            for plan, status, expires_at in subscriptions[i % len(subscriptions)]:
+                session.add(Subscription(
+                    user_id=user_id,
+                    plan=plan,
+                    status=status,
+                    expires_at=expires_at,
+                ))
+        await session.commit()
+
+    return sqlite_session
+
+
+async def collect(stream):
+    chunks = []
+    async for chunk in stream:
+        chunks.append(chunk)
+    return chunks
+
+
+@pytest.mark.asyncio
+class TestSegmentsMatchLegacyQueries:
+    """New EXISTS-based conditions against the queries they replaced."""
+
+    @pytest.mark.parametrize("segment", SEGMENTS)
+    async def test_bot_admin_segments(self, population, segment):
+        """Each bot admin segment should select the same users, each once."""
+        repo = UserRepository()
+        async with population() as session:
+            legacy = await legacy_segment(session, segment)
+
+        telegram_ids = await repo.get_all_telegram_ids(segment)
+
+        assert legacy, segment
+        assert sorted(telegram_ids) == sorted(set(legacy))
+        assert len(telegram_ids) == len(set(telegram_ids))
+        assert await repo.count_by_segment(segment) == len(set(legacy))
+
+    async def test_segment_with_blocked_users(self, population):
+        """exclude_blocked=False should include blocked users, as before."""
+        repo = UserRepository()
+        async with population() as session:
+            legacy = await legacy_segment(session, "all", exclude_blocked=False)
+
+        telegram_ids = await repo.get_all_telegram_ids("all", exclude_blocked=False)
+
+        assert sorted(telegram_ids) == sorted(legacy)
+        assert len(telegram_ids) == 45
+
+    @pytest.mark.parametrize("target_group", TARGET_GROUPS)
+    async def test_webapp_target_groups(self, population, target_group):
+        """Each webapp target group should return the same rows in the same order."""
+        repo = UserRepository()
+        async with population() as session:
+            legacy = await legacy_target_group(session, target_group)
+
+        chunks = await collect(repo.iter_broadcast_recipients(target_group, chunk_size=4))
+
+        assert legacy, target_group
+        assert [row for chunk in chunks for row in chunk] == legacy
+        assert await repo.count_broadcast_recipients(target_group) == len(legacy)
+
+    @pytest.mark.parametrize("target_group", TARGET_GROUPS)
+    async def test_target_groups_after_user_id(self, population, target_group):
+        """Resuming after a user id should match the old after_user_id filter."""
+        repo = UserRepository()
+        async with population() as session:
+            after = (await legacy_target_group(session, "all"))[10][0]
+            legacy = await legacy_target_group(session, target_group, after_user_id=after)
+
+        chunks = await collect(repo.iter_broadcast_recipients(target_group, after_user_id=after, chunk_size=3))
+
+        assert [row for chunk in chunks for row in chunk] == legacy
+        assert await repo.count_broadcast_recipients(target_group, after_user_id=after) == len(legacy)
+
+
+@pytest.mark.asyncio
+class TestKeysetPagination:
+    """Page boundaries in _iter_keyset."""
+
+    @pytest.mark.parametrize("chunk_size", [1, 2, 5, 9, 39, 45, 100])
+    async def test_visits_every_row_once(self, population, chunk_size):
+        """Every matching row should be yielded exactly once, in id order, in full pages."""
+        repo = UserRepository()
+        conditions = repo._segment_conditions("all", exclude_blocked=False)
+
+        chunks = await collect(repo._iter_keyset(conditions, chunk_size=chunk_size))
+        ids = [user_id for chunk in chunks for user_id, _ in chunk]
+
+        async with population() as session:
+            expected = (await session.execute(select(User.id).order_by(User.id))).scalars().all()
+        assert ids == list(expected)
+        assert all(len(chunk) == chunk_size for chunk in chunks[:-1])
+        assert 0 < len(chunks[-1]) <= chunk_size
+
+    async def test_ties_and_duplicate_subscriptions_on_boundaries(self, sqlite_session):
+        """
+        Users sharing last_active_at and holding several subscriptions should
+        not be repeated or skipped where a page ends between them.
+        """
+        same_time = datetime.now() - timedelta(hours=1)
+        async with sqlite_session() as session:
+            session.add_all([
+                User(telegram_id=7_000_000 + i, is_blocked=False, last_active_at=same_time)
+                for i in range(12)
+            ])
+            await session.flush()
+            user_ids = (await session.execute(select(User.id).order_by(User.id))).scalars().all()
+            for user_id in user_ids:
+                session.add_all([
+                    Subscription(user_id=user_id, plan="premium", status="active",
+                                 expires_at=same_time + timedelta(days=30))
+                    for _ in range(3)
+                ])
+            await session.commit()
+
+        repo = UserRepository()
+        for segment in ("premium", "active_week"):
+            for chunk_size in (1, 4, 5, 12):
+                telegram_ids = [
+                    telegram_id
+                    for chunk in await collect(repo.iter_telegram_ids(segment, chunk_size=chunk_size))
+                    for telegram_id in chunk
+                ]
+                assert telegram_ids == [7_000_000 + i for i in range(12)], (segment, chunk_size)
+
+    async def test_rows_added_during_iteration(self, population):
+        """Users added during iteration with larger ids are picked up, earlier pages are not re-read."""
+        repo = UserRepository()
+        seen = []
+        added = False
+        async for chunk in repo.iter_broadcast_recipients("all", chunk_size=10):
+            seen.extend(user_id for user_id, _ in chunk)
+            if not added:
+                async with population() as session:
+                    session.add(User(telegram_id=9_000_000, is_blocked=False))
+                    await session.commit()
+                added = True
+
+        assert len(seen) == len(set(seen))
+        async with population() as session:
+            expected = await legacy_target_group(session, "all")
+        assert seen == [user_id for user_id, _ in expected]
@@ -5,7 +5,7 @@ Event Tracker utility for tracking user milestones and first-time events.
 
 from typing import Optional
 from database.repositories.user import UserRepository
-from database.repositories.conversation import ConversationRepository
+from database.repositories.counters import counters_repo
 from database.models import User
 from utils.system_logger import system_logger
 
@@ -15,7 +15,6 @@ class EventTracker:
 
     def __init__(self):
         self.user_repo = UserRepository()
-        self.conversation_repo = ConversationRepository()
 
     async def track_first_voice_message(
         self,
@@ -28,20 +27,12 @@ class EventTracker:
         Returns:
             True если это было первое голосовое сообщение
         """
-        # Проверяем, было ли уже голосовое сообщение
-        conversations = await self.conversation_repo.get_by_user(
-            user.id,
-            limit=1000
-        )
-
-        # Ищем предыдущие голосовые сообщения (role=user, message_type=voice)
-        voice_messages = [
-            c for c in conversations
-            if c.role == "user" and c.message_type == "voice"
-        ]
+        # Счётчики уже учитывают только что сохранённое сообщение
+        counters = await counters_repo.get(user.id)
+        voice_messages = counters.voice_messages if counters else 0
 
         # Если это первое голосовое сообщение
-        if len(voice_messages) == 1:  # Текущее только что добавлено
+        if voice_messages == 1:  # Текущее только что добавлено
             try:
                 await system_logger.log_first_voice_message(
                     user_id=user.id,
@@ -62,20 +53,12 @@ class EventTracker:
         Returns:
             True если это было первое фото
         """
-        # Проверяем, было ли уже фото
-        conversations = await self.conversation_repo.get_by_user(
-            user.id,
-            limit=1000
-        )
-
-        # Ищем предыдущие сообщения с фото (role=user, message_type=photo)
-        photo_messages = [
-            c for c in conversations
-            if c.role == "user" and c.message_type == "photo"
-        ]
+        # Счётчики уже учитывают только что сохранённое сообщение
+        counters = await counters_repo.get(user.id)
+        photo_messages = counters.photo_messages if counters else 0
 
         # Если это первое фото
-        if len(photo_messages) == 1:  # Текущее только что добавлено
+        if photo_messages == 1:  # Текущее только что добавлено
             try:
                 await system_logger.log_first_photo_message(
                     user_id=user.id,
@@ -95,15 +78,9 @@ class EventTracker:
         Returns:
             Номер вехи, если достигнута, иначе None
         """
-        # Получаем общее количество сообщений пользователя
-        conversations = await self.conversation_repo.get_by_user(
-            user.id,
-            limit=2000  # Достаточно для проверки до 1000
-        )
-
         # Считаем только сообщения пользователя
-        user_messages = [c for c in conversations if c.role == "user"]
-        total_messages = len(user_messages)
+        counters = await counters_repo.get(user.id)
+        total_messages = counters.user_messages if counters else 0
 
         # Вехи
         milestones = [50, 100, 300, 1000]
@@ -0,0 +1,113 @@
+"""
+Fire time.
+Время отправки проактивных сообщений в часовом поясе пользователя.
+
+Ритуалы, поздравления, check-in целей и сводки уходят в местное время
+пользователя (User.timezone), а не по часам сервера. Момент отправки
+считается заранее и хранится в индексированной колонке
+(scheduled_messages.scheduled_for, user_goals.next_check_in); задачи
+планировщика каждые несколько минут забирают наступившие. Так пользователи
+разных поясов не уходят одной пачкой в 09:00 по Москве.
+
+Внутри пояса отправки размазаны: у каждого пользователя постоянный сдвиг
+в пределах SCHEDULER_SPREAD_MINUTES, и «09:00» всех москвичей — это
+поток в течение получаса, а не одна секунда.
+"""
+
+from datetime import date, datetime, time, timedelta, tzinfo
+from typing import Optional
+
+import pytz
+
+from config.settings import settings
+
+
+DEFAULT_TIMEZONE = "Europe/Moscow"
+
+
+def user_timezone(name: Optional[str]) -> tzinfo:
+    """Часовой пояс пользователя (неизвестный — московский, как в TimeContext)."""
+    try:
+        return pytz.timezone(name or DEFAULT_TIMEZONE)
+    except pytz.UnknownTimeZoneError:
+        return pytz.timezone(DEFAULT_TIMEZONE)
+
+
+def spread_offset(user_id: int, minutes: Optional[int] = None) -> timedelta:
+    """Постоянный сдвиг отправки пользователя внутри окна."""
+    window = (settings.SCHEDULER_SPREAD_MINUTES if minutes is None else minutes) * 60
+    if window <= 0:
+        return timedelta(0)
+    # Мультипликативный хэш: соседние id расходятся по всему окну
+    return timedelta(seconds=(user_id * 2654435761) % window)
+
+
+def fire_time_on(
+    timezone: Optional[str],
+    day: date,
+    time_str: str,
+    user_id: int,
+    utc: bool = False,
+) -> datetime:
+    """
+    Момент отправки в заданный день по местному времени пользователя.
+
+    Args:
+        timezone: User.timezone
+        day: Местная дата
+        time_str: Местное время "HH:MM"
+        user_id: ID пользователя (для сдвига внутри окна)
+        utc: Вернуть naive UTC (колонки с utcnow), иначе naive время сервера
+
+    Returns:
+        Время для сохранения в колонку
+    """
+    return _to_column(_local_fire(user_timezone(timezone), day, time_str, user_id), utc)
+
+
+def next_fire_time(
+    timezone: Optional[str],
+    time_str: str,
+    user_id: int,
+    days_ahead: int = 0,
+    weekday: Optional[int] = None,
+    now: Optional[datetime] = None,
+    utc: bool = False,
+) -> datetime:
+    """
+    Ближайший будущий момент отправки в "HH:MM" по местному времени.
+
+    Args:
+        timezone: User.timezone
+        time_str: Местное время "HH:MM"
+        user_id: ID пользователя (для сдвига внутри окна)
+        days_ahead: Не раньше, чем через столько местных дней
+        weekday: Только в этот день недели (0 — понедельник)
+        now: Искать после этого момента (aware; по умолчанию — сейчас)
+        utc: Вернуть naive UTC (колонки с utcnow), иначе naive время сервера
+
+    Returns:
+        Время для сохранения в колонку
+    """
+    tz = user_timezone(timezone)
+    now = now or datetime.now(pytz.utc)
+    day = now.astimezone(tz).date() + timedelta(days=days_ahead)
+
+    while True:
+        if weekday is None or day.weekday() == weekday:
+            fire = _local_fire(tz, day, time_str, user_id)
+            if fire > now:
+                return _to_column(fire, utc)
+        day += timedelta(days=1)
+
+
+def _local_fire(tz, day: date, time_str: str, user_id: int) -> datetime:
+    hour, minute = map(int, time_str.split(":"))
+    return tz.localize(datetime.combine(day, time(hour, minute))) + spread_offset(user_id)
+
+
+def _to_column(moment: datetime, utc: bool) -> datetime:
+    """Aware-момент -> naive значение колонки (UTC или локальное время сервера)."""
+    if utc:
+        return moment.astimezone(pytz.utc).replace(tzinfo=None)
+    return moment.astimezone().replace(tzinfo=None)
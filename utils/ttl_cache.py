@@ -0,0 +1,67 @@
+"""
+TTL cache.
+Кэш результатов async-функций на короткое время (в памяти процесса).
+"""
+
+import asyncio
+import time
+from functools import wraps
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+
+def ttl_cache(ttl: Optional[Callable[[], float]] = None, default_ttl: float = 60.0, maxsize: int = 256):
+    """
+    Декоратор: кэширует результат async-функции по аргументам на ttl секунд.
+
+    Одновременные вызовы с одинаковыми аргументами ждут один и тот же
+    запрос (single-flight), а не выполняют его параллельно.
+
+    Args:
+        ttl: Функция, возвращающая TTL (читается при каждом вызове — удобно для settings)
+        default_ttl: TTL, если ttl не передан
+        maxsize: Максимум ключей (при переполнении удаляются самые старые)
+    """
+
+    def decorator(func: Callable[..., Awaitable[Any]]):
+        cache: Dict[Hashable, Tuple[float, Any]] = {}
+        in_flight: Dict[Hashable, asyncio.Future] = {}
+
+        @wraps(func)
+        async def wrapper(*args: Any, **kwargs: Any) -> Any:
+            key = (args, tuple(sorted(kwargs.items())))
+            now = time.monotonic()
+            lifetime = ttl() if ttl else default_ttl
+
+            cached = cache.get(key)
+            if cached and now - cached[0] < lifetime:
+                return cached[1]
+
+            if key in in_flight:
+                return await asyncio.shield(in_flight[key])
+
+            future = asyncio.get_running_loop().create_future()
+            in_flight[key] = future
+            try:
+                result = await func(*args, **kwargs)
+            except asyncio.CancelledError:
+                future.cancel()
+                raise
+            except Exception as e:
+                future.set_exception(e)
+                # Исключение уже передано ожидающим — не оставляем "never retrieved"
+                future.exception()
+                raise
+            finally:
+                in_flight.pop(key, None)
+
+            future.set_result(result)
+            if lifetime > 0:
+                if len(cache) >= maxsize:
+                    cache.pop(next(iter(cache)))
+                cache[key] = (time.monotonic(), result)
+            return result
+
+        wrapper.cache_clear = cache.clear  # type: ignore[attr-defined]
+        return wrapper
+
+    return decorator
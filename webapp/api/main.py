@@ -31,6 +31,39 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+@app.on_event("startup")
+async def connect_redis():
+    """Redis нужен рассылкам: общий с ботом лимит отправки Telegram."""
+    from services.redis_client import redis_client
+    await redis_client.connect()
+
+
+@app.on_event("startup")
+async def resume_broadcasts():
+    """
+    Продолжаем рассылки, прерванные перезапуском. Наблюдение работает
+    и дальше: рассылку, брошенную другим процессом, подхватит этот.
+    """
+    from services.broadcast import broadcast_engine
+
+    broadcast_engine.start()
+
+
+@app.on_event("shutdown")
+async def pause_broadcasts():
+    """Сохраняем прогресс идущих рассылок."""
+    from services.broadcast import broadcast_engine
+    await broadcast_engine.stop()
+
+
+@app.on_event("shutdown")
+async def disconnect_redis():
+    """Закрываем соединение с Redis после остановки рассылок."""
+    from services.redis_client import redis_client
+    await redis_client.disconnect()
+
+
 # Подключаем роуты
 app.include_router(settings.router, prefix="/api/settings", tags=["settings"])
 app.include_router(stats.router, prefix="/api/stats", tags=["stats"])
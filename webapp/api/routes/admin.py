@@ -13,11 +13,16 @@ from webapp.api.auth import get_current_user
 from webapp.api.middleware import get_current_admin
 from webapp.api.decorators import log_admin_action, log_critical_action
 from database.repositories.user import UserRepository
-from database.repositories.conversation import ConversationRepository
+from database.repositories.conversation import ConversationRepository, new_message_key
 from database.repositories.mood import MoodRepository
 from database.repositories.subscription import SubscriptionRepository
 from database.repositories.promo import PromoRepository
 from database.repositories.profile import profile_repo
+from database.repositories.analytics import analytics_repo
+from database.repositories.counters import counters_repo
+from database.history_summary_cache import history_summary_cache
+from database.context_cache import context_cache
+from database.repositories.message_tag import message_tag_repo
 from database.session import get_session_context
 from database.models import Message
 from config.settings import settings
@@ -344,8 +349,11 @@ async def delete_user(
 
     async with get_session_context() as session:
         # Удаляем связанные данные
+        await message_tag_repo.delete_for_user(session, user_id)
         await session.execute(delete(Message).where(Message.user_id == user_id))
+        await counters_repo.delete_for_user(session, user_id)
         await session.execute(delete(MoodEntry).where(MoodEntry.user_id == user_id))
+        await mood_repo.delete_daily_for_user(session, user_id)
         await session.execute(delete(Subscription).where(Subscription.user_id == user_id))
         await session.execute(delete(MemoryEntry).where(MemoryEntry.user_id == user_id))
         await session.execute(delete(UserFile).where(UserFile.user_id == user_id))
@@ -354,6 +362,9 @@ async def delete_user(
         await session.execute(delete(User).where(User.id == user_id))
 
         await session.commit()
+    await history_summary_cache.invalidate(user_id)
+    # Удаление мимо репозиториев — сбрасываем все секции контекста
+    await context_cache.invalidate(user_id)
 
     return {
         "status": "ok",
@@ -396,12 +407,18 @@ async def reset_user_data(
 
     async with get_session_context() as session:
         # Удаляем связанные данные
+        await message_tag_repo.delete_for_user(session, user_id)
         await session.execute(delete(Message).where(Message.user_id == user_id))
+        await counters_repo.delete_for_user(session, user_id)
         await session.execute(delete(MoodEntry).where(MoodEntry.user_id == user_id))
+        await mood_repo.delete_daily_for_user(session, user_id)
         await session.execute(delete(MemoryEntry).where(MemoryEntry.user_id == user_id))
         await session.execute(delete(UserFile).where(UserFile.user_id == user_id))
 
         await session.commit()
+    await history_summary_cache.invalidate(user_id)
+    # Удаление мимо репозиториев — сбрасываем все секции контекста
+    await context_cache.invalidate(user_id)
 
     # Сбрасываем настройки пользователя
     await user_repo.update(
@@ -427,6 +444,8 @@ async def reset_user_data(
         voice_enabled=False,
         premium_until=None,
     )
+    # Профиль сброшен после удаления данных — секцию могли успеть заполнить заново
+    await context_cache.invalidate(user_id)
 
     logger.info(f"Admin {admin_data['telegram_id']} reset data for user {telegram_id}")
 
@@ -506,9 +525,6 @@ async def send_mira_message(
     как будто его написала сама Мира.
     """
     import httpx
-    from database.session import get_session_context
-    from database.models import Message
-    from datetime import datetime
 
     user = await user_repo.get_by_telegram_id(telegram_id)
 
@@ -540,20 +556,17 @@ async def send_mira_message(
             detail=f"Не удалось отправить сообщение: {str(e)}"
         )
 
-    # Сохраняем сообщение в базу данных как сообщение от ассистента
+    # Сохраняем сообщение как сообщение от ассистента (с тегами и счётчиками)
     try:
-        async with get_session_context() as session:
-            message = Message(
-                user_id=user.id,
-                role="assistant",
-                content=request.message,
-                created_at=datetime.utcnow(),
-            )
-            session.add(message)
-            await session.commit()
+        await conv_repo.save_message(
+            user_id=user.id,
+            role="assistant",
+            content=request.message,
+            idempotency_key=new_message_key(),
+        )
     except Exception as e:
         # Если не удалось сохранить - не критично, сообщение уже отправлено
-        print(f"Failed to save message to database: {e}")
+        logger.error(f"Failed to save Mira message for user {telegram_id}: {e}")
 
     return {
         "status": "ok",
@@ -778,42 +791,25 @@ async def get_top_active_users(
 async def export_user_history_admin(
     telegram_id: int,
     _admin: dict = Depends(require_admin),
+    export_format: str = Query(default="csv", alias="format", pattern="^(csv|xlsx)$"),
+    gzip: bool = Query(default=False, description="Сжать CSV в gzip"),
 ):
-    """Экспортировать историю пользователя (для админа)."""
-    from fastapi.responses import StreamingResponse
-    import io
-    import csv
+    """Экспортировать историю пользователя (для админа, потоково)."""
+    from webapp.api.routes.export import history_response
+    from services.export import export_service
 
     user = await user_repo.get_by_telegram_id(telegram_id)
 
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    # Получить все сообщения
-    messages, _ = await conv_repo.get_paginated(user.id, page=1, per_page=10000)
-
-    # Создать CSV
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(["Дата", "Роль", "Сообщение", "Тип", "Теги"])
-
-    for msg in reversed(messages):
-        writer.writerow([
-            msg.created_at.strftime("%Y-%m-%d %H:%M:%S"),
-            "User" if msg.role == "user" else "Mira",
-            msg.content,
-            msg.message_type or "text",
-            ", ".join(msg.tags) if msg.tags else ""
-        ])
-
-    output.seek(0)
-
-    return StreamingResponse(
-        io.BytesIO(output.getvalue().encode('utf-8-sig')),
-        media_type="text/csv",
-        headers={
-            "Content-Disposition": f"attachment; filename=admin_export_{telegram_id}_history.csv"
-        }
+    return history_response(
+        export_service.stream_history(
+            user.id, export_format, role_labels=("User", "Mira"), compress=gzip
+        ),
+        filename=f"admin_export_{telegram_id}_history",
+        export_format=export_format,
+        compress=gzip,
     )
 
 
@@ -1032,133 +1028,34 @@ async def get_activity_analytics(
     days: int = Query(default=7, ge=1, le=90),
 ):
     """Получить данные активности по дням."""
-    from database.session import get_session_context
-    from database.models import User, Message
-    from sqlalchemy import select, func, and_
-    from datetime import date
-
-    labels = []
-    active_users = []
-    messages_counts = []
+    activity = await analytics_repo.get_activity(days)
 
-    # Периоды для ключевых метрик
-    today_start = datetime.combine(date.today(), datetime.min.time())
-    week_start = today_start - timedelta(days=7)
-    month_start = today_start - timedelta(days=30)
+    labels = [day.strftime("%d.%m") for day, _, _ in activity["days"]]
+    active_users = [active for _, active, _ in activity["days"]]
+    messages_counts = [messages for _, _, messages in activity["days"]]
 
-    async with get_session_context() as session:
-        # График по дням
-        for i in range(days - 1, -1, -1):
-            day = date.today() - timedelta(days=i)
-            day_start = datetime.combine(day, datetime.min.time())
-            day_end = datetime.combine(day, datetime.max.time())
-
-            # Активные пользователи (last_active_at в этот день)
-            active_result = await session.execute(
-                select(func.count(User.id.distinct())).where(
-                    and_(
-                        User.last_active_at >= day_start,
-                        User.last_active_at <= day_end
-                    )
-                )
-            )
-            active_count = active_result.scalar() or 0
+    total_messages = activity["total_messages"]
 
-            # Сообщения за день
-            messages_result = await session.execute(
-                select(func.count(Message.id)).where(
-                    and_(
-                        Message.created_at >= day_start,
-                        Message.created_at <= day_end
-                    )
-                )
-            )
-            messages_count = messages_result.scalar() or 0
-
-            # Форматируем дату
-            label = day.strftime("%d.%m")
-            labels.append(label)
-            active_users.append(active_count)
-            messages_counts.append(messages_count)
-
-        # Ключевые метрики
-        # Сегодня активных пользователей
-        today_active_result = await session.execute(
-            select(func.count(User.id.distinct())).where(
-                User.last_active_at >= today_start
-            )
-        )
-        today_active = today_active_result.scalar() or 0
+    # Средние показатели
+    avg_daily_messages = total_messages / max(days, 1)
+    avg_messages_per_user = total_messages / max(activity["total_users"], 1)
 
-        # За неделю активных пользователей
-        week_active_result = await session.execute(
-            select(func.count(User.id.distinct())).where(
-                User.last_active_at >= week_start
-            )
-        )
-        week_active = week_active_result.scalar() or 0
-
-        # За месяц активных пользователей
-        month_active_result = await session.execute(
-            select(func.count(User.id.distinct())).where(
-                User.last_active_at >= month_start
-            )
-        )
-        month_active = month_active_result.scalar() or 0
-
-        # Всего сообщений
-        total_messages_result = await session.execute(
-            select(func.count(Message.id))
-        )
-        total_messages = total_messages_result.scalar() or 0
-
-        # Детальная статистика: типы сообщений
-        text_messages_result = await session.execute(
-            select(func.count(Message.id)).where(
-                Message.message_type == 'text'
-            )
-        )
-        text_messages = text_messages_result.scalar() or 0
-
-        voice_messages_result = await session.execute(
-            select(func.count(Message.id)).where(
-                Message.message_type == 'voice'
-            )
-        )
-        voice_messages = voice_messages_result.scalar() or 0
-
-        # Импортируем MoodEntry для подсчёта эмоций
-        from database.models import MoodEntry
-        emotion_messages_result = await session.execute(
-            select(func.count(MoodEntry.id))
-        )
-        emotion_messages = emotion_messages_result.scalar() or 0
-
-        # Средние показатели
-        avg_daily_messages = total_messages / max(days, 1)
-
-        total_users_result = await session.execute(
-            select(func.count(User.id))
-        )
-        total_users = total_users_result.scalar() or 1
-        avg_messages_per_user = total_messages / max(total_users, 1)
-
-        # Пиковая активность
-        peak_index = messages_counts.index(max(messages_counts)) if messages_counts else 0
-        peak_day = labels[peak_index] if labels else ""
-        peak_count = max(messages_counts) if messages_counts else 0
+    # Пиковая активность
+    peak_index = messages_counts.index(max(messages_counts)) if messages_counts else 0
+    peak_day = labels[peak_index] if labels else ""
+    peak_count = max(messages_counts) if messages_counts else 0
 
     return {
         "labels": labels,
         "active_users": active_users,
         "messages": messages_counts,
-        "today_active": today_active,
-        "week_active": week_active,
-        "month_active": month_active,
+        "today_active": activity["today_active"],
+        "week_active": activity["week_active"],
+        "month_active": activity["month_active"],
         "total_messages": total_messages,
-        "text_messages": text_messages,
-        "voice_messages": voice_messages,
-        "emotion_messages": emotion_messages,
+        "text_messages": activity["text_messages"],
+        "voice_messages": activity["voice_messages"],
+        "emotion_messages": activity["emotion_messages"],
         "avg_daily_messages": round(avg_daily_messages, 1),
         "avg_messages_per_user": round(avg_messages_per_user, 1),
         "peak_day": peak_day,
@@ -1229,52 +1126,12 @@ async def get_mood_analytics(
     days: int = Query(default=30, ge=7, le=90),
 ):
     """Получить данные настроения по дням."""
-    from database.session import get_session_context
-    from database.models import MoodEntry
-    from sqlalchemy import select, func, and_
-    from datetime import date
-
-    labels = []
-    average_moods = []
-    entry_counts = []
-
-    async with get_session_context() as session:
-        for i in range(days - 1, -1, -1):
-            day = date.today() - timedelta(days=i)
-            day_start = datetime.combine(day, datetime.min.time())
-            day_end = datetime.combine(day, datetime.max.time())
-
-            # Средний mood_score за день
-            avg_result = await session.execute(
-                select(func.avg(MoodEntry.mood_score)).where(
-                    and_(
-                        MoodEntry.created_at >= day_start,
-                        MoodEntry.created_at <= day_end
-                    )
-                )
-            )
-            avg_mood = avg_result.scalar()
-
-            # Количество записей за день
-            count_result = await session.execute(
-                select(func.count(MoodEntry.id)).where(
-                    and_(
-                        MoodEntry.created_at >= day_start,
-                        MoodEntry.created_at <= day_end
-                    )
-                )
-            )
-            entry_count = count_result.scalar() or 0
-
-            label = day.strftime("%d.%m")
-            labels.append(label)
-            average_moods.append(round(avg_mood, 1) if avg_mood else 0)
-            entry_counts.append(entry_count)
+    mood_by_day = await analytics_repo.get_mood_by_day(days)
 
     return {
-        "labels": labels,
-        "average_mood": average_moods,
-        "entry_counts": entry_counts,
+        "labels": [day.strftime("%d.%m") for day, _, _ in mood_by_day],
+        "average_mood": [round(avg_mood, 1) if avg_mood else 0 for _, avg_mood, _ in mood_by_day],
+        "entry_counts": [count for _, _, count in mood_by_day],
     }
 
 
@@ -1284,48 +1141,30 @@ async def get_emotions_analytics(
     days: int = Query(default=30, ge=7, le=90),
 ):
     """Получить распределение эмоций."""
-    from database.session import get_session_context
-    from database.models import MoodEntry
-    from sqlalchemy import select, func
-
-    async with get_session_context() as session:
-        cutoff = datetime.now() - timedelta(days=days)
-
-        # Подсчитываем количество каждой эмоции
-        result = await session.execute(
-            select(
-                MoodEntry.primary_emotion,
-                func.count(MoodEntry.id)
-            ).where(
-                MoodEntry.created_at >= cutoff
-            ).group_by(MoodEntry.primary_emotion)
-            .order_by(func.count(MoodEntry.id).desc())
-        )
-
-        emotion_counts = dict(result.all())
-
-        # Эмоции на русском для UI
-        emotion_labels_ru = {
-            "joy": "Радость",
-            "sadness": "Грусть",
-            "anxiety": "Тревога",
-            "anger": "Гнев",
-            "fear": "Страх",
-            "calm": "Спокойствие",
-            "frustration": "Раздражение",
-            "hope": "Надежда",
-            "loneliness": "Одиночество",
-            "overwhelmed": "Перегружена",
-            "neutral": "Нейтрально",
-        }
+    emotion_counts = dict(await analytics_repo.get_emotion_counts(days))
+
+    # Эмоции на русском для UI
+    emotion_labels_ru = {
+        "joy": "Радость",
+        "sadness": "Грусть",
+        "anxiety": "Тревога",
+        "anger": "Гнев",
+        "fear": "Страх",
+        "calm": "Спокойствие",
+        "frustration": "Раздражение",
+        "hope": "Надежда",
+        "loneliness": "Одиночество",
+        "overwhelmed": "Перегружена",
+        "neutral": "Нейтрально",
+    }
 
-        labels = []
-        values = []
+    labels = []
+    values = []
 
-        for emotion, count in emotion_counts.items():
-            label = emotion_labels_ru.get(emotion, emotion.capitalize())
-            labels.append(label)
-            values.append(count)
+    for emotion, count in emotion_counts.items():
+        label = emotion_labels_ru.get(emotion, emotion.capitalize())
+        labels.append(label)
+        values.append(count)
 
     return {
         "labels": labels,
@@ -1339,41 +1178,11 @@ async def get_top_tags(
     days: int = Query(default=30, ge=7, le=90),
 ):
     """Получить топ-5 тегов сообщений."""
-    from database.session import get_session_context
-    from database.models import Message
-    from sqlalchemy import select, func, and_
-
-    cutoff = datetime.now() - timedelta(days=days)
-
-    async with get_session_context() as session:
-        # Получить все сообщения за период
-        result = await session.execute(
-            select(Message.tags).where(
-                and_(
-                    Message.created_at >= cutoff,
-                    Message.tags.isnot(None)
-                )
-            )
-        )
-        # Получаем все результаты сразу, пока сессия активна
-        messages = list(result.scalars())
-
-    # Подсчитываем теги (вне контекста сессии)
-    tag_counts = {}
-    for tags_array in messages:
-        if tags_array:
-            for tag in tags_array:
-                tag_counts[tag] = tag_counts.get(tag, 0) + 1
-
-    # Сортируем и берём топ-5
-    top_tags = sorted(tag_counts.items(), key=lambda x: x[1], reverse=True)[:5]
-
-    labels = [tag for tag, _ in top_tags]
-    values = [count for _, count in top_tags]
+    top_tags = await analytics_repo.get_tag_counts(days, limit=5)
 
     return {
-        "labels": labels,
-        "values": values,
+        "labels": [tag for tag, _ in top_tags],
+        "values": [count for _, count in top_tags],
     }
 
 
@@ -1390,7 +1199,7 @@ class BroadcastRequest(BaseModel):
     """Запрос на массовую рассылку."""
     message: str
     target_group: str  # "all", "premium", "trial", "free", "active_today", "active_week", "inactive"
-    delay_seconds: Optional[int] = 1  # Задержка между сообщениями
+    delay_seconds: Optional[int] = 1  # Устарело: скорость задаёт TELEGRAM_GLOBAL_RATE_LIMIT
 
 
 class BroadcastResponse(BaseModel):
@@ -1401,44 +1210,30 @@ class BroadcastResponse(BaseModel):
     message: str
 
 
+class BroadcastStatusResponse(BaseModel):
+    """Статус рассылки."""
+    task_id: str
+    status: str  # pending, running, completed, failed
+    target_group: str
+    total: int
+    sent: int
+    failed: int
+    blocked: int
+    progress_percent: float
+    rate_per_second: Optional[float] = None
+    last_error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+
 @router.get("/analytics/retention", response_model=RetentionMetricsResponse)
 async def get_retention_metrics(
     _admin: dict = Depends(require_admin),
 ):
     """Получить retention метрики (DAU/WAU/MAU)."""
-    from database.session import get_session_context
-    from database.models import User
-    from sqlalchemy import select, func
-
-    now = datetime.now()
-    day_ago = now - timedelta(days=1)
-    week_ago = now - timedelta(days=7)
-    month_ago = now - timedelta(days=30)
-
-    async with get_session_context() as session:
-        # DAU - активные за последние 24 часа
-        dau_result = await session.execute(
-            select(func.count(User.id.distinct())).where(
-                User.last_active_at >= day_ago
-            )
-        )
-        dau = dau_result.scalar() or 0
-
-        # WAU - активные за последние 7 дней
-        wau_result = await session.execute(
-            select(func.count(User.id.distinct())).where(
-                User.last_active_at >= week_ago
-            )
-        )
-        wau = wau_result.scalar() or 0
-
-        # MAU - активные за последние 30 дней
-        mau_result = await session.execute(
-            select(func.count(User.id.distinct())).where(
-                User.last_active_at >= month_ago
-            )
-        )
-        mau = mau_result.scalar() or 0
+    counts = await analytics_repo.get_active_user_counts()
+    dau, wau, mau = counts["dau"], counts["wau"], counts["mau"]
 
     # Расчет stickiness (DAU/WAU и WAU/MAU)
     dau_wau_ratio = round((dau / wau * 100) if wau > 0 else 0, 1)
@@ -1462,130 +1257,68 @@ async def create_broadcast(
     _admin: dict = Depends(require_admin),
 ):
     """Создать массовую рассылку."""
-    from database.session import get_session_context
-    from database.models import User, Subscription
-    from sqlalchemy import select, and_, or_
-    import uuid
-
-    async with get_session_context() as session:
-        # Определить целевую группу пользователей
-        query = select(User.telegram_id).where(User.is_blocked == False)
-
-        if request.target_group == "premium":
-            # Пользователи с активной Premium подпиской
-            premium_user_ids = await session.execute(
-                select(Subscription.user_id).where(
-                    and_(
-                        Subscription.plan == "premium",
-                        Subscription.expires_at > datetime.now()
-                    )
-                )
-            )
-            premium_user_ids = [uid for (uid,) in premium_user_ids.all()]
-            query = query.where(User.id.in_(premium_user_ids))
-
-        elif request.target_group == "trial":
-            # Пользователи с активной Trial подпиской
-            trial_user_ids = await session.execute(
-                select(Subscription.user_id).where(
-                    and_(
-                        Subscription.plan == "trial",
-                        Subscription.expires_at > datetime.now()
-                    )
-                )
-            )
-            trial_user_ids = [uid for (uid,) in trial_user_ids.all()]
-            query = query.where(User.id.in_(trial_user_ids))
-
-        elif request.target_group == "free":
-            # Пользователи без активной подписки
-            active_subscription_user_ids = await session.execute(
-                select(Subscription.user_id).where(
-                    Subscription.expires_at > datetime.now()
-                )
-            )
-            active_subscription_user_ids = [uid for (uid,) in active_subscription_user_ids.all()]
-            query = query.where(User.id.notin_(active_subscription_user_ids))
-
-        elif request.target_group == "active_today":
-            # Активны сегодня
-            today_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-            query = query.where(User.last_active_at >= today_start)
-
-        elif request.target_group == "active_week":
-            # Активны за неделю
-            week_ago = datetime.now() - timedelta(days=7)
-            query = query.where(User.last_active_at >= week_ago)
-
-        elif request.target_group == "inactive":
-            # Неактивны >30 дней
-            month_ago = datetime.now() - timedelta(days=30)
-            query = query.where(
-                or_(
-                    User.last_active_at < month_ago,
-                    User.last_active_at.is_(None)
-                )
-            )
-
-        # "all" - не добавляем дополнительных фильтров
+    from services.broadcast import broadcast_engine
 
-        result = await session.execute(query)
-        telegram_ids = [tid for (tid,) in result.all()]
-
-    # Генерируем уникальный ID для задачи
-    task_id = str(uuid.uuid4())
+    # Рассылка идёт в фоне, прогресс — GET /broadcast/{task_id}
+    broadcast = await broadcast_engine.start_broadcast(
+        message=request.message,
+        target_group=request.target_group,
+        created_by=_admin.get("user_id"),
+    )
 
-    # Запускаем рассылку в фоне
-    import asyncio
-    import httpx
+    return {
+        "status": "started",
+        "task_id": broadcast.id,
+        "target_users_count": broadcast.total,
+        "message": f"Рассылка запущена для {broadcast.total} пользователей"
+    }
 
-    async def send_broadcast():
-        """Фоновая задача для рассылки."""
-        logger.info(f"Starting broadcast {task_id} to {len(telegram_ids)} users")
 
-        success_count = 0
-        fail_count = 0
+@router.get("/broadcast/{task_id}", response_model=BroadcastStatusResponse)
+async def get_broadcast_status(
+    task_id: str,
+    _admin: dict = Depends(require_admin),
+):
+    """Статус и прогресс рассылки."""
+    from services.broadcast import broadcast_engine
+    from database.repositories.broadcast import broadcast_repo
+
+    broadcast = await broadcast_repo.get(task_id)
+    if not broadcast:
+        raise HTTPException(status_code=404, detail="Broadcast not found")
+
+    status = {
+        "task_id": broadcast.id,
+        "status": broadcast.status,
+        "target_group": broadcast.target_group,
+        "total": broadcast.total,
+        "sent": broadcast.sent,
+        "failed": broadcast.failed,
+        "blocked": broadcast.blocked,
+        "last_error": broadcast.last_error,
+        "created_at": broadcast.created_at,
+        "started_at": broadcast.started_at,
+        "finished_at": broadcast.finished_at,
+        "rate_per_second": None,
+    }
 
-        async with httpx.AsyncClient() as client:
-            for tid in telegram_ids:
-                try:
-                    response = await client.post(
-                        f"https://api.telegram.org/bot{settings.TELEGRAM_BOT_TOKEN}/sendMessage",
-                        json={
-                            "chat_id": tid,
-                            "text": request.message,
-                            "parse_mode": "Markdown"
-                        },
-                        timeout=10.0
-                    )
-                    result = response.json()
-                    if result.get("ok"):
-                        success_count += 1
-                        logger.debug(f"Broadcast message sent to {tid}")
-                    else:
-                        fail_count += 1
-                        logger.warning(f"Failed to send broadcast to {tid}: {result.get('description')}")
-                except Exception as e:
-                    fail_count += 1
-                    logger.warning(f"Failed to send broadcast to {tid}: {e}")
-
-                # Задержка между сообщениями
-                if request.delay_seconds and request.delay_seconds > 0:
-                    await asyncio.sleep(request.delay_seconds)
-
-        logger.info(
-            f"Broadcast {task_id} completed: {success_count} success, {fail_count} failed"
+    # Живые счётчики, если рассылка идёт в этом процессе (в БД — последний checkpoint)
+    live = broadcast_engine.get_live_progress(task_id)
+    if live:
+        status.update(
+            sent=live["sent"],
+            failed=live["failed"],
+            blocked=live["blocked"],
+            rate_per_second=live["rate_per_second"],
         )
 
-    # Запускаем в фоне
-    asyncio.create_task(send_broadcast())
-
-    return {
-        "status": "started",
-        "task_id": task_id,
-        "target_users_count": len(telegram_ids),
-        "message": f"Рассылка запущена для {len(telegram_ids)} пользователей"
-    }
+    # total считается при запуске: вступившие в сегмент позже тоже получат
+    # рассылку, поэтому обработанных может оказаться больше
+    processed = status["sent"] + status["failed"] + status["blocked"]
+    status["progress_percent"] = (
+        min(round(processed / broadcast.total * 100, 1), 100.0) if broadcast.total else 100.0
+    )
+    return status
 
 
 # ========== Promo Codes Endpoints ==========
@@ -2500,15 +2233,16 @@ async def generate_user_report(
         tokens_used = response.usage.input_tokens + response.usage.output_tokens
 
         # Рассчитываем стоимость для claude-sonnet-4-20250514
-        # Input: $3 per million tokens, Output: $15 per million tokens
-        input_cost = (response.usage.input_tokens / 1_000_000) * 3.0
-        output_cost = (response.usage.output_tokens / 1_000_000) * 15.0
-        cost_usd = round(input_cost + output_cost, 6)
+        from database.repositories.api_cost import calculate_claude_cost
+        cost_usd = calculate_claude_cost(
+            "claude-sonnet-4-20250514",
+            response.usage.input_tokens,
+            response.usage.output_tokens,
+        )
 
         # Трекаем стоимость API
-        from database.repositories.api_cost import ApiCostRepository
-        api_cost_repo = ApiCostRepository()
-        await api_cost_repo.create(
+        from database.api_cost_recorder import api_cost_recorder
+        await api_cost_recorder.record(
             user_id=user.id,
             provider='claude',
             operation='generate_report',
@@ -44,6 +44,9 @@ class ApiCostStats(BaseModel):
     total_tokens: int
     by_provider: dict
     unique_users: int
+    cache_read_tokens: int = 0
+    cache_write_tokens: int = 0
+    cache_savings_usd: float = 0.0
 
 
 # === Эндпоинты ===
@@ -120,7 +123,8 @@ async def get_api_costs_stats(
         - to_date: Конец периода (опционально, формат YYYY-MM-DD)
 
     Returns:
-        Статистика: общая стоимость, токены, расходы по провайдерам, количество пользователей
+        Статистика: общая стоимость, токены, расходы по провайдерам, количество пользователей,
+        токены prompt caching и экономия от него
     """
     repo = ApiCostRepository()
 
@@ -143,7 +147,10 @@ async def get_api_costs_stats(
         total_cost=stats['total_cost'],
         total_tokens=stats['total_tokens'],
         by_provider=stats['by_provider'],
-        unique_users=stats['unique_users']
+        unique_users=stats['unique_users'],
+        cache_read_tokens=stats['cache_read_tokens'],
+        cache_write_tokens=stats['cache_write_tokens'],
+        cache_savings_usd=stats['cache_savings_usd']
     )
 
 
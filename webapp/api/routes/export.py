@@ -4,13 +4,14 @@ Export API endpoints.
 
 import io
 import csv
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from fastapi.responses import StreamingResponse
 
 from webapp.api.auth import get_current_user
 from database.repositories.user import UserRepository
 from database.repositories.conversation import ConversationRepository
 from database.repositories.mood import MoodRepository
+from services.export import export_service
 
 
 router = APIRouter()
@@ -20,38 +21,48 @@ mood_repo = MoodRepository()
 
 
 @router.get("/history")
-async def export_history(current_user: dict = Depends(get_current_user)):
-    """Экспорт истории сообщений пользователя в CSV."""
+async def export_history(
+    current_user: dict = Depends(get_current_user),
+    export_format: str = Query(default="csv", alias="format", pattern="^(csv|xlsx)$"),
+    gzip: bool = Query(default=False, description="Сжать CSV в gzip"),
+):
+    """Экспорт всей истории сообщений пользователя (потоково)."""
     user = await user_repo.get_by_telegram_id(current_user["user_id"])
 
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    # Получить все сообщения
-    messages, _ = await conv_repo.get_paginated(user.id, page=1, per_page=10000)
-
-    # Создать CSV
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(["Дата", "Роль", "Сообщение", "Тип", "Теги"])
+    return history_response(
+        export_service.stream_history(
+            user.id, export_format, role_labels=("Вы", "Мира"), compress=gzip
+        ),
+        filename=f"mira_history_{user.telegram_id}",
+        export_format=export_format,
+        compress=gzip,
+    )
 
-    for msg in reversed(messages):  # В хронологическом порядке
-        writer.writerow([
-            msg.created_at.strftime("%Y-%m-%d %H:%M:%S"),
-            "Вы" if msg.role == "user" else "Мира",
-            msg.content,
-            msg.message_type or "text",
-            ", ".join(msg.tags) if msg.tags else ""
-        ])
 
-    output.seek(0)
+def history_response(
+    stream,
+    filename: str,
+    export_format: str = "csv",
+    compress: bool = False,
+) -> StreamingResponse:
+    """StreamingResponse для файла выгрузки с нужным типом и именем."""
+    if export_format == "xlsx":
+        media_type = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        filename += ".xlsx"
+    elif compress:
+        media_type = "application/gzip"
+        filename += ".csv.gz"
+    else:
+        media_type = "text/csv"
+        filename += ".csv"
 
     return StreamingResponse(
-        io.BytesIO(output.getvalue().encode('utf-8-sig')),
-        media_type="text/csv",
-        headers={
-            "Content-Disposition": f"attachment; filename=mira_history_{user.telegram_id}.csv"
-        }
+        stream,
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
     )
 
 
@@ -12,7 +12,8 @@ from webapp.api.auth import get_current_user
 from database.repositories.user import UserRepository
 from database.repositories.conversation import ConversationRepository
 from database.repositories.user_report import UserReportRepository
-from database.repositories.api_cost import ApiCostRepository
+from database.repositories.api_cost import calculate_claude_cost
+from database.api_cost_recorder import api_cost_recorder
 from config.settings import settings
 
 
@@ -20,7 +21,6 @@ router = APIRouter()
 user_repo = UserRepository()
 conv_repo = ConversationRepository()
 report_repo = UserReportRepository()
-api_cost_repo = ApiCostRepository()
 
 
 @router.post("/analysis")
@@ -162,12 +162,14 @@ async def generate_personality_analysis(current_user: dict = Depends(get_current
         tokens_used = response.usage.input_tokens + response.usage.output_tokens
 
         # Рассчитываем стоимость
-        input_cost = (response.usage.input_tokens / 1_000_000) * 3.0
-        output_cost = (response.usage.output_tokens / 1_000_000) * 15.0
-        cost_usd = round(input_cost + output_cost, 6)
+        cost_usd = calculate_claude_cost(
+            "claude-sonnet-4-20250514",
+            response.usage.input_tokens,
+            response.usage.output_tokens,
+        )
 
         # Трекаем стоимость API
-        await api_cost_repo.create(
+        await api_cost_recorder.record(
             user_id=user.id,
             provider='claude',
             operation='personality_analysis',
@@ -9,7 +9,7 @@ from datetime import datetime, timedelta
 
 from webapp.api.auth import get_current_user
 from database.repositories.user import UserRepository
-from database.repositories.mood import MoodRepository
+from database.repositories.mood import MoodRepository, combine_mood_days
 from database.repositories.memory import MemoryRepository
 from database.repositories.conversation import ConversationRepository
 from database.repositories.subscription import SubscriptionRepository
@@ -61,31 +61,20 @@ async def get_stats(current_user: dict = Depends(get_current_user)):
     week_ago = datetime.now() - timedelta(days=7)
     messages_this_week = await conversation_repo.count_by_user_since(user.id, week_ago)
 
+    # Дневные агрегаты настроения за месяц (одним запросом)
+    mood_days = await mood_repo.get_daily(user.id, days=30)
+
     # График настроения за последние 7 дней
-    mood_entries = await mood_repo.get_recent(user.id, days=7)
-    mood_chart = []
-
-    # Группируем по дням
-    mood_by_day: Dict[str, List] = {}
-    for entry in mood_entries:
-        day_key = entry.created_at.strftime("%Y-%m-%d")
-        if day_key not in mood_by_day:
-            mood_by_day[day_key] = []
-        mood_by_day[day_key].append(entry)
-
-    # Усредняем по дням
-    for day_key in sorted(mood_by_day.keys()):
-        entries = mood_by_day[day_key]
-        avg_score = sum(e.mood_score for e in entries) / len(entries)
-        # Берём наиболее частую эмоцию
-        emotions = [e.primary_emotion for e in entries if e.primary_emotion]
-        top_emotion = max(set(emotions), key=emotions.count) if emotions else "neutral"
-
-        mood_chart.append(MoodPoint(
-            date=day_key,
-            score=round(avg_score, 2),
-            emotion=top_emotion
-        ))
+    chart_since = (datetime.now() - timedelta(days=7)).date()
+    mood_chart = [
+        MoodPoint(
+            date=day.day.strftime("%Y-%m-%d"),
+            score=round(day.average_score, 2),
+            emotion=day.dominant_emotion or "neutral",
+        )
+        for day in mood_days
+        if day.day >= chart_since
+    ]
 
     # Топ темы за последний месяц
     topics = await memory_repo.get_recent_topics(user.id, limit=10)
@@ -99,11 +88,7 @@ async def get_stats(current_user: dict = Depends(get_current_user)):
     ]
 
     # Топ эмоции
-    all_moods = await mood_repo.get_recent(user.id, days=30)
-    emotion_counts: Dict[str, int] = {}
-    for mood in all_moods:
-        if mood.primary_emotion:
-            emotion_counts[mood.primary_emotion] = emotion_counts.get(mood.primary_emotion, 0) + 1
+    emotion_counts = combine_mood_days(mood_days).emotions
 
     # Подписка
     subscription = await subscription_repo.get_active(user.id)